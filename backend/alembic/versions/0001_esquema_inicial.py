@@ -0,0 +1,136 @@
+"""esquema inicial
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'clientes',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('telefono', sa.String(length=20), nullable=False),
+        sa.Column('password_hash', sa.Text(), nullable=False),
+        sa.Column('plan_actual', sa.String(length=50), nullable=True),
+        sa.Column('estado_cuenta', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_clientes_id', 'clientes', ['id'])
+    op.create_index('ix_clientes_email', 'clientes', ['email'], unique=True)
+
+    op.create_table(
+        'consumos',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('servicio', sa.String(length=50), nullable=False),
+        sa.Column('cantidad', sa.Float(), nullable=False),
+        sa.Column('unidad', sa.String(length=20), nullable=False),
+        sa.Column('fecha', sa.DateTime(), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('tipo_consumo', sa.String(length=20), nullable=True),
+        sa.Column('costo_unitario', sa.Float(), nullable=True),
+        sa.Column('costo_total', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_consumos_id', 'consumos', ['id'])
+    op.create_index('ix_consumos_cliente_id', 'consumos', ['cliente_id'])
+
+    op.create_table(
+        'facturas',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('numero_factura', sa.String(length=50), nullable=False),
+        sa.Column('monto_total', sa.Float(), nullable=False),
+        sa.Column('monto_subtotal', sa.Float(), nullable=True),
+        sa.Column('impuestos', sa.Float(), nullable=True),
+        sa.Column('descuentos', sa.Float(), nullable=True),
+        sa.Column('fecha_emision', sa.DateTime(), nullable=False),
+        sa.Column('fecha_vencimiento', sa.DateTime(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('metodo_pago', sa.String(length=50), nullable=True),
+        sa.Column('fecha_pago', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('numero_factura')
+    )
+    op.create_index('ix_facturas_id', 'facturas', ['id'])
+    op.create_index('ix_facturas_cliente_id', 'facturas', ['cliente_id'])
+
+    op.create_table(
+        'saldos',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('saldo_actual', sa.Float(), nullable=True),
+        sa.Column('limite_credito', sa.Float(), nullable=True),
+        sa.Column('saldo_disponible', sa.Float(), nullable=True),
+        sa.Column('fecha_ultima_actualizacion', sa.DateTime(), nullable=False),
+        sa.Column('moneda', sa.String(length=10), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_saldos_id', 'saldos', ['id'])
+    op.create_index('ix_saldos_cliente_id', 'saldos', ['cliente_id'], unique=True)
+
+    op.create_table(
+        'planes',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('descripcion', sa.Text(), nullable=True),
+        sa.Column('precio_mensual', sa.Float(), nullable=False),
+        sa.Column('datos_incluidos', sa.Float(), nullable=True),
+        sa.Column('minutos_incluidos', sa.Integer(), nullable=True),
+        sa.Column('sms_incluidos', sa.Integer(), nullable=True),
+        sa.Column('velocidad_maxima', sa.Float(), nullable=True),
+        sa.Column('activo', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_planes_id', 'planes', ['id'])
+
+    op.create_table(
+        'consumos_diarios',
+        sa.Column('id', sa.String(length=50), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('fecha', sa.DateTime(), nullable=False),
+        sa.Column('datos_consumidos', sa.Float(), nullable=True),
+        sa.Column('minutos_consumidos', sa.Integer(), nullable=True),
+        sa.Column('sms_consumidos', sa.Integer(), nullable=True),
+        sa.Column('costo_total', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_consumos_diarios_id', 'consumos_diarios', ['id'])
+    op.create_index('ix_consumos_diarios_cliente_id', 'consumos_diarios', ['cliente_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('consumos_diarios')
+    op.drop_table('planes')
+    op.drop_table('saldos')
+    op.drop_table('facturas')
+    op.drop_table('consumos')
+    op.drop_table('clientes')
@@ -0,0 +1,37 @@
+"""retencion de consumos
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job_checkpoints',
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('nombre')
+    )
+    op.create_index('ix_consumos_fecha_id', 'consumos', ['fecha', 'id'])
+    op.create_index(
+        'ix_consumos_diarios_cliente_fecha', 'consumos_diarios',
+        ['cliente_id', 'fecha'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_consumos_diarios_cliente_fecha', table_name='consumos_diarios')
+    op.drop_index('ix_consumos_fecha_id', table_name='consumos')
+    op.drop_table('job_checkpoints')
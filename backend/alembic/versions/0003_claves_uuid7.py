@@ -0,0 +1,219 @@
+"""claves uuid7 en consumos, consumos_diarios y facturas
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 11:00:00.000000
+
+Cada tabla se reconstruye con una clave primaria UUIDv7 nativa. Los ids de
+texto existentes se conservan en ``id_externo`` para que la API siga
+devolviendo los mismos valores, y el UUID de cada fila se genera a partir de
+su ``created_at`` para mantener el orden temporal en el índice.
+
+La bajada hace la copia inversa: cada fila recupera como clave su id de texto
+(``id_externo``) o, si se creó con la clave UUIDv7, el texto del UUID.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.ids import uuid7
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# Filas copiadas por lote
+BATCH_SIZE = 5000
+
+
+def _columnas(tabla: str) -> list:
+    """Columnas de datos de la tabla (objetos nuevos en cada llamada)"""
+    return {
+        'consumos': [
+            sa.Column('servicio', sa.String(length=50), nullable=False),
+            sa.Column('cantidad', sa.Float(), nullable=False),
+            sa.Column('unidad', sa.String(length=20), nullable=False),
+            sa.Column('fecha', sa.DateTime(), nullable=False),
+            sa.Column('cliente_id', sa.String(length=50), sa.ForeignKey('clientes.id'), nullable=False),
+            sa.Column('tipo_consumo', sa.String(length=20), nullable=True),
+            sa.Column('costo_unitario', sa.Float(), nullable=True),
+            sa.Column('costo_total', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        ],
+        'consumos_diarios': [
+            sa.Column('cliente_id', sa.String(length=50), sa.ForeignKey('clientes.id'), nullable=False),
+            sa.Column('fecha', sa.DateTime(), nullable=False),
+            sa.Column('datos_consumidos', sa.Float(), nullable=True),
+            sa.Column('minutos_consumidos', sa.Integer(), nullable=True),
+            sa.Column('sms_consumidos', sa.Integer(), nullable=True),
+            sa.Column('costo_total', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        ],
+        'facturas': [
+            sa.Column('cliente_id', sa.String(length=50), sa.ForeignKey('clientes.id'), nullable=False),
+            sa.Column('numero_factura', sa.String(length=50), nullable=False, unique=True),
+            sa.Column('monto_total', sa.Float(), nullable=False),
+            sa.Column('monto_subtotal', sa.Float(), nullable=True),
+            sa.Column('impuestos', sa.Float(), nullable=True),
+            sa.Column('descuentos', sa.Float(), nullable=True),
+            sa.Column('fecha_emision', sa.DateTime(), nullable=False),
+            sa.Column('fecha_vencimiento', sa.DateTime(), nullable=False),
+            sa.Column('estado', sa.String(length=20), nullable=True),
+            sa.Column('metodo_pago', sa.String(length=50), nullable=True),
+            sa.Column('fecha_pago', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        ],
+    }[tabla]
+
+
+# Índices secundarios de cada tabla (nombre, columnas, único)
+INDICES = {
+    'consumos': [
+        ('ix_consumos_cliente_id', ['cliente_id'], False),
+        ('ix_consumos_fecha_id', ['fecha', 'id'], False),
+    ],
+    'consumos_diarios': [
+        ('ix_consumos_diarios_cliente_id', ['cliente_id'], False),
+        ('ix_consumos_diarios_cliente_fecha', ['cliente_id', 'fecha'], True),
+    ],
+    'facturas': [
+        ('ix_facturas_cliente_id', ['cliente_id'], False),
+    ],
+}
+
+
+def _rebuild_table(tabla: str) -> None:
+    bind = op.get_bind()
+    legacy = f'{tabla}_legacy'
+    columnas = _columnas(tabla)
+    nombres = [c.name for c in columnas]
+
+    # Liberar los nombres de índices y restricciones antes de recrear la tabla
+    op.drop_index(f'ix_{tabla}_id', table_name=tabla)
+    for nombre, _, _ in INDICES[tabla]:
+        if sa.inspect(bind).has_index(tabla, nombre):
+            op.drop_index(nombre, table_name=tabla)
+    op.rename_table(tabla, legacy)
+    if bind.dialect.name == 'postgresql':
+        _rename_constraints(tabla, legacy)
+
+    nueva = op.create_table(
+        tabla,
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('id_externo', sa.String(length=50), nullable=True),
+        *columnas,
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(f'ix_{tabla}_id_externo', tabla, ['id_externo'], unique=True)
+
+    # Copiar por lotes en orden de creación, generando el UUID desde created_at
+    origen = sa.table(
+        legacy, sa.column('id', sa.String()),
+        *[sa.column(c.name, c.type) for c in _columnas(tabla)]
+    )
+    ultimo = None
+    while True:
+        query = sa.select(origen).order_by(origen.c.id).limit(BATCH_SIZE)
+        if ultimo is not None:
+            query = query.where(origen.c.id > ultimo)
+        filas = bind.execute(query).mappings().all()
+        if not filas:
+            break
+        bind.execute(nueva.insert(), [
+            {
+                **{n: fila[n] for n in nombres},
+                'id': uuid7(fila['created_at']) if fila['created_at'] else uuid7(),
+                'id_externo': fila['id'],
+            }
+            for fila in filas
+        ])
+        ultimo = filas[-1]['id']
+
+    op.drop_table(legacy)
+    for nombre, columnas, unico in INDICES[tabla]:
+        op.create_index(nombre, tabla, columnas, unique=unico)
+
+
+def _rename_constraints(tabla: str, nuevo: str) -> None:
+    """Liberar en PostgreSQL los nombres de restricciones de la tabla renombrada
+
+    Incluye la clave foránea: si ``{tabla}_cliente_id_fkey`` siguiera ocupado,
+    PostgreSQL llamaría ``{tabla}_cliente_id_fkey1`` a la de la tabla nueva y
+    0004 no la encontraría por su nombre.
+    """
+    op.execute(f'ALTER TABLE {nuevo} RENAME CONSTRAINT {tabla}_pkey TO {nuevo}_pkey')
+    op.execute(
+        f'ALTER TABLE {nuevo} RENAME CONSTRAINT {tabla}_cliente_id_fkey '
+        f'TO {nuevo}_cliente_id_fkey'
+    )
+    if tabla == 'facturas':
+        op.execute(
+            f'ALTER TABLE {nuevo} RENAME CONSTRAINT {tabla}_numero_factura_key '
+            f'TO {nuevo}_numero_factura_key'
+        )
+
+
+def _restore_table(tabla: str) -> None:
+    """Volver a la clave de texto: el id es el ``id_externo`` o, si la fila se
+    creó después de la migración, el texto de su UUID"""
+    bind = op.get_bind()
+    uuid7_tabla = f'{tabla}_uuid7'
+    columnas = _columnas(tabla)
+    nombres = [c.name for c in columnas]
+
+    op.drop_index(f'ix_{tabla}_id_externo', table_name=tabla)
+    for nombre, _, _ in INDICES[tabla]:
+        if sa.inspect(bind).has_index(tabla, nombre):
+            op.drop_index(nombre, table_name=tabla)
+    op.rename_table(tabla, uuid7_tabla)
+    if bind.dialect.name == 'postgresql':
+        _rename_constraints(tabla, uuid7_tabla)
+
+    extra = {'sqlite_autoincrement': True} if tabla == 'consumos_diarios' else {}
+    anterior = op.create_table(
+        tabla,
+        sa.Column('id', sa.String(length=50), nullable=False),
+        *columnas,
+        sa.PrimaryKeyConstraint('id'),
+        **extra
+    )
+    op.create_index(f'ix_{tabla}_id', tabla, ['id'])
+
+    origen = sa.table(
+        uuid7_tabla, sa.column('id', sa.Uuid()), sa.column('id_externo', sa.String()),
+        *[sa.column(c.name, c.type) for c in _columnas(tabla)]
+    )
+    ultimo = None
+    while True:
+        query = sa.select(origen).order_by(origen.c.id).limit(BATCH_SIZE)
+        if ultimo is not None:
+            query = query.where(origen.c.id > ultimo)
+        filas = bind.execute(query).mappings().all()
+        if not filas:
+            break
+        bind.execute(anterior.insert(), [
+            {
+                **{n: fila[n] for n in nombres},
+                'id': fila['id_externo'] or str(fila['id']),
+            }
+            for fila in filas
+        ])
+        ultimo = filas[-1]['id']
+
+    op.drop_table(uuid7_tabla)
+    for nombre, columnas_indice, unico in INDICES[tabla]:
+        op.create_index(nombre, tabla, columnas_indice, unique=unico)
+
+
+def upgrade() -> None:
+    for tabla in ('consumos', 'consumos_diarios', 'facturas'):
+        _rebuild_table(tabla)
+
+
+def downgrade() -> None:
+    for tabla in ('facturas', 'consumos_diarios', 'consumos'):
+        _restore_table(tabla)
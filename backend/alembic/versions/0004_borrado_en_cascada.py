@@ -0,0 +1,51 @@
+"""borrado en cascada de clientes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLAS = ('consumos', 'facturas', 'saldos', 'consumos_diarios')
+
+# Nombres para las claves foráneas sin nombre al reconstruir tablas en SQLite
+CONVENCION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _replace_foreign_keys(ondelete) -> None:
+    bind = op.get_bind()
+    for tabla in TABLAS:
+        nombre = f'{tabla}_cliente_id_fkey'
+        if bind.dialect.name == 'postgresql':
+            # NOT VALID + VALIDATE evita bloquear escrituras mientras se valida
+            accion = f' ON DELETE {ondelete}' if ondelete else ''
+            op.execute(f'ALTER TABLE {tabla} DROP CONSTRAINT {nombre}')
+            op.execute(
+                f'ALTER TABLE {tabla} ADD CONSTRAINT {nombre} FOREIGN KEY (cliente_id) '
+                f'REFERENCES clientes (id){accion} NOT VALID'
+            )
+            op.execute(f'ALTER TABLE {tabla} VALIDATE CONSTRAINT {nombre}')
+        else:
+            with op.batch_alter_table(tabla, naming_convention=CONVENCION) as batch:
+                batch.drop_constraint(nombre, type_='foreignkey')
+                batch.create_foreign_key(nombre, 'clientes', ['cliente_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    op.add_column('clientes', sa.Column('eliminado_en', sa.DateTime(timezone=True), nullable=True))
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade() -> None:
+    _replace_foreign_keys(None)
+    with op.batch_alter_table('clientes') as batch:
+        batch.drop_column('eliminado_en')
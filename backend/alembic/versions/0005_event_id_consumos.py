@@ -0,0 +1,36 @@
+"""event_id en consumos
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00.000000
+
+Los productores envían su propio id de evento; el índice único por cliente
+hace que reenviar un lote de CDRs no duplique consumos.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('consumos', sa.Column('event_id', sa.String(length=100), nullable=True))
+    if op.get_bind().dialect.name == 'postgresql':
+        # Sin bloquear las inserciones mientras se construye el índice
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_consumos_cliente_event', 'consumos', ['cliente_id', 'event_id'],
+                unique=True, postgresql_concurrently=True
+            )
+    else:
+        op.create_index('ix_consumos_cliente_event', 'consumos', ['cliente_id', 'event_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_consumos_cliente_event', table_name='consumos')
+    op.drop_column('consumos', 'event_id')
@@ -0,0 +1,59 @@
+"""busqueda indexada de clientes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:00:00.000000
+
+PostgreSQL: extensión pg_trgm con índices GIN de trigramas sobre nombre y
+email, e índice por prefijo sobre telefono. SQLite: tabla FTS5 mantenida por
+triggers, e índice B-tree sobre telefono.
+"""
+from alembic import op
+
+from app.search import FTS_SQLITE_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # CONCURRENTLY: la tabla de clientes sigue aceptando escrituras
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_nombre_trgm '
+                'ON clientes USING gin (nombre gin_trgm_ops)'
+            )
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_email_trgm '
+                'ON clientes USING gin (email gin_trgm_ops)'
+            )
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_telefono_prefijo '
+                'ON clientes (telefono text_pattern_ops)'
+            )
+    else:
+        op.create_index('ix_clientes_telefono_prefijo', 'clientes', ['telefono'])
+        if bind.dialect.name == 'sqlite':
+            for sentencia in FTS_SQLITE_DDL:
+                op.execute(sentencia)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_clientes_telefono_prefijo')
+        op.execute('DROP INDEX IF EXISTS ix_clientes_email_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_clientes_nombre_trgm')
+    else:
+        if bind.dialect.name == 'sqlite':
+            for trigger in ('clientes_fts_ai', 'clientes_fts_ad', 'clientes_fts_au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute('DROP TABLE IF EXISTS clientes_fts')
+        op.drop_index('ix_clientes_telefono_prefijo', table_name='clientes')
@@ -0,0 +1,81 @@
+"""tablas de resumen para analitica
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Índices por fecha de creación/modificación para el refresco incremental
+INDICES_MARCA = [
+    ('ix_consumos_created_at', 'consumos', ['created_at']),
+    ('ix_facturas_created_at', 'facturas', ['created_at']),
+    ('ix_facturas_updated_at', 'facturas', ['updated_at']),
+    ('ix_clientes_updated_at', 'clientes', ['updated_at']),
+]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analytics_uso_diario',
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('servicio', sa.String(length=50), nullable=False),
+        sa.Column('cantidad', sa.Float(), nullable=True),
+        sa.Column('costo', sa.Float(), nullable=True),
+        sa.Column('eventos', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('fecha', 'servicio')
+    )
+    op.create_table(
+        'analytics_clientes_mes',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('mes', sa.String(length=7), nullable=False),
+        sa.Column('datos', sa.Float(), nullable=True),
+        sa.Column('minutos', sa.Float(), nullable=True),
+        sa.Column('sms', sa.Float(), nullable=True),
+        sa.Column('costo', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('cliente_id', 'mes')
+    )
+    op.create_index('ix_analytics_clientes_mes_mes_costo', 'analytics_clientes_mes', ['mes', 'costo'])
+    op.create_table(
+        'analytics_facturas_clientes',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('plan', sa.String(length=50), nullable=False),
+        sa.Column('facturado', sa.Float(), nullable=True),
+        sa.Column('pagado', sa.Float(), nullable=True),
+        sa.Column('pendiente', sa.Float(), nullable=True),
+        sa.Column('vencido', sa.Float(), nullable=True),
+        sa.Column('facturas_vencidas', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('cliente_id')
+    )
+    op.create_table(
+        'analytics_planes',
+        sa.Column('plan', sa.String(length=50), nullable=False),
+        sa.Column('clientes', sa.Integer(), nullable=True),
+        sa.Column('facturado', sa.Float(), nullable=True),
+        sa.Column('pagado', sa.Float(), nullable=True),
+        sa.Column('pendiente', sa.Float(), nullable=True),
+        sa.Column('vencido', sa.Float(), nullable=True),
+        sa.Column('facturas_vencidas', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('plan')
+    )
+    for nombre, tabla, columnas in INDICES_MARCA:
+        op.create_index(nombre, tabla, columnas)
+
+
+def downgrade() -> None:
+    for nombre, tabla, _ in INDICES_MARCA:
+        op.drop_index(nombre, table_name=tabla)
+    op.drop_table('analytics_planes')
+    op.drop_table('analytics_facturas_clientes')
+    op.drop_index('ix_analytics_clientes_mes_mes_costo', table_name='analytics_clientes_mes')
+    op.drop_table('analytics_clientes_mes')
+    op.drop_table('analytics_uso_diario')
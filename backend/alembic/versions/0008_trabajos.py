@@ -0,0 +1,42 @@
+"""trabajos en segundo plano
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('cola', sa.String(length=30), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('parametros', sa.Text(), nullable=True),
+        sa.Column('progreso', sa.Float(), nullable=True),
+        sa.Column('mensaje', sa.Text(), nullable=True),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('solicitado_por', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_solicitado_por', 'jobs', ['solicitado_por'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_solicitado_por', table_name='jobs')
+    op.drop_table('jobs')
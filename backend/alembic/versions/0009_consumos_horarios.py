@@ -0,0 +1,36 @@
+"""rollup horario de consumos para series temporales
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'consumos_horarios',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('hora', sa.DateTime(), nullable=False),
+        sa.Column('servicio', sa.String(length=50), nullable=False),
+        sa.Column('cantidad', sa.Float(), nullable=True),
+        sa.Column('costo', sa.Float(), nullable=True),
+        sa.Column('eventos', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cliente_id', 'hora', 'servicio')
+    )
+    op.create_index('ix_consumos_horarios_hora', 'consumos_horarios', ['hora'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_consumos_horarios_hora', table_name='consumos_horarios')
+    op.drop_table('consumos_horarios')
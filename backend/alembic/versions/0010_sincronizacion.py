@@ -0,0 +1,86 @@
+"""sincronizacion incremental: updated_at en altas, indices y eliminaciones
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 18:00:00.000000
+
+``updated_at`` pasa a rellenarse también al insertar (las filas existentes
+toman su ``created_at``), de modo que una sola columna ordena altas y
+modificaciones. El relleno se hace por lotes para no bloquear ``consumos``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+TABLAS = ('consumos', 'facturas')
+
+# Filas por UPDATE al rellenar updated_at
+LOTE_RELLENO = 10000
+
+
+def _backfill_updated_at(tabla: str) -> None:
+    bind = op.get_bind()
+    while True:
+        resultado = bind.execute(sa.text(
+            f'UPDATE {tabla} SET updated_at = created_at WHERE id IN '
+            f'(SELECT id FROM {tabla} WHERE updated_at IS NULL LIMIT {LOTE_RELLENO})'
+        ))
+        if resultado.rowcount < LOTE_RELLENO:
+            return
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for tabla in TABLAS:
+        if bind.dialect.name == 'postgresql':
+            op.execute(f'ALTER TABLE {tabla} ALTER COLUMN updated_at SET DEFAULT now()')
+        else:
+            with op.batch_alter_table(tabla) as batch:
+                batch.alter_column('updated_at', server_default=sa.text('(CURRENT_TIMESTAMP)'))
+
+    if bind.dialect.name == 'postgresql':
+        # Cada lote del relleno se confirma por separado; CONCURRENTLY: consumos
+        # y facturas siguen aceptando escrituras mientras se crean los índices
+        with op.get_context().autocommit_block():
+            for tabla in TABLAS:
+                _backfill_updated_at(tabla)
+            for tabla in TABLAS:
+                op.execute(
+                    f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{tabla}_cliente_updated '
+                    f'ON {tabla} (cliente_id, updated_at, id)'
+                )
+    else:
+        for tabla in TABLAS:
+            _backfill_updated_at(tabla)
+            op.create_index(f'ix_{tabla}_cliente_updated', tabla, ['cliente_id', 'updated_at', 'id'])
+
+    op.create_table(
+        'eliminaciones',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('entidad', sa.String(length=20), nullable=False),
+        sa.Column('entidad_id', sa.String(length=50), nullable=False),
+        sa.Column('eliminado_en', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_eliminaciones_cliente_id', 'eliminaciones', ['cliente_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_eliminaciones_cliente_id', table_name='eliminaciones')
+    op.drop_table('eliminaciones')
+    bind = op.get_bind()
+    for tabla in TABLAS:
+        op.drop_index(f'ix_{tabla}_cliente_updated', table_name=tabla)
+        if bind.dialect.name == 'postgresql':
+            op.execute(f'ALTER TABLE {tabla} ALTER COLUMN updated_at DROP DEFAULT')
+        else:
+            with op.batch_alter_table(tabla) as batch:
+                batch.alter_column('updated_at', server_default=None)
@@ -0,0 +1,87 @@
+"""grupos de lineas con bolsa compartida y su acumulado mensual
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 19:00:00.000000
+
+``clientes.grupo_id`` se añade como columna nula: en PostgreSQL no reescribe
+la tabla. En SQLite la tabla se recrea para que la clave foránea quede como
+restricción de tabla (la reflexión solo lee ``ON DELETE`` de ahí, y el esquema
+debe coincidir con el modelo); la subida y la bajada vuelven a crear los
+triggers de búsqueda de 0006.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import FTS_SQLITE_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'grupos',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('plan_id', sa.String(length=50), nullable=False),
+        sa.Column('miembros', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['plan_id'], ['planes.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'consumos_grupos_mes',
+        sa.Column('grupo_id', sa.Uuid(), nullable=False),
+        sa.Column('mes', sa.String(length=7), nullable=False),
+        sa.Column('datos', sa.Float(), nullable=True),
+        sa.Column('minutos', sa.Float(), nullable=True),
+        sa.Column('sms', sa.Float(), nullable=True),
+        sa.Column('costo', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['grupo_id'], ['grupos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('grupo_id', 'mes')
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        with op.batch_alter_table('clientes', recreate='always') as batch:
+            batch.add_column(sa.Column('grupo_id', sa.Uuid(), nullable=True))
+            batch.create_foreign_key(
+                'fk_clientes_grupo_id', 'grupos', ['grupo_id'], ['id'], ondelete='SET NULL'
+            )
+        for sentencia in FTS_SQLITE_DDL:
+            op.execute(sentencia)
+    else:
+        op.add_column('clientes', sa.Column('grupo_id', sa.Uuid(), nullable=True))
+        op.create_foreign_key(
+            'fk_clientes_grupo_id', 'clientes', 'grupos', ['grupo_id'], ['id'], ondelete='SET NULL'
+        )
+    if bind.dialect.name == 'postgresql':
+        # CONCURRENTLY: la tabla de clientes sigue aceptando escrituras
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_grupo_id ON clientes (grupo_id)'
+            )
+    else:
+        op.create_index('ix_clientes_grupo_id', 'clientes', ['grupo_id'])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    op.drop_index('ix_clientes_grupo_id', table_name='clientes')
+    if bind.dialect.name == 'sqlite':
+        with op.batch_alter_table('clientes', recreate='always') as batch:
+            batch.drop_column('grupo_id')
+        for sentencia in FTS_SQLITE_DDL:
+            op.execute(sentencia)
+    else:
+        op.drop_constraint('fk_clientes_grupo_id', 'clientes', type_='foreignkey')
+        op.drop_column('clientes', 'grupo_id')
+    op.drop_table('consumos_grupos_mes')
+    op.drop_table('grupos')
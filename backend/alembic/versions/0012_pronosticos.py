@@ -0,0 +1,38 @@
+"""pronosticos de consumo y factura al cierre del mes
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'pronosticos',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('mes', sa.String(length=7), nullable=False),
+        sa.Column('datos', sa.Float(), nullable=True),
+        sa.Column('minutos', sa.Float(), nullable=True),
+        sa.Column('sms', sa.Float(), nullable=True),
+        sa.Column('costo', sa.Float(), nullable=True),
+        sa.Column('costo_actual', sa.Float(), nullable=True),
+        sa.Column('factura_estimada', sa.Float(), nullable=True),
+        sa.Column('modelo', sa.String(length=20), nullable=False),
+        sa.Column('calculado_en', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cliente_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pronosticos')
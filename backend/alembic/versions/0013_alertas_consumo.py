@@ -0,0 +1,54 @@
+"""deteccion de consumos anomalos: estado movil y alertas
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'anomalias_estado',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('metrica', sa.String(length=20), nullable=False),
+        sa.Column('media', sa.Float(), nullable=True),
+        sa.Column('varianza', sa.Float(), nullable=True),
+        sa.Column('dias', sa.Integer(), nullable=True),
+        sa.Column('ultimo_dia', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cliente_id', 'metrica')
+    )
+    op.create_table(
+        'alertas_consumo',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('metrica', sa.String(length=20), nullable=False),
+        sa.Column('valor', sa.Float(), nullable=False),
+        sa.Column('media', sa.Float(), nullable=False),
+        sa.Column('desviacion', sa.Float(), nullable=False),
+        sa.Column('puntuacion', sa.Float(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_alertas_consumo_cliente_dia', 'alertas_consumo', ['cliente_id', 'dia', 'metrica'], unique=True)
+    op.create_index('ix_alertas_consumo_estado_dia', 'alertas_consumo', ['estado', 'dia'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alertas_consumo_estado_dia', table_name='alertas_consumo')
+    op.drop_index('ix_alertas_consumo_cliente_dia', table_name='alertas_consumo')
+    op.drop_table('alertas_consumo')
+    op.drop_table('anomalias_estado')
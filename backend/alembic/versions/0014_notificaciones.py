@@ -0,0 +1,70 @@
+"""contadores mensuales por linea y outbox de notificaciones
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19 22:00:00.000000
+
+Los contadores del mes en curso se rellenan desde ``consumos`` para que el
+primer consumo tras el despliegue compare contra el total real del mes.
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'consumos_mes',
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('mes', sa.String(length=7), nullable=False),
+        sa.Column('datos', sa.Float(), nullable=True),
+        sa.Column('minutos', sa.Float(), nullable=True),
+        sa.Column('sms', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cliente_id', 'mes')
+    )
+    op.create_table(
+        'notificaciones_outbox',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('cliente_id', sa.String(length=50), nullable=False),
+        sa.Column('tipo', sa.String(length=30), nullable=False),
+        sa.Column('datos', sa.Text(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=True),
+        sa.Column('disponible_en', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['cliente_id'], ['clientes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_notificaciones_outbox_estado_id', 'notificaciones_outbox', ['estado', 'id']
+    )
+
+    inicio = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    fin = (inicio + timedelta(days=32)).replace(day=1)
+    op.get_bind().execute(
+        sa.text(
+            "INSERT INTO consumos_mes (cliente_id, mes, datos, minutos, sms) "
+            "SELECT cliente_id, :mes, "
+            "SUM(CASE WHEN servicio = 'datos' THEN cantidad ELSE 0 END), "
+            "SUM(CASE WHEN servicio = 'minutos' THEN cantidad ELSE 0 END), "
+            "SUM(CASE WHEN servicio = 'sms' THEN cantidad ELSE 0 END) "
+            "FROM consumos WHERE fecha >= :inicio AND fecha < :fin GROUP BY cliente_id"
+        ),
+        {"mes": inicio.strftime("%Y-%m"), "inicio": inicio, "fin": fin}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notificaciones_outbox_estado_id', table_name='notificaciones_outbox')
+    op.drop_table('notificaciones_outbox')
+    op.drop_table('consumos_mes')
@@ -0,0 +1,50 @@
+"""busqueda de clientes por telefono normalizado
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-20 09:00:00.000000
+
+El índice por prefijo de ``telefono`` pasa a ser sobre el teléfono sin '+'
+ni separadores, la misma normalización que aplica la búsqueda al texto: así
+``1234`` encuentra ``+1234567890`` y ``+1 234-567`` encuentra ``1234567...``.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+# Misma expresión que app.models.telefono_normalizado
+TELEFONO_NORMALIZADO = (
+    "replace(replace(replace(replace(replace(telefono, '+', ''), ' ', ''), '-', ''), '(', ''), ')', '')"
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY: la tabla de clientes sigue aceptando escrituras
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_telefono_normalizado '
+                f'ON clientes ({TELEFONO_NORMALIZADO} text_pattern_ops)'
+            )
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_clientes_telefono_prefijo')
+    else:
+        op.execute(f'CREATE INDEX ix_clientes_telefono_normalizado ON clientes ({TELEFONO_NORMALIZADO})')
+        op.drop_index('ix_clientes_telefono_prefijo', table_name='clientes')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute(
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_clientes_telefono_prefijo '
+                'ON clientes (telefono text_pattern_ops)'
+            )
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_clientes_telefono_normalizado')
+    else:
+        op.create_index('ix_clientes_telefono_prefijo', 'clientes', ['telefono'])
+        op.execute('DROP INDEX ix_clientes_telefono_normalizado')
@@ -0,0 +1,187 @@
+"""
+Control de admisión: límite de tasa por cliente y de concurrencia por endpoint.
+
+Cada endpoint caro pertenece a una clase de ruta (``dashboard``, ``lectura``,
+``ingesta``, ``admin``, ``trabajos``) y se protege con ``Depends(admit(clase))``
+en el decorador, que se evalúa antes que ``get_current_user`` y por tanto
+antes de tocar el pool de conexiones:
+
+- Cubo de tokens por ``(cliente_id, clase)`` con ``rate_limit_per_second`` y
+  ``rate_limit_burst``. El cliente sale del JWT sin consultar la BD. Al
+  agotarse responde 429 con ``Retry-After``. Con ``rate_limit_redis_url`` los
+  cubos viven en Redis y el límite es global entre workers; si Redis no
+  responde se deja pasar la petición.
+- Un máximo de peticiones en curso por endpoint y worker
+  (``concurrency_limits``). Por encima se responde 503 con ``Retry-After``
+  en lugar de hacer cola esperando una conexión del pool.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+
+from .auth import security, verify_token
+from .config import settings
+from .metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """Cubos de tokens en memoria (por worker)"""
+
+    def __init__(self, max_cubos: int = 100000):
+        self.max_cubos = max_cubos
+        self._lock = threading.Lock()
+        self._cubos: Dict[str, Tuple[float, float]] = {}
+
+    def acquire(self, clave: str, tasa: float, capacidad: int) -> Tuple[bool, float]:
+        """Consumir un token; devuelve si se admite y los segundos hasta el siguiente"""
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ultimo = self._cubos.get(clave, (float(capacidad), ahora))
+            tokens = min(float(capacidad), tokens + (ahora - ultimo) * tasa)
+            if tokens >= 1.0:
+                self._cubos[clave] = (tokens - 1.0, ahora)
+                return True, 0.0
+            self._cubos[clave] = (tokens, ahora)
+            if len(self._cubos) > self.max_cubos:
+                self._evict(ahora, tasa, capacidad)
+            return False, (1.0 - tokens) / tasa
+
+    def _evict(self, ahora: float, tasa: float, capacidad: int) -> None:
+        # Un cubo que ya se habría rellenado equivale a no tenerlo
+        lleno = capacidad / tasa
+        self._cubos = {k: v for k, v in self._cubos.items() if ahora - v[1] < lleno}
+
+
+# Mismo algoritmo que TokenBucketLimiter, atómico en Redis y con su reloj
+_TOKEN_BUCKET_LUA = """
+local tasa = tonumber(ARGV[1])
+local capacidad = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cubo = redis.call('HMGET', KEYS[1], 'tokens', 'ultimo')
+local tokens = tonumber(cubo[1]) or capacidad
+local ultimo = tonumber(cubo[2]) or ahora
+tokens = math.min(capacidad, tokens + (ahora - ultimo) * tasa)
+local admitido = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    admitido = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ultimo', tostring(ahora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / tasa) + 1)
+return {admitido, tostring(tokens)}
+"""
+
+
+class RedisTokenBucketLimiter:
+    """Cubos de tokens compartidos entre workers en Redis"""
+
+    def __init__(self, url: str, prefijo: str = "telcox:tasa"):
+        import redis
+
+        self.prefijo = prefijo
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+
+    def acquire(self, clave: str, tasa: float, capacidad: int) -> Tuple[bool, float]:
+        admitido, tokens = self._script(keys=[f"{self.prefijo}:{clave}"], args=[tasa, capacidad])
+        if admitido:
+            return True, 0.0
+        return False, (1.0 - float(tokens)) / tasa
+
+
+def _build_limiter():
+    if settings.rate_limit_redis_url:
+        try:
+            return RedisTokenBucketLimiter(settings.rate_limit_redis_url)
+        except ImportError:
+            logger.warning("Paquete redis no disponible, límite de tasa por worker")
+    return TokenBucketLimiter()
+
+
+# Limitador de tasa del proceso
+rate_limiter = _build_limiter()
+
+
+class ConcurrencyLimit:
+    """Peticiones en curso de un endpoint en este worker"""
+
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self.en_curso = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.en_curso >= self.maximo:
+                return False
+            self.en_curso += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.en_curso -= 1
+
+
+def _get_client_key(request: Request, credentials: Optional[HTTPAuthorizationCredentials]) -> str:
+    """Cliente del token (sin consultar la BD) o, si no es válido, la IP"""
+    token = verify_token(credentials.credentials) if credentials else None
+    if token is not None:
+        return token.cliente_id
+    return f"ip:{request.client.host if request.client else 'desconocida'}"
+
+
+def _reject(codigo: int, clase: str, motivo: str, espera_s: float, detalle: str):
+    metricas.incr("admision_rechazos", clase=clase, motivo=motivo)
+    raise HTTPException(
+        status_code=codigo,
+        detail=detalle,
+        headers={"Retry-After": str(max(1, math.ceil(espera_s)))}
+    )
+
+
+def admit(clase: str):
+    """Dependencia de admisión para los endpoints de una clase de ruta"""
+    # Un contador por endpoint: cada llamada a admit() decora un endpoint
+    limite = ConcurrencyLimit(settings.concurrency_limits.get(clase, 0))
+
+    async def dependencia(request: Request,
+                          credentials: HTTPAuthorizationCredentials = Depends(security)):
+        if not settings.rate_limit_enabled:
+            yield
+            return
+
+        tasa = settings.rate_limit_per_second.get(clase)
+        if tasa:
+            clave = f"{clase}:{_get_client_key(request, credentials)}"
+            try:
+                admitido, espera_s = rate_limiter.acquire(
+                    clave, tasa, settings.rate_limit_burst.get(clase, 1)
+                )
+            except Exception as e:
+                # Sin el almacén de cubos se admite: mejor sin límite que sin servicio
+                logger.warning(f"Límite de tasa no disponible: {e}")
+                admitido, espera_s = True, 0.0
+            if not admitido:
+                _reject(status.HTTP_429_TOO_MANY_REQUESTS, clase, "tasa", espera_s,
+                        "Demasiadas peticiones, reintente más tarde")
+
+        if limite.maximo <= 0:
+            yield
+            return
+        if not limite.try_acquire():
+            _reject(status.HTTP_503_SERVICE_UNAVAILABLE, clase, "concurrencia", 1.0,
+                    "Servicio saturado, reintente más tarde")
+        try:
+            yield
+        finally:
+            limite.release()
+
+    return dependencia
@@ -0,0 +1,596 @@
+"""
+Analítica de toda la base de clientes servida desde tablas de resumen.
+
+``/admin/analytics`` solo lee las tablas ``analytics_*``; nunca recorre
+``consumos`` ni ``facturas``. Esas tablas se refrescan de forma incremental:
+
+- Consumos: cada refresco agrega los consumos con ``created_at`` entre la
+  marca de agua guardada y ``ahora - analytics_safety_lag_s`` y los suma a
+  ``analytics_uso_diario`` y ``analytics_clientes_mes``. Los consumos son
+  inmutables, así que basta con acumular. Suma y marca de agua se confirman
+  en la misma transacción, por lo que un refresco interrumpido no cuenta dos
+  veces ninguna ventana.
+- Facturas: cambian de estado, así que no se acumulan. Se buscan los clientes
+  con facturas creadas o modificadas (o con cambio de plan) desde la marca de
+  agua, se recalculan sus totales y la diferencia con los anteriores se
+  aplica a ``analytics_planes``.
+- Rollup horario: ``consumos_horarios`` (cliente, hora, servicio) se acumula
+  igual que los resúmenes de consumo, con su propia marca de agua, y es la
+  fuente de las series temporales (``app/series.py``). El checkpoint guarda
+  también la ``cobertura``: la primera hora a partir de la cual el rollup
+  tiene todos los consumos (lo anterior ya estaba compactado o archivado al
+  crearlo). Las horas más antiguas que ``series_hourly_retention_days`` se
+  podan.
+- Grupos: ``consumos_grupos_mes`` es la suma de ``analytics_clientes_mes`` de
+  los miembros actuales de cada grupo. El refresco suma cada ventana al grupo
+  que tiene la línea en ese momento; al unir o quitar una línea se suman o
+  restan sus meses ya acumulados, con la marca de consumos bloqueada para no
+  cruzarse con un refresco.
+
+El margen ``analytics_safety_lag_s`` cubre las transacciones que confirman
+poco después de fijar su ``created_at`` y la resolución de segundos de
+``CURRENT_TIMESTAMP`` en SQLite.
+"""
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .metrics import metricas
+from .models import (
+    AnalyticsClienteMes, AnalyticsFacturasCliente, AnalyticsPlan, AnalyticsUsoDiario,
+    Cliente, Consumo, ConsumoDiario, ConsumoGrupoMes, ConsumoHorario, Factura, Grupo, JobCheckpoint
+)
+from .retention import get_retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+JOB_CONSUMOS = "analytics_consumos"
+JOB_FACTURAS = "analytics_facturas"
+JOB_HORARIO = "consumos_horarios"
+
+# Clientes por consulta IN al leer o recalcular resúmenes
+CHUNK_CLIENTES = 500
+
+CAMPOS_FACTURAS = ("facturado", "pagado", "pendiente", "vencido", "facturas_vencidas")
+
+CAMPOS_MES = ("datos", "minutos", "sms", "costo")
+
+
+def _as_utc(valor: datetime) -> datetime:
+    return valor.replace(tzinfo=timezone.utc) if valor.tzinfo is None else valor
+
+
+def _as_date(valor) -> date:
+    # SQLite devuelve date() como texto
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _chunks(valores: List, tamano: int = CHUNK_CLIENTES) -> Iterable[List]:
+    for i in range(0, len(valores), tamano):
+        yield valores[i:i + tamano]
+
+
+def _lock_watermark(db: Session, nombre: str) -> Optional[datetime]:
+    """Leer la marca de agua bloqueando su fila (un solo refresco a la vez en PostgreSQL)
+
+    Si la fila no existe se crea sin confirmar (la transacción es la del
+    llamante, también desde las peticiones) y sin chocar con otra creación
+    concurrente.
+    """
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(
+        dialecto.insert(JobCheckpoint).values(nombre=nombre, valor=None)
+        .on_conflict_do_nothing(index_elements=["nombre"])
+    )
+    checkpoint = db.query(JobCheckpoint).filter(
+        JobCheckpoint.nombre == nombre
+    ).with_for_update().one()
+    if not checkpoint.valor:
+        return None
+    return datetime.fromisoformat(json.loads(checkpoint.valor)["hasta"])
+
+
+def _save_watermark(db: Session, nombre: str, hasta: datetime, **extra) -> None:
+    db.merge(JobCheckpoint(nombre=nombre, valor=json.dumps({"hasta": hasta.isoformat(), **extra})))
+
+
+def _checkpoint_data(db: Session, nombre: str) -> dict:
+    checkpoint = db.get(JobCheckpoint, nombre)
+    return json.loads(checkpoint.valor) if checkpoint and checkpoint.valor else {}
+
+
+def get_watermarks(db: Session) -> Dict[str, Optional[str]]:
+    marcas = {}
+    for nombre in (JOB_CONSUMOS, JOB_FACTURAS, JOB_HORARIO):
+        checkpoint = db.get(JobCheckpoint, nombre)
+        marcas[nombre] = json.loads(checkpoint.valor)["hasta"] if checkpoint and checkpoint.valor else None
+    return marcas
+
+
+def _refresh_bound() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.analytics_safety_lag_s)
+
+
+def _fold_consumos(db: Session, desde: datetime, hasta: datetime) -> int:
+    """Sumar a los resúmenes los consumos con created_at en (desde, hasta]"""
+    dia = func.date(Consumo.fecha)
+    filas = db.query(
+        Consumo.cliente_id, dia, Consumo.servicio,
+        func.sum(Consumo.cantidad), func.sum(Consumo.costo_total), func.count()
+    ).filter(
+        Consumo.created_at > desde,
+        Consumo.created_at <= hasta
+    ).group_by(Consumo.cliente_id, dia, Consumo.servicio).all()
+
+    uso: Dict[Tuple[date, str], List[float]] = {}
+    mensual: Dict[Tuple[str, str], Dict[str, float]] = {}
+    for cliente_id, dia_valor, servicio, cantidad, costo, eventos in filas:
+        dia_valor = _as_date(dia_valor)
+        totales = uso.setdefault((dia_valor, servicio), [0.0, 0.0, 0])
+        totales[0] += cantidad or 0.0
+        totales[1] += costo or 0.0
+        totales[2] += eventos
+        mes = mensual.setdefault(
+            (cliente_id, dia_valor.strftime("%Y-%m")),
+            {"datos": 0.0, "minutos": 0.0, "sms": 0.0, "costo": 0.0}
+        )
+        if servicio in ("datos", "minutos", "sms"):
+            mes[servicio] += cantidad or 0.0
+        mes["costo"] += costo or 0.0
+
+    if uso:
+        existentes = {
+            (fila.fecha, fila.servicio): fila
+            for fila in db.query(AnalyticsUsoDiario).filter(
+                AnalyticsUsoDiario.fecha.in_({dia_valor for dia_valor, _ in uso})
+            )
+        }
+        for (dia_valor, servicio), (cantidad, costo, eventos) in uso.items():
+            fila = existentes.get((dia_valor, servicio))
+            if fila is None:
+                db.add(AnalyticsUsoDiario(
+                    fecha=dia_valor, servicio=servicio, cantidad=cantidad, costo=costo, eventos=eventos
+                ))
+            else:
+                fila.cantidad += cantidad
+                fila.costo += costo
+                fila.eventos += eventos
+
+    claves = list(mensual)
+    for lote in _chunks(claves):
+        existentes = {
+            (fila.cliente_id, fila.mes): fila
+            for fila in db.query(AnalyticsClienteMes).filter(
+                AnalyticsClienteMes.cliente_id.in_({cliente_id for cliente_id, _ in lote}),
+                AnalyticsClienteMes.mes.in_({mes for _, mes in lote})
+            )
+        }
+        for clave in lote:
+            totales = mensual[clave]
+            fila = existentes.get(clave)
+            if fila is None:
+                db.add(AnalyticsClienteMes(cliente_id=clave[0], mes=clave[1], **totales))
+            else:
+                for campo, valor in totales.items():
+                    setattr(fila, campo, getattr(fila, campo) + valor)
+
+    # Lo mismo por grupo, con la pertenencia actual de cada línea
+    grupos = {}
+    for lote in _chunks(sorted({cliente_id for cliente_id, _ in mensual})):
+        grupos.update(
+            db.query(Cliente.id, Cliente.grupo_id).filter(
+                Cliente.id.in_(lote),
+                Cliente.grupo_id.isnot(None)
+            )
+        )
+    por_grupo: Dict[Tuple[object, str], Dict[str, float]] = {}
+    for (cliente_id, mes), totales in mensual.items():
+        if cliente_id in grupos:
+            acumulado = por_grupo.setdefault((grupos[cliente_id], mes), dict.fromkeys(CAMPOS_MES, 0.0))
+            for campo, valor in totales.items():
+                acumulado[campo] += valor
+    _add_group_totals(db, por_grupo, +1)
+
+    return len(filas)
+
+
+def _add_group_totals(db: Session, totales: Dict[Tuple[object, str], Dict[str, float]], signo: int) -> None:
+    """Sumar (o restar con ``signo`` -1) totales por (grupo, mes) al acumulado de grupos"""
+    claves = list(totales)
+    for lote in _chunks(claves):
+        existentes = {
+            (fila.grupo_id, fila.mes): fila
+            for fila in db.query(ConsumoGrupoMes).filter(
+                ConsumoGrupoMes.grupo_id.in_({grupo_id for grupo_id, _ in lote}),
+                ConsumoGrupoMes.mes.in_({mes for _, mes in lote})
+            )
+        }
+        for clave in lote:
+            fila = existentes.get(clave)
+            if fila is None:
+                fila = ConsumoGrupoMes(grupo_id=clave[0], mes=clave[1], **dict.fromkeys(CAMPOS_MES, 0.0))
+                db.add(fila)
+            for campo, valor in totales[clave].items():
+                setattr(fila, campo, getattr(fila, campo) + signo * valor)
+
+
+def _member_totals(db: Session, cliente_id: str, grupo_id) -> Dict[Tuple[object, str], Dict[str, float]]:
+    """Meses acumulados de una línea, con la clave (grupo, mes) del acumulado de grupos"""
+    return {
+        (grupo_id, fila.mes): {campo: getattr(fila, campo) or 0.0 for campo in CAMPOS_MES}
+        for fila in db.query(AnalyticsClienteMes).filter(AnalyticsClienteMes.cliente_id == cliente_id)
+    }
+
+
+def move_group_member(db: Session, cliente: Cliente, grupo: Optional[Grupo]) -> None:
+    """Pasar una línea a ``grupo`` (o sacarla con None) moviendo sus totales (sin confirmar)
+
+    Bloquea la marca de consumos hasta el commit del llamante: un refresco en
+    curso termina antes o empieza después, nunca suma la misma ventana con la
+    pertenencia a medias.
+    """
+    _lock_watermark(db, JOB_CONSUMOS)
+    anterior = db.get(Grupo, cliente.grupo_id) if cliente.grupo_id is not None else None
+    if anterior is not None and grupo is not None and anterior.id == grupo.id:
+        return
+    if anterior is not None:
+        _add_group_totals(db, _member_totals(db, cliente.id, anterior.id), -1)
+        anterior.miembros -= 1
+    if grupo is not None:
+        _add_group_totals(db, _member_totals(db, cliente.id, grupo.id), +1)
+        grupo.miembros += 1
+    cliente.grupo_id = grupo.id if grupo is not None else None
+
+
+def refresh_consumo_summaries(db: Session, hasta: Optional[datetime] = None) -> Dict[str, int]:
+    """Llevar los resúmenes de consumo hasta ``hasta`` por ventanas de created_at"""
+    hasta = _as_utc(hasta or _refresh_bound())
+    marca = _lock_watermark(db, JOB_CONSUMOS)
+    resumen = {"ventanas": 0, "grupos": 0}
+
+    if marca is None:
+        # Primer refresco: empezar por el consumo más antiguo
+        minimo = db.query(func.min(Consumo.created_at)).scalar()
+        if minimo is None:
+            _save_watermark(db, JOB_CONSUMOS, hasta)
+            db.commit()
+            return resumen
+        marca = _as_utc(minimo) - timedelta(microseconds=1)
+    marca = _as_utc(marca)
+
+    ventana = timedelta(hours=settings.analytics_window_hours)
+    while marca < hasta:
+        fin = min(marca + ventana, hasta)
+        try:
+            resumen["grupos"] += _fold_consumos(db, marca, fin)
+            _save_watermark(db, JOB_CONSUMOS, fin)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        resumen["ventanas"] += 1
+        marca = fin
+        if marca < hasta:
+            # Volver a tomar el bloqueo de la marca para la siguiente ventana
+            _lock_watermark(db, JOB_CONSUMOS)
+    return resumen
+
+
+def _hour_start(db: Session, columna):
+    """Inicio de la hora de una fecha en SQL"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", columna)
+    return func.strftime("%Y-%m-%d %H:00:00", columna)
+
+
+def _as_datetime(valor) -> datetime:
+    # SQLite devuelve strftime() como texto
+    return datetime.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def hourly_retention_bound() -> datetime:
+    """Primera hora que se conserva en el rollup horario"""
+    limite = datetime.now() - timedelta(days=settings.series_hourly_retention_days)
+    return limite.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _initial_hourly_coverage(db: Session) -> datetime:
+    """Primera hora cuyos consumos siguen todos en ``consumos`` al crear el rollup"""
+    cobertura = get_retention_cutoff()
+    ultimo_diario = db.query(func.max(ConsumoDiario.fecha)).scalar()
+    if ultimo_diario is not None:
+        dia = _as_datetime(ultimo_diario).replace(hour=0, minute=0, second=0, microsecond=0)
+        cobertura = max(cobertura, dia + timedelta(days=1))
+    if settings.archive_enabled:
+        from .archive import get_archive_cutoff
+
+        cobertura = max(cobertura, get_archive_cutoff())
+    return cobertura
+
+
+def get_hourly_coverage(db: Session) -> Optional[Tuple[datetime, datetime]]:
+    """Cobertura del rollup horario: (primera hora completa, marca de agua de created_at)"""
+    datos = _checkpoint_data(db, JOB_HORARIO)
+    if not datos.get("cobertura"):
+        return None
+    cobertura = max(datetime.fromisoformat(datos["cobertura"]), hourly_retention_bound())
+    return cobertura, _as_utc(datetime.fromisoformat(datos["hasta"]))
+
+
+def _fold_hourly(db: Session, desde: datetime, hasta: datetime) -> int:
+    """Sumar al rollup horario los consumos con created_at en (desde, hasta]"""
+    hora = _hour_start(db, Consumo.fecha)
+    filas = db.query(
+        Consumo.cliente_id, hora, Consumo.servicio,
+        func.sum(Consumo.cantidad), func.sum(Consumo.costo_total), func.count()
+    ).filter(
+        Consumo.created_at > desde,
+        Consumo.created_at <= hasta
+    ).group_by(Consumo.cliente_id, hora, Consumo.servicio).all()
+
+    acumulado = {
+        (cliente_id, _as_datetime(hora_valor), servicio): (cantidad or 0.0, costo or 0.0, eventos)
+        for cliente_id, hora_valor, servicio, cantidad, costo, eventos in filas
+    }
+    claves = list(acumulado)
+    for lote in _chunks(claves):
+        existentes = {
+            (fila.cliente_id, fila.hora, fila.servicio): fila
+            for fila in db.query(ConsumoHorario).filter(
+                ConsumoHorario.cliente_id.in_({cliente_id for cliente_id, _, _ in lote}),
+                ConsumoHorario.hora.in_({hora_valor for _, hora_valor, _ in lote})
+            )
+        }
+        for clave in lote:
+            cantidad, costo, eventos = acumulado[clave]
+            fila = existentes.get(clave)
+            if fila is None:
+                db.add(ConsumoHorario(
+                    cliente_id=clave[0], hora=clave[1], servicio=clave[2],
+                    cantidad=cantidad, costo=costo, eventos=eventos
+                ))
+            else:
+                fila.cantidad += cantidad
+                fila.costo += costo
+                fila.eventos += eventos
+
+    return len(filas)
+
+
+def refresh_hourly_rollup(db: Session, hasta: Optional[datetime] = None) -> Dict[str, int]:
+    """Llevar el rollup horario hasta ``hasta`` y podar las horas antiguas"""
+    hasta = _as_utc(hasta or _refresh_bound())
+    marca = _lock_watermark(db, JOB_HORARIO)
+    cobertura = _checkpoint_data(db, JOB_HORARIO).get("cobertura")
+    resumen = {"ventanas": 0, "grupos": 0, "podadas": 0}
+
+    if marca is None:
+        # Primer refresco: desde el consumo más antiguo que sigue sin compactar
+        cobertura = _initial_hourly_coverage(db).isoformat()
+        minimo = db.query(func.min(Consumo.created_at)).scalar()
+        if minimo is None:
+            _save_watermark(db, JOB_HORARIO, hasta, cobertura=cobertura)
+            db.commit()
+            return resumen
+        marca = _as_utc(minimo) - timedelta(microseconds=1)
+    marca = _as_utc(marca)
+
+    ventana = timedelta(hours=settings.analytics_window_hours)
+    while marca < hasta:
+        fin = min(marca + ventana, hasta)
+        try:
+            resumen["grupos"] += _fold_hourly(db, marca, fin)
+            _save_watermark(db, JOB_HORARIO, fin, cobertura=cobertura)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        resumen["ventanas"] += 1
+        marca = fin
+        if marca < hasta:
+            _lock_watermark(db, JOB_HORARIO)
+
+    resumen["podadas"] = db.query(ConsumoHorario).filter(
+        ConsumoHorario.hora < hourly_retention_bound()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return resumen
+
+
+def _apply_plan_delta(planes: Dict[str, AnalyticsPlan], db: Session,
+                      fila: AnalyticsFacturasCliente, signo: int) -> None:
+    plan = planes.get(fila.plan)
+    if plan is None:
+        plan = db.get(AnalyticsPlan, fila.plan)
+        if plan is None:
+            plan = AnalyticsPlan(plan=fila.plan, clientes=0, **{c: 0 for c in CAMPOS_FACTURAS})
+            db.add(plan)
+        planes[fila.plan] = plan
+    plan.clientes += signo
+    for campo in CAMPOS_FACTURAS:
+        setattr(plan, campo, getattr(plan, campo) + signo * (getattr(fila, campo) or 0))
+
+
+def _recompute_facturas(db: Session, cliente_ids: List[str]) -> None:
+    """Recalcular los totales de facturas de unos clientes y ajustar los de su plan"""
+    nuevos = {
+        fila.cliente_id: fila
+        for fila in db.query(
+            Factura.cliente_id,
+            func.sum(Factura.monto_total).label("facturado"),
+            func.sum(case((Factura.estado == "pagada", Factura.monto_total), else_=0.0)).label("pagado"),
+            func.sum(case((Factura.estado == "pendiente", Factura.monto_total), else_=0.0)).label("pendiente"),
+            func.sum(case((Factura.estado == "vencida", Factura.monto_total), else_=0.0)).label("vencido"),
+            func.sum(case((Factura.estado == "vencida", 1), else_=0)).label("facturas_vencidas"),
+        ).filter(Factura.cliente_id.in_(cliente_ids)).group_by(Factura.cliente_id)
+    }
+    planes_cliente = dict(
+        db.query(Cliente.id, Cliente.plan_actual).filter(
+            Cliente.id.in_(cliente_ids),
+            Cliente.eliminado_en.is_(None)
+        )
+    )
+    existentes = {
+        fila.cliente_id: fila
+        for fila in db.query(AnalyticsFacturasCliente).filter(
+            AnalyticsFacturasCliente.cliente_id.in_(cliente_ids)
+        )
+    }
+
+    planes: Dict[str, AnalyticsPlan] = {}
+    for cliente_id in cliente_ids:
+        anterior = existentes.get(cliente_id)
+        if anterior is not None:
+            _apply_plan_delta(planes, db, anterior, -1)
+
+        nuevo = nuevos.get(cliente_id)
+        if nuevo is None or cliente_id not in planes_cliente:
+            # Sin facturas o cuenta eliminada: deja de contar
+            if anterior is not None:
+                db.delete(anterior)
+            continue
+
+        fila = anterior or AnalyticsFacturasCliente(cliente_id=cliente_id)
+        fila.plan = planes_cliente[cliente_id] or "básico"
+        for campo in CAMPOS_FACTURAS:
+            setattr(fila, campo, getattr(nuevo, campo) or 0)
+        if anterior is None:
+            db.add(fila)
+        _apply_plan_delta(planes, db, fila, +1)
+
+
+def refresh_factura_summaries(db: Session, hasta: Optional[datetime] = None) -> Dict[str, int]:
+    """Recalcular los resúmenes de los clientes con facturas o plan cambiados"""
+    hasta = _as_utc(hasta or _refresh_bound())
+    marca = _lock_watermark(db, JOB_FACTURAS)
+
+    if marca is None:
+        # Primer refresco: todos los clientes con facturas
+        cambiados = {fila[0] for fila in db.query(Factura.cliente_id).distinct()}
+    else:
+        cambiados = {
+            fila[0] for fila in db.query(Factura.cliente_id).filter(
+                or_(
+                    Factura.created_at.between(marca, hasta),
+                    Factura.updated_at.between(marca, hasta)
+                )
+            ).distinct()
+        }
+        cambiados.update(
+            fila[0] for fila in db.query(Cliente.id).filter(Cliente.updated_at.between(marca, hasta))
+        )
+
+    try:
+        for lote in _chunks(sorted(cambiados)):
+            _recompute_facturas(db, lote)
+            db.flush()
+        _save_watermark(db, JOB_FACTURAS, hasta)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"clientes": len(cambiados)}
+
+
+def forget_cliente(db: Session, cliente_id: str) -> None:
+    """Quitar a un cliente purgado de los resúmenes (sin confirmar)"""
+    cliente = db.get(Cliente, cliente_id)
+    if cliente is not None and cliente.grupo_id is not None:
+        move_group_member(db, cliente, None)
+    fila = db.get(AnalyticsFacturasCliente, cliente_id)
+    if fila is not None:
+        _apply_plan_delta({}, db, fila, -1)
+        db.delete(fila)
+    db.query(AnalyticsClienteMes).filter(
+        AnalyticsClienteMes.cliente_id == cliente_id
+    ).delete(synchronize_session=False)
+    db.query(ConsumoHorario).filter(
+        ConsumoHorario.cliente_id == cliente_id
+    ).delete(synchronize_session=False)
+
+
+def refresh_analytics(db: Session) -> Dict[str, Dict[str, int]]:
+    """Refrescar todas las tablas de resumen"""
+    inicio = time.perf_counter()
+    hasta = _refresh_bound()
+    resumen = {
+        "consumos": refresh_consumo_summaries(db, hasta),
+        "facturas": refresh_factura_summaries(db, hasta),
+        "horario": refresh_hourly_rollup(db, hasta),
+    }
+    duracion = time.perf_counter() - inicio
+    metricas.observe("analytics_refresco_segundos", duracion)
+    metricas.set("analytics_marca_agua_timestamp", hasta.timestamp())
+    logger.info(f"Analítica refrescada en {duracion:.2f}s: {resumen}")
+    return resumen
+
+
+def get_analytics(db: Session, dias: int, top: int, mes: Optional[str] = None) -> dict:
+    """Leer la analítica de la base de clientes desde las tablas de resumen"""
+    mes = mes or datetime.now().strftime("%Y-%m")
+    desde = date.today() - timedelta(days=dias)
+
+    consumidores = db.query(AnalyticsClienteMes).filter(
+        AnalyticsClienteMes.mes == mes
+    ).order_by(AnalyticsClienteMes.costo.desc()).limit(top).all()
+    nombres = dict(
+        db.query(Cliente.id, Cliente.nombre).filter(
+            Cliente.id.in_([fila.cliente_id for fila in consumidores])
+        )
+    ) if consumidores else {}
+
+    planes = db.query(AnalyticsPlan).filter(AnalyticsPlan.clientes > 0).order_by(
+        AnalyticsPlan.facturado.desc()
+    ).all()
+
+    uso = db.query(AnalyticsUsoDiario).filter(
+        AnalyticsUsoDiario.fecha >= desde
+    ).order_by(AnalyticsUsoDiario.fecha, AnalyticsUsoDiario.servicio).all()
+
+    return {
+        "mes": mes,
+        "marcas_agua": get_watermarks(db),
+        "top_consumidores": [
+            {
+                "cliente_id": fila.cliente_id,
+                "nombre": nombres.get(fila.cliente_id),
+                "datos": fila.datos,
+                "minutos": fila.minutos,
+                "sms": fila.sms,
+                "costo": fila.costo,
+            }
+            for fila in consumidores
+        ],
+        "ingresos_por_plan": [
+            {
+                "plan": fila.plan,
+                "clientes": fila.clientes,
+                "facturado": fila.facturado,
+                "pagado": fila.pagado,
+                "pendiente": fila.pendiente,
+                "vencido": fila.vencido,
+            }
+            for fila in planes
+        ],
+        "vencido": {
+            "monto": sum(fila.vencido for fila in planes),
+            "facturas": sum(fila.facturas_vencidas for fila in planes),
+        },
+        "uso_diario": [
+            {
+                "fecha": fila.fecha.isoformat(),
+                "servicio": fila.servicio,
+                "cantidad": fila.cantidad,
+                "costo": fila.costo,
+                "eventos": fila.eventos,
+            }
+            for fila in uso
+        ],
+    }
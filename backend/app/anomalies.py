@@ -0,0 +1,295 @@
+"""
+Detección de consumos anómalos (sobrecostes y fraude, p. ej. picos de roaming).
+
+Para cada cliente y métrica (datos, minutos, sms, costo y costo de roaming)
+se mantiene la media y la varianza móviles exponenciales del consumo diario
+(``anomalias_estado``, con una ventana equivalente de ``anomaly_window_days``).
+El trabajo ``detect_anomalies`` solo procesa los días cerrados desde su
+checkpoint, así que lo que cuesta cada noche depende de los datos nuevos y no
+del historial:
+
+- Lee los totales por cliente y día con una consulta agrupada: de
+  ``consumos``, con el roaming aparte, o para los días ya compactados de
+  ``consumos_diarios`` más lo que quede sin compactar (sin desglose de
+  roaming: esa métrica no se evalúa esos días).
+- Recorre los días y, en cada uno, actualiza a la vez con NumPy a todos los
+  clientes con consumo: los días sin consumo desde su último día entran como
+  ceros (en forma cerrada), se compara el día con la media y se actualiza el
+  estado. Los clientes sin consumo no se tocan hasta que vuelven a tenerlo.
+- Un día es anómalo si supera la media en ``anomaly_z_threshold``
+  desviaciones y en al menos ``anomaly_min_delta`` de la métrica, con
+  ``anomaly_min_days`` días observados. Se anota en ``alertas_consumo``.
+
+Estado y alertas de cada lote de clientes se confirman juntos y el estado
+guarda el último día aplicado: repetir un lote tras una caída no vuelve a
+aplicar sus días.
+"""
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .metrics import metricas
+from .models import AlertaConsumo, AnomaliaEstado, Consumo, ConsumoDiario, JobCheckpoint
+from .retention import get_retention_cutoff
+
+logger = logging.getLogger(__name__)
+
+JOB_ANOMALIAS = "anomalias_consumo"
+
+METRICAS = ("datos", "minutos", "sms", "costo", "costo_roaming")
+ROAMING = METRICAS.index("costo_roaming")
+
+# Días leídos por consulta y clientes por lote de estado
+DIAS_POR_PASADA = 7
+CHUNK_CLIENTES = 2000
+
+
+def _load_checkpoint(db: Session) -> Optional[date]:
+    """Primer día aún sin procesar"""
+    checkpoint = db.get(JobCheckpoint, JOB_ANOMALIAS)
+    if checkpoint is None or not checkpoint.valor:
+        return None
+    return date.fromisoformat(json.loads(checkpoint.valor)["dia"])
+
+
+def _save_checkpoint(db: Session, dia: date) -> None:
+    db.merge(JobCheckpoint(nombre=JOB_ANOMALIAS, valor=json.dumps({"dia": dia.isoformat()})))
+
+
+def _closed_until() -> date:
+    """Primer día que aún puede recibir consumos"""
+    return (datetime.now() - timedelta(hours=settings.anomaly_close_hours)).date()
+
+
+def _as_days(columna) -> np.ndarray:
+    # SQLite devuelve date() como texto
+    return np.array(columna, dtype="datetime64[D]")
+
+
+def _raw_rows(db: Session, desde: datetime, hasta: datetime, con_roaming: bool):
+    """Totales de ``consumos`` por cliente, día y servicio (y roaming si se pide)"""
+    columnas = [Consumo.cliente_id, func.date(Consumo.fecha), Consumo.servicio]
+    if con_roaming:
+        columnas.append(case((Consumo.tipo_consumo == "roaming", 1), else_=0))
+    return db.query(
+        *columnas, func.sum(Consumo.cantidad), func.sum(Consumo.costo_total)
+    ).filter(
+        Consumo.fecha >= desde,
+        Consumo.fecha < hasta
+    ).group_by(*columnas).all()
+
+
+def load_daily_totals(db: Session, desde: date, hasta: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clientes con consumo, consumo (clientes × días × métricas) y qué días tuvo cada uno
+
+    Cubre los días de ``desde`` a ``hasta`` (sin incluir). El roaming de los
+    días compactados es NaN.
+    """
+    inicio = datetime.combine(desde, datetime.min.time())
+    fin = datetime.combine(hasta, datetime.min.time())
+    corte = max(min(get_retention_cutoff(), fin), inicio)
+
+    clientes, dias, metricas_col, valores = [], [], [], []
+
+    def agregar(cliente_col, dia_col, metrica, valor_col):
+        clientes.append(np.asarray(cliente_col, dtype=object))
+        dias.append(_as_days(dia_col))
+        metricas_col.append(np.asarray(metrica, dtype=np.int64) * np.ones(len(cliente_col), dtype=np.int64))
+        valores.append(np.nan_to_num(np.array(valor_col, dtype=np.float64)))
+
+    def agregar_servicios(cliente_col, dia_col, servicio_col, cantidad_col, costo_col):
+        servicios = np.asarray(servicio_col)
+        metrica = np.full(len(servicios), -1, dtype=np.int64)
+        for indice, servicio in enumerate(METRICAS[:3]):
+            metrica[servicios == servicio] = indice
+        conocido = metrica >= 0
+        agregar(np.asarray(cliente_col, dtype=object)[conocido], _as_days(dia_col)[conocido],
+                metrica[conocido], np.asarray(cantidad_col, dtype=np.float64)[conocido])
+        agregar(cliente_col, dia_col, METRICAS.index("costo"), costo_col)
+
+    # Días ya compactados: resumen diario más lo que quede sin compactar
+    if corte > inicio:
+        dia = func.date(ConsumoDiario.fecha)
+        filas = db.query(
+            ConsumoDiario.cliente_id, dia,
+            func.sum(ConsumoDiario.datos_consumidos), func.sum(ConsumoDiario.minutos_consumidos),
+            func.sum(ConsumoDiario.sms_consumidos), func.sum(ConsumoDiario.costo_total)
+        ).filter(
+            ConsumoDiario.fecha >= inicio,
+            ConsumoDiario.fecha < corte
+        ).group_by(ConsumoDiario.cliente_id, dia).all()
+        if filas:
+            cliente_col, dia_col, *columnas = zip(*filas)
+            for metrica, valor_col in enumerate(columnas):
+                agregar(cliente_col, dia_col, metrica, valor_col)
+        filas = _raw_rows(db, inicio, corte, con_roaming=False)
+        if filas:
+            agregar_servicios(*zip(*filas))
+
+    filas = _raw_rows(db, corte, fin, con_roaming=True)
+    if filas:
+        cliente_col, dia_col, servicio_col, roaming_col, cantidad_col, costo_col = zip(*filas)
+        agregar_servicios(cliente_col, dia_col, servicio_col, cantidad_col, costo_col)
+        roaming = np.asarray(roaming_col, dtype=bool)
+        agregar(np.asarray(cliente_col, dtype=object)[roaming], _as_days(dia_col)[roaming], ROAMING,
+                np.asarray(costo_col, dtype=np.float64)[roaming])
+
+    total_dias = (hasta - desde).days
+    if not clientes:
+        return np.array([], dtype=str), np.zeros((0, total_dias, len(METRICAS))), np.zeros((0, total_dias), bool)
+
+    ids, posicion = np.unique(np.concatenate(clientes).astype(str), return_inverse=True)
+    indice = (np.concatenate(dias) - np.datetime64(desde, "D")).astype(np.int64)
+    consumo = np.zeros((len(ids), total_dias, len(METRICAS)))
+    np.add.at(consumo, (posicion, indice, np.concatenate(metricas_col)), np.concatenate(valores))
+    con_consumo = np.zeros((len(ids), total_dias), dtype=bool)
+    con_consumo[posicion, indice] = True
+
+    dias_compactados = (corte.date() - desde).days
+    consumo[:, :dias_compactados, ROAMING] = np.nan
+    return ids, consumo, con_consumo
+
+
+def _load_state(db: Session, ids: List[str]):
+    """Media, varianza, días observados y último día (clientes × métricas)"""
+    forma = (len(ids), len(METRICAS))
+    media, varianza = np.zeros(forma), np.zeros(forma)
+    dias = np.zeros(forma, dtype=np.int64)
+    ultimo = np.full(forma, np.datetime64("NaT"), dtype="datetime64[D]")
+    posiciones = {cliente_id: i for i, cliente_id in enumerate(ids)}
+    for fila in db.query(AnomaliaEstado).filter(AnomaliaEstado.cliente_id.in_(ids)):
+        if fila.metrica not in METRICAS:
+            continue
+        i, j = posiciones[fila.cliente_id], METRICAS.index(fila.metrica)
+        media[i, j], varianza[i, j], dias[i, j] = fila.media, fila.varianza, fila.dias
+        ultimo[i, j] = np.datetime64(fila.ultimo_dia, "D")
+    return media, varianza, dias, ultimo
+
+
+def detect_chunk(consumo: np.ndarray, con_consumo: np.ndarray, desde: date, estado) -> Tuple[tuple, list]:
+    """Aplicar los días de un lote de clientes al estado y devolver el estado nuevo y las alertas
+
+    Las alertas son tuplas (cliente, día, métrica, valor, media, desviación, puntuación)
+    con las posiciones de cliente y métrica en el lote.
+    """
+    media, varianza, dias, ultimo = (valor.copy() for valor in estado)
+    alfa = 2.0 / (settings.anomaly_window_days + 1)
+    beta = 1.0 - alfa
+    minimo = np.array([settings.anomaly_min_delta.get(metrica, 0.0) for metrica in METRICAS])
+    alertas = []
+
+    for d in range(consumo.shape[1]):
+        dia = np.datetime64(desde, "D") + d
+        # Días ya aplicados (lote repetido tras una caída) no cuentan dos veces
+        aplicar = con_consumo[:, d, None] & ~(ultimo >= dia)
+        if not aplicar.any():
+            continue
+
+        # Días sin consumo desde el último: k ceros seguidos en forma cerrada
+        huecos = np.where(np.isnat(ultimo), 0, (dia - ultimo).astype(np.int64) - 1)
+        huecos = np.where(aplicar, np.maximum(huecos, 0), 0)
+        factor = beta ** huecos
+        varianza = factor * (varianza + media ** 2 * (1 - factor))
+        media = factor * media
+        dias = dias + huecos
+
+        valor = consumo[:, d]
+        evaluable = aplicar & ~np.isnan(valor)
+        desviacion = np.sqrt(varianza)
+        exceso = np.nan_to_num(valor) - media
+        anomalo = (
+            evaluable
+            & (dias >= settings.anomaly_min_days)
+            & (exceso >= settings.anomaly_z_threshold * desviacion)
+            & (exceso >= minimo)
+        )
+        for i, j in zip(*np.nonzero(anomalo)):
+            puntuacion = float(exceso[i, j] / desviacion[i, j]) if desviacion[i, j] > 0 else None
+            alertas.append((i, dia, j, float(valor[i, j]), float(media[i, j]),
+                            float(desviacion[i, j]), puntuacion))
+
+        # Primer día observado: la media arranca en el valor
+        nueva_media = np.where(dias == 0, valor, media + alfa * exceso)
+        nueva_varianza = np.where(dias == 0, 0.0, beta * (varianza + alfa * exceso ** 2))
+        media = np.where(evaluable, nueva_media, media)
+        varianza = np.where(evaluable, nueva_varianza, varianza)
+        dias = np.where(evaluable, dias + 1, dias)
+        ultimo = np.where(aplicar, dia, ultimo)
+
+    return (media, varianza, dias, ultimo), alertas
+
+
+def _save_chunk(db: Session, ids: List[str], estado, alertas: list) -> None:
+    media, varianza, dias, ultimo = estado
+    db.query(AnomaliaEstado).filter(AnomaliaEstado.cliente_id.in_(ids)).delete(synchronize_session=False)
+    filas = [
+        {
+            "cliente_id": ids[i],
+            "metrica": METRICAS[j],
+            "media": float(media[i, j]),
+            "varianza": float(varianza[i, j]),
+            "dias": int(dias[i, j]),
+            "ultimo_dia": ultimo[i, j].item(),
+        }
+        for i, j in zip(*np.nonzero(~np.isnat(ultimo)))
+    ]
+    if filas:
+        db.execute(insert(AnomaliaEstado), filas)
+    if alertas:
+        db.execute(insert(AlertaConsumo), [
+            {
+                "cliente_id": ids[i],
+                "dia": dia.item(),
+                "metrica": METRICAS[j],
+                "valor": valor,
+                "media": media_dia,
+                "desviacion": desviacion,
+                "puntuacion": puntuacion,
+                "estado": "abierta",
+            }
+            for i, dia, j, valor, media_dia, desviacion, puntuacion in alertas
+        ])
+
+
+def detect_anomalies(db: Session, hasta: Optional[date] = None) -> Dict[str, int]:
+    """Procesar los días cerrados desde el checkpoint y anotar las alertas"""
+    inicio_proceso = time.perf_counter()
+    hasta = hasta or _closed_until()
+    desde = _load_checkpoint(db) or hasta - timedelta(days=settings.anomaly_warmup_days)
+    resumen = {"dias": 0, "clientes": 0, "alertas": 0}
+
+    while desde < hasta:
+        fin = min(desde + timedelta(days=DIAS_POR_PASADA), hasta)
+        ids, consumo, con_consumo = load_daily_totals(db, desde, fin)
+        for i in range(0, len(ids), CHUNK_CLIENTES):
+            lote = ids[i:i + CHUNK_CLIENTES].tolist()
+            try:
+                estado, alertas = detect_chunk(
+                    consumo[i:i + CHUNK_CLIENTES], con_consumo[i:i + CHUNK_CLIENTES],
+                    desde, _load_state(db, lote)
+                )
+                _save_chunk(db, lote, estado, alertas)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            resumen["alertas"] += len(alertas)
+            metricas.incr("anomalias_alertas", len(alertas))
+
+        _save_checkpoint(db, fin)
+        db.commit()
+        resumen["dias"] += (fin - desde).days
+        resumen["clientes"] += len(ids)
+        desde = fin
+
+    duracion = time.perf_counter() - inicio_proceso
+    metricas.observe("anomalias_segundos", duracion)
+    logger.info(f"Detección de anomalías en {duracion:.2f}s: {resumen}")
+    return resumen
@@ -0,0 +1,294 @@
+"""
+Archivo histórico de consumos en Parquet comprimido.
+
+Los consumos más antiguos que ``settings.archive_after_months`` se mueven de la
+tabla ``consumos`` a ficheros Parquet en disco local, particionados por mes y
+por shard de cliente:
+
+    {archive_dir}/consumos/mes=YYYY-MM/shard=NNN/part-XXXXXXXX.parquet
+
+Las columnas de baja cardinalidad (servicio, unidad, tipo_consumo) se guardan
+con codificación de diccionario y las lecturas usan memory-map, de modo que
+los endpoints de historial pueden consultar meses archivados sin mantener los
+datos fríos en la base de datos. Archivar no es borrar: la API los sigue
+leyendo, así que no se anotan en ``eliminaciones`` (ver ``app/sync.py``).
+"""
+import heapq
+import logging
+import os
+import uuid
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Consumo
+
+logger = logging.getLogger(__name__)
+
+# Columnas que se copian al archivo, en el orden del esquema Parquet
+COLUMNAS_ARCHIVO = [
+    "id", "cliente_id", "servicio", "cantidad", "unidad", "fecha",
+    "tipo_consumo", "costo_unitario", "costo_total", "created_at"
+]
+
+# Columnas con codificación de diccionario
+COLUMNAS_DICCIONARIO = ["cliente_id", "servicio", "unidad", "tipo_consumo"]
+
+
+def _archive_schema():
+    """Esquema Parquet del archivo de consumos"""
+    import pyarrow as pa
+
+    texto_dict = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.string()),
+        ("cliente_id", texto_dict),
+        ("servicio", texto_dict),
+        ("cantidad", pa.float64()),
+        ("unidad", texto_dict),
+        ("fecha", pa.timestamp("us")),
+        ("tipo_consumo", texto_dict),
+        ("costo_unitario", pa.float64()),
+        ("costo_total", pa.float64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+
+def get_cliente_shard(cliente_id: str) -> int:
+    """Shard estable (independiente del proceso) para un cliente"""
+    return zlib.crc32(cliente_id.encode("utf-8")) % settings.archive_shards
+
+
+def _partition_path(mes: str, shard: int) -> str:
+    return os.path.join(settings.archive_dir, "consumos", f"mes={mes}", f"shard={shard:03d}")
+
+
+def get_archive_cutoff(ahora: Optional[datetime] = None) -> datetime:
+    """Primer día del mes más antiguo que se conserva en la base de datos"""
+    ahora = ahora or datetime.now()
+    meses = ahora.year * 12 + (ahora.month - 1) - settings.archive_after_months
+    return datetime(meses // 12, meses % 12 + 1, 1)
+
+
+def _months_between(desde: datetime, hasta: datetime) -> List[str]:
+    """Lista de meses YYYY-MM que cubre el rango [desde, hasta]"""
+    meses = []
+    actual = desde.year * 12 + (desde.month - 1)
+    fin = hasta.year * 12 + (hasta.month - 1)
+    while actual <= fin:
+        meses.append(f"{actual // 12:04d}-{actual % 12 + 1:02d}")
+        actual += 1
+    return meses
+
+
+def _archived_ids(mes: str, shard: int) -> Set[str]:
+    """Ids ya escritos en los ficheros de una partición (solo se lee la columna id)"""
+    directorio = _partition_path(mes, shard)
+    if not os.path.isdir(directorio):
+        return set()
+
+    import pyarrow.parquet as pq
+
+    ids: Set[str] = set()
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(".parquet"):
+            tabla = pq.read_table(os.path.join(directorio, nombre), columns=["id"], memory_map=True)
+            ids.update(tabla.column("id").to_pylist())
+    return ids
+
+
+def _write_partition(filas: List[dict], mes: str, shard: int) -> str:
+    """Escribir un fichero Parquet de forma atómica y devolver su ruta"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filas.sort(key=lambda f: (f["cliente_id"], f["fecha"]))
+    tabla = pa.Table.from_pylist(filas, schema=_archive_schema())
+
+    directorio = _partition_path(mes, shard)
+    os.makedirs(directorio, exist_ok=True)
+
+    # Nombre determinista por partición y rango de ids: repetir el mismo lote
+    # sobrescribe el fichero (las filas de otros lotes las filtra el llamador)
+    ids = sorted(f["id"] for f in filas)
+    firma = zlib.crc32(f"{mes}|{shard}|{ids[0]}|{ids[-1]}|{len(ids)}".encode("utf-8"))
+    ruta = os.path.join(directorio, f"part-{firma:08x}.parquet")
+    ruta_tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+
+    pq.write_table(
+        tabla,
+        ruta_tmp,
+        compression=settings.archive_compression,
+        use_dictionary=COLUMNAS_DICCIONARIO,
+    )
+    os.replace(ruta_tmp, ruta)
+    return ruta
+
+
+def archive_consumos(db: Session, antes_de: Optional[datetime] = None,
+                     chunk_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Mover a Parquet los consumos con fecha anterior a ``antes_de``.
+
+    Procesa los consumos en lotes ordenados por (fecha, id). Cada lote se
+    escribe en disco antes de borrarse de la base de datos y se confirma en su
+    propia transacción, para no mantener bloqueos largos.
+    """
+    antes_de = antes_de or get_archive_cutoff()
+    chunk_size = chunk_size or settings.archive_chunk_size
+    columnas = [getattr(Consumo, c) for c in COLUMNAS_ARCHIVO] + [Consumo.id_externo]
+
+    resumen = {"filas": 0, "ficheros": 0, "lotes": 0}
+    ultimo: Optional[Tuple[datetime, uuid.UUID]] = None
+    # Ids ya archivados por partición: una ejecución que cayó entre escribir un
+    # fichero y confirmar el borrado deja esas filas en disco y en la BD, y el
+    # reintento (con otros límites de lote) no debe volver a escribirlas
+    archivados: Dict[Tuple[str, int], Set[str]] = {}
+
+    while True:
+        query = db.query(*columnas).filter(Consumo.fecha < antes_de)
+        if ultimo is not None:
+            query = query.filter(or_(
+                Consumo.fecha > ultimo[0],
+                and_(Consumo.fecha == ultimo[0], Consumo.id > ultimo[1])
+            ))
+        lote = query.order_by(Consumo.fecha, Consumo.id).limit(chunk_size).all()
+        if not lote:
+            break
+
+        # Agrupar por mes y shard de cliente
+        particiones: Dict[Tuple[str, int], List[dict]] = {}
+        for fila in lote:
+            registro = dict(zip(COLUMNAS_ARCHIVO, fila))
+            registro["id"] = fila.id_externo or str(fila.id)  # id público
+            clave = (registro["fecha"].strftime("%Y-%m"), get_cliente_shard(registro["cliente_id"]))
+            particiones.setdefault(clave, []).append(registro)
+
+        for (mes, shard), filas in particiones.items():
+            if (mes, shard) not in archivados:
+                archivados[(mes, shard)] = _archived_ids(mes, shard)
+            vistos = archivados[(mes, shard)]
+            filas = [f for f in filas if f["id"] not in vistos]
+            if not filas:
+                continue
+            _write_partition(filas, mes, shard)
+            vistos.update(f["id"] for f in filas)
+            resumen["ficheros"] += 1
+
+        ids = [fila.id for fila in lote]
+        try:
+            db.query(Consumo).filter(Consumo.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        ultimo = (lote[-1].fecha, lote[-1].id)
+        resumen["filas"] += len(lote)
+        resumen["lotes"] += 1
+        logger.info(f"Archivados {resumen['filas']} consumos ({resumen['ficheros']} ficheros)")
+
+    return resumen
+
+
+def purge_archived_consumos(cliente_id: str) -> int:
+    """
+    Borrar del archivo los consumos de un cliente; devuelve las filas borradas.
+
+    Solo se recorren las particiones de su shard. Cada fichero que contiene al
+    cliente se reescribe sin sus filas (o se borra si no queda ninguna) de
+    forma atómica, de uno en uno, así que la memoria está acotada por el
+    tamaño de un fichero y repetir la purga tras una caída es seguro.
+    """
+    base = os.path.join(settings.archive_dir, "consumos")
+    if not os.path.isdir(base):
+        return 0
+
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    sufijo = f"shard={get_cliente_shard(cliente_id):03d}"
+    borradas = 0
+    for mes in sorted(os.listdir(base)):
+        directorio = os.path.join(base, mes, sufijo)
+        if not os.path.isdir(directorio):
+            continue
+        for nombre in sorted(os.listdir(directorio)):
+            if not nombre.endswith(".parquet"):
+                continue
+            ruta = os.path.join(directorio, nombre)
+            clientes = pq.read_table(ruta, columns=["cliente_id"], memory_map=True).column("cliente_id")
+            coincide = pc.equal(clientes.cast("string"), cliente_id)
+            propias = pc.sum(coincide).as_py() or 0
+            if not propias:
+                continue
+
+            if propias == len(clientes):
+                os.remove(ruta)
+            else:
+                tabla = pq.read_table(ruta, memory_map=True)
+                restantes = tabla.filter(pc.invert(coincide.combine_chunks()))
+                ruta_tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+                pq.write_table(
+                    restantes.cast(_archive_schema()),
+                    ruta_tmp,
+                    compression=settings.archive_compression,
+                    use_dictionary=COLUMNAS_DICCIONARIO,
+                )
+                os.replace(ruta_tmp, ruta)
+            borradas += propias
+    return borradas
+
+
+def read_archived_consumos(cliente_id: str, desde: datetime,
+                           hasta: Optional[datetime] = None) -> List[tuple]:
+    """
+    Leer del archivo los consumos de un cliente en el rango [desde, hasta).
+
+    Devuelve tuplas (fecha, servicio, cantidad, costo_total) ordenadas por
+    fecha. Solo se abren las particiones del shard del cliente para los meses
+    del rango.
+    """
+    return list(iter_archived_consumos(cliente_id, desde, hasta))
+
+
+def iter_archived_consumos(cliente_id: str, desde: datetime,
+                           hasta: Optional[datetime] = None) -> Iterator[tuple]:
+    """
+    Como ``read_archived_consumos`` pero mes a mes: en memoria solo está el
+    mes del cliente que se está recorriendo.
+    """
+    hasta = hasta or datetime.now()
+    if desde >= hasta:
+        return
+
+    import pyarrow.parquet as pq
+
+    shard = get_cliente_shard(cliente_id)
+    for mes in _months_between(desde, hasta):
+        directorio = _partition_path(mes, shard)
+        if not os.path.isdir(directorio):
+            continue
+        partes = []
+        for nombre in sorted(os.listdir(directorio)):
+            if not nombre.endswith(".parquet"):
+                continue
+            tabla = pq.read_table(
+                os.path.join(directorio, nombre),
+                columns=["fecha", "servicio", "cantidad", "costo_total"],
+                filters=[
+                    ("cliente_id", "=", cliente_id),
+                    ("fecha", ">=", desde),
+                    ("fecha", "<", hasta),
+                ],
+                memory_map=True,
+            )
+            columnas = tabla.to_pydict()
+            partes.append(zip(columnas["fecha"], columnas["servicio"],
+                              columnas["cantidad"], columnas["costo_total"]))
+        # Cada fichero está ordenado por (cliente_id, fecha): basta intercalarlos
+        yield from heapq.merge(*partes, key=lambda fila: fila[0])
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -10,19 +10,23 @@ from .models import Cliente
 from .schemas import TokenData
 from .config import settings
 
-# Configurar contexto de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """Contexto de contraseñas (passlib se importa al primer uso: solo lo usan login y registro)"""
+    from passlib.context import CryptContext
+    
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Configurar seguridad
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar contraseña en texto plano contra hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Generar hash de contraseña"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token de acceso JWT"""
@@ -51,11 +55,13 @@ def verify_token(token: str) -> Optional[TokenData]:
     except JWTError:
         return None
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> Cliente:
     """Obtener usuario actual desde token JWT"""
+    # Dependencia síncrona: FastAPI la ejecuta en el threadpool, así la espera
+    # por una conexión del pool no bloquea el event loop
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
@@ -69,7 +75,10 @@ async def get_current_user(
             raise credentials_exception
         
         # Buscar usuario en base de datos
-        user = db.query(Cliente).filter(Cliente.id == token_data.cliente_id).first()
+        user = db.query(Cliente).filter(
+            Cliente.id == token_data.cliente_id,
+            Cliente.eliminado_en.is_(None)
+        ).first()
         if user is None:
             raise credentials_exception
         
@@ -86,3 +95,15 @@ async def get_current_active_user(current_user: Cliente = Depends(get_current_us
             detail="Usuario inactivo"
         )
     return current_user
+
+def is_admin(cliente: Cliente) -> bool:
+    return cliente.id in settings.admin_ids
+
+def get_current_admin(current_user: Cliente = Depends(get_current_user)) -> Cliente:
+    """Obtener usuario actual exigiendo que sea administrador (``ADMIN_IDS``)"""
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador"
+        )
+    return current_user
@@ -0,0 +1,167 @@
+"""
+Escritura agrupada (group commit) de consumos individuales.
+
+Con ``settings.consumo_group_commit`` activo, ``POST /consumos`` no hace su
+propio commit: encola la fila en una cola asyncio acotada y un escritor en
+segundo plano la inserta junto a las demás en un único INSERT multi-fila,
+cada ``group_commit_window_ms`` milisegundos o al llegar a
+``group_commit_max_rows`` filas. Cada petición espera a que su lote se
+confirme y sabe si su fila se insertó o era un evento ya ingerido. El mismo
+commit suma las filas insertadas a los contadores del mes
+(``app/notifications.py``).
+
+Si la cola está llena, ``submit`` lanza ``QueueFullError`` y el endpoint
+responde 503 para que el productor reintente más tarde.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .config import settings
+from .database import SessionLocal
+from .events import describe_consumo, publish_event
+from .metrics import metricas
+from .models import Consumo
+from .notifications import record_usage
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """La cola de escritura agrupada está llena"""
+
+
+class ConsumoBatchWriter:
+    """Escritor en segundo plano que agrupa inserciones de consumos"""
+
+    def __init__(self, max_queue: int, max_rows: int, window_ms: int):
+        self.max_rows = max_rows
+        self.window = window_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        # Hilo propio: el flush no compite con las peticiones por el threadpool
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="group-commit")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Escritura agrupada de consumos activa (ventana {self.window * 1000:.0f}ms, "
+            f"máximo {self.max_rows} filas)"
+        )
+
+    async def stop(self) -> None:
+        """Vaciar la cola pendiente y detener el escritor"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, fila: dict) -> bool:
+        """Encolar una fila y esperar a que su lote se confirme.
+
+        Devuelve False si la fila no se insertó por tener un ``event_id`` ya
+        existente para el cliente.
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((fila, futuro))
+        except asyncio.QueueFull:
+            metricas.incr("group_commit_rechazos")
+            raise QueueFullError()
+        metricas.set("group_commit_cola", self._queue.qsize())
+        return await futuro
+
+    async def _collect(self) -> List[Tuple[dict, asyncio.Future]]:
+        """Esperar la primera fila y recoger las que lleguen dentro de la ventana"""
+        lote = [await self._queue.get()]
+        limite = time.monotonic() + self.window
+        while len(lote) < self.max_rows:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._queue.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _run(self) -> None:
+        while True:
+            lote = await self._collect()
+            inicio = time.perf_counter()
+            try:
+                insertados = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _insert_batch, [fila for fila, _ in lote]
+                )
+                for fila, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_result(fila["id"] in insertados)
+            except Exception as e:
+                logger.error(f"Error en escritura agrupada de {len(lote)} consumos: {e}")
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            finally:
+                for _ in lote:
+                    self._queue.task_done()
+
+            metricas.observe("group_commit_flush_segundos", time.perf_counter() - inicio)
+            metricas.incr("group_commit_filas", len(lote))
+            metricas.incr("group_commit_lotes")
+
+
+def _insert_batch(filas: List[dict]) -> Set:
+    """Insertar un lote de consumos en una sola transacción; devuelve los ids insertados"""
+    db = SessionLocal()
+    try:
+        dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        # Los eventos repetidos (en el lote o ya guardados) se omiten sin abortar el lote
+        stmt = dialecto.insert(Consumo).on_conflict_do_nothing(
+            index_elements=["cliente_id", "event_id"]
+        ).returning(Consumo.id)
+        insertados = set(db.execute(stmt, filas).scalars())
+        # Contadores del mes y avisos de umbral en la misma transacción
+        record_usage(db, [fila for fila in filas if fila["id"] in insertados])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    # Publicar ya confirmado y fuera del event loop (este hilo es el del escritor)
+    for fila in filas:
+        if fila["id"] in insertados:
+            publish_event(fila["cliente_id"], "consumo", describe_consumo(Consumo(**fila)))
+    return insertados
+
+
+# Escritor del proceso (solo existe si la escritura agrupada está activa)
+consumo_writer: Optional[ConsumoBatchWriter] = None
+
+
+async def start_consumo_writer() -> None:
+    global consumo_writer
+    consumo_writer = ConsumoBatchWriter(
+        max_queue=settings.group_commit_queue_size,
+        max_rows=settings.group_commit_max_rows,
+        window_ms=settings.group_commit_window_ms
+    )
+    await consumo_writer.start()
+
+
+async def stop_consumo_writer() -> None:
+    global consumo_writer
+    if consumo_writer is not None:
+        await consumo_writer.stop()
+        consumo_writer = None
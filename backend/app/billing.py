@@ -0,0 +1,104 @@
+"""
+Ciclo de facturación mensual.
+
+Genera una factura por cliente activo con la cuota de su plan más el coste de
+los consumos del mes (crudos y compactados). El número de factura es
+determinista (``FAC-<cliente>-<YYYYMM>``), así que repetir el ciclo de un mes
+no duplica facturas: solo crea las que falten.
+"""
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Cliente, Consumo, ConsumoDiario, Factura, Plan
+
+logger = logging.getLogger(__name__)
+
+
+def plan_id_of(plan_actual: str) -> str:
+    """"básico" -> "plan_basico" (ids de la tabla planes)"""
+    sin_acentos = unicodedata.normalize("NFKD", plan_actual or "").encode("ascii", "ignore").decode()
+    return f"plan_{sin_acentos.lower()}"
+
+
+def _month_range(mes: str):
+    inicio = datetime.strptime(mes, "%Y-%m")
+    fin = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, fin
+
+
+def _usage_costs(db: Session, cliente_ids, inicio: datetime, fin: datetime) -> Dict[str, float]:
+    costes: Dict[str, float] = {}
+    for modelo in (Consumo, ConsumoDiario):
+        for cliente_id, costo in db.query(modelo.cliente_id, func.sum(modelo.costo_total)).filter(
+            modelo.cliente_id.in_(cliente_ids),
+            modelo.fecha >= inicio,
+            modelo.fecha < fin
+        ).group_by(modelo.cliente_id):
+            costes[cliente_id] = costes.get(cliente_id, 0.0) + (costo or 0.0)
+    return costes
+
+
+def run_billing(db: Session, mes: str, chunk_size: int = 500,
+                progreso: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """Emitir las facturas del mes ``YYYY-MM`` que aún no existan"""
+    inicio, fin = _month_range(mes)
+    sufijo = inicio.strftime("%Y%m")
+    precios = {plan.id: plan.precio_mensual for plan in db.query(Plan)}
+
+    activos = Cliente.eliminado_en.is_(None) & (Cliente.estado_cuenta == "activo")
+    total = db.query(func.count(Cliente.id)).filter(activos).scalar()
+    resumen = {"clientes": total, "facturas": 0, "omitidas": 0}
+
+    ultimo = None
+    procesados = 0
+    while True:
+        query = db.query(Cliente.id, Cliente.plan_actual).filter(activos)
+        if ultimo is not None:
+            query = query.filter(Cliente.id > ultimo)
+        clientes = query.order_by(Cliente.id).limit(chunk_size).all()
+        if not clientes:
+            break
+
+        ids = [cliente.id for cliente in clientes]
+        numeros = {f"FAC-{cliente_id}-{sufijo}": cliente_id for cliente_id in ids}
+        existentes = {
+            fila.numero_factura for fila in db.query(Factura.numero_factura).filter(
+                Factura.numero_factura.in_(list(numeros))
+            )
+        }
+        costes = _usage_costs(db, ids, inicio, fin)
+
+        for cliente in clientes:
+            numero = f"FAC-{cliente.id}-{sufijo}"
+            if numero in existentes:
+                resumen["omitidas"] += 1
+                continue
+            subtotal = precios.get(plan_id_of(cliente.plan_actual), 0.0) + costes.get(cliente.id, 0.0)
+            impuestos = round(subtotal * settings.billing_tax_rate, 2)
+            db.add(Factura(
+                cliente_id=cliente.id,
+                numero_factura=numero,
+                monto_subtotal=round(subtotal, 2),
+                impuestos=impuestos,
+                descuentos=0.0,
+                monto_total=round(subtotal + impuestos, 2),
+                fecha_emision=fin,
+                fecha_vencimiento=fin + timedelta(days=settings.billing_due_days),
+                estado="pendiente"
+            ))
+            resumen["facturas"] += 1
+
+        db.commit()
+        ultimo = ids[-1]
+        procesados += len(ids)
+        if progreso is not None:
+            progreso(procesados, total)
+
+    logger.info(f"Facturación {mes}: {resumen}")
+    return resumen
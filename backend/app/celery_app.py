@@ -0,0 +1,32 @@
+"""
+Aplicación Celery para ejecutar los trabajos de ``app/jobs.py``.
+
+Solo se usa con ``JOBS_BACKEND=celery``. Cada cola se atiende con su propio
+worker para limitar la concurrencia por tipo de trabajo, por ejemplo::
+
+    celery -A app.celery_app worker -Q exportaciones -c 2
+    celery -A app.celery_app worker -Q facturacion,purgas,agregados -c 1
+"""
+import uuid
+
+from celery import Celery
+
+from .config import settings
+
+celery_app = Celery("telcox", broker=settings.celery_broker_url)
+celery_app.conf.update(
+    # El estado y el resultado viven en la tabla jobs, no en Celery
+    task_ignore_result=True,
+    # Confirmar al terminar: si el worker cae, el trabajo se reentrega
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_default_queue="agregados",
+)
+
+
+@celery_app.task(name="telcox.run_job")
+def run_job_task(job_id: str) -> None:
+    from .jobs import run_job
+
+    run_job(uuid.UUID(job_id))
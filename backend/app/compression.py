@@ -0,0 +1,221 @@
+"""
+Compresión de respuestas negociada con ``Accept-Encoding``.
+
+Algoritmos por orden de preferencia: zstd y brotli si están instalados
+(``zstandard`` y ``brotli`` son opcionales) y gzip siempre. Solo se
+comprimen tipos de texto (JSON, CSV...) y a partir de
+``compression_min_size`` bytes: por debajo la cabecera y el coste de CPU no
+compensan.
+
+- Respuesta completa (JSON de la API): se comprime de una vez. Si supera
+  ``compression_offload_size`` se comprime en el threadpool para no bloquear
+  el event loop.
+- Respuesta en streaming (exportaciones, ``FileResponse``): se comprime
+  trozo a trozo con un compresor incremental, sin cargarla entera en memoria.
+
+Los eventos SSE (``text/event-stream``) no se comprimen: el compresor
+retendría los eventos hasta llenar un bloque.
+"""
+import logging
+import zlib
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "text/csv", "text/plain", "text/html",
+    "application/javascript", "application/xml", "application/x-ndjson",
+    "application/vnd.telcox.columnar+json", "application/msgpack",
+    "application/vnd.apache.arrow.stream",
+)
+
+
+class GzipCompressor:
+    def __init__(self, nivel: int):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31: formato gzip
+
+    def compress(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos)
+
+    def flush(self) -> bytes:
+        return self._compresor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, calidad: int):
+        self._compresor = brotli.Compressor(quality=calidad)
+
+    def compress(self, datos: bytes) -> bytes:
+        return self._compresor.process(datos)
+
+    def flush(self) -> bytes:
+        return self._compresor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, nivel: int):
+        self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def compress(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos)
+
+    def flush(self) -> bytes:
+        return self._compresor.flush()
+
+
+def available_encodings() -> List[str]:
+    """Codificaciones soportadas, de la preferida a la menos preferida"""
+    codificaciones = []
+    if zstandard is not None:
+        codificaciones.append("zstd")
+    if brotli is not None:
+        codificaciones.append("br")
+    codificaciones.append("gzip")
+    return codificaciones
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Mejor codificación aceptada por el cliente (respetando q=0)"""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                calidad = float(parametros.strip()[2:])
+            except ValueError:
+                continue
+        aceptadas[nombre.strip().lower()] = calidad
+    candidatas = [
+        (aceptadas.get(c, aceptadas.get("*", 0.0)), -i, c)
+        for i, c in enumerate(available_encodings())
+    ]
+    calidad, _, codificacion = max(candidatas)
+    return codificacion if calidad > 0 else None
+
+
+def build_compressor(codificacion: str):
+    if codificacion == "zstd":
+        return ZstdCompressor(settings.compression_zstd_level)
+    if codificacion == "br":
+        return BrotliCompressor(settings.compression_brotli_quality)
+    return GzipCompressor(settings.compression_gzip_level)
+
+
+def _compress_all(codificacion: str, cuerpo: bytes) -> bytes:
+    compresor = build_compressor(codificacion)
+    return compresor.compress(cuerpo) + compresor.flush()
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión (completa o en streaming)"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, offload_size: int = 262144):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        respuesta = _CompressedResponse(self, codificacion, send)
+        await self.app(scope, receive, respuesta.send)
+
+
+class _CompressedResponse:
+    """Estado de una respuesta: decide al ver el primer trozo del cuerpo"""
+
+    def __init__(self, middleware: CompressionMiddleware, codificacion: str, send: Send):
+        self.middleware = middleware
+        self.codificacion = codificacion
+        self._send = send
+        self._inicio: Optional[Message] = None
+        self._compresor = None
+        self._directo = False
+
+    def _compressible(self, cabeceras: Headers) -> bool:
+        tipo = cabeceras.get("content-type", "").split(";")[0].strip().lower()
+        return "content-encoding" not in cabeceras and tipo in COMPRESSIBLE_TYPES
+
+    async def send(self, mensaje: Message) -> None:
+        if mensaje["type"] == "http.response.start":
+            self._inicio = mensaje
+            self._directo = not self._compressible(Headers(raw=mensaje["headers"]))
+            if self._directo:
+                await self._send(mensaje)
+            return
+        if mensaje["type"] != "http.response.body" or self._directo:
+            await self._send(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+
+        if self._compresor is None and self._inicio is not None:
+            inicio, self._inicio = self._inicio, None
+            if not mas:
+                await self._send_whole(inicio, cuerpo)
+                return
+            # Streaming: cabeceras sin Content-Length y compresor incremental
+            self._compresor = build_compressor(self.codificacion)
+            self._set_headers(inicio)
+            await self._send(inicio)
+
+        comprimido = await self._run(self._compresor.compress, cuerpo)
+        if not mas:
+            comprimido += self._compresor.flush()
+        self._count(len(cuerpo), len(comprimido))
+        if comprimido or not mas:
+            await self._send({"type": "http.response.body", "body": comprimido, "more_body": mas})
+
+    async def _send_whole(self, inicio: Message, cuerpo: bytes) -> None:
+        if len(cuerpo) < self.middleware.minimum_size:
+            await self._send(inicio)
+            await self._send({"type": "http.response.body", "body": cuerpo})
+            return
+        comprimido = await self._run(_compress_all, self.codificacion, cuerpo)
+        self._count(len(cuerpo), len(comprimido))
+        cabeceras = self._set_headers(inicio)
+        cabeceras["content-length"] = str(len(comprimido))
+        await self._send(inicio)
+        await self._send({"type": "http.response.body", "body": comprimido})
+
+    async def _run(self, funcion, *args) -> bytes:
+        # Los cuerpos grandes se comprimen fuera del event loop
+        if len(args[-1]) >= self.middleware.offload_size:
+            return await run_in_threadpool(funcion, *args)
+        return funcion(*args)
+
+    def _set_headers(self, inicio: Message) -> MutableHeaders:
+        cabeceras = MutableHeaders(raw=inicio["headers"])
+        cabeceras["content-encoding"] = self.codificacion
+        cabeceras.add_vary_header("Accept-Encoding")
+        if "content-length" in cabeceras:
+            del cabeceras["content-length"]
+        return cabeceras
+
+    def _count(self, entrada: int, salida: int) -> None:
+        metricas.incr("compresion_bytes_entrada", entrada, algoritmo=self.codificacion)
+        metricas.incr("compresion_bytes_salida", salida, algoritmo=self.codificacion)
@@ -0,0 +1,239 @@
+"""
+Secciones del dashboard del usuario.
+
+Las usan tanto los endpoints individuales (``/dashboard/resumen``,
+``/dashboard/graficos``, ``/consumos``, ``/facturas``) como
+``GET /dashboard/bootstrap``, que las calcula a la vez, cada una en su propia
+sesión del pool, y las devuelve en una sola respuesta.
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .database import SessionLocal
+from .fields import project_query
+from .forecast import get_forecast
+from .historial import columns_to_rows, period_numbers
+from .hotcache import daily_usage
+from .models import Cliente, Consumo, Factura, Saldo
+from .schemas import (
+    ClienteResponse, ConsumoResponse, DashboardBootstrap, DashboardGraficos,
+    DashboardResumen, FacturaResponse, PaginatedResponse, PronosticoResponse, SaldoResponse
+)
+from .series import get_series
+
+
+def build_resumen(db: Session, cliente: Cliente) -> DashboardResumen:
+    """Saldo, consumo del mes actual y anterior y conteo de facturas"""
+    saldo = db.query(Saldo).filter(Saldo.cliente_id == cliente.id).first()
+    if not saldo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Saldo no encontrado"
+        )
+
+    fecha_inicio_mes = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    fecha_inicio_mes_anterior = (fecha_inicio_mes - timedelta(days=1)).replace(day=1)
+    fecha_fin_mes_anterior = fecha_inicio_mes - timedelta(seconds=1)
+
+    # Clientes activos: ambos meses desde la caché en memoria
+    memoria = daily_usage(db, cliente.id, fecha_inicio_mes_anterior.date(), date.today())
+    if memoria is not None:
+        dias_mes_anterior = (fecha_inicio_mes - fecha_inicio_mes_anterior).days
+        consumo_mes_anterior = float(memoria["cantidad"][:dias_mes_anterior].sum())
+        consumo_mes_actual = float(memoria["cantidad"][dias_mes_anterior:].sum())
+    else:
+        # Calcular consumo del mes actual
+        consumo_mes_actual = db.query(Consumo).filter(
+            Consumo.cliente_id == cliente.id,
+            Consumo.fecha >= fecha_inicio_mes
+        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
+
+        # Calcular consumo del mes anterior
+        consumo_mes_anterior = db.query(Consumo).filter(
+            Consumo.cliente_id == cliente.id,
+            Consumo.fecha >= fecha_inicio_mes_anterior,
+            Consumo.fecha <= fecha_fin_mes_anterior
+        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
+
+    # Contar facturas por estado en una sola consulta
+    por_estado = dict(db.query(Factura.estado, func.count(Factura.id)).filter(
+        Factura.cliente_id == cliente.id
+    ).group_by(Factura.estado).all())
+
+    pronostico = get_forecast(db, cliente.id)
+
+    return DashboardResumen(
+        cliente=ClienteResponse.from_orm(cliente),
+        saldo=SaldoResponse.from_orm(saldo),
+        consumo_mes_actual=consumo_mes_actual,
+        consumo_mes_anterior=consumo_mes_anterior,
+        facturas_pendientes=por_estado.get("pendiente", 0),
+        facturas_vencidas=por_estado.get("vencida", 0),
+        total_facturas=sum(por_estado.values()),
+        pronostico=PronosticoResponse.from_orm(pronostico) if pronostico else None
+    )
+
+
+def build_consumo_chart(db: Session, cliente_id: str, granularidad: str,
+                        desde: datetime) -> Dict[str, np.ndarray]:
+    """Serie diaria o mensual hasta hoy en las columnas de ``ConsumoGrafico`` (días sin consumo a cero)"""
+    if granularidad == "dia":
+        # Clientes activos: la serie diaria sale de la caché en memoria
+        memoria = daily_usage(db, cliente_id, desde.date(), date.today())
+        if memoria is not None:
+            return {
+                "fecha": np.datetime_as_string(
+                    np.arange(np.datetime64(desde.date()), np.datetime64(date.today()) + 1), unit="D"
+                ),
+                "datos": memoria["datos"],
+                "minutos": memoria["minutos"].astype(np.int64),
+                "sms": memoria["sms"].astype(np.int64),
+                "costo": memoria["costo"]
+            }
+
+    unidad = {"dia": "D", "mes": "M"}[granularidad]
+    serie = get_series(db, cliente_id, granularidad, desde, datetime.now(),
+                       puntos=settings.series_max_points)
+    columnas = dict(serie.columnas)
+    columnas["fecha"] = np.datetime_as_string(
+        columnas["fecha"].astype("datetime64[s]").astype(f"datetime64[{unidad}]"), unit=unidad
+    )
+    columnas["minutos"] = columnas["minutos"].astype(np.int64)
+    columnas["sms"] = columnas["sms"].astype(np.int64)
+    return columnas
+
+
+def build_graficos_columnar(db: Session, cliente_id: str, dias: int, meses: int) -> Dict[str, Dict[str, np.ndarray]]:
+    """Consumo diario y mensual y facturación mensual como columnas por serie"""
+    # Consumo diario
+    fecha_inicio = datetime.now() - timedelta(days=dias)
+    consumo_diario = build_consumo_chart(db, cliente_id, "dia", fecha_inicio)
+
+    # Consumo mensual (meses de calendario, incluye meses archivados)
+    fecha_inicio_meses = datetime.now() - timedelta(days=meses * 30)
+    consumo_mensual = build_consumo_chart(db, cliente_id, "mes", fecha_inicio_meses)
+
+    # Facturación mensual
+    facturas = db.query(Factura.fecha_emision, Factura.monto_total, Factura.estado).filter(
+        Factura.cliente_id == cliente_id,
+        Factura.fecha_emision >= fecha_inicio_meses
+    ).all()
+    if facturas:
+        fechas, montos, estados = zip(*facturas)
+        claves, indices = np.unique(period_numbers(fechas, "M"), return_inverse=True)
+        estados = np.array(estados)
+        facturacion_mensual = {
+            "mes": np.datetime_as_string(claves, unit="M"),
+            "total": np.bincount(indices, weights=np.array(montos, dtype=float), minlength=len(claves)),
+            "pendientes": np.bincount(indices[estados == "pendiente"], minlength=len(claves)),
+            "pagadas": np.bincount(indices[estados == "pagada"], minlength=len(claves))
+        }
+    else:
+        facturacion_mensual = {
+            "mes": np.array([], dtype=str),
+            "total": np.zeros(0),
+            "pendientes": np.zeros(0, dtype=np.int64),
+            "pagadas": np.zeros(0, dtype=np.int64)
+        }
+
+    return {
+        "consumo_diario": consumo_diario,
+        "consumo_mensual": consumo_mensual,
+        "facturacion_mensual": facturacion_mensual
+    }
+
+
+def build_graficos(db: Session, cliente_id: str, dias: int, meses: int) -> DashboardGraficos:
+    """Consumo diario y mensual y facturación mensual"""
+    series = build_graficos_columnar(db, cliente_id, dias, meses)
+    return DashboardGraficos(**{nombre: columns_to_rows(columnas) for nombre, columnas in series.items()})
+
+
+def build_consumos_page(db: Session, cliente_id: str, page: int, size: int,
+                        servicio: Optional[str] = None, fecha_inicio: Optional[datetime] = None,
+                        fecha_fin: Optional[datetime] = None,
+                        campos: Optional[List[str]] = None) -> PaginatedResponse:
+    """Página de consumos del cliente, del más reciente al más antiguo (solo ``campos`` si se indican)"""
+    query = db.query(Consumo).filter(Consumo.cliente_id == cliente_id)
+
+    # Aplicar filtros
+    if servicio:
+        query = query.filter(Consumo.servicio == servicio)
+    if fecha_inicio:
+        query = query.filter(Consumo.fecha >= fecha_inicio)
+    if fecha_fin:
+        query = query.filter(Consumo.fecha <= fecha_fin)
+
+    total = query.count()
+    query = query.order_by(Consumo.fecha.desc()).offset((page - 1) * size).limit(size)
+    if campos:
+        # Solo las columnas pedidas, sin hidratar objetos ORM
+        query, to_dict = project_query(query, Consumo, campos)
+        items = [to_dict(fila) for fila in query.all()]
+    else:
+        items = [ConsumoResponse.from_orm(c).dict() for c in query.all()]
+
+    return PaginatedResponse(
+        items=items,
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size
+    )
+
+
+def build_facturas_page(db: Session, cliente_id: str, page: int, size: int,
+                        estado: Optional[str] = None,
+                        campos: Optional[List[str]] = None) -> PaginatedResponse:
+    """Página de facturas del cliente, de la más reciente a la más antigua (solo ``campos`` si se indican)"""
+    query = db.query(Factura).filter(Factura.cliente_id == cliente_id)
+
+    if estado:
+        query = query.filter(Factura.estado == estado)
+
+    total = query.count()
+    query = query.order_by(Factura.fecha_emision.desc()).offset((page - 1) * size).limit(size)
+    if campos:
+        query, to_dict = project_query(query, Factura, campos)
+        items = [to_dict(fila) for fila in query.all()]
+    else:
+        items = [FacturaResponse.from_orm(f).dict() for f in query.all()]
+
+    return PaginatedResponse(
+        items=items,
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size
+    )
+
+
+def _run_section(guard, funcion, *args):
+    """Calcular una sección en su propia sesión (con el guardián de la petición)"""
+    db = SessionLocal()
+    if guard is not None:
+        db.info["guard"] = guard
+    try:
+        return funcion(db, *args)
+    finally:
+        db.close()
+
+
+async def build_bootstrap(cliente: Cliente, guard=None, dias: int = 7, meses: int = 6,
+                          size: int = 10) -> DashboardBootstrap:
+    """Todas las secciones del dashboard en paralelo, una conexión del pool por sección"""
+    resumen, graficos, consumos, facturas = await asyncio.gather(
+        run_in_threadpool(_run_section, guard, build_resumen, cliente),
+        run_in_threadpool(_run_section, guard, build_graficos, cliente.id, dias, meses),
+        run_in_threadpool(_run_section, guard, build_consumos_page, cliente.id, 1, size),
+        run_in_threadpool(_run_section, guard, build_facturas_page, cliente.id, 1, size),
+    )
+    return DashboardBootstrap(resumen=resumen, graficos=graficos, consumos=consumos, facturas=facturas)
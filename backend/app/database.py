@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from functools import lru_cache
+from typing import Optional
 from .config import settings
 import logging
+import os
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +20,14 @@ engine = create_engine(
     echo=settings.debug
 )
 
+# SQLite no aplica las claves foráneas (ni ON DELETE CASCADE) salvo que se active
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 # Crear sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -34,20 +46,42 @@ def get_db():
     finally:
         db.close()
 
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+def _alembic_config():
+    from alembic.config import Config
+    
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    return config
+
 def init_db():
-    """Inicializar base de datos y crear tablas"""
+    """Llevar el esquema a la última migración (se ejecuta una vez por despliegue, no al arrancar)"""
+    from alembic import command
+    
     try:
-        # Importar todos los modelos para que SQLAlchemy los reconozca
-        from . import models
-        
-        # Crear todas las tablas
-        Base.metadata.create_all(bind=engine)
+        command.upgrade(_alembic_config(), "head")
         logger.info("Base de datos inicializada correctamente")
         
     except Exception as e:
         logger.error(f"Error inicializando BD: {e}")
         raise
 
+@lru_cache(maxsize=1)
+def get_expected_revision() -> Optional[str]:
+    """Última migración del código desplegado"""
+    from alembic.script import ScriptDirectory
+    
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+def get_schema_revision(db) -> Optional[str]:
+    """Migración aplicada en la base de datos (None si no hay tabla de versiones)"""
+    try:
+        return db.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except SQLAlchemyError:
+        db.rollback()
+        return None
+
 def create_initial_data():
     """Crear datos iniciales de prueba"""
     from .auth import get_password_hash
@@ -144,7 +178,6 @@ def create_initial_data():
                     costo_total = cantidad * costo_unitario
                     
                     consumo = Consumo(
-                        id=f"consumo_{i}_{servicio}_{random.randint(1000, 9999)}",
                         servicio=servicio,
                         cantidad=cantidad,
                         unidad=unidades[servicio],
@@ -171,7 +204,6 @@ def create_initial_data():
             fecha_pago = fecha_emision + timedelta(days=random.randint(1, 10)) if estado == "pagada" else None
             
             factura = Factura(
-                id=f"factura_{i}_{random.randint(1000, 9999)}",
                 cliente_id=cliente_prueba.id,
                 numero_factura=f"FAC-{fecha_emision.strftime('%Y%m')}-{random.randint(1000, 9999)}",
                 monto_total=monto_total,
@@ -0,0 +1,188 @@
+"""
+Supresión de CDRs duplicados en la ingesta.
+
+La garantía la da el índice único ``(cliente_id, event_id)`` de ``consumos``.
+Delante hay un filtro de Bloom con los eventos recientes: si responde "nunca
+visto" el consumo se inserta sin consultar antes la base de datos; solo los
+posibles duplicados (o falsos positivos) pagan la búsqueda del existente.
+
+El filtro tiene dos generaciones que rotan cada ``dedupe_window_hours``, así
+que recuerda entre una y dos ventanas de eventos. Con ``dedupe_redis_url`` los
+bits viven en Redis y los comparten todos los workers.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .metrics import metricas
+from .models import Consumo
+
+logger = logging.getLogger(__name__)
+
+
+def get_event_key(cliente_id: str, event_id: str) -> str:
+    return f"{cliente_id}:{event_id}"
+
+
+def _bloom_size(capacidad: int, error: float):
+    """Bits y número de funciones hash para la capacidad y tasa de error dadas"""
+    bits = max(64, int(-capacidad * math.log(error) / (math.log(2) ** 2)))
+    hashes = max(1, round(bits / capacidad * math.log(2)))
+    return bits, hashes
+
+
+def _bit_positions(clave: str, bits: int, hashes: int) -> List[int]:
+    """Posiciones por doble hashing (Kirsch-Mitzenmacher) sobre un único blake2b"""
+    digest = hashlib.blake2b(clave.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class BloomFilter:
+    """Filtro de Bloom en memoria con dos generaciones rotativas"""
+
+    def __init__(self, capacidad: int, error: float, ventana_s: float):
+        self.bits, self.hashes = _bloom_size(capacidad, error)
+        self.ventana_s = ventana_s
+        self._lock = threading.Lock()
+        self._actual = bytearray(self.bits // 8 + 1)
+        self._anterior = bytearray(self.bits // 8 + 1)
+        self._generacion = int(time.time() // ventana_s)
+
+    def _rotate(self) -> None:
+        generacion = int(time.time() // self.ventana_s)
+        if generacion == self._generacion:
+            return
+        # Si pasó más de una ventana, la generación anterior también caducó
+        self._anterior = self._actual if generacion == self._generacion + 1 else bytearray(len(self._actual))
+        self._actual = bytearray(len(self._actual))
+        self._generacion = generacion
+
+    def might_contain(self, clave: str) -> bool:
+        posiciones = _bit_positions(clave, self.bits, self.hashes)
+        with self._lock:
+            self._rotate()
+            for tabla in (self._actual, self._anterior):
+                if all(tabla[p >> 3] & (1 << (p & 7)) for p in posiciones):
+                    return True
+        return False
+
+    def add(self, clave: str) -> None:
+        posiciones = _bit_positions(clave, self.bits, self.hashes)
+        with self._lock:
+            self._rotate()
+            for p in posiciones:
+                self._actual[p >> 3] |= 1 << (p & 7)
+
+
+class RedisBloomFilter:
+    """Filtro de Bloom compartido en Redis (SETBIT/GETBIT por generación)"""
+
+    def __init__(self, url: str, capacidad: int, error: float, ventana_s: float,
+                 prefijo: str = "telcox:dedupe"):
+        import redis
+
+        self.bits, self.hashes = _bloom_size(capacidad, error)
+        self.ventana_s = ventana_s
+        self.prefijo = prefijo
+        self._redis = redis.Redis.from_url(url)
+
+    def _keys(self) -> List[str]:
+        generacion = int(time.time() // self.ventana_s)
+        return [f"{self.prefijo}:{generacion}", f"{self.prefijo}:{generacion - 1}"]
+
+    def might_contain(self, clave: str) -> bool:
+        posiciones = _bit_positions(clave, self.bits, self.hashes)
+        pipe = self._redis.pipeline(transaction=False)
+        for key in self._keys():
+            for p in posiciones:
+                pipe.getbit(key, p)
+        valores = pipe.execute()
+        return any(
+            all(valores[i * self.hashes:(i + 1) * self.hashes])
+            for i in range(len(valores) // self.hashes)
+        )
+
+    def add(self, clave: str) -> None:
+        key = self._keys()[0]
+        pipe = self._redis.pipeline(transaction=False)
+        for p in _bit_positions(clave, self.bits, self.hashes):
+            pipe.setbit(key, p, 1)
+        # Cada generación se consulta durante dos ventanas
+        pipe.expire(key, int(self.ventana_s * 2) + 60)
+        pipe.execute()
+
+
+def _build_filter():
+    if not settings.dedupe_filter_enabled:
+        return None
+    ventana_s = settings.dedupe_window_hours * 3600
+    if settings.dedupe_redis_url:
+        try:
+            return RedisBloomFilter(
+                settings.dedupe_redis_url, settings.dedupe_filter_capacity,
+                settings.dedupe_filter_error_rate, ventana_s
+            )
+        except ImportError:
+            logger.warning("Paquete redis no disponible, filtro de duplicados en memoria")
+    return BloomFilter(settings.dedupe_filter_capacity, settings.dedupe_filter_error_rate, ventana_s)
+
+
+# Filtro del proceso (None si está desactivado: siempre se consulta la BD)
+event_filter = _build_filter()
+
+
+def is_new_event(cliente_id: str, event_id: str) -> bool:
+    """True si el evento es seguro nuevo; False si puede ser un duplicado"""
+    if event_filter is None:
+        return False
+    try:
+        nuevo = not event_filter.might_contain(get_event_key(cliente_id, event_id))
+    except Exception as e:
+        # Sin filtro la ingesta sigue siendo correcta, solo consulta más la BD
+        logger.warning(f"Filtro de duplicados no disponible: {e}")
+        return False
+    metricas.incr("dedupe_filtro", resultado="nuevo" if nuevo else "posible_duplicado")
+    return nuevo
+
+
+def remember_event(cliente_id: str, event_id: str) -> None:
+    if event_filter is None:
+        return
+    try:
+        event_filter.add(get_event_key(cliente_id, event_id))
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el evento en el filtro: {e}")
+
+
+def find_consumo_by_event(db: Session, cliente_id: str, event_id: str) -> Optional[Consumo]:
+    return db.query(Consumo).filter(
+        Consumo.cliente_id == cliente_id,
+        Consumo.event_id == event_id
+    ).first()
+
+
+def warm_event_filter(db: Session, horas: Optional[int] = None, chunk_size: int = 10000) -> int:
+    """Cargar en el filtro los eventos de la última ventana (arranque del proceso)"""
+    if event_filter is None:
+        return 0
+    horas = horas if horas is not None else settings.dedupe_window_hours
+    desde = datetime.now() - timedelta(hours=horas)
+    query = db.query(Consumo.cliente_id, Consumo.event_id).filter(
+        Consumo.event_id.isnot(None),
+        Consumo.fecha >= desde
+    )
+    cargados = 0
+    for cliente_id, event_id in query.yield_per(chunk_size):
+        remember_event(cliente_id, event_id)
+        cargados += 1
+    logger.info(f"Filtro de duplicados precargado con {cargados} eventos")
+    return cargados
@@ -0,0 +1,368 @@
+"""
+Publicación de cambios por cliente para ``GET /user/stream``.
+
+Las escrituras ORM confirmadas de consumos, saldos y facturas se convierten en
+deltas y se reparten a las conexiones SSE abiertas del cliente. Los eventos se
+recogen en ``after_flush`` y solo se publican en ``after_commit``, así que un
+rollback no emite nada. Las inserciones que no pasan por el ORM (escritura
+agrupada) publican con ``publish_event``.
+
+Por defecto el reparto es en proceso: cada conexión tiene una cola acotada y
+si se llena se sustituye su contenido por un evento ``resync`` para que el
+cliente recargue. Con ``events_redis_url`` los eventos pasan por Redis
+pub/sub y cada worker los reparte a sus propias conexiones, así que también
+llegan los publicados por otros workers o por los scripts de mantenimiento.
+``publish`` no espera a Redis: deja el evento en una cola acotada que un hilo
+envía por pipelines; si la cola se llena el evento se descarta y se avisa a
+los oyentes del hueco. El hilo se arranca en el proceso que publica: con
+``server_preload`` el broker se crea en el arbiter de gunicorn, y los hilos no
+sobreviven al fork de los workers.
+
+Además de las conexiones SSE, el broker avisa a los oyentes registrados con
+``add_listener`` de todos los eventos (la caché de clientes activos de
+``app/hotcache.py``), y de los posibles huecos si se pierde la conexión con
+Redis.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .metrics import metricas
+from .models import Consumo, Factura, Saldo
+
+logger = logging.getLogger(__name__)
+
+CANAL_REDIS = "telcox:eventos"
+
+
+def _json_default(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class EventBroker:
+    """Reparto en proceso de eventos a las suscripciones abiertas"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._suscripciones: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._oyentes: List[Tuple[Callable[[str, str], None], Optional[Callable[[], None]]]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._loop = None
+
+    def subscribe(self, cliente_id: str) -> asyncio.Queue:
+        cola: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._suscripciones[cliente_id].add(cola)
+        metricas.incr("stream_conexiones_abiertas")
+        metricas.set("stream_conexiones", self.connection_count())
+        return cola
+
+    def unsubscribe(self, cliente_id: str, cola: asyncio.Queue) -> None:
+        colas = self._suscripciones.get(cliente_id)
+        if colas is not None:
+            colas.discard(cola)
+            if not colas:
+                del self._suscripciones[cliente_id]
+        metricas.set("stream_conexiones", self.connection_count())
+
+    def connection_count(self) -> int:
+        return sum(len(colas) for colas in self._suscripciones.values())
+
+    def add_listener(self, oyente: Callable[[str, str], None],
+                     hueco: Optional[Callable[[], None]] = None) -> None:
+        """Recibir todos los eventos (haya o no conexiones) y el aviso de eventos perdidos"""
+        self._oyentes.append((oyente, hueco))
+
+    def listening(self) -> bool:
+        """True si los oyentes reciben ahora mismo todos los eventos"""
+        return True
+
+    def _notify(self, cliente_id: str, mensaje: str) -> None:
+        for oyente, _ in self._oyentes:
+            try:
+                oyente(cliente_id, mensaje)
+            except Exception as e:
+                logger.warning(f"Oyente de eventos fallido: {e}")
+
+    def _notify_gap(self) -> None:
+        for _, hueco in self._oyentes:
+            if hueco is not None:
+                hueco()
+
+    def publish(self, cliente_id: str, mensaje: str) -> None:
+        """Publicar desde cualquier hilo; sin event loop activo solo avisa a los oyentes"""
+        self._notify(cliente_id, mensaje)
+        loop = self._loop
+        if loop is None or cliente_id not in self._suscripciones:
+            return
+        try:
+            en_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            en_loop = False
+        if en_loop:
+            self._dispatch(cliente_id, mensaje)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, cliente_id, mensaje)
+
+    def _dispatch(self, cliente_id: str, mensaje: str) -> None:
+        for cola in list(self._suscripciones.get(cliente_id, ())):
+            try:
+                cola.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                # Cliente lento: descartar lo pendiente y pedirle que recargue
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(json.dumps({"tipo": "resync"}))
+                metricas.incr("stream_resync")
+        metricas.incr("stream_eventos_enviados")
+
+
+class RedisEventBroker(EventBroker):
+    """Reparto entre workers: se publica en Redis y cada worker escucha el canal"""
+
+    def __init__(self, url: str, queue_size: int, publish_queue_size: int = 10000,
+                 publish_batch: int = 500):
+        import redis
+
+        super().__init__(queue_size)
+        self.url = url
+        self.publish_queue_size = publish_queue_size
+        self.publish_batch = publish_batch
+        self._redis = redis.Redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+        self._escuchando = False
+        # Envío a Redis en un hilo propio: publicar nunca bloquea al llamante.
+        # Cola e hilo son del proceso que los arranca (ver ``_outbox``)
+        self._salida: Optional[queue.Queue] = None
+        self._publicador: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._arranque = threading.Lock()
+        # Los scripts publican sin ciclo de vida: enviar lo pendiente al salir
+        atexit.register(self.flush)
+
+    async def start(self) -> None:
+        await super().start()
+        self._outbox()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+        await super().stop()
+
+    def listening(self) -> bool:
+        return self._escuchando
+
+    def publish(self, cliente_id: str, mensaje: str) -> None:
+        # Los oyentes lo reciben de vuelta por el canal, como los demás workers
+        try:
+            self._outbox().put_nowait((f"{CANAL_REDIS}:{cliente_id}", mensaje))
+        except queue.Full:
+            metricas.incr("eventos_descartados")
+            self._notify_gap()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Esperar a que se envíe lo publicado hasta ahora"""
+        if self._pid != os.getpid() or not self._publicador.is_alive():
+            return
+        hecho = threading.Event()
+        try:
+            self._salida.put(hecho, timeout=timeout)
+        except queue.Full:
+            return
+        hecho.wait(timeout)
+
+    def _outbox(self) -> queue.Queue:
+        """Cola de salida del proceso actual; arranca su hilo en el primer uso.
+
+        Tras un fork la cola heredada no tiene hilo que la vacíe (y lo que
+        contenga ya lo envía el padre): el hijo empieza con una cola nueva.
+        """
+        if self._pid == os.getpid():
+            return self._salida
+        with self._arranque:
+            if self._pid != os.getpid():
+                salida: queue.Queue = queue.Queue(maxsize=self.publish_queue_size)
+                publicador = threading.Thread(
+                    target=self._publish_loop, args=(salida,), name="eventos-redis", daemon=True
+                )
+                publicador.start()
+                self._salida, self._publicador = salida, publicador
+                self._pid = os.getpid()
+        return self._salida
+
+    def _publish_loop(self, salida: queue.Queue) -> None:
+        while True:
+            lote = [salida.get()]
+            while len(lote) < self.publish_batch:
+                try:
+                    lote.append(salida.get_nowait())
+                except queue.Empty:
+                    break
+            mensajes = [m for m in lote if not isinstance(m, threading.Event)]
+            if mensajes:
+                try:
+                    pipe = self._redis.pipeline(transaction=False)
+                    for canal, mensaje in mensajes:
+                        pipe.publish(canal, mensaje)
+                    pipe.execute()
+                    metricas.incr("eventos_publicados", len(mensajes))
+                except Exception as e:
+                    logger.warning(f"No se pudieron publicar {len(mensajes)} eventos en Redis: {e}")
+                    metricas.incr("eventos_descartados", len(mensajes))
+                    self._notify_gap()
+            for marca in lote:
+                if isinstance(marca, threading.Event):
+                    marca.set()
+
+    async def _listen(self) -> None:
+        import redis.asyncio as aioredis
+
+        prefijo = len(CANAL_REDIS) + 1
+        while True:
+            cliente = aioredis.Redis.from_url(self.url)
+            try:
+                async with cliente.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CANAL_REDIS}:*")
+                    self._escuchando = True
+                    async for mensaje in pubsub.listen():
+                        if mensaje["type"] != "pmessage":
+                            continue
+                        cliente_id = mensaje["channel"].decode()[prefijo:]
+                        if self._oyentes:
+                            self._notify(cliente_id, mensaje["data"].decode())
+                        if cliente_id in self._suscripciones:
+                            self._dispatch(cliente_id, mensaje["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Conexión pub/sub con Redis perdida: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                if self._escuchando:
+                    # Lo publicado mientras no escuchamos no llegará nunca
+                    self._escuchando = False
+                    self._notify_gap()
+                await cliente.aclose()
+
+
+def _build_broker() -> EventBroker:
+    if settings.events_redis_url:
+        try:
+            return RedisEventBroker(
+                settings.events_redis_url, settings.stream_queue_size,
+                settings.events_publish_queue_size, settings.events_publish_batch
+            )
+        except ImportError:
+            logger.warning("Paquete redis no disponible, eventos solo en proceso")
+    return EventBroker(settings.stream_queue_size)
+
+
+# Broker del proceso
+broker = _build_broker()
+
+
+def publish_event(cliente_id: str, tipo: str, datos: dict) -> None:
+    """Publicar un delta para las conexiones abiertas del cliente"""
+    try:
+        broker.publish(cliente_id, json.dumps({"tipo": tipo, "datos": datos}, default=_json_default))
+    except Exception as e:
+        # Perder un delta no debe hacer fallar la escritura que lo generó
+        logger.warning(f"No se pudo publicar el evento {tipo}: {e}")
+
+
+def describe_consumo(consumo: Consumo) -> dict:
+    """Delta con la forma de ``ConsumoResponse``: la app lo inserta como una fila más"""
+    # Tras el flush las columnas con valor del servidor no están cargadas; leerlas
+    # aquí lanzaría una consulta por consumo, y acaban de fijarse a "ahora"
+    cargados = inspect(consumo).dict
+    ahora = datetime.now(timezone.utc)
+    return {
+        "id": consumo.id_publico,
+        "cliente_id": consumo.cliente_id,
+        "servicio": consumo.servicio,
+        "cantidad": consumo.cantidad,
+        "unidad": consumo.unidad,
+        "fecha": consumo.fecha,
+        "tipo_consumo": consumo.tipo_consumo,
+        "costo_unitario": consumo.costo_unitario,
+        "costo_total": consumo.costo_total,
+        "event_id": consumo.event_id,
+        "created_at": cargados.get("created_at") or ahora,
+        "updated_at": cargados.get("updated_at"),
+    }
+
+
+def _describe_saldo(saldo: Saldo) -> dict:
+    return {
+        "saldo_actual": saldo.saldo_actual,
+        "limite_credito": saldo.limite_credito,
+        "saldo_disponible": saldo.saldo_disponible,
+        "moneda": saldo.moneda,
+    }
+
+
+def _describe_factura(factura: Factura) -> dict:
+    return {
+        "id": factura.id_publico,
+        "numero_factura": factura.numero_factura,
+        "estado": factura.estado,
+        "monto_total": factura.monto_total,
+        "fecha_vencimiento": factura.fecha_vencimiento,
+    }
+
+
+def _changed(obj, *atributos: str) -> bool:
+    estado = inspect(obj)
+    return any(estado.attrs[a].history.has_changes() for a in atributos)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session: Session, flush_context) -> None:
+    pendientes = session.info.setdefault("eventos_pendientes", [])
+    for obj in session.new:
+        if isinstance(obj, Consumo):
+            pendientes.append((obj.cliente_id, "consumo", describe_consumo(obj)))
+        elif isinstance(obj, Factura):
+            pendientes.append((obj.cliente_id, "factura", _describe_factura(obj)))
+        elif isinstance(obj, Saldo):
+            pendientes.append((obj.cliente_id, "saldo", _describe_saldo(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, Saldo) and _changed(obj, "saldo_actual", "limite_credito", "saldo_disponible"):
+            pendientes.append((obj.cliente_id, "saldo", _describe_saldo(obj)))
+        elif isinstance(obj, Factura) and _changed(obj, "estado"):
+            pendientes.append((obj.cliente_id, "factura", _describe_factura(obj)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session: Session) -> None:
+    for cliente_id, tipo, datos in session.info.pop("eventos_pendientes", ()):
+        publish_event(cliente_id, tipo, datos)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session: Session) -> None:
+    session.info.pop("eventos_pendientes", None)
@@ -0,0 +1,34 @@
+"""
+Exportación del historial de consumos de un cliente a CSV.
+
+Usa la misma lectura unificada que los gráficos (consumos crudos,
+compactados y archivados), de modo que la exportación cubre todo el periodo
+aunque parte ya no esté en la tabla ``consumos``. Las filas se escriben a
+medida que se leen, ya en orden de fecha: la memoria no crece con el
+historial del cliente.
+"""
+import csv
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .historial import iter_consumos_periodo
+
+
+def export_consumos(db: Session, cliente_id: str, desde: datetime, hasta: Optional[datetime],
+                    destino: str) -> Dict[str, object]:
+    """Escribir los consumos del periodo en ``destino`` (CSV); devuelve ruta y filas"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporal = f"{destino}.tmp"
+    with open(temporal, "w", newline="", encoding="utf-8") as fichero:
+        escritor = csv.writer(fichero)
+        escritor.writerow(["fecha", "servicio", "cantidad", "costo_total"])
+        filas = 0
+        for fecha, servicio, cantidad, costo in iter_consumos_periodo(db, cliente_id, desde, hasta):
+            escritor.writerow([fecha.isoformat(), servicio, cantidad, costo or 0.0])
+            filas += 1
+    os.replace(temporal, destino)
+
+    return {"fichero": destino, "filas": filas}
@@ -0,0 +1,66 @@
+"""
+Campos parciales (``?fields=id,fecha,cantidad``) en los listados.
+
+Los nombres se validan contra el esquema de respuesta del endpoint y se
+llevan a la lista del ``SELECT``: la consulta lee solo esas columnas como
+filas Core (sin hidratar objetos ORM) y cada elemento se serializa con solo
+esos campos. Sin ``fields`` los endpoints devuelven el esquema completo como
+hasta ahora.
+"""
+from typing import Callable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+
+
+def sparse_fields(schema: Type[BaseModel]):
+    """Dependencia que valida ``fields`` contra los campos del esquema de respuesta"""
+    validos = list(schema.model_fields)
+
+    def dependencia(
+        fields: Optional[str] = Query(
+            None, description=f"Campos a devolver separados por comas: {', '.join(validos)}"
+        )
+    ) -> Optional[List[str]]:
+        if not fields:
+            return None
+        campos = list(dict.fromkeys(c.strip() for c in fields.split(",") if c.strip()))
+        desconocidos = [c for c in campos if c not in schema.model_fields]
+        if not campos:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Indique al menos un campo"
+            )
+        if desconocidos:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Campos no válidos: {', '.join(desconocidos)}. Disponibles: {', '.join(validos)}"
+            )
+        return campos
+
+    return dependencia
+
+
+def _public_id(modelo):
+    """Columnas y conversión del id público (el heredado o el UUID como texto)"""
+    if hasattr(modelo, "id_externo"):
+        return [modelo.id, modelo.id_externo], lambda fila, i: fila[i + 1] or str(fila[i])
+    return [modelo.id], lambda fila, i: fila[i]
+
+
+def project_query(query, modelo, campos: List[str]) -> Tuple[object, Callable[[tuple], dict]]:
+    """Reducir la consulta a las columnas de los campos y devolver el conversor de filas"""
+    columnas = []
+    lectores = []
+    for campo in campos:
+        if campo == "id":
+            cols, leer = _public_id(modelo)
+        else:
+            cols, leer = [getattr(modelo, campo)], (lambda fila, i: fila[i])
+        lectores.append((campo, len(columnas), leer))
+        columnas.extend(cols)
+
+    def to_dict(fila) -> dict:
+        return {campo: leer(fila, i) for campo, i, leer in lectores}
+
+    return query.with_entities(*columnas), to_dict
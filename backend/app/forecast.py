@@ -0,0 +1,179 @@
+"""
+Pronóstico del consumo y la factura al cierre del mes.
+
+El trabajo ``forecast_consumos`` recorre los clientes activos por lotes de
+``forecast_chunk_size``. En cada lote:
+
+- Carga el consumo por día de la ventana (``forecast_history_days`` días
+  completos más hoy) en una matriz días × clientes × campos. Los días ya
+  compactados salen de ``consumos_diarios`` y el resto del rollup horario
+  (``consumos_horarios``), ambos agrupados por día en SQL; antes de empezar se
+  refresca el rollup para que llegue hasta ahora.
+- Ajusta a cada cliente y campo una tendencia lineal más un efecto por día de
+  la semana (``app/forecast_model.py``): el lote entero se resuelve con un
+  producto de matrices, sin bucles por cliente.
+- Los clientes con menos historial que la ventana (altas recientes) se
+  proyectan al ritmo medio de los días que llevan de alta.
+- Total del mes = consumo real hasta ayer + lo que falta de hoy y de los días
+  restantes según el modelo. La factura estimada suma la cuota del plan y los
+  impuestos como el ciclo de facturación (``app/billing.py``).
+
+``forecast_benchmark.py`` mide el ajuste con datos sintéticos (p. ej. un
+millón de clientes).
+"""
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from .analytics import get_hourly_coverage, refresh_hourly_rollup
+from .billing import plan_id_of
+from .config import settings
+from .forecast_model import CAMPOS, build_model, project_month
+from .metrics import metricas
+from .models import Cliente, ConsumoDiario, ConsumoHorario, Plan, Pronostico
+
+logger = logging.getLogger(__name__)
+
+
+def _client_positions(ids: np.ndarray, orden: np.ndarray, columna) -> np.ndarray:
+    return orden[np.searchsorted(ids, np.asarray(columna), sorter=orden)]
+
+
+def load_history(db: Session, ids: List[str], inicio: date, hoy: date, cobertura: datetime) -> np.ndarray:
+    """Consumo por día (de ``inicio`` a hoy) × cliente × campo de un lote de clientes"""
+    origen = np.datetime64(inicio, "D")
+    historia = np.zeros(((hoy - inicio).days + 1, len(ids), len(CAMPOS)))
+    clientes = np.asarray(ids)
+    orden = np.argsort(clientes)
+    desde = datetime.combine(inicio, datetime.min.time())
+
+    # Días anteriores a la cobertura del rollup: resumen diario de la compactación
+    if cobertura > desde:
+        dia = func.date(ConsumoDiario.fecha)
+        filas = db.query(
+            ConsumoDiario.cliente_id, dia,
+            func.sum(ConsumoDiario.datos_consumidos), func.sum(ConsumoDiario.minutos_consumidos),
+            func.sum(ConsumoDiario.sms_consumidos), func.sum(ConsumoDiario.costo_total)
+        ).filter(
+            ConsumoDiario.cliente_id.in_(ids),
+            ConsumoDiario.fecha >= desde,
+            ConsumoDiario.fecha < cobertura
+        ).group_by(ConsumoDiario.cliente_id, dia).all()
+        if filas:
+            cliente_col, dia_col, *valores = zip(*filas)
+            posicion = _client_positions(clientes, orden, cliente_col)
+            indice = (np.array(dia_col, dtype="datetime64[D]") - origen).astype(np.int64)
+            historia[indice, posicion] += np.nan_to_num(np.array(valores, dtype=np.float64).T)
+
+    dia = func.date(ConsumoHorario.hora)
+    filas = db.query(
+        ConsumoHorario.cliente_id, dia, ConsumoHorario.servicio,
+        func.sum(ConsumoHorario.cantidad), func.sum(ConsumoHorario.costo)
+    ).filter(
+        ConsumoHorario.cliente_id.in_(ids),
+        ConsumoHorario.hora >= max(desde, cobertura)
+    ).group_by(ConsumoHorario.cliente_id, dia, ConsumoHorario.servicio).all()
+    if filas:
+        cliente_col, dia_col, servicio_col, cantidad_col, costo_col = zip(*filas)
+        posicion = _client_positions(clientes, orden, cliente_col)
+        indice = (np.array(dia_col, dtype="datetime64[D]") - origen).astype(np.int64)
+        servicios = np.asarray(servicio_col)
+        cantidades = np.nan_to_num(np.array(cantidad_col, dtype=np.float64))
+        for campo, servicio in enumerate(CAMPOS[:3]):
+            filtro = servicios == servicio
+            np.add.at(historia, (indice[filtro], posicion[filtro], campo), cantidades[filtro])
+        costos = np.nan_to_num(np.array(costo_col, dtype=np.float64))
+        np.add.at(historia, (indice, posicion, CAMPOS.index("costo")), costos)
+
+    return historia
+
+
+def _month_bounds(hoy: date) -> Tuple[date, date]:
+    inicio_mes = hoy.replace(day=1)
+    return inicio_mes, (inicio_mes + timedelta(days=32)).replace(day=1)
+
+
+def run_forecast(db: Session, chunk_size: Optional[int] = None,
+                 progreso: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """Calcular y guardar el pronóstico de cierre del mes de todos los clientes activos"""
+    chunk_size = chunk_size or settings.forecast_chunk_size
+    inicio_proceso = time.perf_counter()
+
+    # El rollup horario tiene que llegar hasta ahora antes de leerlo
+    refresh_hourly_rollup(db)
+    cobertura, _ = get_hourly_coverage(db)
+
+    hoy = date.today()
+    inicio_mes, fin_mes = _month_bounds(hoy)
+    dias_mes = (hoy - inicio_mes).days
+    ventana = max(settings.forecast_history_days, dias_mes)
+    inicio = hoy - timedelta(days=ventana)
+    mes = hoy.strftime("%Y-%m")
+    proyector, futuro = build_model(inicio, hoy, fin_mes, settings.forecast_ridge)
+    precios = {plan.id: plan.precio_mensual for plan in db.query(Plan)}
+
+    activos = Cliente.eliminado_en.is_(None) & (Cliente.estado_cuenta == "activo")
+    total = db.query(func.count(Cliente.id)).filter(activos).scalar()
+    resumen = {"clientes": total, "tendencia": 0, "ritmo": 0}
+
+    ultimo = None
+    procesados = 0
+    while True:
+        query = db.query(Cliente.id, Cliente.plan_actual, Cliente.created_at).filter(activos)
+        if ultimo is not None:
+            query = query.filter(Cliente.id > ultimo)
+        lote = query.order_by(Cliente.id).limit(chunk_size).all()
+        if not lote:
+            break
+
+        ids = [cliente.id for cliente in lote]
+        altas = np.array([(cliente.created_at or datetime.now()).date() for cliente in lote],
+                         dtype="datetime64[D]")
+        observados = np.clip((np.datetime64(hoy, "D") - altas).astype(np.int64), 0, ventana)
+        historia = load_history(db, ids, inicio, hoy, cobertura)
+        totales, tendencia = project_month(historia, observados, proyector, futuro, dias_mes)
+
+        costo_actual = historia[ventana - dias_mes:, :, CAMPOS.index("costo")].sum(axis=0)
+        cuotas = np.array([precios.get(plan_id_of(cliente.plan_actual), 0.0) for cliente in lote])
+        facturas = np.round((cuotas + totales[:, CAMPOS.index("costo")]) * (1 + settings.billing_tax_rate), 2)
+
+        db.query(Pronostico).filter(Pronostico.cliente_id.in_(ids)).delete(synchronize_session=False)
+        db.execute(insert(Pronostico), [
+            {
+                "cliente_id": cliente_id,
+                "mes": mes,
+                **{campo: float(valor) for campo, valor in zip(CAMPOS, fila)},
+                "costo_actual": float(actual),
+                "factura_estimada": float(factura),
+                "modelo": "tendencia" if usa_modelo else "ritmo",
+            }
+            for cliente_id, fila, actual, factura, usa_modelo
+            in zip(ids, totales, costo_actual, facturas, tendencia)
+        ])
+        db.commit()
+
+        resumen["tendencia"] += int(tendencia.sum())
+        resumen["ritmo"] += len(ids) - int(tendencia.sum())
+        ultimo = ids[-1]
+        procesados += len(ids)
+        if progreso is not None:
+            progreso(procesados, total)
+
+    duracion = time.perf_counter() - inicio_proceso
+    metricas.observe("pronostico_segundos", duracion)
+    metricas.set("pronostico_clientes", procesados)
+    logger.info(f"Pronóstico {mes} calculado en {duracion:.2f}s: {resumen}")
+    return resumen
+
+
+def get_forecast(db: Session, cliente_id: str) -> Optional[Pronostico]:
+    """Pronóstico del mes en curso de un cliente (None si aún no se ha calculado)"""
+    pronostico = db.get(Pronostico, cliente_id)
+    if pronostico is None or pronostico.mes != date.today().strftime("%Y-%m"):
+        return None
+    return pronostico
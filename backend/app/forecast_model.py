@@ -0,0 +1,74 @@
+"""
+Modelo del pronóstico de cierre de mes (sin base de datos).
+
+Tendencia lineal más efecto por día de la semana, ajustada por mínimos
+cuadrados con regularización ridge a cada cliente y campo. Los clientes de un
+lote comparten los días, así que la matriz del ajuste es común: el proyector
+se calcula una vez (``build_model``) y ``project_month`` resuelve un lote
+entero con un producto de matrices. Lo usan el trabajo de ``app/forecast.py``
+y ``forecast_benchmark.py``.
+"""
+from datetime import date
+from typing import Tuple
+
+import numpy as np
+
+CAMPOS = ("datos", "minutos", "sms", "costo")
+
+# Columnas del modelo: constante, tendencia y de martes a domingo (el lunes es la referencia)
+PARAMETROS = 8
+
+
+def _weekday(dias: np.ndarray) -> np.ndarray:
+    # El 1970-01-01 fue jueves: lunes = 0
+    return (dias.astype("datetime64[D]").astype(np.int64) + 3) % 7
+
+
+def design_matrix(dias: np.ndarray, inicio: np.datetime64, ventana: int) -> np.ndarray:
+    """Filas del modelo para ``dias``: constante, tendencia en ventanas y día de la semana"""
+    filas = np.zeros((len(dias), PARAMETROS))
+    filas[:, 0] = 1.0
+    filas[:, 1] = (dias - inicio).astype(np.float64) / ventana
+    semana = _weekday(dias)
+    filas[np.flatnonzero(semana > 0), 1 + semana[semana > 0]] = 1.0
+    return filas
+
+
+def build_model(inicio: date, hoy: date, fin_mes: date, ridge: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Proyector del ajuste (parámetros × días de historial) y filas de los días por proyectar
+
+    El historial son los días de ``inicio`` a ayer; se proyecta de hoy a fin de mes.
+    """
+    origen = np.datetime64(inicio, "D")
+    ventana = (hoy - inicio).days
+    historial = design_matrix(origen + np.arange(ventana), origen, ventana)
+    futuro = design_matrix(np.arange(np.datetime64(hoy, "D"), np.datetime64(fin_mes, "D")), origen, ventana)
+    # La constante no se regulariza
+    penalizacion = ridge * np.eye(PARAMETROS)
+    penalizacion[0, 0] = 0.0
+    proyector = np.linalg.solve(historial.T @ historial + penalizacion, historial.T)
+    return proyector, futuro
+
+
+def project_month(historia: np.ndarray, observados: np.ndarray, proyector: np.ndarray,
+                  futuro: np.ndarray, dias_mes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Total proyectado del mes por cliente y campo y qué clientes usan el modelo
+
+    ``historia`` es días × clientes × campos, con hoy (hasta ahora) en la
+    última fila; ``observados`` los días de historial de cada cliente y
+    ``dias_mes`` los días del mes anteriores a hoy.
+    """
+    pasado, hoy_real = historia[:-1], historia[-1]
+    ventana, clientes, campos = pasado.shape
+
+    # Un solo producto ajusta todos los clientes y campos del lote
+    coeficientes = proyector @ pasado.reshape(ventana, clientes * campos)
+    prevision = np.clip(futuro @ coeficientes, 0.0, None).reshape(len(futuro), clientes, campos)
+
+    tendencia = observados >= ventana
+    ritmo = pasado.sum(axis=0) / np.maximum(observados, 1)[:, None]
+    prevision = np.where(tendencia[None, :, None], prevision, ritmo[None])
+    # Hoy ya lleva consumo real: se proyecta al menos eso
+    prevision[0] = np.maximum(prevision[0], hoy_real)
+
+    return pasado[ventana - dias_mes:].sum(axis=0) + prevision.sum(axis=0), tendencia
@@ -0,0 +1,123 @@
+"""
+Formatos de respuesta de los gráficos negociados con ``Accept``.
+
+- ``application/json`` (por defecto): lista de objetos por periodo, como
+  siempre (``List[ConsumoGrafico]``).
+- ``application/vnd.telcox.columnar+json``: columnas paralelas por serie
+  (``{"fecha": [...], "datos": [...], ...}``), sin repetir las claves en
+  cada periodo.
+- ``application/msgpack``: las mismas columnas en MessagePack (``msgpack`` es
+  opcional).
+- ``application/vnd.apache.arrow.stream``: Arrow IPC. Una serie es una tabla
+  con una columna por campo; varias series son una tabla de una fila con una
+  columna ``struct`` de listas por serie.
+
+Los formatos columnares se generan directamente de las columnas numpy de la
+agregación, sin construir un diccionario por periodo.
+"""
+from typing import Dict, Union
+
+import numpy as np
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.telcox.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Alias aceptados en Accept para cada formato
+_ALIAS = {"application/x-msgpack": MSGPACK}
+
+Columnas = Dict[str, np.ndarray]
+
+
+def available_formats():
+    """Formatos soportados, del preferido en empate al menos preferido"""
+    formatos = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        formatos.append(MSGPACK)
+    formatos.append(ARROW_STREAM)
+    return formatos
+
+
+def choose_format(accept: str) -> str:
+    """Formato de mayor calidad aceptado por el cliente (JSON si no hay ninguno)"""
+    aceptados = {}
+    for parte in accept.split(","):
+        tipo, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            nombre, _, valor = parametro.strip().partition("=")
+            if nombre == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        tipo = tipo.strip().lower()
+        aceptados[_ALIAS.get(tipo, tipo)] = calidad
+    comodin = max(aceptados.get("*/*", 0.0), aceptados.get("application/*", 0.0))
+    candidatos = [
+        (aceptados.get(f, comodin if f == JSON else 0.0), -i, f)
+        for i, f in enumerate(available_formats())
+    ]
+    calidad, _, formato = max(candidatos)
+    return formato if calidad > 0 else JSON
+
+
+def negotiate_format(request: Request, response: Response) -> str:
+    """Dependencia con el formato negociado para la respuesta"""
+    response.headers["Vary"] = "Accept"
+    return choose_format(request.headers.get("accept", ""))
+
+
+def _to_lists(columnas: Union[Columnas, Dict[str, Columnas]]) -> dict:
+    return {
+        nombre: _to_lists(valor) if isinstance(valor, dict) else valor.tolist()
+        for nombre, valor in columnas.items()
+    }
+
+
+def _arrow_table(columnas: Union[Columnas, Dict[str, Columnas]]):
+    import pyarrow as pa
+
+    if not any(isinstance(valor, dict) for valor in columnas.values()):
+        return pa.table({nombre: pa.array(valor) for nombre, valor in columnas.items()})
+    # Varias series de distinta longitud: una fila con una lista por campo
+    series = {}
+    for serie, campos in columnas.items():
+        listas = [
+            pa.ListArray.from_arrays(pa.array([0, len(valor)], pa.int32()), pa.array(valor))
+            for valor in campos.values()
+        ]
+        series[serie] = pa.StructArray.from_arrays(listas, names=list(campos))
+    return pa.table(series)
+
+
+def encode_columns(formato: str, columnas: Union[Columnas, Dict[str, Columnas]]) -> bytes:
+    """Codificar columnas (una serie o varias por nombre) en un formato columnar"""
+    if formato == MSGPACK:
+        return msgpack.packb(_to_lists(columnas))
+    if formato == ARROW_STREAM:
+        import pyarrow as pa
+
+        tabla = _arrow_table(columnas)
+        salida = pa.BufferOutputStream()
+        with pa.ipc.new_stream(salida, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+        return salida.getvalue().to_pybytes()
+    return JSONResponse(_to_lists(columnas)).body
+
+
+def columnar_response(formato: str, columnas: Union[Columnas, Dict[str, Columnas]]) -> Response:
+    """Respuesta en un formato columnar (``formato`` distinto de ``application/json``)"""
+    return Response(
+        content=encode_columns(formato, columnas),
+        media_type=formato,
+        headers={"Vary": "Accept"}
+    )
@@ -0,0 +1,99 @@
+"""
+Consumo conjunto de los grupos de líneas (planes familiares y corporativos).
+
+Las líneas de un grupo comparten las bolsas de su plan. El total del mes sale
+de dos lecturas que no dependen del número de líneas:
+
+- La fila de ``consumos_grupos_mes`` del mes, que el refresco de analítica
+  mantiene hasta su marca de agua de consumos (``app/analytics.py``).
+- Una consulta agrupada por servicio con los consumos de las líneas del grupo
+  creados después de esa marca (los que el refresco aún no ha sumado).
+
+Acumulado y marca se leen en la misma sentencia: un refresco que confirme
+entre dos lecturas no puede hacer que una ventana cuente dos veces o ninguna.
+"""
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from .analytics import CAMPOS_MES, JOB_CONSUMOS
+from .models import Cliente, Consumo, ConsumoGrupoMes, Grupo, JobCheckpoint, Plan
+from .schemas import BolsaServicio, GrupoConsumo, GrupoResponse
+
+# Megas por GB: el plan cuenta los datos en GB y los consumos en MB
+MB_POR_GB = 1024
+
+
+def _month_bounds(mes: str) -> Tuple[datetime, datetime]:
+    """Inicio del mes y del siguiente"""
+    inicio = datetime.strptime(mes, "%Y-%m")
+    if inicio.month == 12:
+        return inicio, inicio.replace(year=inicio.year + 1, month=1)
+    return inicio, inicio.replace(month=inicio.month + 1)
+
+
+def _pending_totals(db: Session, grupo_id, mes: str, marca: Optional[datetime]) -> Dict[str, float]:
+    """Consumos del grupo en el mes aún sin sumar al acumulado, en una consulta"""
+    inicio, fin = _month_bounds(mes)
+    query = db.query(
+        Consumo.servicio, func.sum(Consumo.cantidad), func.sum(Consumo.costo_total)
+    ).join(Cliente, Cliente.id == Consumo.cliente_id).filter(
+        Cliente.grupo_id == grupo_id,
+        Consumo.fecha >= inicio,
+        Consumo.fecha < fin
+    )
+    if marca is not None:
+        query = query.filter(Consumo.created_at > marca)
+
+    totales = dict.fromkeys(CAMPOS_MES, 0.0)
+    for servicio, cantidad, costo in query.group_by(Consumo.servicio):
+        if servicio in totales:
+            totales[servicio] += cantidad or 0.0
+        totales["costo"] += costo or 0.0
+    return totales
+
+
+def _allowance(usado: float, incluido: Optional[float], servicio: str) -> BolsaServicio:
+    if not incluido:
+        return BolsaServicio(servicio=servicio, usado=usado)
+    return BolsaServicio(
+        servicio=servicio,
+        usado=usado,
+        incluido=incluido,
+        restante=max(incluido - usado, 0.0),
+        porcentaje=round(usado / incluido * 100, 2)
+    )
+
+
+def get_group_usage(db: Session, grupo: Grupo, mes: Optional[str] = None) -> GrupoConsumo:
+    """Consumo conjunto del mes frente a las bolsas del plan del grupo"""
+    mes = mes or datetime.now().strftime("%Y-%m")
+    fila = db.query(JobCheckpoint.valor, ConsumoGrupoMes).outerjoin(
+        ConsumoGrupoMes,
+        and_(ConsumoGrupoMes.grupo_id == grupo.id, ConsumoGrupoMes.mes == mes)
+    ).filter(JobCheckpoint.nombre == JOB_CONSUMOS).first()
+    valor, acumulado = fila if fila is not None else (None, None)
+    marca = datetime.fromisoformat(json.loads(valor)["hasta"]) if valor else None
+
+    totales = _pending_totals(db, grupo.id, mes, marca)
+    if acumulado is not None and marca is not None:
+        for campo in CAMPOS_MES:
+            totales[campo] += getattr(acumulado, campo) or 0.0
+
+    # Un plan con 0 incluido en una bolsa no tiene tope (p. ej. datos ilimitados)
+    plan = db.get(Plan, grupo.plan_id)
+    incluidos = {
+        "datos": (plan.datos_incluidos or 0) * MB_POR_GB if plan else None,
+        "minutos": plan.minutos_incluidos if plan else None,
+        "sms": plan.sms_incluidos if plan else None,
+    }
+    return GrupoConsumo(
+        grupo=GrupoResponse.from_orm(grupo),
+        mes=mes,
+        bolsas=[_allowance(totales[servicio], incluidos[servicio], servicio) for servicio in incluidos],
+        costo=totales["costo"],
+        acumulado_hasta=marca
+    )
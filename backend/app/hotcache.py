@@ -0,0 +1,304 @@
+"""
+Caché en memoria del consumo reciente de los clientes más activos.
+
+Unas pocas líneas (IoT, corporativas) generan la mayoría de los consumos y de
+las visitas al dashboard. Para ellas cada worker guarda un buffer circular
+NumPy de ``hot_cache_days`` días × (datos, minutos, sms, costo, cantidad) y
+responde desde memoria el gráfico diario (``/user/consumos/grafico`` y la
+serie diaria de ``/dashboard/graficos``) y el consumo del mes actual y del
+anterior del resumen.
+
+- Un cliente entra tras ``hot_cache_admit_after`` lecturas sin acierto: se
+  carga con una consulta agrupada por día y desde entonces lo mantienen al día
+  los eventos ``consumo`` del broker (``app/events.py``), que ya recogen las
+  altas ORM confirmadas y la escritura agrupada. Con más de
+  ``hot_cache_max_clients`` clientes sale el usado hace más tiempo (LRU).
+- Con varios workers los eventos tienen que pasar por Redis
+  (``events_redis_url``) para que cada caché vea las altas de los demás; sin
+  Redis la caché solo se activa con un único worker. Si se pierde la conexión
+  con Redis la caché se vacía.
+- Carga y eventos simultáneos: los eventos que llegan durante la carga se
+  apartan. La consulta de carga (una sola sentencia) agrega los consumos con
+  ``created_at`` anterior a ``registro - hot_cache_load_margin_s`` y devuelve
+  uno a uno los más recientes; los eventos apartados que ya estaban entre esos
+  se descartan por id.
+- Un consumo con fecha futura saca al cliente de la caché: el gráfico termina
+  en el momento actual y el resumen no, así que ya no coincidirían.
+
+``/metrics`` incluye los clientes en memoria, los bytes por cliente y en
+total, las lecturas por resultado y la tasa de acierto.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import String, Uuid, cast, func, null, select, union_all
+from sqlalchemy.orm import Session
+
+from . import events
+from .config import settings
+from .metrics import metricas
+from .models import Consumo
+
+logger = logging.getLogger(__name__)
+
+# Columnas del buffer de cada cliente (cantidad: todos los servicios, como el resumen)
+CAMPOS = ("datos", "minutos", "sms", "costo", "cantidad")
+
+# (id público, fecha, servicio, cantidad, costo)
+ConsumoEvento = Tuple[Optional[str], datetime, str, float, float]
+
+
+def _as_date(valor) -> date:
+    # SQLite devuelve date() como texto
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _values(servicio: str, cantidad: float, costo: float) -> List[float]:
+    """Fila del buffer de un consumo"""
+    return [
+        cantidad if servicio == "datos" else 0.0,
+        cantidad if servicio == "minutos" else 0.0,
+        cantidad if servicio == "sms" else 0.0,
+        costo,
+        cantidad,
+    ]
+
+
+class UsageBuffer:
+    """Totales diarios de un cliente en un buffer circular (fila = día % días)"""
+
+    def __init__(self, dias: int):
+        self.totales = np.zeros((dias, len(CAMPOS)))
+        self.dia = np.full(dias, -1, dtype=np.int32)  # ordinal del día de cada fila
+
+    @property
+    def nbytes(self) -> int:
+        return self.totales.nbytes + self.dia.nbytes
+
+    def add(self, dias: np.ndarray, valores: np.ndarray) -> None:
+        """Sumar ``valores`` (n × CAMPOS) a los días (ordinales) dados"""
+        orden = np.argsort(dias, kind="stable")
+        dias, valores = dias[orden], valores[orden]
+        filas = dias % len(self.dia)
+        # Un día más reciente que el de su fila la reutiliza (con días repetidos
+        # gana la última asignación, la del día mayor)
+        nuevos = self.dia[filas] < dias
+        if nuevos.any():
+            self.totales[filas[nuevos]] = 0.0
+            self.dia[filas[nuevos]] = dias[nuevos]
+        validos = self.dia[filas] == dias
+        np.add.at(self.totales, filas[validos], valores[validos])
+
+    def window(self, desde: int, hasta: int) -> np.ndarray:
+        """Totales de los días [desde, hasta] (cero los días sin consumo)"""
+        dias = np.arange(desde, hasta + 1)
+        filas = dias % len(self.dia)
+        return np.where((self.dia[filas] == dias)[:, None], self.totales[filas], 0.0)
+
+
+def _load_query(cliente_id: str, desde: date, corte: datetime):
+    """Consumos desde ``desde``: agregados por día y servicio los anteriores a ``corte``, uno a uno el resto"""
+    dia = func.date(Consumo.fecha)
+    filtro = (Consumo.cliente_id == cliente_id, Consumo.fecha >= datetime(desde.year, desde.month, desde.day))
+    agregados = select(
+        cast(null(), Uuid).label("id"), cast(null(), String).label("id_externo"), dia.label("dia"),
+        Consumo.servicio, func.sum(Consumo.cantidad).label("cantidad"),
+        func.sum(Consumo.costo_total).label("costo"), func.max(Consumo.fecha).label("fecha")
+    ).where(*filtro, Consumo.created_at < corte).group_by(dia, Consumo.servicio)
+    recientes = select(
+        Consumo.id, Consumo.id_externo, dia, Consumo.servicio,
+        Consumo.cantidad, Consumo.costo_total, Consumo.fecha
+    ).where(*filtro, Consumo.created_at >= corte)
+    return union_all(agregados, recientes)
+
+
+class HotUsageCache:
+    """Buffers por cliente con expulsión LRU, alimentados por los eventos de consumo"""
+
+    def __init__(self, max_clientes: int, dias: int, admitir_tras: int, margen_s: float):
+        self.max_clientes = max_clientes
+        self.dias = dias
+        self.admitir_tras = admitir_tras
+        self.margen_s = margen_s
+        self._lock = threading.Lock()
+        self._buffers: "OrderedDict[str, UsageBuffer]" = OrderedDict()
+        self._candidatos: "OrderedDict[str, int]" = OrderedDict()  # lecturas sin acierto
+        self._cargando: Dict[str, List[ConsumoEvento]] = {}  # eventos apartados
+        self._generacion = 0  # cambia al vaciar: descarta las cargas en curso
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _first_day(self) -> int:
+        return date.today().toordinal() - self.dias + 1
+
+    def _add(self, buffer: UsageBuffer, consumos: List[ConsumoEvento]) -> bool:
+        """Sumar consumos al buffer; False si alguno tiene fecha futura"""
+        ahora = datetime.now()
+        if any(fecha > ahora for _, fecha, _, _, _ in consumos):
+            return False
+        primero = self._first_day()
+        recientes = [c for c in consumos if c[1].toordinal() >= primero]
+        if recientes:
+            buffer.add(
+                np.fromiter((c[1].toordinal() for c in recientes), np.int32, len(recientes)),
+                np.array([_values(c[2], c[3] or 0.0, c[4] or 0.0) for c in recientes])
+            )
+        return True
+
+    def _forget(self, cliente_id: str) -> None:
+        self._buffers.pop(cliente_id, None)
+        metricas.incr("hot_cache_invalidaciones")
+
+    def apply_event(self, cliente_id: str, mensaje: str) -> None:
+        """Oyente del broker: sumar un consumo nuevo si el cliente está en memoria"""
+        # Sin lock: la mayoría de los eventos son de clientes que no están
+        if cliente_id not in self._buffers and cliente_id not in self._cargando:
+            return
+        evento = json.loads(mensaje)
+        if evento.get("tipo") != "consumo":
+            return
+        datos = evento["datos"]
+        consumo = (
+            datos["id"], datetime.fromisoformat(datos["fecha"]).replace(tzinfo=None),
+            datos["servicio"], datos["cantidad"], datos.get("costo_total")
+        )
+        with self._lock:
+            if cliente_id in self._cargando:
+                self._cargando[cliente_id].append(consumo)
+                return
+            buffer = self._buffers.get(cliente_id)
+            if buffer is not None and not self._add(buffer, [consumo]):
+                self._forget(cliente_id)
+
+    def clear(self) -> None:
+        """Vaciar la caché (se han podido perder eventos)"""
+        with self._lock:
+            self._buffers.clear()
+            self._cargando.clear()
+            self._generacion += 1
+        metricas.incr("hot_cache_vaciados")
+        logger.warning("Caché de clientes activos vaciada: posibles eventos perdidos")
+
+    def _admit(self, cliente_id: str) -> bool:
+        """Contar una lectura sin acierto; True si el cliente debe cargarse"""
+        if cliente_id in self._cargando:
+            return False
+        lecturas = self._candidatos.pop(cliente_id, 0) + 1
+        if lecturas >= self.admitir_tras:
+            return True
+        self._candidatos[cliente_id] = lecturas
+        while len(self._candidatos) > 4 * self.max_clientes:
+            self._candidatos.popitem(last=False)
+        return False
+
+    def _load(self, db: Session, cliente_id: str) -> Optional[UsageBuffer]:
+        """Cargar los días del buffer desde la BD y registrarlo (None si no puede cachearse)"""
+        primero = self._first_day()
+        with self._lock:
+            if not events.broker.listening():
+                return None
+            self._cargando[cliente_id] = []
+            generacion = self._generacion
+        corte = datetime.now(timezone.utc) - timedelta(seconds=self.margen_s)
+        try:
+            filas = db.execute(_load_query(cliente_id, date.fromordinal(primero), corte)).all()
+        except Exception:
+            with self._lock:
+                self._cargando.pop(cliente_id, None)
+            raise
+
+        vistos = {id_externo or str(id_valor) for id_valor, id_externo, *_ in filas if id_valor is not None}
+        futuros = any(fecha > datetime.now() for *_, fecha in filas)
+        # Los agregados cuentan en su día: basta con la medianoche como fecha
+        cargados = [
+            (None, datetime.combine(_as_date(dia_valor), datetime.min.time()), servicio, cantidad, costo)
+            for _, _, dia_valor, servicio, cantidad, costo, _ in filas
+        ]
+
+        buffer = UsageBuffer(self.dias)
+        with self._lock:
+            apartados = self._cargando.pop(cliente_id, None)
+            if apartados is None or generacion != self._generacion or futuros:
+                return None
+            self._add(buffer, cargados)
+            if not self._add(buffer, [c for c in apartados if c[0] not in vistos]):
+                return None
+            self._buffers[cliente_id] = buffer
+            while len(self._buffers) > self.max_clientes:
+                self._buffers.popitem(last=False)
+                metricas.incr("hot_cache_expulsiones")
+        metricas.incr("hot_cache_cargas")
+        return buffer
+
+    def lookup(self, db: Session, cliente_id: str, desde: date, hasta: date) -> Optional[np.ndarray]:
+        """Totales por día de [desde, hasta] (días × CAMPOS) o None si hay que ir a la BD"""
+        if desde.toordinal() < self._first_day() or hasta > date.today():
+            return None
+        with self._lock:
+            buffer = self._buffers.get(cliente_id)
+            if buffer is not None:
+                self._buffers.move_to_end(cliente_id)
+                self.aciertos += 1
+                ventana = buffer.window(desde.toordinal(), hasta.toordinal())
+            else:
+                self.fallos += 1
+                cargar = self._admit(cliente_id)
+        self._report(acierto=buffer is not None)
+        if buffer is not None:
+            return ventana
+        if not cargar:
+            return None
+
+        buffer = self._load(db, cliente_id)
+        if buffer is None:
+            return None
+        with self._lock:
+            return buffer.window(desde.toordinal(), hasta.toordinal())
+
+    def _report(self, acierto: bool) -> None:
+        metricas.incr("hot_cache_lecturas", resultado="acierto" if acierto else "fallo")
+        por_cliente = UsageBuffer(self.dias).nbytes
+        metricas.set("hot_cache_clientes", len(self._buffers))
+        metricas.set("hot_cache_bytes_por_cliente", por_cliente)
+        metricas.set("hot_cache_bytes", len(self._buffers) * por_cliente)
+        metricas.set("hot_cache_tasa_acierto", self.aciertos / (self.aciertos + self.fallos))
+
+
+def _build_cache() -> Optional[HotUsageCache]:
+    if not settings.hot_cache_enabled:
+        return None
+    if not isinstance(events.broker, events.RedisEventBroker) and settings.server_workers != 1:
+        logger.warning("La caché de clientes activos necesita EVENTS_REDIS_URL con varios workers: desactivada")
+        return None
+    # Más allá del horizonte de retención los consumos crudos ya no están en la BD
+    dias = min(settings.hot_cache_days, settings.retention_horizon_days)
+    cache = HotUsageCache(
+        settings.hot_cache_max_clients, dias,
+        settings.hot_cache_admit_after, settings.hot_cache_load_margin_s
+    )
+    events.broker.add_listener(cache.apply_event, cache.clear)
+    return cache
+
+
+# Caché del proceso (None si está desactivada: siempre se consulta la BD)
+usage_cache = _build_cache()
+
+
+def daily_usage(db: Session, cliente_id: str, desde: date, hasta: date) -> Optional[Dict[str, np.ndarray]]:
+    """Columnas por día de [desde, hasta] desde memoria, o None si hay que consultar la BD"""
+    if usage_cache is None:
+        return None
+    try:
+        ventana = usage_cache.lookup(db, cliente_id, desde, hasta)
+    except Exception as e:
+        # Sin caché las lecturas siguen siendo correctas, solo más caras
+        logger.warning(f"Caché de clientes activos no disponible: {e}")
+        return None
+    if ventana is None:
+        return None
+    return {campo: ventana[:, i] for i, campo in enumerate(CAMPOS)}
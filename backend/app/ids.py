@@ -0,0 +1,31 @@
+"""
+Generación de identificadores ordenados por tiempo (UUIDv7).
+
+Los 48 bits altos son el timestamp en milisegundos, así que los ids nuevos se
+insertan al final del índice de la clave primaria en vez de repartirse por
+todo el B-tree como los ids aleatorios.
+"""
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+
+def uuid7(timestamp: Optional[datetime] = None) -> uuid.UUID:
+    """Generar un UUIDv7 (RFC 9562) para el instante dado o el actual"""
+    segundos = timestamp.timestamp() if timestamp is not None else time.time()
+    milisegundos = int(segundos * 1000) & 0xFFFFFFFFFFFF
+
+    aleatorio = int.from_bytes(os.urandom(10), "big")
+    rand_a = (aleatorio >> 62) & 0xFFF
+    rand_b = aleatorio & ((1 << 62) - 1)
+
+    valor = (milisegundos << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=valor)
+
+
+def uuid7_floor(timestamp: datetime) -> uuid.UUID:
+    """Menor UUIDv7 del milisegundo dado (límite para filtrar ids por tiempo)"""
+    milisegundos = int(timestamp.timestamp() * 1000) & 0xFFFFFFFFFFFF
+    return uuid.UUID(int=milisegundos << 80)
@@ -0,0 +1,276 @@
+"""
+Trabajos en segundo plano (exportaciones, agregados, facturación, purgas).
+
+Cada trabajo es una fila de ``jobs`` con su estado, progreso y resultado, de
+modo que ``GET /jobs/{id}`` funciona igual sea cual sea el ejecutor:
+
+- ``thread``: un pool de hilos por cola dentro del proceso de la API, con
+  ``jobs_queue_concurrency`` hilos por cola.
+- ``celery``: se encola en Redis y lo ejecuta un worker de Celery lanzado con
+  ``-Q <cola> -c <concurrencia>`` (ver ``app/celery_app.py``).
+- ``eager``: se ejecuta en el momento, en el hilo que lo envía (tests y
+  scripts).
+
+Los trabajos son idempotentes (la facturación no duplica facturas, la purga
+y los refrescos se reanudan desde su checkpoint), así que reintentarlos es
+seguro.
+"""
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal
+from .metrics import metricas
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """Trabajo desconocido o con parámetros inválidos"""
+
+
+class JobContext:
+    """Acceso del trabajo a su sesión y a su progreso"""
+
+    def __init__(self, job_id: uuid.UUID, db: Session):
+        self.job_id = job_id
+        self.db = db
+        self._ultimo_reporte = 0.0
+
+    def report(self, hechos: int, total: int, mensaje: Optional[str] = None) -> None:
+        """Guardar el progreso (como mucho cada ``jobs_progress_interval_s``)"""
+        ahora = time.monotonic()
+        if hechos < total and ahora - self._ultimo_reporte < settings.jobs_progress_interval_s:
+            return
+        self._ultimo_reporte = ahora
+        # Sesión propia: no interfiere con la transacción del trabajo
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == self.job_id).update({
+                Job.progreso: min(1.0, hechos / total) if total else 1.0,
+                Job.mensaje: mensaje or f"{hechos}/{total}",
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+@dataclass
+class JobType:
+    nombre: str
+    cola: str
+    funcion: Callable[..., dict]
+    publico: bool = False  # lo puede enviar cualquier usuario, no solo administradores
+    validar: Optional[Callable[[dict], None]] = None  # comprueba los parámetros al enviarlo
+
+
+# Tipos de trabajo registrados
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(nombre: str, cola: str, publico: bool = False,
+             validar: Optional[Callable[[dict], None]] = None):
+    """Registrar una función como tipo de trabajo
+
+    ``validar`` recibe los parámetros en ``submit_job`` y lanza ``JobError``
+    si no sirven, para rechazarlos antes de encolar el trabajo.
+    """
+    def decorador(funcion):
+        JOB_TYPES[nombre] = JobType(nombre, cola, funcion, publico, validar)
+        return funcion
+    return decorador
+
+
+def _parse_date(valor: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(valor) if valor else None
+    except (TypeError, ValueError):
+        raise JobError(f"Fecha inválida: {valor}")
+
+
+def _validate_export(parametros: dict) -> None:
+    if not parametros.get("desde"):
+        raise JobError("Falta la fecha inicial de la exportación (desde)")
+    _parse_date(parametros["desde"])
+    _parse_date(parametros.get("hasta"))
+
+
+@job_type("export_consumos", cola="exportaciones", publico=True, validar=_validate_export)
+def _export_consumos(ctx: JobContext, cliente_id: str, desde: str, hasta: Optional[str] = None) -> dict:
+    from .exports import export_consumos
+
+    destino = os.path.join(settings.jobs_result_dir, "exportaciones", f"{ctx.job_id}.csv")
+    return export_consumos(ctx.db, cliente_id, _parse_date(desde), _parse_date(hasta), destino)
+
+
+@job_type("refresh_analytics", cola="agregados")
+def _refresh_analytics(ctx: JobContext) -> dict:
+    from .analytics import refresh_analytics
+
+    return refresh_analytics(ctx.db)
+
+
+@job_type("compact_consumos", cola="agregados")
+def _compact_consumos(ctx: JobContext, horizonte_dias: Optional[int] = None) -> dict:
+    from .retention import compact_consumos
+
+    return compact_consumos(ctx.db, horizonte_dias=horizonte_dias)
+
+
+@job_type("billing_run", cola="facturacion")
+def _billing_run(ctx: JobContext, mes: str) -> dict:
+    from .billing import run_billing
+
+    try:
+        datetime.strptime(mes, "%Y-%m")
+    except ValueError:
+        raise JobError(f"Mes inválido: {mes}")
+    return run_billing(ctx.db, mes, progreso=lambda hechos, total: ctx.report(hechos, total))
+
+
+@job_type("forecast_consumos", cola="agregados")
+def _forecast_consumos(ctx: JobContext) -> dict:
+    from .forecast import run_forecast
+
+    return run_forecast(ctx.db, progreso=lambda hechos, total: ctx.report(hechos, total))
+
+
+@job_type("detect_anomalies", cola="agregados")
+def _detect_anomalies(ctx: JobContext) -> dict:
+    from .anomalies import detect_anomalies
+
+    return detect_anomalies(ctx.db)
+
+
+@job_type("dispatch_notifications", cola="agregados")
+def _dispatch_notifications(ctx: JobContext) -> dict:
+    from .notifications import drain_outbox
+
+    return drain_outbox(ctx.db)
+
+
+@job_type("purge_cliente", cola="purgas")
+def _purge_cliente(ctx: JobContext, cliente_id: str) -> dict:
+    from .purge import purge_cliente
+
+    return purge_cliente(cliente_id)
+
+
+@job_type("purge_pending_clientes", cola="purgas")
+def _purge_pending_clientes(ctx: JobContext) -> dict:
+    from .purge import purge_pending_clientes
+
+    return {"clientes": purge_pending_clientes()}
+
+
+def run_job(job_id: uuid.UUID) -> None:
+    """Ejecutar un trabajo pendiente y guardar su resultado (lo llama el ejecutor)"""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        # en_curso: Celery reentrega el trabajo si su worker cayó a medias
+        if job is None or job.estado not in ("pendiente", "en_curso"):
+            logger.warning(f"Trabajo {job_id} ya terminado o inexistente")
+            return
+        job.estado = "en_curso"
+        job.started_at = datetime.now(timezone.utc)
+        db.commit()
+
+        tipo = JOB_TYPES[job.tipo]
+        parametros = json.loads(job.parametros or "{}")
+        inicio = time.perf_counter()
+        try:
+            resultado = tipo.funcion(JobContext(job.id, db), **parametros)
+            db.rollback()  # descartar lo que el trabajo dejara sin confirmar
+            job.estado = "completado"
+            job.progreso = 1.0
+            job.resultado = json.dumps(resultado, default=str)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Trabajo {job.tipo} {job_id} fallido: {e}")
+            job.estado = "fallido"
+            job.error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+
+        metricas.incr("jobs_terminados", tipo=job.tipo, estado=job.estado)
+        metricas.observe("jobs_duracion_segundos", time.perf_counter() - inicio, tipo=job.tipo)
+    finally:
+        db.close()
+
+
+# Pools de hilos por cola (modo thread)
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(cola: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        if cola not in _executors:
+            _executors[cola] = ThreadPoolExecutor(
+                max_workers=settings.jobs_queue_concurrency.get(cola, 1),
+                thread_name_prefix=f"job-{cola}"
+            )
+        return _executors[cola]
+
+
+def _dispatch(job: Job) -> None:
+    if settings.jobs_backend == "celery":
+        from .celery_app import run_job_task
+
+        run_job_task.apply_async(args=[str(job.id)], queue=job.cola)
+    elif settings.jobs_backend == "eager":
+        run_job(job.id)
+    else:
+        _get_executor(job.cola).submit(run_job, job.id)
+
+
+def submit_job(db: Session, tipo: str, parametros: Optional[dict] = None,
+               solicitado_por: Optional[str] = None) -> Job:
+    """Registrar un trabajo y enviarlo a su cola"""
+    if tipo not in JOB_TYPES:
+        raise JobError(f"Tipo de trabajo desconocido: {tipo}")
+    try:
+        inspect.signature(JOB_TYPES[tipo].funcion).bind(None, **(parametros or {}))
+    except TypeError as e:
+        raise JobError(f"Parámetros inválidos para {tipo}: {e}")
+    if JOB_TYPES[tipo].validar is not None:
+        JOB_TYPES[tipo].validar(parametros or {})
+    job = Job(
+        tipo=tipo,
+        cola=JOB_TYPES[tipo].cola,
+        estado="pendiente",
+        progreso=0.0,
+        parametros=json.dumps(parametros or {}),
+        solicitado_por=solicitado_por
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _dispatch(job)
+    metricas.incr("jobs_enviados", tipo=tipo)
+    if settings.jobs_backend == "eager":
+        db.refresh(job)
+    return job
+
+
+def shutdown_executors() -> None:
+    """Esperar a los trabajos en curso del modo thread"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
@@ -1,15 +1,24 @@
+import time
+
+# Inicio de la importación de la app (tiempo de arranque en /metrics)
+_inicio_importacion = time.perf_counter()
+
 from fastapi import FastAPI, Depends, HTTPException, status, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import uuid
 import logging
-from sqlalchemy import func
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
 
-from .database import get_db, init_db
-from .models import Cliente, Consumo, Factura, Saldo, Plan, ConsumoDiario
+from .database import get_db, get_expected_revision, get_schema_revision, SessionLocal
+from .models import Cliente, Consumo, Factura, Saldo, Plan, ConsumoDiario, Grupo, Job, AlertaConsumo
 from .schemas import (
     ClienteCreate, ClienteResponse, ClienteUpdate,
     ConsumoCreate, ConsumoResponse, ConsumoUpdate,
@@ -17,15 +26,44 @@ from .schemas import (
     SaldoCreate, SaldoResponse, SaldoUpdate,
     PlanCreate, PlanResponse, PlanUpdate,
     ConsumoDiarioCreate, ConsumoDiarioResponse,
-    DashboardResumen, DashboardGraficos, ConsumoGrafico,
-    LoginRequest, LoginResponse, APIResponse, PaginatedResponse
+    DashboardResumen, DashboardGraficos, DashboardBootstrap, ConsumoGrafico,
+    PuntoSerie, SerieConsumo, SyncResponse, GrupoCreate, GrupoResponse, GrupoConsumo, PronosticoResponse,
+    LoginRequest, LoginResponse, APIResponse, PaginatedResponse, AnalyticsResponse, AlertaResponse,
+    JobCreate, JobResponse
+)
+from .auth import get_current_admin, get_current_user, is_admin, create_access_token, get_password_hash, verify_password
+from .historial import columns_to_rows
+from .metrics import metricas
+from .admission import admit
+from .timeouts import guard_queries
+from .compression import CompressionMiddleware
+from .dashboard import (
+    build_bootstrap, build_consumo_chart, build_consumos_page, build_facturas_page,
+    build_graficos, build_graficos_columnar, build_resumen
 )
-from .auth import get_current_user, create_access_token, get_password_hash, verify_password
+from .series import get_series, to_local
+from .sync import SyncTokenError, SyncTokenExpired, get_changes
+from .search import search_clientes
+from .fields import sparse_fields
+from .formats import JSON, columnar_response, negotiate_format
+from .analytics import get_analytics, move_group_member, refresh_analytics
+from .grupos import get_group_usage
+from .forecast import get_forecast
+from .notifications import drain_outbox, record_usage
+from .jobs import JOB_TYPES, JobError, submit_job, shutdown_executors
+from .config import settings
+from . import batching, dedupe, events
+from .ids import uuid7
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+metricas.set("arranque_importacion_segundos", time.perf_counter() - _inicio_importacion)
+
+# El worker acepta tráfico entre el fin del arranque y el inicio del cierre
+_aceptando_trafico = False
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title="Telcox Consumo API",
@@ -42,24 +80,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprimir respuestas según Accept-Encoding
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        offload_size=settings.compression_offload_size
+    )
+
 # Configurar seguridad
 security = HTTPBearer()
 
 # Evento de inicio
 @app.on_event("startup")
 async def startup_event():
+    # Sin efectos sobre la BD: el esquema lo crean las migraciones (init_db.py o
+    # alembic upgrade head) una vez por despliegue, no cada worker al arrancar
+    global _aceptando_trafico
+    inicio = time.perf_counter()
     logger.info("Iniciando aplicación Telcox...")
-    try:
-        init_db()
-        logger.info("Base de datos inicializada correctamente")
-        
-        # Inicializar datos de prueba
+    
+    if settings.seed_demo_data:
         from .database import init_initial_data
-        init_initial_data()
-        logger.info("Datos iniciales creados correctamente")
-        
+        await run_in_threadpool(init_initial_data)
+    
+    await events.broker.start()
+    
+    if settings.consumo_group_commit:
+        await batching.start_consumo_writer()
+    
+    if settings.analytics_refresh_interval_s > 0:
+        asyncio.create_task(_refresh_analytics_periodically())
+    
+    if settings.notify_dispatch_interval_s > 0:
+        asyncio.create_task(_dispatch_notifications_periodically())
+    
+    # Precargar el filtro de duplicados sin retrasar el arranque: mientras tanto
+    # los duplicados los detecta el índice único
+    if dedupe.event_filter is not None:
+        asyncio.create_task(run_in_threadpool(_warm_event_filter_job))
+    
+    _aceptando_trafico = True
+    duracion = time.perf_counter() - inicio
+    metricas.set("arranque_segundos", duracion)
+    logger.info(f"Aplicación lista en {duracion:.3f}s")
+
+def _warm_event_filter_job():
+    db = SessionLocal()
+    try:
+        dedupe.warm_event_filter(db)
     except Exception as e:
-        logger.error(f"Error inicializando BD: {e}")
+        logger.error(f"Error precargando el filtro de duplicados: {e}")
+    finally:
+        db.close()
+
+def _refresh_analytics_job():
+    db = SessionLocal()
+    try:
+        refresh_analytics(db)
+    finally:
+        db.close()
+
+async def _refresh_analytics_periodically():
+    """Refrescar las tablas de resumen de analítica cada cierto intervalo"""
+    while True:
+        try:
+            await run_in_threadpool(_refresh_analytics_job)
+        except Exception as e:
+            logger.error(f"Error refrescando analítica: {e}")
+        await asyncio.sleep(settings.analytics_refresh_interval_s)
+
+def _dispatch_notifications_job():
+    db = SessionLocal()
+    try:
+        drain_outbox(db)
+    finally:
+        db.close()
+
+async def _dispatch_notifications_periodically():
+    """Entregar los avisos del outbox de umbrales cada cierto intervalo"""
+    while True:
+        try:
+            await run_in_threadpool(_dispatch_notifications_job)
+        except Exception as e:
+            logger.error(f"Error despachando avisos: {e}")
+        await asyncio.sleep(settings.notify_dispatch_interval_s)
+
+# Evento de cierre
+@app.on_event("shutdown")
+async def shutdown_event():
+    global _aceptando_trafico
+    # Dejar de recibir tráfico del balanceador mientras se termina
+    _aceptando_trafico = False
+    # Confirmar los consumos que queden en la cola de escritura agrupada
+    await batching.stop_consumo_writer()
+    await events.broker.stop()
+    # Dejar terminar los trabajos en curso del modo thread
+    await run_in_threadpool(shutdown_executors)
 
 # ============================================================================
 # ENDPOINTS DE AUTENTICACIÓN
@@ -151,61 +268,15 @@ async def register(cliente_data: ClienteCreate, db: Session = Depends(get_db)):
 # ENDPOINTS DEL DASHBOARD
 # ============================================================================
 
-@app.get("/dashboard/resumen", response_model=DashboardResumen)
-async def get_dashboard_resumen(
+@app.get("/dashboard/resumen", response_model=DashboardResumen,
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_dashboard_resumen(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener resumen del dashboard para el usuario autenticado"""
     try:
-        # Obtener saldo del cliente
-        saldo = db.query(Saldo).filter(Saldo.cliente_id == current_user.id).first()
-        if not saldo:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Saldo no encontrado"
-            )
-        
-        # Calcular consumo del mes actual
-        fecha_inicio_mes = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        consumo_mes_actual = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio_mes
-        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
-        
-        # Calcular consumo del mes anterior
-        fecha_inicio_mes_anterior = (fecha_inicio_mes - timedelta(days=1)).replace(day=1)
-        fecha_fin_mes_anterior = fecha_inicio_mes - timedelta(seconds=1)
-        consumo_mes_anterior = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio_mes_anterior,
-            Consumo.fecha <= fecha_fin_mes_anterior
-        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
-        
-        # Contar facturas
-        facturas_pendientes = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id,
-            Factura.estado == "pendiente"
-        ).count()
-        
-        facturas_vencidas = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id,
-            Factura.estado == "vencida"
-        ).count()
-        
-        total_facturas = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id
-        ).count()
-        
-        return DashboardResumen(
-            cliente=ClienteResponse.from_orm(current_user),
-            saldo=SaldoResponse.from_orm(saldo),
-            consumo_mes_actual=consumo_mes_actual,
-            consumo_mes_anterior=consumo_mes_anterior,
-            facturas_pendientes=facturas_pendientes,
-            facturas_vencidas=facturas_vencidas,
-            total_facturas=total_facturas
-        )
+        return build_resumen(db, current_user)
         
     except HTTPException:
         raise
@@ -216,108 +287,23 @@ async def get_dashboard_resumen(
             detail="Error interno del servidor"
         )
 
-@app.get("/dashboard/graficos", response_model=DashboardGraficos)
-async def get_dashboard_graficos(
+@app.get("/dashboard/graficos", response_model=DashboardGraficos,
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_dashboard_graficos(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
-    dias: int = Query(7, description="Número de días para el gráfico diario"),
-    meses: int = Query(6, description="Número de meses para el gráfico mensual")
+    dias: int = Query(7, ge=1, le=90, description="Número de días para el gráfico diario"),
+    meses: int = Query(6, ge=1, le=24, description="Número de meses para el gráfico mensual"),
+    formato: str = Depends(negotiate_format)
 ):
-    """Obtener datos para gráficos del dashboard"""
+    """Obtener datos para gráficos del dashboard (JSON por filas, columnar, MessagePack o Arrow)"""
     try:
-        # Consumo diario
-        fecha_inicio = datetime.now() - timedelta(days=dias)
-        consumos_diarios = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio
-        ).order_by(Consumo.fecha).all()
-        
-        # Agrupar por día
-        consumo_por_dia = {}
-        for consumo in consumos_diarios:
-            fecha_str = consumo.fecha.strftime("%Y-%m-%d")
-            if fecha_str not in consumo_por_dia:
-                consumo_por_dia[fecha_str] = {
-                    "fecha": fecha_str,
-                    "datos": 0.0,
-                    "minutos": 0,
-                    "sms": 0,
-                    "costo": 0.0
-                }
-            
-            if consumo.servicio == "datos":
-                consumo_por_dia[fecha_str]["datos"] += consumo.cantidad
-            elif consumo.servicio == "minutos":
-                consumo_por_dia[fecha_str]["minutos"] += int(consumo.cantidad)
-            elif consumo.servicio == "sms":
-                consumo_por_dia[fecha_str]["sms"] += int(consumo.cantidad)
-            
-            consumo_por_dia[fecha_str]["costo"] += consumo.costo_total
-        
-        consumo_diario = list(consumo_por_dia.values())
-        
-        # Consumo mensual (últimos N meses)
-        fecha_inicio_meses = datetime.now() - timedelta(days=meses * 30)
-        consumos_mensuales = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio_meses
-        ).order_by(Consumo.fecha).all()
-        
-        # Agrupar por mes
-        consumo_por_mes = {}
-        for consumo in consumos_mensuales:
-            fecha_str = consumo.fecha.strftime("%Y-%m")
-            if fecha_str not in consumo_por_mes:
-                consumo_por_mes[fecha_str] = {
-                    "fecha": fecha_str,
-                    "datos": 0.0,
-                    "minutos": 0,
-                    "sms": 0,
-                    "costo": 0.0
-                }
-            
-            if consumo.servicio == "datos":
-                consumo_por_mes[fecha_str]["datos"] += consumo.cantidad
-            elif consumo.servicio == "minutos":
-                consumo_por_mes[fecha_str]["minutos"] += int(consumo.cantidad)
-            elif consumo.servicio == "sms":
-                consumo_por_mes[fecha_str]["sms"] += int(consumo.cantidad)
-            
-            consumo_por_mes[fecha_str]["costo"] += consumo.costo_total
-        
-        consumo_mensual = list(consumo_por_mes.values())
-        
-        # Facturación mensual
-        facturas_mensuales = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id,
-            Factura.fecha_emision >= fecha_inicio_meses
-        ).order_by(Factura.fecha_emision).all()
-        
-        facturacion_por_mes = {}
-        for factura in facturas_mensuales:
-            fecha_str = factura.fecha_emision.strftime("%Y-%m")
-            if fecha_str not in facturacion_por_mes:
-                facturacion_por_mes[fecha_str] = {
-                    "mes": fecha_str,
-                    "total": 0.0,
-                    "pendientes": 0,
-                    "pagadas": 0
-                }
-            
-            facturacion_por_mes[fecha_str]["total"] += factura.monto_total
-            if factura.estado == "pendiente":
-                facturacion_por_mes[fecha_str]["pendientes"] += 1
-            elif factura.estado == "pagada":
-                facturacion_por_mes[fecha_str]["pagadas"] += 1
-        
-        facturacion_mensual = list(facturacion_por_mes.values())
-        
-        return DashboardGraficos(
-            consumo_diario=consumo_diario,
-            consumo_mensual=consumo_mensual,
-            facturacion_mensual=facturacion_mensual
-        )
+        if formato != JSON:
+            return columnar_response(formato, build_graficos_columnar(db, current_user.id, dias, meses))
+        return build_graficos(db, current_user.id, dias, meses)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo gráficos del dashboard: {e}")
         raise HTTPException(
@@ -325,50 +311,53 @@ async def get_dashboard_graficos(
             detail="Error interno del servidor"
         )
 
+@app.get("/dashboard/bootstrap", response_model=DashboardBootstrap,
+         dependencies=[Depends(admit("bootstrap")), Depends(guard_queries("bootstrap"))])
+async def get_dashboard_bootstrap(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    dias: int = Query(7, ge=1, le=90, description="Número de días para el gráfico diario"),
+    meses: int = Query(6, ge=1, le=24, description="Número de meses para el gráfico mensual"),
+    size: int = Query(10, ge=1, le=100, description="Tamaño de la primera página de consumos y facturas")
+):
+    """Dashboard completo en una petición: resumen, gráficos y primeras páginas de consumos y facturas"""
+    guard = db.info.get("guard")
+    # Autenticado una vez: cada sección usa su propia conexión del pool
+    db.close()
+    try:
+        return await build_bootstrap(current_user, guard, dias, meses, size)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo el dashboard: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
 # ============================================================================
 # ENDPOINTS DE CONSUMO
 # ============================================================================
 
-@app.get("/consumos", response_model=PaginatedResponse)
-async def get_consumos(
+@app.get("/consumos", response_model=PaginatedResponse,
+         dependencies=[Depends(admit("lectura")), Depends(guard_queries("lectura"))])
+def get_consumos(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Número de página"),
     size: int = Query(20, ge=1, le=100, description="Tamaño de página"),
     servicio: Optional[str] = Query(None, description="Filtrar por servicio"),
     fecha_inicio: Optional[datetime] = Query(None, description="Fecha de inicio"),
-    fecha_fin: Optional[datetime] = Query(None, description="Fecha de fin")
+    fecha_fin: Optional[datetime] = Query(None, description="Fecha de fin"),
+    campos: Optional[List[str]] = Depends(sparse_fields(ConsumoResponse))
 ):
     """Obtener lista paginada de consumos del usuario"""
     try:
-        query = db.query(Consumo).filter(Consumo.cliente_id == current_user.id)
-        
-        # Aplicar filtros
-        if servicio:
-            query = query.filter(Consumo.servicio == servicio)
-        if fecha_inicio:
-            query = query.filter(Consumo.fecha >= fecha_inicio)
-        if fecha_fin:
-            query = query.filter(Consumo.fecha <= fecha_fin)
-        
-        # Contar total
-        total = query.count()
-        
-        # Paginar
-        offset = (page - 1) * size
-        consumos = query.order_by(Consumo.fecha.desc()).offset(offset).limit(size).all()
-        
-        # Calcular páginas
-        pages = (total + size - 1) // size
-        
-        return PaginatedResponse(
-            items=[ConsumoResponse.from_orm(c).dict() for c in consumos],
-            total=total,
-            page=page,
-            size=size,
-            pages=pages
-        )
+        return build_consumos_page(db, current_user.id, page, size, servicio, fecha_inicio, fecha_fin, campos)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo consumos: {e}")
         raise HTTPException(
@@ -376,7 +365,14 @@ async def get_consumos(
             detail="Error interno del servidor"
         )
 
-@app.post("/consumos", response_model=ConsumoResponse)
+def _duplicate_event_error() -> HTTPException:
+    # El evento ya se ingirió pero su consumo ya no está (p. ej. compactado o archivado)
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Evento ya ingerido"
+    )
+
+@app.post("/consumos", response_model=ConsumoResponse, dependencies=[Depends(admit("ingesta"))])
 async def create_consumo(
     consumo_data: ConsumoCreate,
     current_user: Cliente = Depends(get_current_user),
@@ -391,17 +387,70 @@ async def create_consumo(
                 detail="No autorizado para crear consumo para otro cliente"
             )
         
-        # Crear consumo
-        consumo_id = f"consumo_{uuid.uuid4().hex[:8]}"
+        # Reenvío de un evento ya ingerido: devolver el consumo existente.
+        # El filtro descarta sin consultar la BD los eventos seguro nuevos.
+        event_id = consumo_data.event_id
+        if event_id and not dedupe.is_new_event(current_user.id, event_id):
+            existente = dedupe.find_consumo_by_event(db, current_user.id, event_id)
+            if existente is not None:
+                metricas.incr("dedupe_duplicados")
+                return ConsumoResponse.from_orm(existente)
+        
+        # Escritura agrupada: el consumo se confirma junto a otros en un único INSERT
+        if batching.consumo_writer is not None:
+            fila = consumo_data.dict()
+            fila.update(id=uuid7(), created_at=datetime.now(timezone.utc))
+            # Devolver la conexión al pool antes de esperar: el escritor la necesita
+            db.close()
+            try:
+                insertado = await batching.consumo_writer.submit(fila)
+            except batching.QueueFullError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Servicio saturado, reintente más tarde",
+                    headers={"Retry-After": "1"}
+                )
+            if event_id:
+                dedupe.remember_event(current_user.id, event_id)
+                if not insertado:
+                    # Otro envío del mismo evento ganó la carrera. La sesión de la
+                    # petición ya se cerró: el existente se busca con una nueva
+                    metricas.incr("dedupe_duplicados")
+                    sesion = SessionLocal()
+                    try:
+                        existente = dedupe.find_consumo_by_event(sesion, current_user.id, event_id)
+                        if existente is None:
+                            raise _duplicate_event_error()
+                        return ConsumoResponse.from_orm(existente)
+                    finally:
+                        sesion.close()
+            return ConsumoResponse(**{**fila, "id": str(fila["id"])})
+        
+        # Crear consumo (el id UUIDv7 lo asigna el modelo)
         nuevo_consumo = Consumo(
-            id=consumo_id,
             **consumo_data.dict(exclude={"cliente_id"}),
             cliente_id=consumo_data.cliente_id
         )
         
         db.add(nuevo_consumo)
-        db.commit()
+        try:
+            db.flush()
+            # Contadores del mes y avisos de umbral, en la transacción del consumo
+            record_usage(db, [consumo_data.dict()])
+            db.commit()
+        except IntegrityError:
+            # El índice único (cliente_id, event_id) rechazó un duplicado concurrente
+            db.rollback()
+            if not event_id:
+                raise
+            metricas.incr("dedupe_duplicados")
+            existente = dedupe.find_consumo_by_event(db, current_user.id, event_id)
+            if existente is None:
+                raise _duplicate_event_error()
+            return ConsumoResponse.from_orm(existente)
         db.refresh(nuevo_consumo)
+        if event_id:
+            dedupe.remember_event(current_user.id, event_id)
         
         return ConsumoResponse.from_orm(nuevo_consumo)
         
@@ -419,40 +468,22 @@ async def create_consumo(
 # ENDPOINTS DE FACTURAS
 # ============================================================================
 
-@app.get("/facturas", response_model=PaginatedResponse)
-async def get_facturas(
+@app.get("/facturas", response_model=PaginatedResponse,
+         dependencies=[Depends(admit("lectura")), Depends(guard_queries("lectura"))])
+def get_facturas(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Número de página"),
     size: int = Query(20, ge=1, le=100, description="Tamaño de página"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado")
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    campos: Optional[List[str]] = Depends(sparse_fields(FacturaResponse))
 ):
     """Obtener lista paginada de facturas del usuario"""
     try:
-        query = db.query(Factura).filter(Factura.cliente_id == current_user.id)
-        
-        # Aplicar filtros
-        if estado:
-            query = query.filter(Factura.estado == estado)
-        
-        # Contar total
-        total = query.count()
-        
-        # Paginar
-        offset = (page - 1) * size
-        facturas = query.order_by(Factura.fecha_emision.desc()).offset(offset).limit(size).all()
-        
-        # Calcular páginas
-        pages = (total + size - 1) // size
-        
-        return PaginatedResponse(
-            items=[FacturaResponse.from_orm(f).dict() for f in facturas],
-            total=total,
-            page=page,
-            size=size,
-            pages=pages
-        )
+        return build_facturas_page(db, current_user.id, page, size, estado, campos)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo facturas: {e}")
         raise HTTPException(
@@ -520,8 +551,9 @@ async def get_user_saldo(
 
 
 
-@app.get("/user/consumos", response_model=PaginatedResponse)
-async def get_user_consumos(
+@app.get("/user/consumos", response_model=PaginatedResponse,
+         dependencies=[Depends(admit("lectura")), Depends(guard_queries("lectura"))])
+def get_user_consumos(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Número de página"),
@@ -559,10 +591,10 @@ async def get_user_consumos(
                 consumo_response = ConsumoResponse.from_orm(consumo)
                 items.append(consumo_response.dict())
             except Exception as e:
-                logger.warning(f"Error convirtiendo consumo {consumo.id}: {e}")
+                logger.warning(f"Error convirtiendo consumo {consumo.id_publico}: {e}")
                 # Agregar datos básicos si falla la conversión
                 items.append({
-                    "id": str(consumo.id),
+                    "id": consumo.id_publico,
                     "servicio": str(consumo.servicio),
                     "cantidad": float(consumo.cantidad),
                     "unidad": str(consumo.unidad),
@@ -583,6 +615,8 @@ async def get_user_consumos(
             pages=pages
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo consumos del usuario: {e}")
         raise HTTPException(
@@ -590,61 +624,15 @@ async def get_user_consumos(
             detail="Error interno del servidor"
         )
 
-@app.get("/user/consumos/resumen", response_model=DashboardResumen)
-async def get_user_consumos_resumen(
+@app.get("/user/consumos/resumen", response_model=DashboardResumen,
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_user_consumos_resumen(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Obtener resumen de consumos del usuario (endpoint alternativo)"""
     try:
-        # Obtener saldo del cliente
-        saldo = db.query(Saldo).filter(Saldo.cliente_id == current_user.id).first()
-        if not saldo:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Saldo no encontrado"
-            )
-        
-        # Calcular consumo del mes actual
-        fecha_inicio_mes = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        consumo_mes_actual = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio_mes
-        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
-        
-        # Calcular consumo del mes anterior
-        fecha_inicio_mes_anterior = (fecha_inicio_mes - timedelta(days=1)).replace(day=1)
-        fecha_fin_mes_anterior = fecha_inicio_mes - timedelta(seconds=1)
-        consumo_mes_anterior = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio_mes_anterior,
-            Consumo.fecha <= fecha_fin_mes_anterior
-        ).with_entities(func.sum(Consumo.cantidad)).scalar() or 0.0
-        
-        # Contar facturas
-        facturas_pendientes = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id,
-            Factura.estado == "pendiente"
-        ).count()
-        
-        facturas_vencidas = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id,
-            Factura.estado == "vencida"
-        ).count()
-        
-        total_facturas = db.query(Factura).filter(
-            Factura.cliente_id == current_user.id
-        ).count()
-        
-        return DashboardResumen(
-            cliente=ClienteResponse.from_orm(current_user),
-            saldo=SaldoResponse.from_orm(saldo),
-            consumo_mes_actual=consumo_mes_actual,
-            consumo_mes_anterior=consumo_mes_anterior,
-            facturas_pendientes=facturas_pendientes,
-            facturas_vencidas=facturas_vencidas,
-            total_facturas=total_facturas
-        )
+        return build_resumen(db, current_user)
         
     except HTTPException:
         raise
@@ -655,56 +643,29 @@ async def get_user_consumos_resumen(
             detail="Error interno del servidor"
         )
 
-@app.get("/user/consumos/grafico", response_model=List[ConsumoGrafico])
-async def get_user_consumos_grafico(
+@app.get("/user/consumos/grafico", response_model=List[ConsumoGrafico],
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_user_consumos_grafico(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
-    dias: int = Query(7, description="Número de días para el gráfico diario")
+    dias: int = Query(7, ge=1, le=90, description="Número de días para el gráfico diario"),
+    formato: str = Depends(negotiate_format)
 ):
     """Obtener datos para gráficos de consumo del usuario (endpoint alternativo)"""
     try:
         # Consumo diario
         fecha_inicio = datetime.now() - timedelta(days=dias)
-        consumos_diarios = db.query(Consumo).filter(
-            Consumo.cliente_id == current_user.id,
-            Consumo.fecha >= fecha_inicio
-        ).order_by(Consumo.fecha).all()
-        
-        # Agrupar por día
-        consumo_por_dia = {}
-        for consumo in consumos_diarios:
-            fecha_str = consumo.fecha.strftime("%Y-%m-%d")
-            if fecha_str not in consumo_por_dia:
-                consumo_por_dia[fecha_str] = {
-                    "fecha": fecha_str,
-                    "datos": 0.0,
-                    "minutos": 0,
-                    "sms": 0,
-                    "costo": 0.0
-                }
-            
-            if consumo.servicio == "datos":
-                consumo_por_dia[fecha_str]["datos"] += consumo.cantidad
-            elif consumo.servicio == "minutos":
-                consumo_por_dia[fecha_str]["minutos"] += int(consumo.cantidad)
-            elif consumo.servicio == "sms":
-                consumo_por_dia[fecha_str]["sms"] += int(consumo.cantidad)
-            
-            consumo_por_dia[fecha_str]["costo"] += consumo.costo_total
+        consumo_por_dia = build_consumo_chart(db, current_user.id, "dia", fecha_inicio)
+        if formato != JSON:
+            return columnar_response(formato, consumo_por_dia)
         
         # Convertir a formato ConsumoGrafico
-        consumo_grafico = []
-        for fecha, datos in consumo_por_dia.items():
-            consumo_grafico.append(ConsumoGrafico(
-                fecha=fecha,
-                datos=datos["datos"],
-                minutos=datos["minutos"],
-                sms=datos["sms"],
-                costo=datos["costo"]
-            ))
+        consumo_grafico = [ConsumoGrafico(**datos) for datos in columns_to_rows(consumo_por_dia)]
         
         return consumo_grafico
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo gráficos de consumo del usuario: {e}")
         raise HTTPException(
@@ -712,6 +673,170 @@ async def get_user_consumos_grafico(
             detail="Error interno del servidor"
         )
 
+@app.get("/user/consumos/series", response_model=SerieConsumo,
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_user_consumos_series(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    granularidad: str = Query("dia", pattern="^(hora|dia|semana|mes)$", description="Granularidad de la serie"),
+    desde: Optional[datetime] = Query(None, description="Inicio del rango (por defecto 30 días antes del fin)"),
+    hasta: Optional[datetime] = Query(None, description="Fin del rango (por defecto ahora)"),
+    servicio: Optional[str] = Query(None, pattern="^(datos|minutos|sms)$", description="Filtrar por servicio"),
+    agregado: str = Query("suma", pattern="^(suma|media|maximo)$",
+                          description="Cómo se agrupan los intervalos al reducir puntos"),
+    puntos: int = Query(settings.series_default_points, ge=1, le=settings.series_max_points,
+                        description="Número máximo de puntos"),
+    formato: str = Depends(negotiate_format)
+):
+    """Serie temporal de consumo con granularidad, filtro de servicio y presupuesto de puntos"""
+    try:
+        hasta = to_local(hasta) if hasta else datetime.now()
+        desde = to_local(desde) if desde else hasta - timedelta(days=30)
+        if desde >= hasta:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El inicio del rango debe ser anterior al fin"
+            )
+        
+        serie = get_series(db, current_user.id, granularidad, desde, hasta, servicio, agregado, puntos)
+        if formato != JSON:
+            return columnar_response(formato, serie.columnas)
+        
+        return SerieConsumo(
+            granularidad=granularidad,
+            agregado=agregado,
+            factor=serie.plan.factor,
+            desde=serie.plan.inicio,
+            hasta=serie.plan.fin,
+            fuentes=serie.fuentes,
+            puntos=[PuntoSerie(**punto) for punto in columns_to_rows(serie.columnas)]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo la serie de consumo del usuario: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/user/sync", response_model=SyncResponse,
+         dependencies=[Depends(admit("lectura")), Depends(guard_queries("lectura"))])
+def get_user_sync(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    since: Optional[str] = Query(None, description="Token de la sincronización anterior (sin token: estado completo)"),
+    limite: int = Query(settings.sync_page_size, ge=1, le=settings.sync_max_page_size,
+                        description="Filas máximas por entidad")
+):
+    """Consumos y facturas nuevos o modificados y borrados desde el último token"""
+    try:
+        return get_changes(db, current_user.id, since, limite)
+        
+    except SyncTokenExpired as e:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"{e}: sincronice de nuevo sin 'since'"
+        )
+    except SyncTokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error sincronizando datos del usuario: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/user/forecast", response_model=PronosticoResponse,
+         dependencies=[Depends(admit("lectura")), Depends(guard_queries("lectura"))])
+def get_user_forecast(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Consumo y factura proyectados al cierre del mes en curso"""
+    try:
+        pronostico = get_forecast(db, current_user.id)
+        if not pronostico:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Pronóstico del mes aún no calculado"
+            )
+        
+        return PronosticoResponse.from_orm(pronostico)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo pronóstico del usuario: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/user/grupo/consumo", response_model=GrupoConsumo,
+         dependencies=[Depends(admit("dashboard")), Depends(guard_queries("dashboard"))])
+def get_user_grupo_consumo(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    mes: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes (YYYY-MM, por defecto el actual)")
+):
+    """Consumo conjunto del grupo del usuario frente a las bolsas compartidas"""
+    try:
+        grupo = db.get(Grupo, current_user.grupo_id) if current_user.grupo_id else None
+        if not grupo:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="La línea no pertenece a ningún grupo"
+            )
+        
+        return get_group_usage(db, grupo, mes)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo consumo del grupo del usuario: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/user/stream")
+async def stream_user_events(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Canal SSE con los cambios del usuario: consumos nuevos, saldo y facturas"""
+    cliente_id = current_user.id
+    # La conexión puede durar horas: no retener una conexión del pool mientras tanto
+    db.close()
+    cola = events.broker.subscribe(cliente_id)
+    
+    async def generar():
+        try:
+            yield f"retry: {settings.stream_retry_ms}\n\n"
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(cola.get(), settings.stream_heartbeat_s)
+                except asyncio.TimeoutError:
+                    # Comentario SSE: mantiene la conexión abierta a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield f"data: {mensaje}\n\n"
+        finally:
+            events.broker.unsubscribe(cliente_id, cola)
+    
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ============================================================================
 # ENDPOINTS DE PLANES
 # ============================================================================
@@ -734,51 +859,149 @@ async def get_planes(db: Session = Depends(get_db)):
 # ENDPOINTS DE ADMINISTRACIÓN
 # ============================================================================
 
-@app.get("/admin/users", response_model=PaginatedResponse)
-async def get_users(
+@app.get("/admin/users", response_model=PaginatedResponse,
+         dependencies=[Depends(admit("admin")), Depends(guard_queries("admin"))])
+def get_users(
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Número de página"),
     size: int = Query(20, ge=1, le=100, description="Tamaño de página"),
-    search: Optional[str] = Query(None, description="Buscar por nombre o email"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado")
+    search: Optional[str] = Query(None, max_length=100, description="Buscar por nombre, email o teléfono"),
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    total_modo: str = Query("exacto", alias="total", pattern="^(exacto|estimado)$",
+                            description="Conteo exacto o estimado del total"),
+    campos: Optional[List[str]] = Depends(sparse_fields(ClienteResponse))
 ):
     """Obtener lista paginada de usuarios (solo administradores)"""
     try:
         # TODO: Verificar si el usuario actual es administrador
         # Por ahora permitimos acceso a todos los usuarios autenticados
         
-        query = db.query(Cliente)
+        # Búsqueda indexada y ordenada por relevancia
+        estimado = total_modo == "estimado"
+        users, total = search_clientes(db, search, estado, page, size,
+                                       estimar_total=estimado, campos=campos)
         
-        # Aplicar filtros
-        if search:
-            query = query.filter(
-                Cliente.nombre.ilike(f"%{search}%") | 
-                Cliente.email.ilike(f"%{search}%")
-            )
+        # Convertir a respuesta (con campos ya vienen como diccionarios)
+        if campos:
+            items = users
+        else:
+            items = [ClienteResponse.from_orm(user).dict() for user in users]
         
-        if estado:
-            query = query.filter(Cliente.estado_cuenta == estado)
+        return PaginatedResponse(
+            items=items,
+            total=total,
+            page=page,
+            size=size,
+            pages=(total + size - 1) // size,
+            total_estimado=estimado
+        )
         
-        # Contar total de registros
-        total = query.count()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo usuarios: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/admin/analytics", response_model=AnalyticsResponse,
+         dependencies=[Depends(admit("admin")), Depends(guard_queries("admin"))])
+def get_admin_analytics(
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    dias: int = Query(30, ge=1, le=366, description="Días de uso por servicio"),
+    top: int = Query(10, ge=1, le=100, description="Número de mayores consumidores"),
+    mes: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes del ranking (YYYY-MM)")
+):
+    """Analítica de toda la base de clientes (solo lee las tablas de resumen)"""
+    try:
+        return AnalyticsResponse(**get_analytics(db, dias, top, mes))
         
-        # Aplicar paginación
-        users = query.offset((page - 1) * size).limit(size).all()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo analítica: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/admin/alertas", response_model=PaginatedResponse,
+         dependencies=[Depends(admit("admin")), Depends(guard_queries("admin"))])
+def get_alertas(
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    page: int = Query(1, ge=1, description="Número de página"),
+    size: int = Query(20, ge=1, le=100, description="Tamaño de página"),
+    estado: Optional[str] = Query("abierta", pattern="^(abierta|revisada)$", description="Filtrar por estado"),
+    metrica: Optional[str] = Query(None, pattern="^(datos|minutos|sms|costo|costo_roaming)$",
+                                   description="Filtrar por métrica"),
+    cliente_id: Optional[str] = Query(None, description="Filtrar por cliente"),
+    desde: Optional[date] = Query(None, description="Primer día de las alertas")
+):
+    """Consumos anómalos detectados por el trabajo detect_anomalies, del más reciente al más antiguo"""
+    try:
+        query = db.query(AlertaConsumo)
+        if estado:
+            query = query.filter(AlertaConsumo.estado == estado)
+        if metrica:
+            query = query.filter(AlertaConsumo.metrica == metrica)
+        if cliente_id:
+            query = query.filter(AlertaConsumo.cliente_id == cliente_id)
+        if desde:
+            query = query.filter(AlertaConsumo.dia >= desde)
         
-        # Convertir a respuesta
-        user_responses = [ClienteResponse.from_orm(user) for user in users]
+        total = query.count()
+        alertas = query.order_by(
+            AlertaConsumo.dia.desc(), AlertaConsumo.id.desc()
+        ).offset((page - 1) * size).limit(size).all()
         
         return PaginatedResponse(
-            items=[user.dict() for user in user_responses],
+            items=[AlertaResponse.from_orm(alerta).dict() for alerta in alertas],
             total=total,
             page=page,
             size=size,
             pages=(total + size - 1) // size
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error obteniendo usuarios: {e}")
+        logger.error(f"Error obteniendo alertas: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.put("/admin/alertas/{alerta_id}/revisada", response_model=AlertaResponse,
+         dependencies=[Depends(admit("admin"))])
+def review_alerta(
+    alerta_id: uuid.UUID,
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Marcar una alerta como revisada"""
+    try:
+        alerta = db.get(AlertaConsumo, alerta_id)
+        if not alerta:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Alerta no encontrada"
+            )
+        
+        alerta.estado = "revisada"
+        db.commit()
+        db.refresh(alerta)
+        
+        return AlertaResponse.from_orm(alerta)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error revisando alerta: {e}")
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor"
@@ -904,15 +1127,18 @@ async def update_user(
             detail="Error interno del servidor"
         )
 
-@app.delete("/admin/users/{user_id}")
-async def delete_user(
+@app.delete("/admin/users/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+def delete_user(
     user_id: str,
     current_user: Cliente = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Eliminar un usuario"""
+    """Eliminar un usuario (el historial se purga en segundo plano)"""
     try:
-        user = db.query(Cliente).filter(Cliente.id == user_id).first()
+        user = db.query(Cliente).filter(
+            Cliente.id == user_id,
+            Cliente.eliminado_en.is_(None)
+        ).first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -926,10 +1152,16 @@ async def delete_user(
                 detail="No puedes eliminar tu propia cuenta"
             )
         
-        db.delete(user)
+        # Marcar la cuenta como eliminada; consumos y facturas se borran por lotes
+        user.eliminado_en = datetime.now()
+        user.estado_cuenta = "cancelado"
+        # Desde la baja la línea deja de contar en la bolsa de su grupo
+        if user.grupo_id is not None:
+            move_group_member(db, user, None)
         db.commit()
+        job = submit_job(db, "purge_cliente", {"cliente_id": user.id}, solicitado_por=current_user.id)
         
-        return {"message": "Usuario eliminado correctamente"}
+        return {"message": "Usuario eliminado correctamente", "job_id": str(job.id)}
         
     except HTTPException:
         raise
@@ -941,6 +1173,241 @@ async def delete_user(
             detail="Error interno del servidor"
         )
 
+# ============================================================================
+# ENDPOINTS DE GRUPOS (PLANES FAMILIARES Y CORPORATIVOS)
+# ============================================================================
+
+def _get_grupo(db: Session, grupo_id: uuid.UUID) -> Grupo:
+    grupo = db.get(Grupo, grupo_id)
+    if not grupo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Grupo no encontrado"
+        )
+    return grupo
+
+@app.post("/admin/grupos", response_model=GrupoResponse, dependencies=[Depends(admit("admin"))])
+def create_grupo(
+    grupo_data: GrupoCreate,
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Crear un grupo de líneas que comparten las bolsas de un plan"""
+    try:
+        if not db.get(Plan, grupo_data.plan_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Plan no encontrado"
+            )
+        
+        grupo = Grupo(nombre=grupo_data.nombre, tipo=grupo_data.tipo.value,
+                      plan_id=grupo_data.plan_id, miembros=0)
+        db.add(grupo)
+        db.commit()
+        db.refresh(grupo)
+        
+        return GrupoResponse.from_orm(grupo)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creando grupo: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.put("/admin/grupos/{grupo_id}/miembros/{user_id}", response_model=GrupoResponse,
+         dependencies=[Depends(admit("admin"))])
+def add_grupo_member(
+    grupo_id: uuid.UUID,
+    user_id: str,
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Unir una línea al grupo (si estaba en otro, se mueve con su consumo)"""
+    try:
+        grupo = _get_grupo(db, grupo_id)
+        user = db.query(Cliente).filter(
+            Cliente.id == user_id,
+            Cliente.eliminado_en.is_(None)
+        ).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuario no encontrado"
+            )
+        
+        move_group_member(db, user, grupo)
+        db.commit()
+        db.refresh(grupo)
+        
+        return GrupoResponse.from_orm(grupo)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error añadiendo línea al grupo: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.delete("/admin/grupos/{grupo_id}/miembros/{user_id}", response_model=GrupoResponse,
+            dependencies=[Depends(admit("admin"))])
+def remove_grupo_member(
+    grupo_id: uuid.UUID,
+    user_id: str,
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Sacar una línea del grupo (su consumo deja de contar en la bolsa)"""
+    try:
+        grupo = _get_grupo(db, grupo_id)
+        user = db.query(Cliente).filter(
+            Cliente.id == user_id,
+            Cliente.grupo_id == grupo.id
+        ).first()
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="La línea no pertenece al grupo"
+            )
+        
+        move_group_member(db, user, None)
+        db.commit()
+        db.refresh(grupo)
+        
+        return GrupoResponse.from_orm(grupo)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error quitando línea del grupo: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/admin/grupos/{grupo_id}/consumo", response_model=GrupoConsumo,
+         dependencies=[Depends(admit("admin")), Depends(guard_queries("admin"))])
+def get_grupo_consumo(
+    grupo_id: uuid.UUID,
+    current_user: Cliente = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+    mes: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Mes (YYYY-MM, por defecto el actual)")
+):
+    """Consumo conjunto de un grupo frente a las bolsas de su plan"""
+    try:
+        return get_group_usage(db, _get_grupo(db, grupo_id), mes)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo consumo del grupo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+# ============================================================================
+# ENDPOINTS DE TRABAJOS EN SEGUNDO PLANO
+# ============================================================================
+
+def _get_own_job(db: Session, job_id: uuid.UUID, current_user: Cliente) -> Job:
+    job = db.query(Job).filter(Job.id == job_id, Job.solicitado_por == current_user.id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trabajo no encontrado"
+        )
+    return job
+
+@app.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED,
+          dependencies=[Depends(admit("trabajos"))])
+def create_job(
+    job_data: JobCreate,
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Enviar un trabajo pesado a su cola; se consulta con GET /jobs/{id}"""
+    try:
+        parametros = dict(job_data.parametros)
+        if not is_admin(current_user):
+            # Facturación, agregados y purgas solo los lanzan administradores
+            tipo = JOB_TYPES.get(job_data.tipo)
+            if tipo is None or not tipo.publico:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No autorizado para enviar este tipo de trabajo"
+                )
+            # Un usuario solo exporta su propio historial
+            if job_data.tipo == "export_consumos":
+                parametros["cliente_id"] = current_user.id
+        
+        job = submit_job(db, job_data.tipo, parametros, solicitado_por=current_user.id)
+        return JobResponse.from_orm(job)
+        
+    except HTTPException:
+        raise
+    except JobError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error enviando trabajo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
+
+@app.get("/jobs", response_model=List[JobResponse])
+async def get_jobs(
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    limit: int = Query(20, ge=1, le=100, description="Número de trabajos")
+):
+    """Trabajos enviados por el usuario, del más reciente al más antiguo"""
+    query = db.query(Job).filter(Job.solicitado_por == current_user.id)
+    if estado:
+        query = query.filter(Job.estado == estado)
+    # El id UUIDv7 ordena por fecha de creación
+    return [JobResponse.from_orm(job) for job in query.order_by(Job.id.desc()).limit(limit)]
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: uuid.UUID,
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Estado, progreso y resultado de un trabajo"""
+    return JobResponse.from_orm(_get_own_job(db, job_id, current_user))
+
+@app.get("/jobs/{job_id}/descarga")
+async def download_job_result(
+    job_id: uuid.UUID,
+    current_user: Cliente = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Descargar el fichero generado por un trabajo de exportación"""
+    job = _get_own_job(db, job_id, current_user)
+    resultado = JobResponse.from_orm(job).resultado or {}
+    if job.estado != "completado" or "fichero" not in resultado:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El trabajo no tiene fichero disponible"
+        )
+    return FileResponse(
+        resultado["fichero"],
+        media_type="text/csv",
+        filename=f"consumos_{job.id}.csv"
+    )
+
 # ============================================================================
 # ENDPOINTS DE SALUD
 # ============================================================================
@@ -949,6 +1416,38 @@ async def delete_user(
 async def health_check():
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
+@app.get("/health/live")
+async def liveness_probe():
+    """El proceso responde (no consulta dependencias: un fallo de la BD no debe reiniciarlo)"""
+    return {"status": "ok"}
+
+def _check_readiness() -> dict:
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return {"esquema": get_schema_revision(db), "esperado": get_expected_revision()}
+    finally:
+        db.close()
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """El worker puede recibir tráfico: arrancado, BD accesible y esquema migrado"""
+    if not _aceptando_trafico:
+        return JSONResponse(status_code=503, content={"status": "arrancando o cerrando"})
+    try:
+        revisiones = await run_in_threadpool(_check_readiness)
+    except Exception as e:
+        logger.warning(f"Readiness: base de datos no disponible: {e}")
+        return JSONResponse(status_code=503, content={"status": "base de datos no disponible"})
+    if revisiones["esquema"] != revisiones["esperado"]:
+        return JSONResponse(status_code=503, content={"status": "migraciones pendientes", **revisiones})
+    return {"status": "ok", **revisiones}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas internas del proceso que atiende la petición"""
+    return metricas.snapshot()
+
 @app.get("/test/facturas")
 async def test_facturas(db: Session = Depends(get_db)):
     """Endpoint de prueba para verificar que las facturas funcionen"""
@@ -0,0 +1,58 @@
+"""
+Métricas en proceso (contadores, valores y duraciones).
+
+Cada proceso acumula sus propias métricas; el endpoint ``/metrics`` devuelve
+una foto de las del worker que atiende la petición.
+"""
+import threading
+from typing import Dict
+
+
+def _clave(nombre: str, etiquetas: Dict[str, str]) -> str:
+    if not etiquetas:
+        return nombre
+    partes = ",".join(f"{k}={v}" for k, v in sorted(etiquetas.items()))
+    return f"{nombre}{{{partes}}}"
+
+
+class Metricas:
+    """Registro de métricas seguro entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, float] = {}
+        self._valores: Dict[str, float] = {}
+        self._duraciones: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, nombre: str, valor: float = 1.0, **etiquetas) -> None:
+        """Incrementar un contador"""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0.0) + valor
+
+    def set(self, nombre: str, valor: float, **etiquetas) -> None:
+        """Fijar el valor actual de una métrica"""
+        with self._lock:
+            self._valores[_clave(nombre, etiquetas)] = valor
+
+    def observe(self, nombre: str, segundos: float, **etiquetas) -> None:
+        """Registrar una duración (cuenta, suma y máximo)"""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            actual = self._duraciones.setdefault(clave, {"count": 0, "sum": 0.0, "max": 0.0})
+            actual["count"] += 1
+            actual["sum"] += segundos
+            actual["max"] = max(actual["max"], segundos)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Copia de todas las métricas"""
+        with self._lock:
+            return {
+                "contadores": dict(self._contadores),
+                "valores": dict(self._valores),
+                "duraciones": {k: dict(v) for k, v in self._duraciones.items()},
+            }
+
+
+# Instancia global de métricas
+metricas = Metricas()
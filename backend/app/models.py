@@ -1,10 +1,27 @@
-from sqlalchemy import Column, String, Float, DateTime, Text, Integer, Boolean, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, Float, Date, DateTime, Text, Integer, Boolean, ForeignKey, Index, Uuid
+from sqlalchemy.sql import func, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from .database import Base
+from .ids import uuid7
 
-Base = declarative_base()
+class UuidPrimaryKeyMixin:
+    """Clave primaria UUIDv7 compacta para tablas con muchas escrituras"""
+    
+    id = Column(Uuid, primary_key=True, default=uuid7)  # ordenado por tiempo
+    id_externo = Column(String(50), unique=True, index=True, nullable=True)  # id heredado
+    
+    @property
+    def id_publico(self) -> str:
+        """Id expuesto en la API: el heredado si existe, si no el UUID"""
+        return self.id_externo or str(self.id)
+
+def telefono_normalizado(telefono):
+    """Teléfono sin '+' ni separadores: así se indexa y se busca por prefijo"""
+    # Literales y no parámetros: la consulta debe coincidir con la expresión del índice
+    for separador in ("+", " ", "-", "(", ")"):
+        telefono = func.replace(telefono, literal_column(f"'{separador}'"), literal_column("''"))
+    return telefono
 
 class Cliente(Base):
     __tablename__ = "clientes"
@@ -18,35 +35,70 @@ class Cliente(Base):
     estado_cuenta = Column(String(20), default="activo")  # activo, suspendido, cancelado
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    eliminado_en = Column(DateTime(timezone=True), nullable=True)  # baja pendiente de purga
+    grupo_id = Column(Uuid, ForeignKey("grupos.id", name="fk_clientes_grupo_id", ondelete="SET NULL"), nullable=True, index=True)  # cuenta compartida
     
-    # Relaciones
-    consumos = relationship("Consumo", back_populates="cliente")
-    facturas = relationship("Factura", back_populates="cliente")
-    saldo = relationship("Saldo", back_populates="cliente", uselist=False)
+    __table_args__ = (
+        # Búsqueda por prefijo de teléfono normalizado (app/search.py)
+        Index(
+            "ix_clientes_telefono_normalizado",
+            telefono_normalizado(telefono).label("telefono_normalizado"),
+            postgresql_ops={"telefono_normalizado": "text_pattern_ops"}
+        ),
+        # Cambios de plan recogidos por el refresco de analítica
+        Index("ix_clientes_updated_at", "updated_at"),
+    )
+    
+    # Relaciones (el borrado en cascada lo hace la base de datos, sin cargar hijos)
+    consumos = relationship("Consumo", back_populates="cliente", cascade="all, delete-orphan", passive_deletes=True)
+    facturas = relationship("Factura", back_populates="cliente", cascade="all, delete-orphan", passive_deletes=True)
+    saldo = relationship("Saldo", back_populates="cliente", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
-class Consumo(Base):
+class Grupo(Base):
+    __tablename__ = "grupos"
+    
+    # Cuenta con varias líneas (clientes) que comparten las bolsas de un plan
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    nombre = Column(String(100), nullable=False)
+    tipo = Column(String(20), nullable=False, default="familiar")  # familiar, corporativo
+    plan_id = Column(String(50), ForeignKey("planes.id"), nullable=False)
+    miembros = Column(Integer, default=0)  # líneas activas, mantenido al unir y quitar
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class Consumo(UuidPrimaryKeyMixin, Base):
     __tablename__ = "consumos"
     
-    id = Column(String(50), primary_key=True, index=True)
     servicio = Column(String(50), nullable=False)  # datos, minutos, sms
     cantidad = Column(Float, nullable=False)
     unidad = Column(String(20), nullable=False)  # MB, GB, minutos, unidades
     fecha = Column(DateTime, nullable=False)
-    cliente_id = Column(String(50), ForeignKey("clientes.id"), nullable=False, index=True)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False, index=True)
     tipo_consumo = Column(String(20), default="normal")  # normal, roaming, premium
     costo_unitario = Column(Float, default=0.0)
     costo_total = Column(Float, default=0.0)
+    event_id = Column(String(100), nullable=True)  # id del evento en el sistema de mediación
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relaciones
     cliente = relationship("Cliente", back_populates="consumos")
+    
+    # Índice para recorrer consumos antiguos por orden de fecha (retención y archivo)
+    __table_args__ = (
+        Index("ix_consumos_fecha_id", "fecha", "id"),
+        # Un reenvío del mismo evento no puede crear un segundo consumo
+        Index("ix_consumos_cliente_event", "cliente_id", "event_id", unique=True),
+        # Recorrido incremental del refresco de analítica
+        Index("ix_consumos_created_at", "created_at"),
+        # Sincronización incremental de las apps (app/sync.py)
+        Index("ix_consumos_cliente_updated", "cliente_id", "updated_at", "id"),
+    )
 
-class Factura(Base):
+class Factura(UuidPrimaryKeyMixin, Base):
     __tablename__ = "facturas"
     
-    id = Column(String(50), primary_key=True, index=True)
-    cliente_id = Column(String(50), ForeignKey("clientes.id"), nullable=False, index=True)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False, index=True)
     numero_factura = Column(String(50), unique=True, nullable=False)
     monto_total = Column(Float, nullable=False)
     monto_subtotal = Column(Float, default=0.0)
@@ -58,16 +110,23 @@ class Factura(Base):
     metodo_pago = Column(String(50), default="")
     fecha_pago = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relaciones
     cliente = relationship("Cliente", back_populates="facturas")
+    
+    # Facturas nuevas o modificadas desde el último refresco de analítica
+    __table_args__ = (
+        Index("ix_facturas_created_at", "created_at"),
+        Index("ix_facturas_updated_at", "updated_at"),
+        Index("ix_facturas_cliente_updated", "cliente_id", "updated_at", "id"),
+    )
 
 class Saldo(Base):
     __tablename__ = "saldos"
     
     id = Column(String(50), primary_key=True, index=True)
-    cliente_id = Column(String(50), ForeignKey("clientes.id"), unique=True, nullable=False, index=True)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), unique=True, nullable=False, index=True)
     saldo_actual = Column(Float, default=0.0)
     limite_credito = Column(Float, default=0.0)
     saldo_disponible = Column(Float, default=0.0)  # saldo_actual + limite_credito
@@ -94,11 +153,10 @@ class Plan(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-class ConsumoDiario(Base):
+class ConsumoDiario(UuidPrimaryKeyMixin, Base):
     __tablename__ = "consumos_diarios"
     
-    id = Column(String(50), primary_key=True, index=True)
-    cliente_id = Column(String(50), ForeignKey("clientes.id"), nullable=False, index=True)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False, index=True)
     fecha = Column(DateTime, nullable=False)
     datos_consumidos = Column(Float, default=0.0)  # en MB
     minutos_consumidos = Column(Integer, default=0)
@@ -108,6 +166,204 @@ class ConsumoDiario(Base):
     
     # Índices compuestos para consultas eficientes
     __table_args__ = (
-        # Índice compuesto para consultas por cliente y fecha
-        {'sqlite_autoincrement': True}
+        # Una fila por cliente y día: la compactación acumula sobre ella
+        Index("ix_consumos_diarios_cliente_fecha", "cliente_id", "fecha", unique=True),
     )
+
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+    
+    nombre = Column(String(50), primary_key=True)  # nombre del job
+    valor = Column(Text, nullable=True)  # posición serializada donde reanudar
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Tablas de resumen para analítica (las mantiene app/analytics.py)
+
+class AnalyticsUsoDiario(Base):
+    __tablename__ = "analytics_uso_diario"
+    
+    fecha = Column(Date, primary_key=True)
+    servicio = Column(String(50), primary_key=True)
+    cantidad = Column(Float, default=0.0)
+    costo = Column(Float, default=0.0)
+    eventos = Column(Integer, default=0)
+
+class AnalyticsClienteMes(Base):
+    __tablename__ = "analytics_clientes_mes"
+    
+    cliente_id = Column(String(50), primary_key=True)
+    mes = Column(String(7), primary_key=True)  # YYYY-MM
+    datos = Column(Float, default=0.0)  # en MB
+    minutos = Column(Float, default=0.0)
+    sms = Column(Float, default=0.0)
+    costo = Column(Float, default=0.0)
+    
+    # Ranking de mayores consumidores de un mes
+    __table_args__ = (
+        Index("ix_analytics_clientes_mes_mes_costo", "mes", "costo"),
+    )
+
+class AnalyticsFacturasCliente(Base):
+    __tablename__ = "analytics_facturas_clientes"
+    
+    cliente_id = Column(String(50), primary_key=True)
+    plan = Column(String(50), nullable=False)
+    facturado = Column(Float, default=0.0)
+    pagado = Column(Float, default=0.0)
+    pendiente = Column(Float, default=0.0)
+    vencido = Column(Float, default=0.0)
+    facturas_vencidas = Column(Integer, default=0)
+
+class AnalyticsPlan(Base):
+    __tablename__ = "analytics_planes"
+    
+    plan = Column(String(50), primary_key=True)
+    clientes = Column(Integer, default=0)  # clientes con facturas
+    facturado = Column(Float, default=0.0)
+    pagado = Column(Float, default=0.0)
+    pendiente = Column(Float, default=0.0)
+    vencido = Column(Float, default=0.0)
+    facturas_vencidas = Column(Integer, default=0)
+
+class ConsumoGrupoMes(Base):
+    __tablename__ = "consumos_grupos_mes"
+    
+    # Suma de analytics_clientes_mes de los miembros actuales del grupo
+    grupo_id = Column(Uuid, ForeignKey("grupos.id", ondelete="CASCADE"), primary_key=True)
+    mes = Column(String(7), primary_key=True)  # YYYY-MM
+    datos = Column(Float, default=0.0)  # en MB
+    minutos = Column(Float, default=0.0)
+    sms = Column(Float, default=0.0)
+    costo = Column(Float, default=0.0)
+
+# Rollup horario de consumos para las series temporales (lo mantiene app/analytics.py)
+
+class ConsumoHorario(Base):
+    __tablename__ = "consumos_horarios"
+    
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), primary_key=True)
+    hora = Column(DateTime, primary_key=True)  # inicio de la hora
+    servicio = Column(String(50), primary_key=True)
+    cantidad = Column(Float, default=0.0)
+    costo = Column(Float, default=0.0)
+    eventos = Column(Integer, default=0)
+    
+    # Poda de las horas más antiguas que la retención del rollup
+    __table_args__ = (
+        Index("ix_consumos_horarios_hora", "hora"),
+    )
+
+# Borrados de consumos y facturas para la sincronización incremental (app/sync.py)
+
+class Eliminacion(Base):
+    __tablename__ = "eliminaciones"
+    
+    # UUIDv7: el orden de los ids es el orden de borrado
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    entidad = Column(String(20), nullable=False)  # consumo, factura
+    entidad_id = Column(String(50), nullable=False)  # id público de la fila borrada
+    eliminado_en = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Borrados de un cliente desde el token de sincronización
+    __table_args__ = (
+        Index("ix_eliminaciones_cliente_id", "cliente_id", "id"),
+    )
+
+# Proyección de consumo y factura al cierre del mes (la calcula app/forecast.py)
+
+class Pronostico(Base):
+    __tablename__ = "pronosticos"
+    
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), primary_key=True)
+    mes = Column(String(7), nullable=False)  # YYYY-MM proyectado
+    datos = Column(Float, default=0.0)  # en MB, total proyectado del mes
+    minutos = Column(Float, default=0.0)
+    sms = Column(Float, default=0.0)
+    costo = Column(Float, default=0.0)  # coste de consumos proyectado
+    costo_actual = Column(Float, default=0.0)  # coste de consumos hasta hoy
+    factura_estimada = Column(Float, default=0.0)  # cuota + consumos + impuestos
+    modelo = Column(String(20), nullable=False)  # tendencia, ritmo
+    calculado_en = Column(DateTime(timezone=True), server_default=func.now())
+
+# Detección de consumos anómalos (la mantiene app/anomalies.py)
+
+class AnomaliaEstado(Base):
+    __tablename__ = "anomalias_estado"
+    
+    # Media y varianza móviles (exponenciales) de un cliente y métrica
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), primary_key=True)
+    metrica = Column(String(20), primary_key=True)  # datos, minutos, sms, costo, costo_roaming
+    media = Column(Float, default=0.0)
+    varianza = Column(Float, default=0.0)
+    dias = Column(Integer, default=0)  # días observados (con y sin consumo)
+    ultimo_dia = Column(Date, nullable=False)  # último día aplicado
+
+class AlertaConsumo(Base):
+    __tablename__ = "alertas_consumo"
+    
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    dia = Column(Date, nullable=False)
+    metrica = Column(String(20), nullable=False)
+    valor = Column(Float, nullable=False)
+    media = Column(Float, nullable=False)  # media móvil antes del día
+    desviacion = Column(Float, nullable=False)
+    puntuacion = Column(Float, nullable=True)  # desviaciones sobre la media (None si no había variación)
+    estado = Column(String(20), default="abierta")  # abierta, revisada
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Repetir la detección de un día no duplica alertas
+        Index("ix_alertas_consumo_cliente_dia", "cliente_id", "dia", "metrica", unique=True),
+        # Listado del panel de administración
+        Index("ix_alertas_consumo_estado_dia", "estado", "dia"),
+    )
+
+# Avisos de umbrales de consumo y saldo (los genera y envía app/notifications.py)
+
+class ConsumoMes(Base):
+    __tablename__ = "consumos_mes"
+    
+    # Contadores del mes de una línea, sumados en la misma transacción que el consumo
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), primary_key=True)
+    mes = Column(String(7), primary_key=True)  # YYYY-MM de la fecha del consumo
+    datos = Column(Float, default=0.0)  # en MB
+    minutos = Column(Float, default=0.0)
+    sms = Column(Float, default=0.0)
+
+class NotificacionOutbox(Base):
+    __tablename__ = "notificaciones_outbox"
+    
+    # UUIDv7: el orden de los ids es el orden de creación
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    cliente_id = Column(String(50), ForeignKey("clientes.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String(30), nullable=False)  # umbral_consumo, saldo_bajo
+    datos = Column(Text, nullable=False)  # JSON
+    estado = Column(String(20), default="pendiente")  # pendiente, fallida (las enviadas se borran)
+    intentos = Column(Integer, default=0)
+    disponible_en = Column(DateTime(timezone=True), nullable=True)  # próximo reintento
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Recorrido del despachador por orden de creación
+    __table_args__ = (
+        Index("ix_notificaciones_outbox_estado_id", "estado", "id"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    tipo = Column(String(50), nullable=False)  # export_consumos, billing_run, ...
+    cola = Column(String(30), nullable=False)
+    estado = Column(String(20), default="pendiente")  # pendiente, en_curso, completado, fallido
+    parametros = Column(Text, nullable=True)  # JSON
+    progreso = Column(Float, default=0.0)  # 0..1
+    mensaje = Column(Text, nullable=True)
+    resultado = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    solicitado_por = Column(String(50), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,309 @@
+"""
+Avisos de umbrales de consumo y de saldo con un outbox transaccional.
+
+Los umbrales se evalúan en la escritura comparando el valor anterior y el
+nuevo, sin recorrer los totales de los clientes:
+
+- ``record_usage`` suma los consumos a los contadores del mes de cada línea
+  (``consumos_mes``) con un upsert que devuelve el valor nuevo; el anterior es
+  el nuevo menos lo sumado. Hay aviso cuando el contador cruza una fracción
+  de la bolsa del plan (``notify_usage_thresholds``). Las dos vías de ingesta
+  (``POST /consumos`` y la escritura agrupada de ``app/batching.py``) la
+  llaman antes de su commit.
+- Asignar con el ORM un ``Saldo.saldo_disponible`` que baja de
+  ``notify_low_balance`` avisa desde el evento ``set`` del atributo, que ya
+  recibe el valor anterior: solo cuesta algo cuando cambia un saldo, no en
+  cada flush. El aviso se añade a la sesión del saldo y se escribe en el
+  mismo flush que el cambio.
+
+El aviso se escribe en ``notificaciones_outbox`` en la misma transacción que
+el cambio que lo provoca: un rollback no deja aviso y un commit no lo pierde.
+``drain_outbox`` (en la API cada ``notify_dispatch_interval_s`` o con el
+trabajo ``dispatch_notifications``) entrega los avisos por lotes y en orden de
+creación a los destinos de ``notify_sinks`` y solo entonces los borra. La
+entrega es al menos una vez: si un destino falla o el proceso cae antes del
+borrado el lote se repite entero, así que los destinos descartan repetidos
+por ``id``.
+
+Las líneas de un grupo no avisan por su plan: consumen la bolsa compartida
+del grupo (``app/grupos.py``).
+"""
+import json
+import logging
+import queue
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from .billing import plan_id_of
+from .config import settings
+from .grupos import MB_POR_GB
+from .metrics import metricas
+from .models import Cliente, ConsumoMes, NotificacionOutbox, Plan, Saldo
+
+logger = logging.getLogger(__name__)
+
+SERVICIOS = ("datos", "minutos", "sms")
+
+
+# ============================================================================
+# Evaluación de umbrales (dentro de la transacción de la escritura)
+# ============================================================================
+
+def _allowances(plan: Plan) -> Dict[str, float]:
+    """Bolsas del plan en las unidades de los consumos (0 = sin tope)"""
+    return {
+        "datos": (plan.datos_incluidos or 0) * MB_POR_GB,
+        "minutos": plan.minutos_incluidos or 0,
+        "sms": plan.sms_incluidos or 0,
+    }
+
+
+def _enqueue(db: Session, avisos: List[dict]) -> None:
+    if not avisos:
+        return
+    db.execute(insert(NotificacionOutbox), [
+        {"cliente_id": aviso["cliente_id"], "tipo": aviso["tipo"], "datos": json.dumps(aviso["datos"])}
+        for aviso in avisos
+    ])
+    metricas.incr("notificaciones_generadas", len(avisos))
+
+
+def record_usage(db: Session, consumos: Iterable[dict]) -> int:
+    """Sumar consumos (cliente_id, servicio, cantidad, fecha) a los contadores del
+    mes y encolar los umbrales cruzados; devuelve el número de avisos.
+
+    No hace commit: la llama la ingesta antes de confirmar sus consumos.
+    """
+    deltas: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(SERVICIOS, 0.0))
+    for consumo in consumos:
+        if consumo["servicio"] in SERVICIOS:
+            clave = (consumo["cliente_id"], consumo["fecha"].strftime("%Y-%m"))
+            deltas[clave][consumo["servicio"]] += consumo["cantidad"] or 0.0
+    if not deltas:
+        return 0
+
+    # Upsert en orden de clave: dos lotes concurrentes bloquean las filas en el mismo orden
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialecto.insert(ConsumoMes)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cliente_id", "mes"],
+        set_={servicio: getattr(ConsumoMes, servicio) + getattr(stmt.excluded, servicio) for servicio in SERVICIOS}
+    ).returning(ConsumoMes.cliente_id, ConsumoMes.mes, *(getattr(ConsumoMes, s) for s in SERVICIOS))
+    contadores = db.execute(stmt, [
+        {"cliente_id": cliente_id, "mes": mes, **sumas}
+        for (cliente_id, mes), sumas in sorted(deltas.items())
+    ]).all()
+
+    planes = {plan.id: plan for plan in db.query(Plan)}
+    lineas = dict(db.query(Cliente.id, Cliente.plan_actual).filter(
+        Cliente.id.in_({cliente_id for cliente_id, _ in deltas}),
+        Cliente.grupo_id.is_(None)
+    ))
+
+    avisos = []
+    for cliente_id, mes, *totales in contadores:
+        plan = planes.get(plan_id_of(lineas[cliente_id])) if cliente_id in lineas else None
+        if plan is None:
+            continue
+        incluidos = _allowances(plan)
+        for servicio, nuevo in zip(SERVICIOS, totales):
+            incluido = incluidos[servicio]
+            if not incluido:
+                continue
+            anterior = nuevo - deltas[(cliente_id, mes)][servicio]
+            for umbral in settings.notify_usage_thresholds:
+                if anterior < umbral * incluido <= nuevo:
+                    avisos.append({"cliente_id": cliente_id, "tipo": "umbral_consumo", "datos": {
+                        "mes": mes,
+                        "servicio": servicio,
+                        "umbral": round(umbral * 100),
+                        "usado": nuevo,
+                        "incluido": incluido,
+                    }})
+
+    _enqueue(db, avisos)
+    return len(avisos)
+
+
+# active_history: el valor anterior se carga aunque el atributo estuviera expirado
+@event.listens_for(Saldo.saldo_disponible, "set", active_history=True)
+def _check_low_balance(target: Saldo, valor, anterior, iniciador) -> None:
+    limite = settings.notify_low_balance
+    # Un saldo recién creado no tiene valor anterior: no cruza nada
+    if limite <= 0 or valor is None or not isinstance(anterior, (int, float)):
+        return
+    sesion = object_session(target)
+    if sesion is None or not anterior >= limite > valor:
+        return
+    sesion.add(NotificacionOutbox(cliente_id=target.cliente_id, tipo="saldo_bajo", datos=json.dumps({
+        "saldo_disponible": valor,
+        "saldo_anterior": anterior,
+        "limite": limite,
+        "moneda": target.moneda,
+    })))
+    metricas.incr("notificaciones_generadas")
+
+
+# ============================================================================
+# Destinos
+# ============================================================================
+
+class NotificationSink:
+    """Destino de avisos: ``send`` recibe un lote y lanza una excepción si falla"""
+
+    def send(self, avisos: List[dict]) -> None:
+        raise NotImplementedError
+
+
+class LogSink(NotificationSink):
+    """Escribe cada aviso en el log de la aplicación"""
+
+    def send(self, avisos: List[dict]) -> None:
+        for aviso in avisos:
+            logger.info(f"Aviso {aviso['tipo']} para {aviso['cliente_id']}: {json.dumps(aviso['datos'])}")
+
+
+class WebhookSink(NotificationSink):
+    """POST del lote en JSON; sin URL solo registra el envío (desarrollo)"""
+
+    def __init__(self, url: Optional[str], timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, avisos: List[dict]) -> None:
+        if not self.url:
+            logger.debug(f"Webhook sin URL configurada: {len(avisos)} avisos")
+            return
+        import requests
+
+        respuesta = requests.post(self.url, json={"avisos": avisos}, timeout=self.timeout)
+        respuesta.raise_for_status()
+
+
+class QueueSink(NotificationSink):
+    """Cola en memoria del proceso para consumidores locales; si no cabe el lote, falla y se reintenta"""
+
+    def __init__(self, maxsize: int):
+        self.cola: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def send(self, avisos: List[dict]) -> None:
+        if self.cola.maxsize and self.cola.qsize() + len(avisos) > self.cola.maxsize:
+            raise queue.Full(f"Cola de avisos llena ({self.cola.qsize()} en espera)")
+        for aviso in avisos:
+            self.cola.put_nowait(aviso)
+
+
+# Fábricas de destinos por nombre (``notify_sinks``); ampliable con register_sink
+SINKS: Dict[str, Callable[[], NotificationSink]] = {
+    "log": LogSink,
+    "webhook": lambda: WebhookSink(settings.notify_webhook_url, settings.notify_webhook_timeout_s),
+    "cola": lambda: QueueSink(settings.notify_queue_size),
+}
+
+# Instancias del proceso (la cola local debe ser la misma para quien la lee)
+_instancias: Dict[str, NotificationSink] = {}
+
+
+def register_sink(nombre: str, fabrica: Callable[[], NotificationSink]) -> None:
+    """Añadir un destino que se puede activar en ``notify_sinks``"""
+    SINKS[nombre] = fabrica
+    _instancias.pop(nombre, None)
+
+
+def get_sink(nombre: str) -> NotificationSink:
+    """Instancia del proceso de un destino registrado"""
+    if nombre not in _instancias:
+        if nombre not in SINKS:
+            raise ValueError(f"Destino de avisos desconocido: {nombre}")
+        _instancias[nombre] = SINKS[nombre]()
+    return _instancias[nombre]
+
+
+# ============================================================================
+# Despachador
+# ============================================================================
+
+def _describe(fila: NotificacionOutbox) -> dict:
+    return {
+        "id": str(fila.id),
+        "cliente_id": fila.cliente_id,
+        "tipo": fila.tipo,
+        "datos": json.loads(fila.datos),
+        "creado_en": fila.created_at.isoformat() if fila.created_at else None,
+    }
+
+
+def dispatch_batch(db: Session, destinos: List[NotificationSink], lote: int) -> Tuple[int, int]:
+    """Entregar un lote de avisos pendientes; devuelve (enviados, con fallo)"""
+    ahora = datetime.now(timezone.utc)
+    # SKIP LOCKED: varios despachadores se reparten los lotes sin esperarse
+    filas = db.query(NotificacionOutbox).filter(
+        NotificacionOutbox.estado == "pendiente",
+        or_(NotificacionOutbox.disponible_en.is_(None), NotificacionOutbox.disponible_en <= ahora)
+    ).order_by(NotificacionOutbox.id).limit(lote).with_for_update(skip_locked=True).all()
+    if not filas:
+        db.rollback()
+        return 0, 0
+
+    avisos = [_describe(fila) for fila in filas]
+    try:
+        for destino in destinos:
+            destino.send(avisos)
+    except Exception as e:
+        logger.warning(f"Error entregando {len(filas)} avisos: {e}")
+        for fila in filas:
+            fila.intentos = (fila.intentos or 0) + 1
+            fila.error = str(e)[:1000]
+            if fila.intentos >= settings.notify_max_attempts:
+                fila.estado = "fallida"
+                metricas.incr("notificaciones_fallidas")
+            else:
+                espera = settings.notify_retry_base_s * 2 ** (fila.intentos - 1)
+                fila.disponible_en = ahora + timedelta(seconds=espera)
+        db.commit()
+        metricas.incr("notificaciones_reintentos", len(filas))
+        return 0, len(filas)
+
+    db.query(NotificacionOutbox).filter(
+        NotificacionOutbox.id.in_([fila.id for fila in filas])
+    ).delete(synchronize_session=False)
+    db.commit()
+    metricas.incr("notificaciones_enviadas", len(filas))
+    return len(filas), 0
+
+
+def drain_outbox(db: Session, lote: Optional[int] = None, max_lotes: Optional[int] = None) -> Dict[str, float]:
+    """Entregar lotes hasta vaciar los avisos disponibles (o hasta que un destino falle)"""
+    lote = lote or settings.notify_batch_size
+    destinos = [get_sink(nombre) for nombre in settings.notify_sinks]
+    resumen = {"enviadas": 0, "con_fallo": 0, "lotes": 0}
+    inicio = time.perf_counter()
+
+    while max_lotes is None or resumen["lotes"] < max_lotes:
+        inicio_lote = time.perf_counter()
+        enviadas, con_fallo = dispatch_batch(db, destinos, lote)
+        if not enviadas and not con_fallo:
+            break
+        metricas.observe("notificaciones_lote_segundos", time.perf_counter() - inicio_lote)
+        resumen["enviadas"] += enviadas
+        resumen["con_fallo"] += con_fallo
+        resumen["lotes"] += 1
+        # Un destino caído: no insistir hasta el siguiente ciclo
+        if con_fallo or enviadas < lote:
+            break
+
+    duracion = time.perf_counter() - inicio
+    resumen["segundos"] = round(duracion, 3)
+    if resumen["enviadas"]:
+        metricas.set("notificaciones_por_segundo", resumen["enviadas"] / duracion)
+    metricas.set("notificaciones_pendientes", db.query(NotificacionOutbox).filter(
+        NotificacionOutbox.estado == "pendiente"
+    ).count())
+    db.commit()
+    return resumen
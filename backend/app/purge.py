@@ -0,0 +1,108 @@
+"""
+Purga asíncrona de cuentas eliminadas.
+
+``DELETE /admin/users/{id}`` solo marca al cliente con ``eliminado_en`` y
+responde. Los consumos, facturas y consumos diarios se borran después por
+lotes, cada uno en su propia transacción, y por último la fila del cliente
+(el resto de hijos cae por ``ON DELETE CASCADE``). Así la petición HTTP no
+carga en memoria el historial del cliente ni mantiene bloqueos largos.
+
+Si la línea sigue en un grupo, primero se saca de él (``move_group_member``)
+para que su consumo deje de contar en la bolsa compartida.
+
+Los consumos ya movidos al archivo Parquet (``app/archive.py``) también se
+borran: cada fichero del shard del cliente se reescribe sin sus filas.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .analytics import forget_cliente, move_group_member
+from .archive import purge_archived_consumos
+from .config import settings
+from .database import SessionLocal
+from .metrics import metricas
+from .models import Cliente, Consumo, ConsumoDiario, Factura
+
+logger = logging.getLogger(__name__)
+
+# Tablas hijas que se vacían por lotes antes de borrar el cliente
+TABLAS_PURGA = (Consumo, ConsumoDiario, Factura)
+
+
+def _purge_table(db: Session, modelo, cliente_id: str, chunk_size: int) -> int:
+    """Borrar por lotes las filas de un cliente en una tabla hija"""
+    total = 0
+    while True:
+        ids = [
+            fila.id for fila in db.query(modelo.id)
+            .filter(modelo.cliente_id == cliente_id)
+            .limit(chunk_size)
+        ]
+        if not ids:
+            return total
+        db.query(modelo).filter(modelo.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        total += len(ids)
+        metricas.incr("purga_filas_borradas", len(ids), tabla=modelo.__tablename__)
+
+
+def purge_cliente(cliente_id: str, chunk_size: Optional[int] = None) -> Dict[str, int]:
+    """Purgar un cliente marcado como eliminado y todo su historial"""
+    chunk_size = chunk_size or settings.purge_chunk_size
+    inicio = time.perf_counter()
+    resumen: Dict[str, int] = {}
+
+    db = SessionLocal()
+    try:
+        cliente = db.query(Cliente).filter(Cliente.id == cliente_id).first()
+        if cliente is None or cliente.eliminado_en is None:
+            logger.warning(f"Cliente {cliente_id} no está pendiente de purga")
+            return resumen
+
+        # Sacar la línea de su grupo antes de borrar nada (bajas anteriores a
+        # que DELETE /admin/users lo hiciera): sus totales salen del acumulado
+        # del grupo mientras aún existen sus resúmenes mensuales
+        if cliente.grupo_id is not None:
+            move_group_member(db, cliente, None)
+            db.commit()
+
+        for modelo in TABLAS_PURGA:
+            resumen[modelo.__tablename__] = _purge_table(db, modelo, cliente_id, chunk_size)
+        resumen["archivo"] = purge_archived_consumos(cliente_id)
+        metricas.incr("purga_filas_borradas", resumen["archivo"], tabla="archivo")
+
+        # El saldo cae por ON DELETE CASCADE
+        forget_cliente(db, cliente_id)
+        db.query(Cliente).filter(Cliente.id == cliente_id).delete(synchronize_session=False)
+        db.commit()
+
+        duracion = time.perf_counter() - inicio
+        metricas.incr("purga_clientes")
+        metricas.observe("purga_cliente_segundos", duracion)
+        logger.info(f"Cliente {cliente_id} purgado en {duracion:.2f}s: {resumen}")
+        return resumen
+
+    except Exception as e:
+        logger.error(f"Error purgando cliente {cliente_id}: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def purge_pending_clientes() -> int:
+    """Reanudar las purgas que quedaron a medias (p. ej. por un reinicio)"""
+    db = SessionLocal()
+    try:
+        pendientes = [
+            fila.id for fila in db.query(Cliente.id).filter(Cliente.eliminado_en.isnot(None))
+        ]
+    finally:
+        db.close()
+
+    for cliente_id in pendientes:
+        purge_cliente(cliente_id)
+    return len(pendientes)
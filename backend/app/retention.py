@@ -0,0 +1,221 @@
+"""
+Compactación y retención de consumos crudos.
+
+Los consumos con fecha anterior al horizonte de retención se acumulan en
+``consumos_diarios`` (una fila por cliente y día) y se borran de ``consumos``.
+Cada lote se procesa en una sola transacción: acumulado, borrado y checkpoint
+se confirman juntos, por lo que el job es idempotente y puede reanudarse tras
+una caída sin contar dos veces ningún consumo. El lote solo acumula las filas
+que su propio ``DELETE ... RETURNING`` eliminó, y el acumulado es un upsert
+que suma en la base de datos: dos ejecuciones a la vez (job programado y
+``retention_job.py``) tampoco cuentan dos veces.
+
+Los consumos que el rollup horario (``consumos_horarios``) aún no ha
+acumulado no se compactan: esperan a la siguiente ejecución, para que las
+series temporales no los pierdan.
+
+Compactar no anota los consumos en ``eliminaciones``: salen de la ventana de
+sincronización pero no se borran para la app (ver ``app/sync.py``). Al
+terminar se podan las eliminaciones más antiguas que
+``sync_tombstone_retention_days``.
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .metrics import metricas
+from .models import Consumo, ConsumoDiario, JobCheckpoint
+from .sync import prune_deletions
+
+logger = logging.getLogger(__name__)
+
+JOB_RETENCION = "retencion_consumos"
+
+# Tamaño mínimo de lote cuando el job se autorregula
+MIN_BATCH_SIZE = 100
+
+
+def get_retention_cutoff(horizonte_dias: Optional[int] = None) -> datetime:
+    """Inicio del primer día que se conserva como consumo crudo"""
+    horizonte_dias = horizonte_dias if horizonte_dias is not None else settings.retention_horizon_days
+    corte = datetime.now() - timedelta(days=horizonte_dias)
+    return corte.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _load_checkpoint(db: Session) -> Optional[Tuple[datetime, uuid.UUID]]:
+    checkpoint = db.query(JobCheckpoint).filter(JobCheckpoint.nombre == JOB_RETENCION).first()
+    if checkpoint is None or not checkpoint.valor:
+        return None
+    valor = json.loads(checkpoint.valor)
+    return datetime.fromisoformat(valor["fecha"]), uuid.UUID(valor["id"])
+
+
+def _save_checkpoint(db: Session, posicion: Optional[Tuple[datetime, uuid.UUID]]) -> None:
+    valor = None
+    if posicion is not None:
+        valor = json.dumps({"fecha": posicion[0].isoformat(), "id": str(posicion[1])})
+    db.merge(JobCheckpoint(nombre=JOB_RETENCION, valor=valor))
+
+
+def _wait_for_replicas(db: Session) -> None:
+    """Esperar mientras el retraso de las réplicas supere el máximo configurado"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    while True:
+        retraso = db.execute(text(
+            "SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication"
+        )).scalar() or 0.0
+        metricas.set("retencion_replication_lag_segundos", float(retraso))
+        if retraso <= settings.retention_max_replication_lag_s:
+            return
+        logger.info(f"Retención en pausa: retraso de réplica {retraso:.1f}s")
+        time.sleep(1.0)
+
+
+def _fold_batch(db: Session, lote) -> int:
+    """Acumular un lote de consumos en consumos_diarios; devuelve los días tocados"""
+    acumulado: Dict[Tuple[str, datetime], Dict[str, float]] = {}
+    for fila in lote:
+        dia = fila.fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+        totales = acumulado.setdefault(
+            (fila.cliente_id, dia), {"datos": 0.0, "minutos": 0, "sms": 0, "costo": 0.0}
+        )
+        if fila.servicio == "datos":
+            totales["datos"] += fila.cantidad
+        elif fila.servicio == "minutos":
+            totales["minutos"] += int(fila.cantidad)
+        elif fila.servicio == "sms":
+            totales["sms"] += int(fila.cantidad)
+        totales["costo"] += fila.costo_total or 0.0
+    if not acumulado:
+        return 0
+
+    # Upsert sobre el índice único (cliente_id, fecha): la suma la hace la base
+    # de datos, así que dos ejecuciones a la vez no pisan el acumulado
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialecto.insert(ConsumoDiario)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cliente_id", "fecha"],
+        set_={
+            columna: func.coalesce(getattr(ConsumoDiario, columna), 0) + getattr(stmt.excluded, columna)
+            for columna in ("datos_consumidos", "minutos_consumidos", "sms_consumidos", "costo_total")
+        }
+    )
+    db.execute(stmt, [
+        {
+            "cliente_id": cliente_id,
+            "fecha": dia,
+            "datos_consumidos": totales["datos"],
+            "minutos_consumidos": totales["minutos"],
+            "sms_consumidos": totales["sms"],
+            "costo_total": totales["costo"],
+        }
+        # En orden de clave: dos lotes concurrentes bloquean las filas en el mismo orden
+        for (cliente_id, dia), totales in sorted(acumulado.items())
+    ])
+    return len(acumulado)
+
+
+def compact_consumos(db: Session, horizonte_dias: Optional[int] = None,
+                     batch_size: Optional[int] = None, pausa_ms: Optional[int] = None,
+                     max_lotes: Optional[int] = None) -> Dict[str, float]:
+    """
+    Compactar y borrar los consumos crudos anteriores al horizonte de retención.
+
+    Recorre ``consumos`` en orden (fecha, id) desde el último checkpoint, en
+    lotes pequeños separados por una pausa. Si un lote tarda más que
+    ``retention_max_batch_seconds`` el tamaño de lote se reduce a la mitad.
+    Al terminar el recorrido el checkpoint se reinicia, de modo que la
+    siguiente ejecución recoge también los consumos que llegaron tarde.
+    """
+    from .analytics import get_hourly_coverage
+
+    corte = get_retention_cutoff(horizonte_dias)
+    cobertura_horaria = get_hourly_coverage(db)
+    max_batch = batch_size or settings.retention_batch_size
+    pausa = (pausa_ms if pausa_ms is not None else settings.retention_pause_ms) / 1000.0
+
+    tamano = max_batch
+    posicion = _load_checkpoint(db)
+    resumen = {"filas": 0, "dias": 0, "lotes": 0, "eliminaciones_podadas": 0, "segundos": 0.0}
+    inicio_job = time.perf_counter()
+
+    if posicion is not None:
+        logger.info(f"Reanudando retención desde {posicion[0].isoformat()} / {posicion[1]}")
+
+    while max_lotes is None or resumen["lotes"] < max_lotes:
+        _wait_for_replicas(db)
+        inicio_lote = time.perf_counter()
+
+        query = db.query(Consumo.id, Consumo.fecha).filter(Consumo.fecha < corte)
+        if cobertura_horaria is not None:
+            query = query.filter(Consumo.created_at <= cobertura_horaria[1])
+        if posicion is not None:
+            query = query.filter(or_(
+                Consumo.fecha > posicion[0],
+                and_(Consumo.fecha == posicion[0], Consumo.id > posicion[1])
+            ))
+        lote = query.order_by(Consumo.fecha, Consumo.id).limit(tamano).all()
+
+        if not lote:
+            # Recorrido completo: la próxima ejecución vuelve a empezar
+            _save_checkpoint(db, None)
+            db.commit()
+            break
+
+        try:
+            # Solo se acumula lo que este borrado eliminó: si otra ejecución ya
+            # compactó parte del lote, esas filas no vuelven a sumarse
+            borrados = db.execute(
+                delete(Consumo).where(
+                    Consumo.id.in_([fila.id for fila in lote])
+                ).returning(
+                    Consumo.id, Consumo.id_externo, Consumo.cliente_id, Consumo.fecha,
+                    Consumo.servicio, Consumo.cantidad, Consumo.costo_total
+                ).execution_options(synchronize_session=False)
+            ).all()
+            dias = _fold_batch(db, borrados)
+            posicion = (lote[-1].fecha, lote[-1].id)
+            _save_checkpoint(db, posicion)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        duracion = time.perf_counter() - inicio_lote
+        resumen["filas"] += len(borrados)
+        resumen["dias"] += dias
+        resumen["lotes"] += 1
+
+        metricas.incr("retencion_filas_compactadas", len(borrados))
+        metricas.incr("retencion_lotes")
+        metricas.observe("retencion_lote_segundos", duracion)
+        metricas.set("retencion_checkpoint_timestamp", posicion[0].timestamp())
+        metricas.set("retencion_batch_size", tamano)
+
+        # Autorregulación: lotes lentos implican bloqueos largos
+        if duracion > settings.retention_max_batch_seconds:
+            tamano = max(MIN_BATCH_SIZE, tamano // 2)
+        elif tamano < max_batch:
+            tamano = min(max_batch, tamano * 2)
+
+        if resumen["lotes"] % 50 == 0:
+            logger.info(f"Retención: {resumen['filas']} consumos compactados hasta {posicion[0].isoformat()}")
+
+        time.sleep(pausa)
+
+    resumen["eliminaciones_podadas"] = prune_deletions(db)
+    resumen["segundos"] = round(time.perf_counter() - inicio_job, 3)
+    logger.info(
+        f"Retención completada: {resumen['filas']} consumos en {resumen['lotes']} lotes "
+        f"({resumen['segundos']}s)"
+    )
+    return resumen
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List
-from datetime import datetime
+from pydantic import AliasChoices, BaseModel, Field, validator
+from typing import Any, Dict, Optional, List
+import json
+from datetime import date, datetime
 from enum import Enum
 
 # Enums para valores predefinidos
@@ -20,6 +21,10 @@ class TipoServicio(str, Enum):
     MINUTOS = "minutos"
     SMS = "sms"
 
+class TipoGrupo(str, Enum):
+    FAMILIAR = "familiar"
+    CORPORATIVO = "corporativo"
+
 class TipoConsumo(str, Enum):
     NORMAL = "normal"
     ROAMING = "roaming"
@@ -63,6 +68,8 @@ class ConsumoBase(BaseModel):
 
 class ConsumoCreate(ConsumoBase):
     cliente_id: str
+    # Id del evento asignado por el productor: los reenvíos no se duplican
+    event_id: Optional[str] = Field(None, min_length=1, max_length=100)
 
 class ConsumoUpdate(BaseModel):
     servicio: Optional[TipoServicio] = None
@@ -74,8 +81,10 @@ class ConsumoUpdate(BaseModel):
     costo_total: Optional[float] = Field(None, ge=0)
 
 class ConsumoResponse(ConsumoBase):
-    id: str
+    # Id público: el heredado de la clave antigua o el UUIDv7 como texto
+    id: str = Field(validation_alias=AliasChoices("id_publico", "id"))
     cliente_id: str
+    event_id: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -108,7 +117,8 @@ class FacturaUpdate(BaseModel):
     fecha_pago: Optional[datetime] = None
 
 class FacturaResponse(FacturaBase):
-    id: str
+    # Id público: el heredado de la clave antigua o el UUIDv7 como texto
+    id: str = Field(validation_alias=AliasChoices("id_publico", "id"))
     cliente_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -188,7 +198,8 @@ class ConsumoDiarioCreate(ConsumoDiarioBase):
     cliente_id: str
 
 class ConsumoDiarioResponse(ConsumoDiarioBase):
-    id: str
+    # Id público: el heredado de la clave antigua o el UUIDv7 como texto
+    id: str = Field(validation_alias=AliasChoices("id_publico", "id"))
     cliente_id: str
     created_at: datetime
     
@@ -196,6 +207,20 @@ class ConsumoDiarioResponse(ConsumoDiarioBase):
         from_attributes = True
 
 # Esquemas para Dashboard
+class PronosticoResponse(BaseModel):
+    mes: str  # YYYY-MM
+    datos: float  # total proyectado del mes, en MB
+    minutos: float
+    sms: float
+    costo: float  # coste de consumos proyectado
+    costo_actual: float  # coste de consumos hasta hoy
+    factura_estimada: float  # cuota + consumos + impuestos
+    modelo: str  # tendencia, ritmo (altas recientes)
+    calculado_en: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class DashboardResumen(BaseModel):
     cliente: ClienteResponse
     saldo: SaldoResponse
@@ -204,6 +229,7 @@ class DashboardResumen(BaseModel):
     facturas_pendientes: int
     facturas_vencidas: int
     total_facturas: int
+    pronostico: Optional[PronosticoResponse] = None  # cierre de mes, si ya se calculó
 
 class ConsumoGrafico(BaseModel):
     fecha: str
@@ -217,6 +243,153 @@ class DashboardGraficos(BaseModel):
     consumo_mensual: List[ConsumoGrafico]
     facturacion_mensual: List[dict]
 
+# Series temporales de consumo
+class PuntoSerie(BaseModel):
+    fecha: datetime  # inicio del punto
+    datos: float
+    minutos: float
+    sms: float
+    costo: float
+
+class SerieConsumo(BaseModel):
+    granularidad: str
+    agregado: str
+    factor: int  # intervalos de la granularidad agrupados en cada punto
+    desde: datetime  # inicio del primer punto
+    hasta: datetime
+    fuentes: List[str]  # tablas (y archivo) de las que sale la serie
+    puntos: List[PuntoSerie]
+
+# Esquemas para sincronización incremental
+class EliminacionSync(BaseModel):
+    entidad: str  # consumo, factura
+    id: str  # id público de la fila borrada
+    eliminado_en: Optional[datetime] = None
+
+class SyncResponse(BaseModel):
+    consumos: List[ConsumoResponse]  # insertados o modificados
+    facturas: List[FacturaResponse]
+    eliminados: List[EliminacionSync]
+    since: str  # token para la siguiente sincronización
+    hay_mas: bool  # alguna entidad llenó la página: volver a pedir con ``since``
+
+# Esquemas para analítica de administración
+class AnalyticsConsumidor(BaseModel):
+    cliente_id: str
+    nombre: Optional[str] = None
+    datos: float
+    minutos: float
+    sms: float
+    costo: float
+
+class AnalyticsIngresosPlan(BaseModel):
+    plan: str
+    clientes: int
+    facturado: float
+    pagado: float
+    pendiente: float
+    vencido: float
+
+class AnalyticsUsoServicio(BaseModel):
+    fecha: str
+    servicio: str
+    cantidad: float
+    costo: float
+    eventos: int
+
+class AnalyticsResponse(BaseModel):
+    mes: str
+    marcas_agua: Dict[str, Optional[str]]  # hasta dónde están refrescados los resúmenes
+    top_consumidores: List[AnalyticsConsumidor]
+    ingresos_por_plan: List[AnalyticsIngresosPlan]
+    vencido: Dict[str, float]
+    uso_diario: List[AnalyticsUsoServicio]
+
+# Esquemas para grupos de líneas con bolsa compartida
+class GrupoCreate(BaseModel):
+    nombre: str = Field(..., min_length=2, max_length=100)
+    tipo: TipoGrupo = Field(default=TipoGrupo.FAMILIAR)
+    plan_id: str
+
+class GrupoResponse(BaseModel):
+    id: str
+    nombre: str
+    tipo: TipoGrupo
+    plan_id: str
+    miembros: int
+    created_at: Optional[datetime] = None
+    
+    @validator("id", pre=True)
+    def id_as_str(cls, v):
+        return str(v)
+    
+    class Config:
+        from_attributes = True
+
+class BolsaServicio(BaseModel):
+    servicio: str
+    usado: float  # datos en MB
+    incluido: Optional[float] = None  # None: ilimitado
+    restante: Optional[float] = None
+    porcentaje: Optional[float] = None
+
+class GrupoConsumo(BaseModel):
+    grupo: GrupoResponse
+    mes: str  # YYYY-MM
+    bolsas: List[BolsaServicio]
+    costo: float
+    acumulado_hasta: Optional[datetime] = None  # marca del acumulado; lo posterior se suma al vuelo
+
+# Esquemas para alertas de consumo anómalo
+class AlertaResponse(BaseModel):
+    id: str
+    cliente_id: str
+    dia: date
+    metrica: str  # datos, minutos, sms, costo, costo_roaming
+    valor: float
+    media: float  # media móvil antes del día
+    desviacion: float
+    puntuacion: Optional[float] = None  # desviaciones sobre la media
+    estado: str  # abierta, revisada
+    created_at: Optional[datetime] = None
+    
+    @validator("id", pre=True)
+    def id_as_str(cls, v):
+        return str(v)
+    
+    class Config:
+        from_attributes = True
+
+# Esquemas para trabajos en segundo plano
+class JobCreate(BaseModel):
+    tipo: str = Field(..., max_length=50)
+    parametros: Dict[str, Any] = Field(default_factory=dict)
+
+class JobResponse(BaseModel):
+    id: str
+    tipo: str
+    cola: str
+    estado: str
+    progreso: float
+    mensaje: Optional[str] = None
+    resultado: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    @validator("id", pre=True)
+    def id_as_str(cls, v):
+        return str(v)
+    
+    @validator("resultado", pre=True)
+    def parse_resultado(cls, v):
+        # Se guarda como JSON en la tabla jobs
+        return json.loads(v) if isinstance(v, str) else v
+    
+    class Config:
+        from_attributes = True
+
 # Esquemas para autenticación
 class LoginRequest(BaseModel):
     email: str
@@ -244,3 +417,11 @@ class PaginatedResponse(BaseModel):
     page: int
     size: int
     pages: int
+    total_estimado: bool = False  # total aproximado (búsquedas sobre tablas grandes)
+
+# Dashboard completo en una sola respuesta
+class DashboardBootstrap(BaseModel):
+    resumen: DashboardResumen
+    graficos: DashboardGraficos
+    consumos: PaginatedResponse
+    facturas: PaginatedResponse
@@ -0,0 +1,175 @@
+"""
+Búsqueda indexada de clientes para el panel de administración.
+
+En PostgreSQL se usan índices GIN de trigramas (``pg_trgm``) sobre nombre y
+email, que sirven ``ILIKE '%texto%'`` sin recorrer la tabla, y los resultados
+se ordenan por similitud. En SQLite se usa una tabla FTS5 (``clientes_fts``)
+con búsqueda por prefijo de palabra ordenada por ``bm25``. Si la búsqueda
+parece un teléfono se hace por prefijo sobre el teléfono normalizado (sin '+'
+ni separadores, igual que el texto buscado) con su índice de expresión.
+
+Sin índices de búsqueda (base creada sin migraciones) se vuelve al filtro
+``ILIKE`` original.
+"""
+import json
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, false, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from .fields import project_query
+from .models import Cliente, telefono_normalizado
+
+# Tope del conteo en modo estimado cuando el motor no da una estimación
+MAX_ESTIMATED_COUNT = 10000
+
+# Definición de la tabla FTS5 y sus triggers (la usa también la migración)
+FTS_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+        nombre, email, telefono,
+        content='clientes', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO clientes_fts(rowid, nombre, email, telefono)
+        VALUES (new.rowid, new.nombre, new.email, new.telefono);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre, email, telefono)
+        VALUES ('delete', old.rowid, old.nombre, old.email, old.telefono);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE OF nombre, email, telefono ON clientes BEGIN
+        INSERT INTO clientes_fts(clientes_fts, rowid, nombre, email, telefono)
+        VALUES ('delete', old.rowid, old.nombre, old.email, old.telefono);
+        INSERT INTO clientes_fts(rowid, nombre, email, telefono)
+        VALUES (new.rowid, new.nombre, new.email, new.telefono);
+    END
+    """,
+    "INSERT INTO clientes_fts(clientes_fts) VALUES ('rebuild')",
+]
+
+_TELEFONO = re.compile(r"^\+?[\d\s\-()]{3,}$")
+
+# Disponibilidad de los índices de búsqueda por motor (se comprueba una vez)
+_indices_disponibles = {}
+
+
+def _search_indexes_available(db: Session) -> bool:
+    bind = db.get_bind()
+    clave = str(bind.url)
+    if clave not in _indices_disponibles:
+        if bind.dialect.name == "postgresql":
+            sql = "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_clientes_nombre_trgm'"
+        elif bind.dialect.name == "sqlite":
+            sql = "SELECT 1 FROM sqlite_master WHERE name = 'clientes_fts'"
+        else:
+            sql = None
+        _indices_disponibles[clave] = bool(sql and db.execute(text(sql)).first())
+    return _indices_disponibles[clave]
+
+
+def _fts_query(texto: str) -> str:
+    """Consulta FTS5: cada palabra como prefijo, todas obligatorias"""
+    palabras = re.findall(r"\w+", texto.lower())
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _apply_search(db: Session, query, texto: str):
+    """Filtrar y ordenar la consulta de clientes por relevancia"""
+    # Solo separadores ("---", "( )"): no es un prefijo de teléfono
+    prefijo = re.sub(r"\D", "", texto) if _TELEFONO.match(texto) else ""
+    if prefijo:
+        # Prefijo de teléfono: usa el índice sobre el teléfono normalizado
+        telefono = telefono_normalizado(Cliente.telefono)
+        if db.get_bind().dialect.name == "postgresql":
+            filtro = telefono.like(f"{prefijo}%")
+        else:
+            # Rango equivalente al prefijo (LIKE no usa el índice en SQLite)
+            siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+            filtro = (telefono >= prefijo) & (telefono < siguiente)
+        return query.filter(filtro).order_by(telefono, Cliente.id)
+
+    if not _search_indexes_available(db):
+        return query.filter(
+            Cliente.nombre.ilike(f"%{texto}%") |
+            Cliente.email.ilike(f"%{texto}%")
+        ).order_by(Cliente.nombre, Cliente.id)
+
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        # Los índices GIN de trigramas resuelven ILIKE '%texto%' y el prefijo de email
+        relevancia = func.greatest(
+            func.similarity(Cliente.nombre, texto),
+            func.similarity(Cliente.email, texto)
+        )
+        return query.filter(or_(
+            Cliente.nombre.ilike(f"%{texto}%"),
+            Cliente.email.ilike(f"{texto}%")
+        )).order_by(relevancia.desc(), Cliente.id)
+
+    consulta_fts = _fts_query(texto)
+    if not consulta_fts:
+        return query.filter(false())
+    fts = table("clientes_fts", column("rowid"))
+    coincidencias = select(
+        fts.c.rowid.label("fts_rowid"),
+        literal_column("bm25(clientes_fts)").label("rango")
+    ).where(literal_column("clientes_fts").op("MATCH")(consulta_fts)).subquery()
+    return query.join(
+        coincidencias, coincidencias.c.fts_rowid == literal_column("clientes.rowid")
+    ).order_by(coincidencias.c.rango, Cliente.id)
+
+
+def _estimate_total(db: Session, query) -> int:
+    """Total aproximado sin recorrer todos los resultados"""
+    if db.get_bind().dialect.name == "postgresql":
+        # Estimación del planificador para la consulta filtrada. El texto buscado
+        # va como parámetro del driver, nunca interpolado en el SQL
+        conexion = db.connection()
+        compilada = query.statement.compile(dialect=conexion.dialect)
+        try:
+            plan = conexion.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compilada}", compilada.params
+            ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except (KeyError, IndexError, TypeError, ValueError):
+            pass
+    # Conteo con tope: basta para paginar y no recorre todos los resultados
+    return query.order_by(None).with_entities(Cliente.id).limit(MAX_ESTIMATED_COUNT).count()
+
+
+def search_clientes(db: Session, texto: Optional[str], estado: Optional[str],
+                    page: int, size: int, estimar_total: bool = False,
+                    campos: Optional[List[str]] = None) -> Tuple[list, int]:
+    """Página de clientes activos que coinciden con la búsqueda y total (exacto o estimado)
+
+    Con ``campos`` la página son diccionarios con solo esas columnas en lugar
+    de objetos ``Cliente``.
+    """
+    # Las cuentas eliminadas pendientes de purga no se listan
+    query = db.query(Cliente).filter(Cliente.eliminado_en.is_(None))
+    if estado:
+        query = query.filter(Cliente.estado_cuenta == estado)
+
+    texto = (texto or "").strip()
+    if texto:
+        query = _apply_search(db, query, texto)
+    else:
+        query = query.order_by(Cliente.id)
+
+    total = _estimate_total(db, query) if estimar_total else query.order_by(None).count()
+    query = query.offset((page - 1) * size).limit(size)
+    if campos:
+        query, to_dict = project_query(query, Cliente, campos)
+        return [to_dict(fila) for fila in query.all()], total
+    return query.all(), total
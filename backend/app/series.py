@@ -0,0 +1,305 @@
+"""
+Series temporales de consumo con granularidad y presupuesto de puntos.
+
+``GET /user/consumos/series`` y los gráficos del dashboard piden una serie
+por granularidad (hora, día, semana o mes) y el planificador elige la fuente
+más barata para cada tramo del rango:
+
+- Desde la cobertura del rollup horario: ``consumos_horarios`` más los
+  consumos crudos con ``created_at`` posterior a su marca de agua (los que el
+  refresco aún no ha acumulado).
+- Antes de la cobertura (o si el rollup nunca se ha refrescado):
+  ``consumos`` y ``consumos_diarios`` (los días compactados solo tienen
+  resolución diaria) y el archivo Parquet.
+
+Si el rango tiene más intervalos que el presupuesto de ``puntos``, cada punto
+agrupa ``factor`` intervalos consecutivos y ``agregado`` decide cómo: suma,
+media por intervalo o máximo de un intervalo. La agrupación, la reducción y
+el relleno con ceros (una serie de índices de un CTE recursivo) se hacen en
+SQL: la consulta devuelve como mucho ``puntos`` filas sea cual sea el rango.
+"""
+import calendar
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import Integer, case, cast, extract, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .analytics import get_hourly_coverage
+from .config import settings
+from .models import Consumo, ConsumoDiario, ConsumoHorario
+
+GRANULARIDADES = ("hora", "dia", "semana", "mes")
+AGREGADOS = ("suma", "media", "maximo")
+SERVICIOS = ("datos", "minutos", "sms")
+CAMPOS = ("datos", "minutos", "sms", "costo")
+
+_ANCHOS = {"hora": timedelta(hours=1), "dia": timedelta(days=1), "semana": timedelta(weeks=1)}
+
+# Columna de consumos_diarios con la cantidad de cada servicio
+_COLUMNAS_DIARIAS = {
+    "datos": ConsumoDiario.datos_consumidos,
+    "minutos": ConsumoDiario.minutos_consumidos,
+    "sms": ConsumoDiario.sms_consumidos,
+}
+
+
+@dataclass
+class SeriePlan:
+    granularidad: str
+    agregado: str
+    inicio: datetime  # inicio del primer intervalo (alineado a la granularidad)
+    fin: datetime
+    intervalos: int  # intervalos de la granularidad en [inicio, fin)
+    factor: int  # intervalos por punto
+    puntos: int
+
+
+@dataclass
+class Serie:
+    plan: SeriePlan
+    columnas: Dict[str, np.ndarray]  # fecha (inicio del punto, ISO), datos, minutos, sms, costo
+    fuentes: List[str] = field(default_factory=list)
+
+
+def align(fecha: datetime, granularidad: str) -> datetime:
+    """Inicio del intervalo de la granularidad que contiene la fecha (semanas desde el lunes)"""
+    fecha = fecha.replace(minute=0, second=0, microsecond=0)
+    if granularidad == "hora":
+        return fecha
+    fecha = fecha.replace(hour=0)
+    if granularidad == "semana":
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == "mes":
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _month_number(fecha: datetime) -> int:
+    return fecha.year * 12 + fecha.month - 1
+
+
+def interval_start(inicio: datetime, granularidad: str, indice: int) -> datetime:
+    """Inicio del intervalo ``indice`` contado desde ``inicio``"""
+    if granularidad == "mes":
+        mes = _month_number(inicio) + indice
+        return datetime(mes // 12, mes % 12 + 1, 1)
+    return inicio + indice * _ANCHOS[granularidad]
+
+
+def to_local(fecha: datetime) -> datetime:
+    # Las fechas de consumo se guardan en hora local sin zona
+    return fecha.astimezone().replace(tzinfo=None) if fecha.tzinfo is not None else fecha
+
+
+def plan_series(granularidad: str, desde: datetime, hasta: datetime,
+                puntos: int, agregado: str = "suma") -> SeriePlan:
+    """Intervalos del rango y factor de reducción para no pasar de ``puntos``"""
+    desde, hasta = to_local(desde), to_local(hasta)
+    inicio = align(desde, granularidad)
+    if granularidad == "mes":
+        intervalos = _month_number(hasta) - _month_number(inicio)
+    else:
+        intervalos = (hasta - inicio) // _ANCHOS[granularidad]
+    if interval_start(inicio, granularidad, intervalos) < hasta:
+        intervalos += 1
+    intervalos = max(intervalos, 1)
+    factor = math.ceil(intervalos / puntos)
+    return SeriePlan(
+        granularidad=granularidad,
+        agregado=agregado,
+        inicio=inicio,
+        fin=hasta,
+        intervalos=intervalos,
+        factor=factor,
+        puntos=math.ceil(intervalos / factor)
+    )
+
+
+def _epoch(fecha: datetime) -> int:
+    # Las fechas se guardan sin zona; el SQL también las trata como UTC
+    return calendar.timegm(fecha.timetuple())
+
+
+def _interval_index(db: Session, columna, plan: SeriePlan):
+    """Índice del intervalo de la granularidad de cada fila, en SQL"""
+    postgres = db.get_bind().dialect.name == "postgresql"
+    if plan.granularidad == "mes":
+        if postgres:
+            mes = cast(extract("year", columna) * 12 + extract("month", columna) - 1, Integer)
+        else:
+            mes = cast(func.strftime("%Y", columna), Integer) * 12 + cast(func.strftime("%m", columna), Integer) - 1
+        return mes - _month_number(plan.inicio)
+    ancho = int(_ANCHOS[plan.granularidad].total_seconds())
+    if postgres:
+        segundos = cast(func.floor(extract("epoch", columna)), Integer)
+    else:
+        segundos = cast(func.strftime("%s", columna), Integer)
+    # Siempre >= 0: las filas ya están filtradas a [inicio, fin)
+    return (segundos - _epoch(plan.inicio)) // ancho
+
+
+def _source_selects(db: Session, cliente_id: str, servicio: Optional[str], plan: SeriePlan):
+    """Consultas (fecha, servicio, cantidad, costo) de cada fuente y nombres de las fuentes"""
+    cobertura = get_hourly_coverage(db)
+    division = plan.fin
+    if cobertura is not None:
+        division = min(max(cobertura[0], plan.inicio), plan.fin)
+
+    def crudos(desde: datetime, hasta: datetime):
+        consulta = select(
+            Consumo.fecha.label("fecha"), Consumo.servicio.label("servicio"),
+            Consumo.cantidad.label("cantidad"), Consumo.costo_total.label("costo")
+        ).where(Consumo.cliente_id == cliente_id, Consumo.fecha >= desde, Consumo.fecha < hasta)
+        return consulta.where(Consumo.servicio == servicio) if servicio else consulta
+
+    consultas, fuentes = [], []
+    if division < plan.fin:
+        # Tramo cubierto por el rollup y lo que llegó después de su marca de agua
+        horario = select(
+            ConsumoHorario.hora.label("fecha"), ConsumoHorario.servicio.label("servicio"),
+            ConsumoHorario.cantidad.label("cantidad"), ConsumoHorario.costo.label("costo")
+        ).where(
+            ConsumoHorario.cliente_id == cliente_id,
+            ConsumoHorario.hora >= division,
+            ConsumoHorario.hora < plan.fin
+        )
+        if servicio:
+            horario = horario.where(ConsumoHorario.servicio == servicio)
+        consultas.append(horario)
+        consultas.append(crudos(division, plan.fin).where(Consumo.created_at > cobertura[1]))
+        fuentes.extend(["consumos_horarios", "consumos"])
+
+    if plan.inicio < division:
+        consultas.append(crudos(plan.inicio, division))
+        for nombre, columna in _COLUMNAS_DIARIAS.items():
+            if servicio and servicio != nombre:
+                continue
+            # Como en el historial, el costo del día va con los datos
+            costo = func.coalesce(ConsumoDiario.costo_total, 0.0) if nombre == "datos" else literal(0.0)
+            consultas.append(select(
+                ConsumoDiario.fecha.label("fecha"), literal(nombre).label("servicio"),
+                func.coalesce(columna, 0).label("cantidad"), costo.label("costo")
+            ).where(
+                ConsumoDiario.cliente_id == cliente_id,
+                ConsumoDiario.fecha >= plan.inicio,
+                ConsumoDiario.fecha < division
+            ))
+        fuentes.extend(["consumos", "consumos_diarios"])
+    return consultas, list(dict.fromkeys(fuentes)), division
+
+
+def _query_points(db: Session, consultas, plan: SeriePlan) -> Dict[str, np.ndarray]:
+    """Sumas (o máximos) por punto de todas las fuentes, con ceros en los huecos"""
+    filas = union_all(*consultas).subquery("fuentes")
+
+    # Primero por intervalo de la granularidad...
+    indice = _interval_index(db, filas.c.fecha, plan).label("i")
+    por_servicio = [
+        func.sum(case((filas.c.servicio == nombre, filas.c.cantidad), else_=0.0)).label(nombre)
+        for nombre in SERVICIOS
+    ]
+    intervalos = select(
+        indice, *por_servicio, func.sum(func.coalesce(filas.c.costo, 0.0)).label("costo")
+    ).group_by(indice).subquery("intervalos")
+
+    # ...después por punto (factor intervalos consecutivos)
+    punto = (intervalos.c.i // plan.factor).label("j")
+    agregar = func.max if plan.agregado == "maximo" else func.sum
+    puntos = select(
+        punto, *(agregar(intervalos.c[campo]).label(campo) for campo in CAMPOS)
+    ).group_by(punto).subquery("puntos")
+
+    # Todos los índices de punto, tengan datos o no
+    indices = select(literal(0).label("j")).cte("indices", recursive=True)
+    indices = indices.union_all(select(indices.c.j + 1).where(indices.c.j < plan.puntos - 1))
+
+    consulta = select(
+        indices.c.j, *(func.coalesce(puntos.c[campo], 0.0).label(campo) for campo in CAMPOS)
+    ).select_from(
+        indices.outerjoin(puntos, puntos.c.j == indices.c.j)
+    ).order_by(indices.c.j)
+
+    resultado = db.execute(consulta).all()
+    return {
+        campo: np.fromiter((fila[k + 1] for fila in resultado), float, len(resultado))
+        for k, campo in enumerate(CAMPOS)
+    }
+
+
+def _archived_points(cliente_id: str, servicio: Optional[str], plan: SeriePlan,
+                     hasta: datetime) -> Optional[Dict[str, np.ndarray]]:
+    """Sumas (o máximos) por punto de los consumos archivados en [inicio, hasta)"""
+    from .archive import get_archive_cutoff, read_archived_consumos
+
+    fin = min(get_archive_cutoff(), hasta)
+    if plan.inicio >= fin:
+        return None
+    filas = read_archived_consumos(cliente_id, plan.inicio, fin)
+    if servicio:
+        filas = [fila for fila in filas if fila[1] == servicio]
+    if not filas:
+        return None
+
+    fechas, servicios, cantidades, costos = zip(*filas)
+    if plan.granularidad == "mes":
+        inicio_mes = _month_number(plan.inicio)
+        indices = np.fromiter((_month_number(f) - inicio_mes for f in fechas), np.int64, len(fechas))
+    else:
+        ancho = _ANCHOS[plan.granularidad]
+        indices = np.fromiter(((f - plan.inicio) // ancho for f in fechas), np.int64, len(fechas))
+    servicios = np.array(servicios)
+    cantidades = np.array(cantidades, dtype=float)
+    valores = {nombre: np.where(servicios == nombre, cantidades, 0.0) for nombre in SERVICIOS}
+    valores["costo"] = np.nan_to_num(np.array(costos, dtype=float))
+
+    puntos = {}
+    for campo, pesos in valores.items():
+        por_intervalo = np.bincount(indices, weights=pesos, minlength=plan.intervalos)
+        if plan.agregado == "maximo":
+            puntos[campo] = np.zeros(plan.puntos)
+            np.maximum.at(puntos[campo], np.arange(plan.intervalos) // plan.factor, por_intervalo)
+        else:
+            puntos[campo] = np.bincount(
+                np.arange(plan.intervalos) // plan.factor, weights=por_intervalo, minlength=plan.puntos
+            )
+    return puntos
+
+
+def get_series(db: Session, cliente_id: str, granularidad: str, desde: datetime, hasta: datetime,
+               servicio: Optional[str] = None, agregado: str = "suma",
+               puntos: Optional[int] = None) -> Serie:
+    """Serie de consumo de un cliente con como mucho ``puntos`` puntos"""
+    plan = plan_series(granularidad, desde, hasta, puntos or settings.series_default_points, agregado)
+    consultas, fuentes, division = _source_selects(db, cliente_id, servicio, plan)
+    columnas = _query_points(db, consultas, plan)
+
+    if settings.archive_enabled and plan.inicio < division:
+        archivados = _archived_points(cliente_id, servicio, plan, division)
+        if archivados is not None:
+            fuentes.append("archivo")
+            for campo in CAMPOS:
+                # Un intervalo solo está en el archivo o en la BD salvo consumos tardíos
+                combinar = np.maximum if agregado == "maximo" else np.add
+                columnas[campo] = combinar(columnas[campo], archivados[campo])
+
+    if agregado == "media":
+        # Media por intervalo: el último punto puede agrupar menos intervalos
+        inicios = np.arange(plan.puntos) * plan.factor
+        columnas = {
+            campo: valores / np.minimum(plan.factor, plan.intervalos - inicios)
+            for campo, valores in columnas.items()
+        }
+
+    fechas = np.array(
+        [interval_start(plan.inicio, granularidad, j * plan.factor) for j in range(plan.puntos)],
+        dtype="datetime64[s]"
+    )
+    return Serie(
+        plan=plan,
+        columnas={"fecha": np.datetime_as_string(fechas, unit="s"), **columnas},
+        fuentes=fuentes
+    )
@@ -0,0 +1,24 @@
+"""
+Worker de producción: gunicorn gestiona los procesos y cada uno sirve la app
+con uvicorn (ver ``gunicorn.conf.py``).
+
+El arbiter de gunicorn reinicia los workers caídos o colgados, recicla los
+workers tras ``server_max_requests`` peticiones y hace reinicios escalonados
+sin cortar conexiones (``HUP`` o ``USR2`` + ``QUIT``), cosa que uvicorn solo
+no ofrece.
+"""
+from uvicorn.workers import UvicornWorker
+
+from .config import settings
+
+
+class TelcoxUvicornWorker(UvicornWorker):
+    """Worker uvicorn con el bucle y el parser HTTP de la configuración"""
+
+    CONFIG_KWARGS = {
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        # La app está detrás del proxy del despliegue
+        "proxy_headers": True,
+        "server_header": False,
+    }
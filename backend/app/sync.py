@@ -0,0 +1,194 @@
+"""
+Sincronización incremental de las apps (``GET /user/sync``).
+
+La app guarda un token opaco y en cada sondeo recibe solo los consumos y
+facturas insertados o modificados desde entonces (``updated_at`` se rellena
+también al insertar) y los ids borrados (``eliminaciones``). Cada entidad se
+recorre por (updated_at, id) sobre el índice ``(cliente_id, updated_at, id)``:
+un sondeo sin cambios cuesta unas pocas lecturas de índice sea cual sea el
+historial del cliente.
+
+- El token guarda la última posición devuelta de cada entidad. Si una entidad
+  llena la página, ``hay_mas`` es true y el siguiente token sigue desde esa
+  fila; si no, la posición avanza hasta el límite de esta lectura.
+- El límite es ``ahora - sync_safety_lag_s``: cubre las transacciones que
+  confirman poco después de fijar su ``updated_at``, como el margen de la
+  analítica.
+- Las eliminaciones (``record_deletions``) se escriben solo para borrados
+  reales, en la misma transacción que el borrado; sus ids son UUIDv7, así que
+  se recorren por id. Se podan tras ``sync_tombstone_retention_days``: un
+  token más antiguo ya no puede reconstruir los borrados y la API responde 410
+  para que la app vuelva a sincronizar desde cero (sin ``since``).
+- Los consumos que envejecen (compactados en ``consumos_diarios`` por la
+  retención o movidos al archivo Parquet) no son borrados: la API los sigue
+  sirviendo en gráficos y exportaciones, así que no generan eliminaciones. Que
+  ya no lleguen por ``/user/sync`` es lo esperado; la app conserva lo que
+  recibió y aplica su propia retención local.
+- Sin token se devuelve el estado completo, por páginas; los borrados
+  anteriores no hacen falta.
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .ids import uuid7_floor
+from .metrics import metricas
+from .models import Consumo, Eliminacion, Factura
+from .schemas import ConsumoResponse, EliminacionSync, FacturaResponse, SyncResponse
+
+VERSION_TOKEN = 1
+
+# Entidades sincronizadas: modelo y esquema de respuesta
+ENTIDADES = {
+    "consumos": (Consumo, ConsumoResponse),
+    "facturas": (Factura, FacturaResponse),
+}
+
+# Id mayor que cualquier otro: (marca, ID_MAXIMO) equivale a "después de marca"
+ID_MAXIMO = uuid.UUID(int=(1 << 128) - 1)
+
+Posicion = Tuple[object, uuid.UUID]
+
+
+class SyncTokenError(Exception):
+    """Token de sincronización ilegible"""
+
+
+class SyncTokenExpired(SyncTokenError):
+    """Token anterior a las eliminaciones que se conservan"""
+
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _sync_key(db: Session, columna):
+    # SQLite guarda CURRENT_TIMESTAMP sin fracción y los parámetros con
+    # microsegundos: como texto solo se comparan bien normalizados
+    if _is_sqlite(db):
+        return func.strftime("%Y-%m-%d %H:%M:%f", columna)
+    return columna
+
+
+def _key_bound(db: Session, instante: datetime):
+    """Instante en el mismo dominio que ``_sync_key``"""
+    if _is_sqlite(db):
+        return instante.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return instante
+
+
+def encode_token(hasta: datetime, posiciones: dict, eliminaciones: uuid.UUID) -> str:
+    """Token opaco con la posición de cada entidad"""
+    datos = {"v": VERSION_TOKEN, "hasta": hasta.isoformat(), "eliminaciones": str(eliminaciones)}
+    for entidad, (marca, ultimo_id) in posiciones.items():
+        datos[entidad] = [marca.isoformat() if isinstance(marca, datetime) else marca, str(ultimo_id)]
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_token(db: Session, token: str) -> Tuple[datetime, dict, uuid.UUID]:
+    """Fecha de emisión, posiciones y último borrado visto de un token"""
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if datos.get("v") != VERSION_TOKEN:
+            raise ValueError(f"versión {datos.get('v')}")
+        posiciones = {}
+        for entidad in ENTIDADES:
+            marca, ultimo_id = datos[entidad]
+            posiciones[entidad] = (
+                marca if _is_sqlite(db) else datetime.fromisoformat(marca), uuid.UUID(ultimo_id)
+            )
+        return datetime.fromisoformat(datos["hasta"]), posiciones, uuid.UUID(datos["eliminaciones"])
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise SyncTokenError(f"Token de sincronización inválido: {e}")
+
+
+def _changed_rows(db: Session, modelo, cliente_id: str, posicion: Optional[Posicion],
+                  hasta, limite: int):
+    """Filas del cliente con (updated_at, id) posterior a ``posicion`` y updated_at <= ``hasta``"""
+    clave = _sync_key(db, modelo.updated_at)
+    query = db.query(modelo, clave).filter(modelo.cliente_id == cliente_id, clave <= hasta)
+    if posicion is not None:
+        query = query.filter(tuple_(clave, modelo.id) > tuple_(*posicion))
+    return query.order_by(clave, modelo.id).limit(limite).all()
+
+
+def get_changes(db: Session, cliente_id: str, token: Optional[str], limite: int) -> SyncResponse:
+    """Cambios del cliente desde ``token`` (todo su estado si no hay token)"""
+    ahora = datetime.now(timezone.utc)
+    hasta = ahora - timedelta(seconds=settings.sync_safety_lag_s)
+    hasta_clave = _key_bound(db, hasta)
+    hasta_id = uuid7_floor(hasta)
+
+    if token:
+        emitido, posiciones, desde_id = decode_token(db, token)
+        if emitido < ahora - timedelta(days=settings.sync_tombstone_retention_days):
+            raise SyncTokenExpired("Token de sincronización caducado")
+    else:
+        posiciones = {entidad: None for entidad in ENTIDADES}
+        desde_id = hasta_id
+
+    respuesta = {}
+    siguientes = {}
+    hay_mas = False
+    for entidad, (modelo, esquema) in ENTIDADES.items():
+        filas = _changed_rows(db, modelo, cliente_id, posiciones[entidad], hasta_clave, limite)
+        respuesta[entidad] = [esquema.from_orm(fila) for fila, _ in filas]
+        if len(filas) == limite:
+            hay_mas = True
+            siguientes[entidad] = (filas[-1][1], filas[-1][0].id)
+        else:
+            siguientes[entidad] = (hasta_clave, ID_MAXIMO)
+        metricas.incr("sync_filas", len(filas), entidad=entidad)
+
+    eliminaciones = db.query(Eliminacion).filter(
+        Eliminacion.cliente_id == cliente_id,
+        Eliminacion.id > desde_id,
+        Eliminacion.id < hasta_id
+    ).order_by(Eliminacion.id).limit(limite).all()
+    if len(eliminaciones) == limite:
+        hay_mas = True
+        siguiente_eliminacion = eliminaciones[-1].id
+    else:
+        siguiente_eliminacion = hasta_id
+    metricas.incr("sync_filas", len(eliminaciones), entidad="eliminaciones")
+    metricas.incr("sync_peticiones", tipo="incremental" if token else "completa")
+
+    return SyncResponse(
+        consumos=respuesta["consumos"],
+        facturas=respuesta["facturas"],
+        eliminados=[
+            EliminacionSync(entidad=e.entidad, id=e.entidad_id, eliminado_en=e.eliminado_en)
+            for e in eliminaciones
+        ],
+        since=encode_token(hasta, siguientes, siguiente_eliminacion),
+        hay_mas=hay_mas
+    )
+
+
+def record_deletions(db: Session, entidad: str, filas: Iterable[Tuple[str, str]]) -> None:
+    """Anotar en la transacción actual los borrados (cliente_id, id público) de una entidad
+
+    Solo para filas que dejan de existir; archivar o compactar no cuenta.
+    """
+    valores = [
+        {"cliente_id": cliente_id, "entidad": entidad, "entidad_id": entidad_id}
+        for cliente_id, entidad_id in filas
+    ]
+    if valores:
+        db.execute(insert(Eliminacion), valores)
+
+
+def prune_deletions(db: Session, dias: Optional[int] = None) -> int:
+    """Borrar las eliminaciones más antiguas que la retención de tokens"""
+    dias = dias if dias is not None else settings.sync_tombstone_retention_days
+    corte = uuid7_floor(datetime.now(timezone.utc) - timedelta(days=dias))
+    borradas = db.query(Eliminacion).filter(Eliminacion.id < corte).delete(synchronize_session=False)
+    db.commit()
+    return borradas
@@ -0,0 +1,182 @@
+"""
+Tiempo máximo de las consultas por ruta y cancelación si el cliente se va.
+
+``Depends(guard_queries(clase))`` en el decorador de un endpoint vigila la
+sesión de la petición (la misma que usan ``get_current_user`` y el endpoint):
+
+- Cada sentencia tiene como máximo ``statement_timeouts[clase]`` segundos. En
+  PostgreSQL con ``SET LOCAL statement_timeout`` al empezar cada transacción;
+  en SQLite con un progress handler que interrumpe la sentencia al pasarse.
+- Si el cliente cierra la conexión, la consulta en curso se cancela
+  (``cancel()`` de psycopg2, ``interrupt()`` de sqlite3) y la conexión vuelve
+  al pool en lugar de seguir ocupada hasta terminar.
+
+La sentencia interrumpida se convierte en ``StatementTimeoutError`` (504) o
+``QueryCancelledError`` (503) y se cuenta en ``consultas_interrumpidas`` con
+el nombre de la ruta. Para que la vigilancia de la desconexión pueda correr
+mientras tanto, los endpoints protegidos son síncronos (se ejecutan en el
+threadpool y no bloquean el event loop).
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import engine, get_db
+from .metrics import metricas
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántas instrucciones de la VM de SQLite se comprueba el límite
+SQLITE_PROGRESS_STEPS = 1000
+
+# Cada cuánto se comprueba si el cliente sigue conectado
+DISCONNECT_POLL_S = 0.25
+
+
+class QueryInterruptedError(HTTPException):
+    """Consulta interrumpida por el guardián de la petición"""
+
+
+class StatementTimeoutError(QueryInterruptedError):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="La consulta tardó demasiado"
+        )
+
+
+class QueryCancelledError(QueryInterruptedError):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Consulta cancelada: el cliente cerró la conexión",
+            headers={"Retry-After": "1"}
+        )
+
+
+class QueryGuard:
+    """Límite de tiempo y cancelación de las consultas de una petición"""
+
+    def __init__(self, ruta: str, timeout_s: float):
+        self.ruta = ruta
+        self.timeout_s = timeout_s
+        self.cancelado = False
+        self._limite = time.monotonic() + timeout_s
+        self._lock = threading.Lock()
+        self._conexiones: List[object] = []
+
+    def attach(self, connection) -> None:
+        """Aplicar el límite a la conexión que abre una transacción de la sesión"""
+        dbapi = connection.connection.dbapi_connection
+        connection.info["guard"] = self
+        with self._lock:
+            self._conexiones.append(dbapi)
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.timeout_s * 1000)}")
+        elif connection.dialect.name == "sqlite":
+            dbapi.set_progress_handler(self._sqlite_progress, SQLITE_PROGRESS_STEPS)
+
+    def start_statement(self) -> None:
+        # El límite es por sentencia, como statement_timeout
+        self._limite = time.monotonic() + self.timeout_s
+
+    def _sqlite_progress(self) -> int:
+        # Distinto de cero: SQLite aborta la sentencia con "interrupted"
+        return int(self.cancelado or time.monotonic() > self._limite)
+
+    def detach(self, dbapi) -> None:
+        with self._lock:
+            if dbapi in self._conexiones:
+                self._conexiones.remove(dbapi)
+
+    def cancel(self) -> None:
+        """Cancelar la consulta en curso (se llama desde el event loop)"""
+        self.cancelado = True
+        # Con el lock: una conexión ya devuelta al pool no se cancela
+        with self._lock:
+            for dbapi in self._conexiones:
+                try:
+                    if hasattr(dbapi, "interrupt"):
+                        dbapi.interrupt()
+                    else:
+                        dbapi.cancel()
+                except Exception as e:
+                    logger.warning(f"No se pudo cancelar la consulta de {self.ruta}: {e}")
+
+    def interruption(self, error: Exception) -> Optional[QueryInterruptedError]:
+        """Excepción HTTP equivalente si el error lo provocó este guardián"""
+        if self.cancelado:
+            motivo, excepcion = "desconexion", QueryCancelledError()
+        elif getattr(error, "pgcode", None) == "57014" or "interrupted" in str(error):
+            motivo, excepcion = "timeout", StatementTimeoutError()
+        else:
+            return None
+        metricas.incr("consultas_interrumpidas", ruta=self.ruta, motivo=motivo)
+        logger.warning(f"Consulta de {self.ruta} interrumpida ({motivo})")
+        return excepcion
+
+
+@event.listens_for(Session, "after_begin")
+def _attach_guard(session: Session, transaction, connection) -> None:
+    guard = session.info.get("guard")
+    if guard is not None:
+        guard.attach(connection)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    guard = conn.info.get("guard")
+    if guard is not None:
+        guard.start_statement()
+
+
+@event.listens_for(engine, "handle_error")
+def _translate_interruption(context) -> None:
+    guard = context.connection.info.get("guard") if context.connection is not None else None
+    if guard is not None:
+        excepcion = guard.interruption(context.original_exception)
+        if excepcion is not None:
+            raise excepcion
+
+
+@event.listens_for(engine, "checkin")
+def _detach_guard(dbapi_connection, connection_record) -> None:
+    # La conexión vuelve al pool: las siguientes peticiones no heredan el límite
+    guard = connection_record.info.pop("guard", None)
+    if guard is not None:
+        guard.detach(dbapi_connection)
+        if hasattr(dbapi_connection, "set_progress_handler"):
+            dbapi_connection.set_progress_handler(None, 0)
+
+
+async def _watch_disconnect(request: Request, guard: QueryGuard) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_S)
+    guard.cancel()
+
+
+def guard_queries(clase: str):
+    """Dependencia que limita y cancela las consultas de los endpoints de una clase de ruta"""
+
+    async def dependencia(request: Request, db: Session = Depends(get_db)):
+        timeout_s = settings.statement_timeouts.get(clase)
+        if not timeout_s:
+            yield
+            return
+        guard = QueryGuard(request.scope["endpoint"].__name__, timeout_s)
+        db.info["guard"] = guard
+        vigilante = asyncio.create_task(_watch_disconnect(request, guard))
+        try:
+            yield
+        finally:
+            vigilante.cancel()
+            db.info.pop("guard", None)
+
+    return dependencia
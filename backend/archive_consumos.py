@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script para mover los consumos antiguos al archivo Parquet
+"""
+import sys
+import os
+import argparse
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.archive import archive_consumos, get_archive_cutoff
+from app.config import settings
+
+def main():
+    """Función principal para archivar consumos"""
+    parser = argparse.ArgumentParser(description="Archivar consumos antiguos en Parquet")
+    parser.add_argument("--meses", type=int, default=settings.archive_after_months,
+                        help="Meses de consumos que se conservan en la base de datos")
+    parser.add_argument("--chunk", type=int, default=settings.archive_chunk_size,
+                        help="Filas por lote de borrado")
+    args = parser.parse_args()
+
+    settings.archive_after_months = args.meses
+    corte = get_archive_cutoff()
+
+    print(f"📦 Archivando consumos anteriores a {corte.strftime('%Y-%m-%d')}...")
+    print(f"📁 Directorio de archivo: {settings.archive_dir}")
+
+    db = SessionLocal()
+    try:
+        resumen = archive_consumos(db, antes_de=corte, chunk_size=args.chunk)
+        print("✅ Archivo completado")
+        print(f"   - Consumos archivados: {resumen['filas']}")
+        print(f"   - Ficheros escritos: {resumen['ficheros']}")
+        print(f"   - Lotes: {resumen['lotes']}")
+
+    except Exception as e:
+        print(f"❌ Error archivando consumos: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
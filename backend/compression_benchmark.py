@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script para medir el efecto de la compresión en un endpoint: bytes en la red
+por codificación y latencia estimada en redes móviles típicas.
+
+La latencia estimada es el tiempo de respuesta medido en el servidor más un
+RTT y la transferencia de los bytes comprimidos al ancho de banda del perfil.
+
+    python compression_benchmark.py --token <JWT> --path "/consumos?size=100"
+"""
+import argparse
+import time
+
+import httpx
+
+# Perfiles de red: (nombre, ancho de banda en Mbit/s, RTT en ms)
+MOBILE_PROFILES = [
+    ("3G", 1.6, 300),
+    ("4G", 12.0, 70),
+    ("4G saturada", 3.0, 150),
+]
+
+ENCODINGS = ["identity", "gzip", "br", "zstd"]
+
+def measure(cliente: httpx.Client, path: str, repeticiones: int = 5):
+    """Bytes en la red y tiempo medio de respuesta por codificación aceptada"""
+    resultados = []
+    for codificacion in ENCODINGS:
+        bytes_red, tiempos, usada = 0, [], None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            with cliente.stream("GET", path, headers={"Accept-Encoding": codificacion}) as respuesta:
+                respuesta.raise_for_status()
+                bytes_red = sum(len(trozo) for trozo in respuesta.iter_raw())
+                usada = respuesta.headers.get("content-encoding", "identity")
+            tiempos.append(time.perf_counter() - inicio)
+        # El servidor puede no tener brotli/zstd: se omite lo que no negoció
+        if usada == codificacion:
+            resultados.append((codificacion, bytes_red, sorted(tiempos)[len(tiempos) // 2]))
+    return resultados
+
+def main():
+    """Función principal del benchmark de compresión"""
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--path", default="/dashboard/graficos")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url, headers={"Authorization": f"Bearer {args.token}"}) as cliente:
+        resultados = measure(cliente, args.path, args.repeticiones)
+
+    print(f"📦 {args.path}")
+    for codificacion, bytes_red, segundos in resultados:
+        estimaciones = "  ".join(
+            f"{nombre}: {(segundos + rtt / 1000 + bytes_red * 8 / (mbps * 1e6)) * 1000:6.0f} ms"
+            for nombre, mbps, rtt in MOBILE_PROFILES
+        )
+        print(f"   {codificacion:9s} {bytes_red:9d} B  servidor {segundos * 1000:6.1f} ms  {estimaciones}")
+
+if __name__ == "__main__":
+    main()
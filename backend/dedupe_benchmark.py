@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Script para medir la supresión de duplicados en ``POST /consumos``
+(``app/dedupe.py``): rendimiento de la ingesta según la proporción de eventos
+reenviados.
+
+Para cada tasa de ``--tasas`` (proporción de reenvíos, p. ej. 0 0.05 0.5)
+envía ``--peticiones`` consumos a la API en proceso, con y sin el filtro de
+Bloom, y muestra peticiones por segundo, percentiles de latencia, consultas de
+duplicados que llegaron a la base de datos y filas insertadas (deben coincidir
+con los eventos distintos). Escribe en la base de datos de ``DATABASE_URL``
+sobre un cliente de prueba cuyos consumos borra al terminar.
+
+    python dedupe_benchmark.py --tasas 0 0.05 0.5 --peticiones 5000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from fastapi.testclient import TestClient
+
+from app import dedupe
+from app.auth import create_access_token
+from app.config import settings
+from app.database import SessionLocal
+from app.main import app
+from app.metrics import metricas
+from app.models import Cliente, Consumo
+
+CLIENTE_BENCH = "bench_dedupe"
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _lookups() -> int:
+    """Consultas a la BD por posibles duplicados (con filtro) hasta ahora"""
+    contadores = metricas.snapshot()["contadores"]
+    return int(sum(valor for clave, valor in contadores.items()
+               if clave.startswith("dedupe_filtro") and "posible_duplicado" in clave))
+
+
+def run(client: TestClient, cabeceras: dict, tasa: float, peticiones: int, con_filtro: bool, semilla: int):
+    """Ingesta de ``peticiones`` eventos con ``tasa`` de reenvíos; devuelve métricas"""
+    _cleanup_consumos()
+    dedupe.event_filter = (
+        dedupe.BloomFilter(settings.dedupe_filter_capacity, settings.dedupe_filter_error_rate,
+                           settings.dedupe_window_hours * 3600)
+        if con_filtro else None
+    )
+    aleatorio = random.Random(semilla)
+    enviados, latencias = [], []
+    lookups_antes = _lookups()
+
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        if enviados and aleatorio.random() < tasa:
+            event_id = aleatorio.choice(enviados)
+        else:
+            event_id = f"cdr-{semilla}-{i}"
+            enviados.append(event_id)
+        t0 = time.perf_counter()
+        respuesta = client.post("/consumos", headers=cabeceras, json={
+            "cliente_id": CLIENTE_BENCH, "servicio": "datos", "cantidad": 1.0, "unidad": "MB",
+            "fecha": datetime.now().isoformat(), "event_id": event_id,
+        })
+        latencias.append(time.perf_counter() - t0)
+        respuesta.raise_for_status()
+    transcurrido = time.perf_counter() - inicio
+
+    db = SessionLocal()
+    try:
+        filas = db.query(Consumo).filter(Consumo.cliente_id == CLIENTE_BENCH).count()
+    finally:
+        db.close()
+    # Sin filtro cada evento con event_id consulta la BD antes de insertar
+    lookups = _lookups() - lookups_antes if con_filtro else peticiones
+    latencias.sort()
+    return peticiones / transcurrido, latencias, lookups, filas, len(enviados)
+
+
+def _prepare_client() -> dict:
+    db = SessionLocal()
+    try:
+        if db.get(Cliente, CLIENTE_BENCH) is None:
+            db.add(Cliente(
+                id=CLIENTE_BENCH, nombre="Benchmark", email=f"{CLIENTE_BENCH}@telcox.local",
+                telefono="0000000000", password_hash="-", estado_cuenta="suspendido"
+            ))
+            db.commit()
+    finally:
+        db.close()
+    token = create_access_token({"sub": f"{CLIENTE_BENCH}@telcox.local", "cliente_id": CLIENTE_BENCH})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _cleanup_consumos() -> None:
+    db = SessionLocal()
+    try:
+        db.query(Consumo).filter(Consumo.cliente_id == CLIENTE_BENCH).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _cleanup() -> None:
+    db = SessionLocal()
+    try:
+        db.query(Cliente).filter(Cliente.id == CLIENTE_BENCH).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    """Función principal del benchmark de duplicados"""
+    parser = argparse.ArgumentParser(description="Benchmark de supresión de duplicados en la ingesta")
+    parser.add_argument("--tasas", type=float, nargs="+", default=[0, 0.05, 0.5])
+    parser.add_argument("--peticiones", type=int, default=5000)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    cabeceras = _prepare_client()
+    filtro_original = dedupe.event_filter
+    try:
+        # Sin ``with``: no arranca el ciclo de vida (escritor agrupado, tareas periódicas)
+        client = TestClient(app)
+        print(f"🔁 {args.peticiones} peticiones por tasa de reenvíos")
+        print(f"   {'reenvíos':>9} {'filtro':>7} {'pet/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'consultas BD':>13} {'filas':>7} {'distintos':>10}")
+        for tasa in args.tasas:
+            for con_filtro in (True, False):
+                pet_s, latencias, lookups, filas, distintos = run(
+                    client, cabeceras, tasa, args.peticiones, con_filtro, args.semilla
+                )
+                print(f"   {tasa:>9.0%} {'sí' if con_filtro else 'no':>7} {pet_s:>8,.0f} "
+                      f"{_percentil(latencias, 0.5) * 1000:>8.1f} {_percentil(latencias, 0.99) * 1000:>8.1f} "
+                      f"{lookups:>13} {filas:>7} {distintos:>10}")
+    finally:
+        dedupe.event_filter = filtro_original
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script para medir el efecto de los campos parciales (``?fields=...``) en un
+listado: tamaño de la respuesta y latencia con el esquema completo y con cada
+selección de campos.
+
+Para cada valor de ``--campos`` (``-`` es el esquema completo) pide
+``--path`` ``--repeticiones`` veces y muestra los bytes en la red sin
+comprimir y con gzip, los bytes por elemento, el p50/p99 del tiempo de
+respuesta en el servidor y la latencia estimada en redes móviles (los mismos
+perfiles que ``compression_benchmark.py``).
+
+    python fields_benchmark.py --token <JWT> --path "/consumos?size=100" \\
+        --campos - id,fecha,cantidad id,fecha,servicio,cantidad,costo_total
+"""
+import argparse
+import time
+
+import httpx
+
+from compression_benchmark import MOBILE_PROFILES
+
+CAMPOS_CONSUMOS = ["-", "id,fecha,cantidad", "id,fecha,servicio,cantidad,costo_total"]
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def measure(cliente: httpx.Client, path: str, params: dict, codificacion: str, repeticiones: int):
+    """Bytes en la red y tiempos de respuesta ordenados"""
+    bytes_red, tiempos = 0, []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        with cliente.stream("GET", path, params=params,
+                            headers={"Accept-Encoding": codificacion}) as respuesta:
+            respuesta.raise_for_status()
+            bytes_red = sum(len(trozo) for trozo in respuesta.iter_raw())
+        tiempos.append(time.perf_counter() - inicio)
+    return bytes_red, sorted(tiempos)
+
+
+def main():
+    """Función principal del benchmark de campos parciales"""
+    parser = argparse.ArgumentParser(description="Benchmark de campos parciales en los listados")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--path", default="/consumos?size=100")
+    parser.add_argument("--campos", nargs="+", default=CAMPOS_CONSUMOS,
+                        help="selecciones de campos separados por comas ('-' = todos)")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"✂️  {args.path}")
+    print(f"   {'campos':<40} {'bytes':>8} {'gzip':>7} {'B/elem':>7} {'p50 ms':>7} {'p99 ms':>7}  "
+          + "  ".join(f"{nombre:>11}" for nombre, _, _ in MOBILE_PROFILES))
+    with httpx.Client(base_url=args.url, headers={"Authorization": f"Bearer {args.token}"}) as cliente:
+        for campos in args.campos:
+            params = {} if campos == "-" else {"fields": campos}
+            elementos = len(cliente.get(args.path, params=params).json().get("items", ()))
+            bytes_planos, tiempos = measure(cliente, args.path, params, "identity", args.repeticiones)
+            bytes_gzip, _ = measure(cliente, args.path, params, "gzip", args.repeticiones)
+            p50 = _percentil(tiempos, 0.5)
+            estimaciones = "  ".join(
+                f"{(p50 + rtt / 1000 + bytes_gzip * 8 / (mbps * 1e6)) * 1000:8.0f} ms"
+                for _, mbps, rtt in MOBILE_PROFILES
+            )
+            print(f"   {'(todos)' if campos == '-' else campos:<40} {bytes_planos:>8} {bytes_gzip:>7} "
+                  f"{bytes_planos / max(elementos, 1):>7.0f} {p50 * 1000:>7.1f} "
+                  f"{_percentil(tiempos, 0.99) * 1000:>7.1f}  {estimaciones}")
+
+
+if __name__ == "__main__":
+    main()
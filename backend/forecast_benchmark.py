@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script para medir el ajuste del pronóstico de cierre de mes con datos
+sintéticos: clientes por segundo y tiempo total para ``--clientes``.
+
+Genera por lotes el historial diario de ``--lote`` clientes (tendencia, día de
+la semana y ruido) y mide ``project_month`` sobre cada lote, repartiendo los
+lotes entre ``--procesos`` procesos. No necesita el servidor ni la base de
+datos; con varios procesos conviene fijar ``OPENBLAS_NUM_THREADS=1``.
+
+    OPENBLAS_NUM_THREADS=1 python forecast_benchmark.py --clientes 1000000 --procesos 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.config import settings
+from app.forecast_model import CAMPOS, build_model, project_month
+
+def synthetic_history(clientes: int, dias: int, semilla: int) -> np.ndarray:
+    """Consumo diario (días × clientes × campos) con tendencia, semana y ruido"""
+    rng = np.random.default_rng(semilla)
+    base = rng.gamma(2.0, 50.0, size=(1, clientes, len(CAMPOS)))
+    tendencia = 1 + rng.normal(0, 0.3, size=(1, clientes, len(CAMPOS))) * np.linspace(0, 1, dias)[:, None, None]
+    semana = 1 + 0.3 * np.sin(np.arange(dias) * 2 * np.pi / 7)[:, None, None]
+    ruido = rng.gamma(4.0, 0.25, size=(dias, clientes, len(CAMPOS)))
+    return np.clip(base * tendencia * semana * ruido, 0, None)
+
+def run_chunk(args) -> float:
+    """Generar un lote y devolver lo que tarda su ajuste"""
+    indice, clientes, ventana, dias_mes, modelo = args
+    historia = synthetic_history(clientes, ventana + 1, indice)
+    observados = np.full(clientes, ventana)
+    inicio = time.perf_counter()
+    project_month(historia, observados, *modelo, dias_mes)
+    return time.perf_counter() - inicio
+
+def main():
+    """Función principal del benchmark de pronósticos"""
+    parser = argparse.ArgumentParser(description="Benchmark del pronóstico de cierre de mes")
+    parser.add_argument("--clientes", type=int, default=1000000)
+    parser.add_argument("--lote", type=int, default=settings.forecast_chunk_size)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--dias", type=int, default=settings.forecast_history_days)
+    args = parser.parse_args()
+
+    hoy = date.today()
+    inicio_mes = hoy.replace(day=1)
+    fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+    dias_mes = (hoy - inicio_mes).days
+    ventana = max(args.dias, dias_mes)
+    modelo = build_model(hoy - timedelta(days=ventana), hoy, fin_mes, settings.forecast_ridge)
+
+    lotes = [
+        (i, min(args.lote, args.clientes - i * args.lote), ventana, dias_mes, modelo)
+        for i in range((args.clientes + args.lote - 1) // args.lote)
+    ]
+    print(f"📈 {args.clientes} clientes × {ventana} días en {len(lotes)} lotes de {args.lote}, "
+          f"{args.procesos} procesos")
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        tiempos = list(pool.map(run_chunk, lotes))
+    total = time.perf_counter() - inicio
+
+    ajuste = sum(tiempos)
+    print(f"   ajuste: {ajuste:.2f} s de CPU, {args.clientes / ajuste:,.0f} clientes/s por proceso")
+    print(f"   mediana por lote: {sorted(tiempos)[len(tiempos) // 2] * 1000:.1f} ms")
+    print(f"   total (con generación de datos): {total:.2f} s")
+
+if __name__ == "__main__":
+    main()
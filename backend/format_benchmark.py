@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Script para comparar los formatos de respuesta de los gráficos: tiempo de
+codificación y tamaño (sin comprimir y con gzip) de una serie diaria.
+
+Genera consumos sintéticos de un cliente, los agrega por día como el endpoint
+de gráficos y mide cada formato sobre el resultado. No necesita el servidor.
+
+    python format_benchmark.py --meses 24 --consumos-dia 40
+"""
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.formats import available_formats, encode_columns, JSON
+from app.historial import aggregate_consumos, columns_to_rows
+from app.schemas import ConsumoGrafico
+
+SERVICIOS = ["datos", "minutos", "sms"]
+
+def synthetic_consumos(meses: int, consumos_dia: int):
+    """Consumos (fecha, servicio, cantidad, costo_total) repartidos por día"""
+    inicio = datetime.now() - timedelta(days=meses * 30)
+    filas = []
+    for dia in range(meses * 30):
+        fecha = inicio + timedelta(days=dia)
+        for _ in range(consumos_dia):
+            filas.append((
+                fecha + timedelta(seconds=random.randint(0, 86399)),
+                random.choice(SERVICIOS),
+                round(random.uniform(0.5, 500), 2),
+                round(random.uniform(0, 2), 4),
+            ))
+    return filas
+
+def encode_rows(columnas) -> bytes:
+    """Codificación actual: un ConsumoGrafico por día serializado como JSON"""
+    filas = [ConsumoGrafico(**fila) for fila in columns_to_rows(columnas)]
+    return JSONResponse(jsonable_encoder(filas)).body
+
+def measure(funcion, repeticiones: int):
+    """Resultado y mediana del tiempo de ``funcion``"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, sorted(tiempos)[len(tiempos) // 2]
+
+def main():
+    """Función principal del benchmark de formatos"""
+    parser = argparse.ArgumentParser(description="Benchmark de formatos de respuesta de gráficos")
+    parser.add_argument("--meses", type=int, default=24)
+    parser.add_argument("--consumos-dia", type=int, default=40)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(42)
+    filas = synthetic_consumos(args.meses, args.consumos_dia)
+    columnas, segundos = measure(lambda: aggregate_consumos(filas, "%Y-%m-%d"), args.repeticiones)
+    print(f"📊 {len(filas)} consumos → {len(columnas['fecha'])} días (agregación {segundos * 1000:.1f} ms)")
+
+    for formato in available_formats():
+        if formato == JSON:
+            cuerpo, segundos = measure(lambda: encode_rows(columnas), args.repeticiones)
+        else:
+            cuerpo, segundos = measure(lambda: encode_columns(formato, columnas), args.repeticiones)
+        comprimido = len(gzip.compress(cuerpo, 6))
+        print(f"   {formato:40s} {len(cuerpo):8d} B  gzip {comprimido:7d} B  codificación {segundos * 1000:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Script para medir la escritura agrupada de consumos (``app/batching.py``):
+curva de latencia y rendimiento para distintas ventanas de agrupación.
+
+Para cada ventana de ``--ventanas`` (milisegundos; 0 = un commit por consumo,
+como ``POST /consumos`` sin escritura agrupada) lanza ``--concurrencia``
+productores que envían consumos durante ``--duracion`` segundos y muestra
+filas por segundo, filas por commit y percentiles de latencia hasta la
+confirmación. Escribe en la base de datos de ``DATABASE_URL`` sobre un
+cliente de prueba cuyos consumos borra al terminar.
+
+    python group_commit_benchmark.py --ventanas 0 1 2 5 10 20 --concurrencia 200
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app.batching import ConsumoBatchWriter, QueueFullError
+from app.config import settings
+from app.database import SessionLocal
+from app.ids import uuid7
+from app.metrics import metricas
+from app.models import Cliente, Consumo
+from app.notifications import record_usage
+
+CLIENTE_BENCH = "bench_group_commit"
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _fila() -> dict:
+    return {
+        "id": uuid7(), "cliente_id": CLIENTE_BENCH, "servicio": "datos", "cantidad": 1.0,
+        "unidad": "MB", "fecha": datetime.now(), "tipo_consumo": "normal",
+        "costo_unitario": 0.0, "costo_total": 0.01, "created_at": datetime.now(timezone.utc),
+    }
+
+
+def _insert_one(fila: dict) -> None:
+    """Camino sin agrupar: un INSERT y un commit por consumo"""
+    db = SessionLocal()
+    try:
+        db.add(Consumo(**fila))
+        db.flush()
+        record_usage(db, [fila])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _producer(enviar, fin: float, latencias: list, rechazos: list):
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        try:
+            await enviar(_fila())
+        except QueueFullError:
+            rechazos.append(1)
+            await asyncio.sleep(0.001)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def run_window(ventana_ms: float, concurrencia: int, duracion: float, max_filas: int):
+    """Carga constante con una ventana; devuelve (filas/s, filas por commit, latencias, rechazos)"""
+    latencias, rechazos = [], []
+    lotes_antes = metricas.snapshot()["contadores"].get("group_commit_lotes", 0)
+
+    if ventana_ms == 0:
+        # Mismo número de conexiones que productores, como los hilos de la API
+        pool = ThreadPoolExecutor(max_workers=min(concurrencia, 40))
+        loop = asyncio.get_running_loop()
+
+        async def enviar(fila):
+            await loop.run_in_executor(pool, _insert_one, fila)
+
+        escritor = None
+    else:
+        escritor = ConsumoBatchWriter(settings.group_commit_queue_size, max_filas, ventana_ms)
+        await escritor.start()
+        enviar = escritor.submit
+
+    inicio = time.perf_counter()
+    fin = time.monotonic() + duracion
+    await asyncio.gather(*(_producer(enviar, fin, latencias, rechazos) for _ in range(concurrencia)))
+    transcurrido = time.perf_counter() - inicio
+
+    if escritor is not None:
+        await escritor.stop()
+        lotes = metricas.snapshot()["contadores"].get("group_commit_lotes", 0) - lotes_antes
+    else:
+        pool.shutdown()
+        lotes = len(latencias)
+    latencias.sort()
+    return len(latencias) / transcurrido, len(latencias) / max(lotes, 1), latencias, len(rechazos)
+
+
+def _prepare_client() -> None:
+    db = SessionLocal()
+    try:
+        if db.get(Cliente, CLIENTE_BENCH) is None:
+            db.add(Cliente(
+                id=CLIENTE_BENCH, nombre="Benchmark", email=f"{CLIENTE_BENCH}@telcox.local",
+                telefono="0000000000", password_hash="-", estado_cuenta="suspendido"
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+
+def _cleanup() -> None:
+    db = SessionLocal()
+    try:
+        db.query(Cliente).filter(Cliente.id == CLIENTE_BENCH).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    """Función principal del benchmark de escritura agrupada"""
+    parser = argparse.ArgumentParser(description="Benchmark de escritura agrupada de consumos")
+    parser.add_argument("--ventanas", type=float, nargs="+", default=[0, 1, 2, 5, 10, 20])
+    parser.add_argument("--concurrencia", type=int, default=100)
+    parser.add_argument("--duracion", type=float, default=10.0)
+    parser.add_argument("--max-filas", type=int, default=settings.group_commit_max_rows)
+    args = parser.parse_args()
+
+    _prepare_client()
+    try:
+        print(f"📦 {args.concurrencia} productores, {args.duracion:.0f}s por ventana")
+        print(f"   {'ventana ms':>10} {'filas/s':>10} {'filas/commit':>13} {'p50 ms':>8} "
+              f"{'p99 ms':>8} {'rechazos':>9}")
+        for ventana in args.ventanas:
+            filas_s, por_commit, latencias, rechazos = asyncio.run(
+                run_window(ventana, args.concurrencia, args.duracion, args.max_filas)
+            )
+            print(f"   {ventana:>10g} {filas_s:>10,.0f} {por_commit:>13.1f} "
+                  f"{_percentil(latencias, 0.5) * 1000:>8.1f} {_percentil(latencias, 0.99) * 1000:>8.1f} "
+                  f"{rechazos:>9}")
+    finally:
+        _cleanup()
+
+
+if __name__ == "__main__":
+    main()
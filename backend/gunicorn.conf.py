@@ -0,0 +1,40 @@
+"""
+Configuración de gunicorn para producción.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Todo sale de ``Settings`` (variables SERVER_*), así que el mismo archivo sirve
+para cualquier despliegue. Reinicios sin cortar conexiones:
+
+- ``kill -HUP <pid>``: relee la configuración y sustituye los workers de uno
+  en uno. Con ``server_preload`` el código ya está cargado en el arbiter, así
+  que para desplegar código nuevo hay que usar el siguiente.
+- ``kill -USR2 <pid>`` y, cuando el nuevo arbiter responda, ``kill -QUIT``
+  al antiguo: arranca un arbiter nuevo con el código nuevo en el mismo socket.
+"""
+import multiprocessing
+
+from app.config import settings
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.server_workers or multiprocessing.cpu_count()
+worker_class = "app.server.TelcoxUvicornWorker"
+
+backlog = settings.server_backlog
+keepalive = settings.server_keepalive_s
+timeout = settings.server_timeout_s
+graceful_timeout = settings.server_graceful_timeout_s
+max_requests = settings.server_max_requests
+max_requests_jitter = settings.server_max_requests_jitter
+preload_app = settings.server_preload
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Las conexiones abiertas por el arbiter al precargar la app no pueden
+    # compartirse entre procesos: cada worker abre las suyas
+    from app.database import engine
+
+    engine.dispose(close=False)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Script para medir el tiempo de importación de la app con ``python -X importtime``.
+
+Muestra los módulos con más tiempo acumulado y, con --max-ms, termina con
+error si la importación completa supera el presupuesto (para CI).
+
+    python import_profile.py --top 20 --max-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+def profile_imports(modulo: str):
+    """Tiempos (propio, acumulado) en microsegundos por módulo importado"""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if salida.returncode != 0:
+        raise RuntimeError(salida.stderr.strip().splitlines()[-1])
+    tiempos = {}
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        tiempos[nombre.strip()] = (int(propio), int(acumulado))
+    return tiempos
+
+def main():
+    """Función principal del perfil de importación"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modulo", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    try:
+        tiempos = profile_imports(args.modulo)
+    except RuntimeError as e:
+        print(f"❌ Error importando {args.modulo}: {e}")
+        sys.exit(1)
+
+    total_ms = tiempos[args.modulo][1] / 1000
+    print(f"⏱️  Importación de {args.modulo}: {total_ms:.1f} ms")
+    mayores = sorted(tiempos.items(), key=lambda item: item[1][1], reverse=True)
+    for nombre, (propio, acumulado) in mayores[1:args.top + 1]:
+        print(f"   {acumulado / 1000:8.1f} ms  (propio {propio / 1000:6.1f} ms)  {nombre}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"❌ Supera el presupuesto de {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
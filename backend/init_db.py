@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
-Script para inicializar la base de datos PostgreSQL
+Script para inicializar la base de datos: aplica las migraciones pendientes y,
+con --seed (o SEED_DEMO_DATA=true), crea los datos de demostración.
+
+Se ejecuta una vez por despliegue, antes de arrancar los workers.
 """
 import sys
 import os
@@ -8,25 +11,23 @@ import os
 # Agregar el directorio raíz al path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.database import init_db
+from app.database import init_db, create_initial_data
 from app.config import settings
 
 def main():
     """Función principal para inicializar la base de datos"""
-    print("🚀 Inicializando base de datos PostgreSQL...")
+    print("🚀 Inicializando base de datos...")
     print(f"📊 URL de conexión: {settings.database_url}")
     
     try:
         init_db()
-        print("✅ Base de datos inicializada correctamente")
-        print("📋 Tablas creadas:")
-        print("   - clientes")
-        print("   - consumos") 
-        print("   - facturas")
-        print("   - saldos")
-        print("👤 Cliente de prueba creado:")
-        print("   - Email: juan.perez@email.com")
-        print("   - Contraseña: password123")
+        print("✅ Migraciones aplicadas")
+        
+        if "--seed" in sys.argv or settings.seed_demo_data:
+            create_initial_data()
+            print("👤 Cliente de prueba creado:")
+            print("   - Email: juan.perez@email.com")
+            print("   - Contraseña: password123")
         
     except Exception as e:
         print(f"❌ Error inicializando la base de datos: {e}")
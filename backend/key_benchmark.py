@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Script para comparar las claves primarias de consumos antes y después de la
+migración 0003: texto aleatorio (``consumo_xxxxxxxx``, String(50)) frente a
+UUIDv7 nativo.
+
+Crea dos tablas temporales con las columnas e índices de ``consumos``, inserta
+``--filas`` filas en lotes de ``--lote`` en cada una y muestra filas por
+segundo (total y de los últimos lotes, cuando el índice ya no cabe en caché),
+el tamaño de la tabla y sus índices y las claves repetidas. Funciona contra
+PostgreSQL (``pg_relation_size``) o SQLite (``dbstat``; ahí el UUID se guarda
+como texto de 32 caracteres, así que el tamaño solo es representativo en
+PostgreSQL, con ``uuid`` nativo de 16 bytes):
+
+    DATABASE_URL=postgresql://... python key_benchmark.py --filas 5000000
+    python key_benchmark.py --url sqlite:////tmp/claves.db --filas 1000000
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.ids import uuid7
+
+METADATA = sa.MetaData()
+
+
+def _consumos_table(nombre: str, tipo_id) -> sa.Table:
+    return sa.Table(
+        nombre, METADATA,
+        sa.Column("id", tipo_id, primary_key=True),
+        sa.Column("cliente_id", sa.String(50), nullable=False, index=True),
+        sa.Column("servicio", sa.String(50), nullable=False),
+        sa.Column("cantidad", sa.Float, nullable=False),
+        sa.Column("fecha", sa.DateTime, nullable=False),
+        sa.Column("costo_total", sa.Float),
+        sa.Index(f"ix_{nombre}_fecha_id", "fecha", "id"),
+    )
+
+
+TABLAS = {
+    "texto": (_consumos_table("bench_claves_texto", sa.String(50)),
+              lambda fecha: f"consumo_{uuid.uuid4().hex[:8]}"),
+    "uuid7": (_consumos_table("bench_claves_uuid7", sa.Uuid()),
+              lambda fecha: uuid7(fecha)),
+}
+
+
+def _sizes(conn, tabla: sa.Table):
+    """(bytes de la tabla, bytes de sus índices)"""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(sa.text(
+            "SELECT pg_relation_size(:t), pg_indexes_size(:t)"
+        ), {"t": tabla.name}).one()
+    indices = [indice.name for indice in tabla.indexes] + [f"sqlite_autoindex_{tabla.name}_1"]
+    datos = conn.execute(sa.text("SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = :t"),
+                         {"t": tabla.name}).scalar()
+    indice = conn.execute(sa.text(
+        f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({', '.join(':i%d' % n for n in range(len(indices)))})"
+    ), {f"i{n}": nombre for n, nombre in enumerate(indices)}).scalar()
+    return datos, indice
+
+
+def run(engine, esquema: str, filas: int, lote: int):
+    tabla, nuevo_id = TABLAS[esquema]
+    tabla.drop(engine, checkfirst=True)
+    tabla.create(engine)
+
+    # Las claves de 8 caracteres hex colisionan a partir de unas decenas de
+    # miles de filas: las repetidas se omiten y se cuentan
+    dialecto = postgresql if engine.dialect.name == "postgresql" else sqlite
+    insercion = dialecto.insert(tabla).on_conflict_do_nothing(index_elements=["id"])
+    inicio_fecha = datetime.now() - timedelta(days=90)
+    tiempos = []
+    for desde in range(0, filas, lote):
+        filas_lote = []
+        for i in range(desde, min(desde + lote, filas)):
+            fecha = inicio_fecha + timedelta(seconds=i)
+            filas_lote.append({
+                "id": nuevo_id(fecha), "cliente_id": f"cliente_{i % 50000}", "servicio": "datos",
+                "cantidad": 1.0, "fecha": fecha, "costo_total": 0.01,
+            })
+        inicio = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(insercion, filas_lote)
+        tiempos.append((len(filas_lote), time.perf_counter() - inicio))
+
+    total = sum(n for n, _ in tiempos) / sum(t for _, t in tiempos)
+    ultimos = tiempos[-max(1, len(tiempos) // 10):]
+    final = sum(n for n, _ in ultimos) / sum(t for _, t in ultimos)
+    with engine.connect() as conn:
+        datos, indices = _sizes(conn, tabla)
+        colisiones = filas - conn.execute(sa.select(sa.func.count()).select_from(tabla)).scalar()
+    tabla.drop(engine)
+    return total, final, datos, indices, colisiones
+
+
+def main():
+    """Función principal del benchmark de claves"""
+    parser = argparse.ArgumentParser(description="Benchmark de claves primarias de consumos")
+    parser.add_argument("--url", default=os.environ.get("DATABASE_URL", "sqlite:////tmp/telcox_claves.db"))
+    parser.add_argument("--filas", type=int, default=1000000)
+    parser.add_argument("--lote", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.url)
+    print(f"🔑 {args.filas} filas en lotes de {args.lote} ({engine.dialect.name})")
+    print(f"   {'clave':<8} {'filas/s':>10} {'filas/s (último 10%)':>22} {'tabla MB':>10} "
+          f"{'índices MB':>11} {'colisiones':>11}")
+    for esquema in TABLAS:
+        total, final, datos, indices, colisiones = run(engine, esquema, args.filas, args.lote)
+        print(f"   {esquema:<8} {total:>10,.0f} {final:>22,.0f} {datos / 2**20:>10.1f} "
+              f"{indices / 2**20:>11.1f} {colisiones:>11}")
+
+
+if __name__ == "__main__":
+    main()
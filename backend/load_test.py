@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script de prueba de carga: lanza peticiones concurrentes contra un endpoint y
+muestra los códigos de respuesta y los percentiles de latencia.
+
+Sirve para comprobar el control de admisión: por encima de la capacidad, las
+peticiones sobrantes reciben 429/503 enseguida y el p99 de las admitidas se
+mantiene estable en lugar de crecer con la cola del pool de conexiones.
+
+    python load_test.py --url http://localhost:8000 --token <JWT> \\
+        --path "/dashboard/graficos?meses=24" --concurrencia 200 --duracion 30
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+async def _worker(cliente: httpx.AsyncClient, path: str, fin: float, codigos: Counter, latencias: dict):
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.get(path)
+            codigo = respuesta.status_code
+        except httpx.HTTPError:
+            codigo = "error"
+        codigos[codigo] += 1
+        latencias.setdefault(codigo, []).append(time.perf_counter() - inicio)
+
+async def run_load(url: str, token: str, path: str, concurrencia: int, duracion: float):
+    """Carga constante durante ``duracion`` segundos; devuelve códigos y latencias"""
+    codigos: Counter = Counter()
+    latencias: dict = {}
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=url, headers={"Authorization": f"Bearer {token}"},
+                                 limits=limites, timeout=30.0) as cliente:
+        fin = time.monotonic() + duracion
+        await asyncio.gather(*(
+            _worker(cliente, path, fin, codigos, latencias) for _ in range(concurrencia)
+        ))
+    return codigos, latencias
+
+def main():
+    """Función principal de la prueba de carga"""
+    parser = argparse.ArgumentParser(description="Prueba de carga de un endpoint")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--path", default="/dashboard/graficos")
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--duracion", type=float, default=10.0)
+    args = parser.parse_args()
+
+    codigos, latencias = asyncio.run(
+        run_load(args.url, args.token, args.path, args.concurrencia, args.duracion)
+    )
+    total = sum(codigos.values())
+    print(f"📈 {total} peticiones en {args.duracion:.0f}s ({total / args.duracion:.1f} req/s)")
+    for codigo in sorted(codigos, key=str):
+        valores = sorted(latencias[codigo])
+        print(f"   {codigo}: {codigos[codigo]:6d}  "
+              f"p50 {_percentil(valores, 0.50) * 1000:7.1f} ms  "
+              f"p99 {_percentil(valores, 0.99) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -56,7 +56,6 @@ def populate_consumo_data():
                 
                 # Consumo de datos
                 consumo_datos = Consumo(
-                    id=f"consumo_datos_{cliente.id}_{i}",
                     servicio="datos",
                     cantidad=round(random.uniform(0.1, 2.5), 2),
                     unidad="GB",
@@ -72,7 +71,6 @@ def populate_consumo_data():
                 
                 # Consumo de minutos
                 consumo_minutos = Consumo(
-                    id=f"consumo_min_{cliente.id}_{i}",
                     servicio="minutos",
                     cantidad=random.randint(5, 45),
                     unidad="min",
@@ -89,7 +87,6 @@ def populate_consumo_data():
                 # Consumo de SMS (solo algunos días)
                 if random.random() < 0.3:  # 30% de probabilidad
                     consumo_sms = Consumo(
-                        id=f"consumo_sms_{cliente.id}_{i}",
                         servicio="sms",
                         cantidad=random.randint(1, 5),
                         unidad="sms",
@@ -112,7 +109,6 @@ def populate_consumo_data():
         if facturas_existentes == 0:
             # Factura del mes actual
             factura_actual = Factura(
-                id=f"factura_{cliente.id}_actual",
                 numero_factura=f"FAC-{datetime.now().strftime('%Y%m')}-001",
                 monto_total=89.99,
                 monto_subtotal=75.99,
@@ -131,7 +127,6 @@ def populate_consumo_data():
             
             # Factura del mes anterior (pagada)
             factura_anterior = Factura(
-                id=f"factura_{cliente.id}_anterior",
                 numero_factura=f"FAC-{(datetime.now() - timedelta(days=30)).strftime('%Y%m')}-001",
                 monto_total=89.99,
                 monto_subtotal=75.99,
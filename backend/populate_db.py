@@ -176,7 +176,6 @@ def create_test_data():
                     costo_total = cantidad * costo_unitario
                     
                     consumo = Consumo(
-                        id=f"consumo_{cliente_data['id']}_{i}_{j}_{random.randint(1000, 9999)}",
                         servicio=servicio,
                         cantidad=cantidad,
                         unidad=unidades[servicio],
@@ -209,7 +208,6 @@ def create_test_data():
                 fecha_pago = fecha_emision + timedelta(days=random.randint(1, 10)) if estado == "pagada" else None
                 
                 factura = Factura(
-                    id=f"factura_{cliente_data['id']}_{i}_{random.randint(1000, 9999)}",
                     cliente_id=cliente_data["id"],
                     numero_factura=f"FAC-{cliente_data['id']}-{fecha_emision.strftime('%Y%m')}-{random.randint(1000, 9999)}",
                     monto_total=monto_total,
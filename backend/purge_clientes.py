@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Script para completar la purga de las cuentas eliminadas
+"""
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.purge import purge_pending_clientes
+
+def main():
+    """Función principal para purgar cuentas pendientes"""
+    print("🧹 Purgando cuentas eliminadas pendientes...")
+
+    try:
+        total = purge_pending_clientes()
+        print(f"✅ Cuentas purgadas: {total}")
+
+    except Exception as e:
+        print(f"❌ Error purgando cuentas: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Script para refrescar las tablas de resumen de analítica (programar con cron)
+"""
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.analytics import refresh_analytics
+
+def main():
+    """Función principal del refresco de analítica"""
+    print("📊 Refrescando analítica...")
+
+    db = SessionLocal()
+    try:
+        resumen = refresh_analytics(db)
+        print("✅ Analítica actualizada")
+        print(f"   - Ventanas de consumos: {resumen['consumos']['ventanas']}")
+        print(f"   - Grupos agregados: {resumen['consumos']['grupos']}")
+        print(f"   - Clientes con facturas recalculadas: {resumen['facturas']['clientes']}")
+
+    except Exception as e:
+        print(f"❌ Error refrescando analítica: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Script para compactar y borrar los consumos crudos antiguos
+"""
+import sys
+import os
+import argparse
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.retention import compact_consumos, get_retention_cutoff
+from app.config import settings
+
+def main():
+    """Función principal del job de retención"""
+    parser = argparse.ArgumentParser(description="Compactar consumos antiguos en consumos_diarios")
+    parser.add_argument("--dias", type=int, default=settings.retention_horizon_days,
+                        help="Días de consumos crudos que se conservan")
+    parser.add_argument("--lote", type=int, default=settings.retention_batch_size,
+                        help="Tamaño máximo de lote")
+    parser.add_argument("--pausa-ms", type=int, default=settings.retention_pause_ms,
+                        help="Pausa entre lotes en milisegundos")
+    parser.add_argument("--max-lotes", type=int, default=None,
+                        help="Detener tras N lotes (se reanuda desde el checkpoint)")
+    args = parser.parse_args()
+
+    corte = get_retention_cutoff(args.dias)
+    print(f"🗜️  Compactando consumos anteriores a {corte.strftime('%Y-%m-%d')}...")
+
+    db = SessionLocal()
+    try:
+        resumen = compact_consumos(
+            db,
+            horizonte_dias=args.dias,
+            batch_size=args.lote,
+            pausa_ms=args.pausa_ms,
+            max_lotes=args.max_lotes
+        )
+        print("✅ Retención completada")
+        print(f"   - Consumos compactados: {resumen['filas']}")
+        print(f"   - Días actualizados: {resumen['dias']}")
+        print(f"   - Lotes: {resumen['lotes']}")
+        print(f"   - Duración: {resumen['segundos']}s")
+
+    except Exception as e:
+        print(f"❌ Error en el job de retención: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
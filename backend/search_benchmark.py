@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Script para medir la búsqueda de clientes del panel de administración
+(``app/search.py``) con ``--clientes`` clientes sintéticos (1M, 10M).
+
+Inserta por lotes clientes de prueba con nombres, emails y teléfonos
+aleatorios hasta llegar a ``--clientes`` (con ``--conservar`` se reutilizan
+en la siguiente ejecución) y para cada búsqueda de ``--busquedas`` mide la
+primera página con el índice (trigramas en PostgreSQL, FTS5 en SQLite) y con
+el filtro ``ILIKE`` original (las de teléfono usan siempre su índice), con
+total exacto y estimado. Muestra el p50/p99 de cada combinación y el total
+devuelto. El esquema debe estar migrado (``alembic upgrade head``): sin
+migraciones no hay índices de búsqueda.
+
+    DATABASE_URL=postgresql://... python search_benchmark.py --clientes 10000000 --conservar
+    python search_benchmark.py --clientes 1000000 --repeticiones 5
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import insert
+
+from app import search
+from app.database import SessionLocal, engine
+from app.models import Cliente
+
+PREFIJO_BENCH = "bench_busq_"
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Carmen", "Javier", "Lucía", "Pedro", "Marta", "Sofía",
+           "Diego", "Elena", "Pablo", "Laura", "Andrés", "Paula", "Jorge", "Isabel", "Raúl", "Noelia"]
+APELLIDOS = ["García", "Pérez", "López", "Martínez", "Sánchez", "Gómez", "Fernández", "Díaz", "Ruiz",
+             "Hernández", "Álvarez", "Moreno", "Romero", "Navarro", "Torres", "Domínguez", "Vázquez",
+             "Ramos", "Gil", "Serrano", "Blanco", "Molina", "Castro", "Ortega", "Rubio", "Delgado"]
+DOMINIOS = ["gmail.com", "hotmail.com", "yahoo.es", "telcox.com", "empresa.com"]
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _synthetic_cliente(i: int, aleatorio: random.Random) -> dict:
+    nombre, apellido = aleatorio.choice(NOMBRES), aleatorio.choice(APELLIDOS)
+    segundo = aleatorio.choice(APELLIDOS)
+    usuario = f"{nombre}.{apellido}{i}".lower()
+    numero = f"{aleatorio.randrange(10 ** 8):08d}"
+    telefono = aleatorio.choice([
+        f"+54 9 11 {numero[:4]}-{numero[4:]}", f"+34{aleatorio.randrange(6, 8)}{numero}",
+        f"(011) {numero[:4]}-{numero[4:]}",
+    ])
+    return {
+        "id": f"{PREFIJO_BENCH}{i:08d}", "nombre": f"{nombre} {apellido} {segundo}",
+        "email": f"{usuario}@{aleatorio.choice(DOMINIOS)}", "telefono": telefono,
+        "password_hash": "-", "estado_cuenta": "suspendido",
+    }
+
+
+def _prepare_clients(total: int, lote: int, semilla: int) -> None:
+    """Insertar los clientes que falten hasta ``total``"""
+    db = SessionLocal()
+    try:
+        existentes = db.query(Cliente).filter(Cliente.id.startswith(PREFIJO_BENCH)).count()
+    finally:
+        db.close()
+    if existentes >= total:
+        print(f"   {existentes:,} clientes de prueba ya insertados")
+        return
+
+    aleatorio = random.Random(semilla + existentes)
+    inicio = time.perf_counter()
+    # Un lote por transacción: los índices (y los triggers FTS) se mantienen al insertar
+    for desde in range(existentes, total, lote):
+        filas = [_synthetic_cliente(i, aleatorio) for i in range(desde, min(desde + lote, total))]
+        with engine.begin() as conexion:
+            conexion.execute(insert(Cliente.__table__), filas)
+    transcurrido = time.perf_counter() - inicio
+    print(f"   {total - existentes:,} clientes insertados en {transcurrido:.0f} s "
+          f"({(total - existentes) / transcurrido:,.0f} por segundo)")
+
+
+def run(db, texto: str, repeticiones: int, indexado: bool, estimado: bool):
+    """Latencias de la primera página de ``texto`` y total devuelto"""
+    clave = str(db.get_bind().url)
+    search._indices_disponibles.pop(clave, None)
+    if not indexado:
+        # Como una base sin migraciones: filtro ILIKE sobre toda la tabla
+        search._indices_disponibles[clave] = False
+    latencias, total = [], 0
+    try:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            _, total = search.search_clientes(db, texto, None, 1, 20, estimar_total=estimado)
+            latencias.append(time.perf_counter() - inicio)
+    finally:
+        search._indices_disponibles.pop(clave, None)
+    latencias.sort()
+    return latencias, total
+
+
+def _cleanup() -> None:
+    db = SessionLocal()
+    try:
+        db.query(Cliente).filter(Cliente.id.startswith(PREFIJO_BENCH)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    """Función principal del benchmark de búsqueda de clientes"""
+    parser = argparse.ArgumentParser(description="Benchmark de la búsqueda de clientes")
+    parser.add_argument("--clientes", type=int, default=1000000)
+    parser.add_argument("--lote", type=int, default=10000)
+    parser.add_argument("--busquedas", nargs="+",
+                        default=["pérez", "mar", "lucia gomez", "javier.ruiz", "+54 9 11 1234", "zzz"])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--conservar", action="store_true", help="no borrar los clientes de prueba al terminar")
+    args = parser.parse_args()
+
+    print(f"🔎 Búsqueda de clientes sobre {args.clientes:,} clientes ({engine.dialect.name})")
+    _prepare_clients(args.clientes, args.lote, args.semilla)
+    db = SessionLocal()
+    try:
+        print(f"   {'búsqueda':<16} {'modo':>7} {'total':>9} {'p50 ms':>9} {'p99 ms':>9} {'resultados':>11}")
+        for texto in args.busquedas:
+            for indexado in (True, False):
+                for estimado in (True, False):
+                    latencias, total = run(db, texto, args.repeticiones, indexado, estimado)
+                    print(f"   {texto:<16} {'índice' if indexado else 'ILIKE':>7} "
+                          f"{'estimado' if estimado else 'exacto':>9} "
+                          f"{_percentil(latencias, 0.5) * 1000:>9.1f} {_percentil(latencias, 0.99) * 1000:>9.1f} "
+                          f"{total:>11,}")
+    finally:
+        db.close()
+        if not args.conservar:
+            _cleanup()
+
+
+if __name__ == "__main__":
+    main()
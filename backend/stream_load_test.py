@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Script de prueba de carga del canal SSE (``GET /user/stream``): abre
+``--conexiones`` conexiones inactivas contra un worker y comprueba que las
+mantiene sin degradar el resto de peticiones.
+
+Abre las conexiones a ``--ritmo`` por segundo con sockets asyncio (sin un
+cliente HTTP por conexión, para llegar a decenas de miles desde una sola
+máquina), las mantiene ``--duracion`` segundos leyendo solo los latidos y
+mientras tanto mide la latencia de ``--sonda``. Muestra las conexiones
+establecidas y rechazadas, las cerradas por el servidor, los latidos
+recibidos, el p50/p99 de la sonda y, con ``--pid``, la memoria del worker por
+conexión. Cada conexión usa un descriptor: subir antes ``ulimit -n`` en ambos
+lados.
+
+    ulimit -n 65536
+    python stream_load_test.py --url http://localhost:8000 --token <JWT> \\
+        --conexiones 20000 --ritmo 2000 --duracion 120 --pid <pid del worker>
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import httpx
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for linea in f:
+            if linea.startswith("VmRSS:"):
+                return int(linea.split()[1]) / 1024
+    return 0.0
+
+
+async def _hold(host: str, puerto: int, token: str, fin: float, estado: Counter):
+    """Una conexión SSE inactiva hasta ``fin``: solo lee latidos"""
+    try:
+        lector, escritor = await asyncio.open_connection(host, puerto)
+    except OSError:
+        estado["rechazadas"] += 1
+        return
+    try:
+        escritor.write(
+            f"GET /user/stream HTTP/1.1\r\nHost: {host}\r\nAuthorization: Bearer {token}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode()
+        )
+        await escritor.drain()
+        linea_estado = await lector.readline()
+        partes = linea_estado.split()
+        if len(partes) < 2 or partes[1] != b"200":
+            estado[f"http {partes[1].decode()}" if len(partes) > 1 else "sin respuesta"] += 1
+            return
+        estado["establecidas"] += 1
+        estado["abiertas"] += 1
+        estado["pico"] = max(estado["pico"], estado["abiertas"])
+        while True:
+            restante = fin - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                linea = await asyncio.wait_for(lector.readline(), restante)
+            except asyncio.TimeoutError:
+                break
+            if not linea:
+                estado["cerradas por el servidor"] += 1
+                break
+            if linea.startswith(b": ping"):
+                estado["latidos"] += 1
+        estado["abiertas"] -= 1
+    except OSError:
+        estado["errores"] += 1
+    finally:
+        escritor.close()
+
+
+async def _probe(cliente: httpx.AsyncClient, path: str, fin: float, latencias: list, errores: Counter):
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.get(path)
+            if respuesta.status_code != 200:
+                errores[respuesta.status_code] += 1
+        except httpx.HTTPError:
+            errores["error"] += 1
+        latencias.append(time.perf_counter() - inicio)
+        await asyncio.sleep(0.1)
+
+
+async def run_load(url: str, token: str, conexiones: int, ritmo: float, duracion: float,
+                   sonda: str, pid):
+    partes = urlsplit(url)
+    host, puerto = partes.hostname, partes.port or 80
+    estado: Counter = Counter()
+    latencias, errores_sonda = [], Counter()
+    rss_inicial = _rss_mb(pid) if pid else None
+
+    inicio = time.monotonic()
+    fin = inicio + conexiones / ritmo + duracion
+    tareas = []
+    async with httpx.AsyncClient(base_url=url, headers={"Authorization": f"Bearer {token}"},
+                                 timeout=30.0) as cliente:
+        sondeo = asyncio.create_task(_probe(cliente, sonda, fin, latencias, errores_sonda))
+        for i in range(conexiones):
+            # Apertura escalonada: el objetivo son las conexiones inactivas, no la avalancha
+            espera = inicio + i / ritmo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            tareas.append(asyncio.create_task(_hold(host, puerto, token, fin, estado)))
+        await asyncio.sleep(max(0.0, fin - time.monotonic() - 1.0))
+        rss_final = _rss_mb(pid) if pid else None
+        await asyncio.gather(*tareas, sondeo)
+
+    latencias.sort()
+    return estado, latencias, errores_sonda, rss_inicial, rss_final
+
+
+def main():
+    """Función principal de la prueba de conexiones inactivas"""
+    parser = argparse.ArgumentParser(description="Prueba de carga de conexiones SSE inactivas")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--conexiones", type=int, default=10000)
+    parser.add_argument("--ritmo", type=float, default=1000.0, help="conexiones nuevas por segundo")
+    parser.add_argument("--duracion", type=float, default=60.0, help="segundos con todas abiertas")
+    parser.add_argument("--sonda", default="/health/live")
+    parser.add_argument("--pid", type=int, default=None, help="pid del worker para medir su memoria")
+    args = parser.parse_args()
+
+    estado, latencias, errores_sonda, rss_inicial, rss_final = asyncio.run(run_load(
+        args.url, args.token, args.conexiones, args.ritmo, args.duracion, args.sonda, args.pid
+    ))
+
+    print(f"📡 {args.conexiones} conexiones SSE a {args.url}")
+    print(f"   establecidas: {estado['establecidas']}, abiertas a la vez (máx.): {estado['pico']}")
+    for clave in sorted(k for k in estado if k not in ("establecidas", "abiertas", "pico")):
+        print(f"   {clave}: {estado[clave]}")
+    print(f"   sonda {args.sonda}: {len(latencias)} peticiones, "
+          f"p50 {_percentil(latencias, 0.5) * 1000:.1f} ms, p99 {_percentil(latencias, 0.99) * 1000:.1f} ms, "
+          f"errores {dict(errores_sonda)}")
+    if rss_inicial is not None:
+        por_conexion = (rss_final - rss_inicial) * 1024 / max(estado["pico"], 1)
+        print(f"   memoria del worker: {rss_inicial:.0f} MB → {rss_final:.0f} MB "
+              f"({por_conexion:.1f} KB por conexión)")
+
+
+if __name__ == "__main__":
+    main()
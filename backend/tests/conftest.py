@@ -0,0 +1,85 @@
+"""
+Configuración común de los tests: base de datos SQLite temporal con el
+esquema de los modelos, sin PostgreSQL ni Redis.
+"""
+import os
+import tempfile
+import uuid
+
+_directorio = tempfile.mkdtemp(prefix="telcox-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'test.db')}"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre un esquema vacío (se recrea en cada test)"""
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(db):
+    """Cliente HTTP de la API sobre el esquema del test"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    """Archivo Parquet en un directorio temporal"""
+    monkeypatch.setattr(settings, "archive_dir", str(tmp_path / "archivo"))
+    return tmp_path / "archivo"
+
+
+def make_cliente(db, cliente_id: str, **campos) -> models.Cliente:
+    cliente = models.Cliente(
+        id=cliente_id,
+        nombre=campos.pop("nombre", f"Cliente {cliente_id}"),
+        email=campos.pop("email", f"{cliente_id}@telcox.test"),
+        telefono=campos.pop("telefono", "+5491100000000"),
+        password_hash="x",
+        **campos
+    )
+    db.add(cliente)
+    db.commit()
+    return cliente
+
+
+def auth_headers(cliente: models.Cliente) -> dict:
+    from app.auth import create_access_token
+
+    token = create_access_token({"sub": cliente.email, "cliente_id": cliente.id})
+    return {"Authorization": f"Bearer {token}"}
+
+
+# Filas de consumos sintéticos para las pruebas de volumen
+def synthetic_consumos(clientes, n: int, desde: datetime, horas: int):
+    for i in range(n):
+        yield {
+            "id": uuid.uuid4(),
+            "cliente_id": clientes[i % len(clientes)],
+            "servicio": ("datos", "minutos", "sms")[i % 3],
+            "cantidad": float(i % 7 + 1),
+            "unidad": "MB",
+            "fecha": desde + timedelta(hours=i % horas),
+            "tipo_consumo": "normal",
+            "costo_unitario": 0.0,
+            "costo_total": 0.01,
+        }
@@ -0,0 +1,32 @@
+"""
+Acceso a las rutas de administración (``ADMIN_IDS``).
+"""
+import pytest
+
+from app.config import settings
+
+from .conftest import auth_headers, make_cliente
+
+
+@pytest.fixture
+def admin(db, monkeypatch):
+    cliente = make_cliente(db, "cli_admin")
+    monkeypatch.setattr(settings, "admin_ids", [cliente.id])
+    return cliente
+
+
+def test_analytics_requires_admin(db, client, admin):
+    cliente = make_cliente(db, "cli_normal")
+
+    assert client.get("/admin/analytics", headers=auth_headers(cliente)).status_code == 403
+    assert client.get("/admin/analytics", headers=auth_headers(admin)).status_code == 200
+
+
+def test_alertas_require_admin(db, client, admin):
+    cliente = make_cliente(db, "cli_normal")
+    alerta = "01890000-0000-7000-8000-000000000000"
+
+    assert client.get("/admin/alertas", headers=auth_headers(cliente)).status_code == 403
+    assert client.put(f"/admin/alertas/{alerta}/revisada", headers=auth_headers(cliente)).status_code == 403
+    assert client.get("/admin/alertas", headers=auth_headers(admin)).status_code == 200
+    assert client.put(f"/admin/alertas/{alerta}/revisada", headers=auth_headers(admin)).status_code == 404
@@ -0,0 +1,14 @@
+"""
+Marcas de agua del refresco de analítica (``app/analytics.py``).
+"""
+from app.analytics import JOB_CONSUMOS, _lock_watermark
+from app.models import JobCheckpoint
+
+
+def test_lock_watermark_creates_row_without_committing(db):
+    assert _lock_watermark(db, JOB_CONSUMOS) is None
+    # Una segunda creación (otra petición concurrente) no choca con la primera
+    assert _lock_watermark(db, JOB_CONSUMOS) is None
+    db.rollback()
+
+    assert db.get(JobCheckpoint, JOB_CONSUMOS) is None
@@ -0,0 +1,87 @@
+import csv
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import archive
+from app.config import settings
+from app.exports import export_consumos
+from app.models import Consumo, ConsumoDiario, Eliminacion
+
+from .conftest import make_cliente
+
+pytest.importorskip("pyarrow")
+
+
+def _add_consumos(db, cliente_id, n):
+    for i in range(n):
+        db.add(Consumo(
+            servicio="datos", cantidad=1.0, unidad="MB", cliente_id=cliente_id,
+            fecha=datetime(2020, 1, 1) + timedelta(hours=i)
+        ))
+    db.commit()
+
+
+def test_archive_moves_rows_and_reads_them_back(db, archive_dir):
+    make_cliente(db, "c1")
+    _add_consumos(db, "c1", 12)
+
+    resumen = archive.archive_consumos(db, antes_de=datetime(2021, 1, 1), chunk_size=5)
+
+    assert resumen["filas"] == 12
+    assert db.query(Consumo).count() == 0
+    # Siguen disponibles en la API: no son borrados para la sincronización
+    assert db.query(Eliminacion).count() == 0
+    filas = archive.read_archived_consumos("c1", datetime(2019, 1, 1), datetime(2021, 1, 1))
+    assert len(filas) == 12
+
+
+def test_retry_after_crash_does_not_duplicate_rows(db, archive_dir, monkeypatch):
+    make_cliente(db, "c1")
+    _add_consumos(db, "c1", 25)
+
+    # El segundo lote se escribe en disco pero su borrado no llega a confirmarse
+    original = db.commit
+    llamadas = []
+
+    def falla_en_el_segundo():
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            raise RuntimeError("caída")
+        return original()
+
+    monkeypatch.setattr(db, "commit", falla_en_el_segundo)
+    with pytest.raises(RuntimeError):
+        archive.archive_consumos(db, antes_de=datetime(2021, 1, 1), chunk_size=10)
+    monkeypatch.setattr(db, "commit", original)
+    assert db.query(Consumo).count() == 15
+
+    # Reintento con otros límites de lote
+    archive.archive_consumos(db, antes_de=datetime(2021, 1, 1), chunk_size=7)
+
+    assert db.query(Consumo).count() == 0
+    filas = archive.read_archived_consumos("c1", datetime(2019, 1, 1), datetime(2021, 1, 1))
+    assert len(filas) == 25
+
+
+def test_export_merges_archive_daily_and_live_rows_in_order(db, archive_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "archive_enabled", True)
+    make_cliente(db, "c1")
+    _add_consumos(db, "c1", 12)
+    archive.archive_consumos(db, antes_de=datetime(2021, 1, 1), chunk_size=5)
+    # Consumos que siguen en la tabla y un día compactado, intercalados con el archivo
+    for i in range(12):
+        db.add(Consumo(servicio="sms", cantidad=1.0, unidad="unidades", cliente_id="c1",
+                       fecha=datetime(2020, 1, 1, i, 30)))
+    db.add(ConsumoDiario(cliente_id="c1", fecha=datetime(2020, 1, 1, 5, 15),
+                         datos_consumidos=3.0, minutos_consumidos=2, sms_consumidos=1, costo_total=0.5))
+    db.commit()
+
+    resumen = export_consumos(db, "c1", datetime(2019, 12, 1), None, str(tmp_path / "export.csv"))
+
+    with open(resumen["fichero"], newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+    fechas = [datetime.fromisoformat(fila["fecha"]) for fila in filas]
+    assert resumen["filas"] == len(filas) == 12 + 12 + 3
+    assert fechas == sorted(fechas)
+    assert fechas[0] == datetime(2020, 1, 1) and fechas[1] == datetime(2020, 1, 1, 0, 30)
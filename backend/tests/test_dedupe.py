@@ -0,0 +1,72 @@
+"""
+Supresión de duplicados en ``POST /consumos`` (``app/dedupe.py``).
+"""
+from datetime import datetime
+
+from app import batching, dedupe
+from app.models import Consumo
+
+from .conftest import auth_headers, make_cliente
+
+
+def _consumo(cliente_id: str, event_id: str) -> dict:
+    return {
+        "cliente_id": cliente_id, "servicio": "datos", "cantidad": 5.0, "unidad": "MB",
+        "fecha": datetime.now().isoformat(), "event_id": event_id,
+    }
+
+
+class _LostRaceWriter:
+    """Escritor agrupado que siempre pierde la carrera del índice único"""
+
+    async def submit(self, fila: dict) -> bool:
+        return False
+
+
+def test_resent_event_returns_existing_consumo(db, client):
+    cliente = make_cliente(db, "cli_dup")
+    cabeceras = auth_headers(cliente)
+
+    primero = client.post("/consumos", json=_consumo(cliente.id, "cdr-1"), headers=cabeceras)
+    segundo = client.post("/consumos", json=_consumo(cliente.id, "cdr-1"), headers=cabeceras)
+
+    assert primero.status_code == 200
+    assert segundo.status_code == 200
+    assert segundo.json()["id"] == primero.json()["id"]
+    assert db.query(Consumo).count() == 1
+
+
+def test_group_commit_lost_race_returns_winner(db, client, monkeypatch):
+    cliente = make_cliente(db, "cli_dup")
+    cabeceras = auth_headers(cliente)
+    ganador = client.post("/consumos", json=_consumo(cliente.id, "cdr-1"), headers=cabeceras).json()
+
+    # El filtro responde "nuevo": la petición llega al escritor y pierde la carrera
+    monkeypatch.setattr(dedupe, "is_new_event", lambda cliente_id, event_id: True)
+    monkeypatch.setattr(batching, "consumo_writer", _LostRaceWriter())
+    respuesta = client.post("/consumos", json=_consumo(cliente.id, "cdr-1"), headers=cabeceras)
+
+    assert respuesta.status_code == 200
+    assert respuesta.json()["id"] == ganador["id"]
+
+
+def test_group_commit_lost_race_without_winner_is_conflict(db, client, monkeypatch):
+    cliente = make_cliente(db, "cli_dup")
+
+    # El ganador ya no está (compactado o archivado): 409, no 500
+    monkeypatch.setattr(dedupe, "is_new_event", lambda cliente_id, event_id: True)
+    monkeypatch.setattr(batching, "consumo_writer", _LostRaceWriter())
+    respuesta = client.post("/consumos", json=_consumo(cliente.id, "cdr-1"), headers=auth_headers(cliente))
+
+    assert respuesta.status_code == 409
+
+
+def test_bloom_filter_has_no_false_negatives():
+    filtro = dedupe.BloomFilter(capacidad=10000, error=0.01, ventana_s=3600)
+    claves = [dedupe.get_event_key("cli", f"cdr-{i}") for i in range(10000)]
+    for clave in claves:
+        filtro.add(clave)
+
+    assert all(filtro.might_contain(clave) for clave in claves)
+    falsos = sum(filtro.might_contain(dedupe.get_event_key("otro", f"cdr-{i}")) for i in range(10000))
+    assert falsos < 300
@@ -0,0 +1,116 @@
+"""
+Deltas del canal SSE (``app/events.py``).
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app import events
+from app.ids import uuid7
+from app.models import Consumo
+from app.schemas import ConsumoResponse
+
+from .conftest import make_cliente
+
+
+def test_consumo_delta_has_response_shape(db, monkeypatch):
+    make_cliente(db, "cli_ev")
+    publicados = []
+    monkeypatch.setattr(events, "publish_event", lambda cliente_id, tipo, datos: publicados.append(datos))
+
+    db.add(Consumo(cliente_id="cli_ev", servicio="datos", cantidad=5.0, unidad="MB",
+                   fecha=datetime(2026, 10, 1, 12), costo_total=0.5))
+    db.commit()
+
+    assert len(publicados) == 1
+    delta = publicados[0]
+    assert set(delta) == set(ConsumoResponse.model_fields)
+    # La app inserta el delta como una fila de la tabla
+    fila = ConsumoResponse(**json.loads(json.dumps(delta, default=events._json_default)))
+    assert fila.cliente_id == "cli_ev"
+    assert fila.tipo_consumo == "normal"
+
+
+def test_group_commit_delta_has_response_shape():
+    fila = {
+        "id": uuid7(), "cliente_id": "cli_ev", "servicio": "sms", "cantidad": 1.0, "unidad": "unidades",
+        "fecha": datetime(2026, 10, 1, 12), "tipo_consumo": "roaming", "costo_unitario": 0.1,
+        "costo_total": 0.1, "created_at": datetime.now(timezone.utc),
+    }
+    delta = events.describe_consumo(Consumo(**fila))
+
+    assert set(delta) == set(ConsumoResponse.model_fields)
+    assert delta["created_at"] == fila["created_at"]
+    assert ConsumoResponse(**delta).tipo_consumo == "roaming"
+
+
+class _SlowRedis:
+    """Cliente Redis que tarda en cada envío"""
+
+    def __init__(self):
+        self.enviados = []
+
+    def pipeline(self, transaction=True):
+        return _SlowPipeline(self)
+
+
+class _SlowPipeline:
+    def __init__(self, redis):
+        self.redis, self.pendientes = redis, []
+
+    def publish(self, canal, mensaje):
+        self.pendientes.append((canal, mensaje))
+
+    def execute(self):
+        time.sleep(0.2)
+        self.redis.enviados.extend(self.pendientes)
+
+
+def test_redis_publish_does_not_block_caller():
+    pytest.importorskip("redis")
+    broker = events.RedisEventBroker("redis://localhost:6379/0", queue_size=10)
+    broker._redis = _SlowRedis()
+
+    inicio = time.perf_counter()
+    for i in range(100):
+        broker.publish("cli_ev", f"m{i}")
+    assert time.perf_counter() - inicio < 0.1
+
+    broker.flush()
+    assert [m for _, m in broker._redis.enviados] == [f"m{i}" for i in range(100)]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere os.fork")
+def test_redis_publish_after_fork_reaches_redis():
+    pytest.importorskip("redis")
+    # Como con ``preload_app``: el broker (y su hilo) se crean en el arbiter
+    broker = events.RedisEventBroker("redis://localhost:6379/0", queue_size=10)
+    broker._redis = _SlowRedis()
+    broker.publish("cli_ev", "padre")
+    broker.flush()
+
+    lectura, escritura = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        codigo = 1
+        try:
+            broker._redis.enviados.clear()
+            broker.publish("cli_ev", "hijo")
+            broker.flush()
+            os.write(escritura, json.dumps([m for _, m in broker._redis.enviados]).encode())
+            codigo = 0
+        finally:
+            sys.stdout.flush()
+            os._exit(codigo)
+
+    os.close(escritura)
+    with os.fdopen(lectura) as f:
+        enviados_hijo = json.loads(f.read() or "null")
+    os.waitpid(pid, 0)
+
+    assert enviados_hijo == ["hijo"]
+    assert [m for _, m in broker._redis.enviados] == ["padre"]
@@ -0,0 +1,83 @@
+"""
+Grupos de líneas con bolsa compartida (``/admin/grupos``).
+"""
+from datetime import datetime
+
+import pytest
+
+from app import jobs
+from app.config import settings
+from app.models import AnalyticsClienteMes, Cliente, ConsumoGrupoMes, Grupo, Plan
+from app.purge import purge_cliente
+
+from .conftest import auth_headers, make_cliente
+
+
+@pytest.fixture
+def admin(db, monkeypatch):
+    cliente = make_cliente(db, "cli_admin")
+    monkeypatch.setattr(settings, "admin_ids", [cliente.id])
+    # La purga se lanza a mano en cada test
+    monkeypatch.setattr(jobs, "_dispatch", lambda job: None)
+    return cliente
+
+
+@pytest.fixture
+def grupo(db, client, admin):
+    db.add(Plan(id="familiar", nombre="Familiar", precio_mensual=30.0, datos_incluidos=50.0))
+    db.commit()
+    respuesta = client.post("/admin/grupos", headers=auth_headers(admin),
+                            json={"nombre": "Familia", "plan_id": "familiar"})
+    assert respuesta.status_code == 200
+    return respuesta.json()["id"]
+
+
+def _add_line(db, client, admin, grupo, cliente_id: str, datos: float):
+    make_cliente(db, cliente_id, email=f"{cliente_id}@telcox.test")
+    db.add(AnalyticsClienteMes(cliente_id=cliente_id, mes="2026-10", datos=datos,
+                               minutos=0.0, sms=0.0, costo=0.0))
+    db.commit()
+    respuesta = client.put(f"/admin/grupos/{grupo}/miembros/{cliente_id}", headers=auth_headers(admin))
+    assert respuesta.status_code == 200
+
+
+def _pooled(db, grupo) -> tuple:
+    db.expire_all()
+    fila = db.query(ConsumoGrupoMes).one()
+    return db.query(Grupo).one().miembros, fila.datos
+
+
+def test_grupo_endpoints_require_admin(db, client, admin, grupo):
+    cliente = make_cliente(db, "cli_normal")
+    cabeceras = auth_headers(cliente)
+
+    assert client.post("/admin/grupos", headers=cabeceras,
+                       json={"nombre": "Otro", "plan_id": "familiar"}).status_code == 403
+    assert client.put(f"/admin/grupos/{grupo}/miembros/cli_normal", headers=cabeceras).status_code == 403
+    assert client.delete(f"/admin/grupos/{grupo}/miembros/cli_normal", headers=cabeceras).status_code == 403
+    assert client.get(f"/admin/grupos/{grupo}/consumo", headers=cabeceras).status_code == 403
+
+
+def test_deleted_line_leaves_its_group(db, client, admin, grupo):
+    _add_line(db, client, admin, grupo, "cli_a", 100.0)
+    _add_line(db, client, admin, grupo, "cli_b", 40.0)
+    assert _pooled(db, grupo) == (2, 140.0)
+
+    assert client.delete("/admin/users/cli_a", headers=auth_headers(admin)).status_code == 202
+    assert _pooled(db, grupo) == (1, 40.0)
+
+    purge_cliente("cli_a")
+    assert _pooled(db, grupo) == (1, 40.0)
+
+
+def test_purge_detaches_line_still_in_group(db, client, admin, grupo):
+    _add_line(db, client, admin, grupo, "cli_a", 100.0)
+    _add_line(db, client, admin, grupo, "cli_b", 40.0)
+    # Baja marcada sin pasar por DELETE /admin/users (p. ej. anterior al cambio)
+    cliente = db.get(Cliente, "cli_a")
+    cliente.eliminado_en = datetime.now()
+    db.commit()
+
+    purge_cliente("cli_a")
+
+    assert _pooled(db, grupo) == (1, 40.0)
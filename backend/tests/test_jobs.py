@@ -0,0 +1,63 @@
+"""
+Envío de trabajos con ``POST /jobs`` (``app/jobs.py``).
+"""
+import json
+import uuid
+
+import pytest
+
+from app import jobs
+from app.config import settings
+from app.models import Job
+
+from .conftest import auth_headers, make_cliente
+
+
+@pytest.fixture(autouse=True)
+def no_dispatch(monkeypatch):
+    # Solo se comprueba el registro del trabajo, no su ejecución
+    monkeypatch.setattr(jobs, "_dispatch", lambda job: None)
+
+
+def test_user_can_only_export_own_consumos(db, client):
+    cliente = make_cliente(db, "cli_job")
+
+    respuesta = client.post("/jobs", headers=auth_headers(cliente), json={
+        "tipo": "export_consumos", "parametros": {"cliente_id": "otro", "desde": "2026-01-01"},
+    })
+
+    assert respuesta.status_code == 202
+    job = db.get(Job, uuid.UUID(respuesta.json()["id"]))
+    assert json.loads(job.parametros)["cliente_id"] == "cli_job"
+
+
+@pytest.mark.parametrize("parametros", [
+    {}, {"desde": ""}, {"desde": None}, {"desde": "ayer"}, {"desde": "2026-01-01", "hasta": "mañana"},
+])
+def test_export_requires_valid_dates(db, client, parametros):
+    cliente = make_cliente(db, "cli_job")
+
+    respuesta = client.post("/jobs", headers=auth_headers(cliente), json={
+        "tipo": "export_consumos", "parametros": parametros,
+    })
+
+    assert respuesta.status_code == 422
+    assert db.query(Job).count() == 0
+
+
+@pytest.mark.parametrize("tipo", ["billing_run", "purge_pending_clientes", "refresh_analytics", "desconocido"])
+def test_user_cannot_submit_restricted_jobs(db, client, tipo):
+    cliente = make_cliente(db, "cli_job")
+
+    respuesta = client.post("/jobs", headers=auth_headers(cliente), json={"tipo": tipo})
+
+    assert respuesta.status_code == 403
+
+
+def test_admin_can_submit_restricted_jobs(db, client, monkeypatch):
+    admin = make_cliente(db, "cli_admin")
+    monkeypatch.setattr(settings, "admin_ids", [admin.id])
+
+    respuesta = client.post("/jobs", headers=auth_headers(admin), json={"tipo": "refresh_analytics"})
+
+    assert respuesta.status_code == 202
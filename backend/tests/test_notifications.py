@@ -0,0 +1,70 @@
+"""
+Avisos de umbral de consumo y de saldo (``app/notifications.py``).
+"""
+import json
+from datetime import datetime
+
+from app.config import settings
+from app.models import NotificacionOutbox, Plan, Saldo
+from app.notifications import record_usage
+
+from .conftest import make_cliente
+
+
+def _consumo(cantidad: float) -> dict:
+    return {"cliente_id": "cli_umbral", "servicio": "minutos", "cantidad": cantidad,
+            "fecha": datetime(2026, 10, 5, 12)}
+
+
+def test_threshold_is_notified_once_when_crossed(db):
+    db.add(Plan(id="plan_basico", nombre="Básico", precio_mensual=10.0, minutos_incluidos=100))
+    make_cliente(db, "cli_umbral", plan_actual="básico")
+
+    assert record_usage(db, [_consumo(70.0)]) == 0
+    assert record_usage(db, [_consumo(15.0)]) == 1
+    assert record_usage(db, [_consumo(5.0)]) == 0
+    # Un lote que cruza de una vez el 100 % avisa solo de ese umbral
+    assert record_usage(db, [_consumo(6.0), _consumo(6.0)]) == 1
+    db.commit()
+
+    avisos = [json.loads(aviso.datos) for aviso in db.query(NotificacionOutbox).order_by(NotificacionOutbox.id)]
+    assert [(aviso["umbral"], aviso["usado"]) for aviso in avisos] == [(80, 85.0), (100, 102.0)]
+
+
+def _avisos_saldo(db) -> list:
+    return [
+        json.loads(aviso.datos)
+        for aviso in db.query(NotificacionOutbox).filter(NotificacionOutbox.tipo == "saldo_bajo")
+        .order_by(NotificacionOutbox.id)
+    ]
+
+
+def test_low_balance_is_notified_once_when_crossed(db, monkeypatch):
+    monkeypatch.setattr(settings, "notify_low_balance", 10.0)
+    make_cliente(db, "cli_saldo")
+    db.add(Saldo(id="saldo_1", cliente_id="cli_saldo", saldo_actual=15.0, saldo_disponible=15.0,
+                 fecha_ultima_actualizacion=datetime(2026, 10, 1), moneda="EUR"))
+    db.commit()
+    saldo = db.get(Saldo, "saldo_1")
+
+    # Tras cada commit el atributo está expirado: el valor anterior se recarga
+    for valor in (12.0, 8.0, 5.0, 20.0, 9.5):
+        saldo.saldo_disponible = valor
+        db.commit()
+
+    assert [(a["saldo_anterior"], a["saldo_disponible"]) for a in _avisos_saldo(db)] == [(12.0, 8.0), (20.0, 9.5)]
+    assert _avisos_saldo(db)[0]["moneda"] == "EUR"
+
+
+def test_low_balance_notice_is_rolled_back_with_the_change(db, monkeypatch):
+    monkeypatch.setattr(settings, "notify_low_balance", 10.0)
+    make_cliente(db, "cli_saldo")
+    db.add(Saldo(id="saldo_1", cliente_id="cli_saldo", saldo_disponible=15.0,
+                 fecha_ultima_actualizacion=datetime(2026, 10, 1)))
+    db.commit()
+
+    db.get(Saldo, "saldo_1").saldo_disponible = 3.0
+    db.rollback()
+
+    assert _avisos_saldo(db) == []
+    assert db.get(Saldo, "saldo_1").saldo_disponible == 15.0
@@ -0,0 +1,105 @@
+import os
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+from sqlalchemy import insert
+
+from app import archive
+from app.database import SessionLocal
+from app.models import Cliente, Consumo, Factura
+from app.purge import purge_cliente
+
+from .conftest import make_cliente, synthetic_consumos
+
+
+def _same_shard_ids():
+    """Dos ids de cliente que comparten shard del archivo"""
+    primero = "c1"
+    shard = archive.get_cliente_shard(primero)
+    segundo = next(
+        f"c{i}" for i in range(2, 10000) if archive.get_cliente_shard(f"c{i}") == shard
+    )
+    return primero, segundo
+
+
+def _insert_consumos(db, cliente_id, n, desde):
+    generador = synthetic_consumos([cliente_id], n, desde, horas=24 * 300)
+    while True:
+        bloque = list(islice(generador, 50_000))
+        if not bloque:
+            return
+        db.execute(insert(Consumo), bloque)
+        db.commit()
+
+
+def _mark_deleted(db, cliente_id):
+    db.get(Cliente, cliente_id).eliminado_en = datetime.now()
+    db.commit()
+
+
+def test_purge_removes_database_and_archived_rows(db, archive_dir):
+    pytest.importorskip("pyarrow")
+    purgado, otro = _same_shard_ids()
+    for cliente_id in (purgado, otro):
+        make_cliente(db, cliente_id)
+        _insert_consumos(db, cliente_id, 30, datetime(2020, 1, 1))
+        _insert_consumos(db, cliente_id, 5, datetime.now() - timedelta(days=1))
+    db.add(Factura(
+        cliente_id=purgado, numero_factura="F-1", monto_total=10.0,
+        fecha_emision=datetime.now(), fecha_vencimiento=datetime.now()
+    ))
+    db.commit()
+    archive.archive_consumos(db, antes_de=datetime(2021, 1, 1), chunk_size=20)
+    _mark_deleted(db, purgado)
+
+    resumen = purge_cliente(purgado, chunk_size=7)
+
+    assert resumen["consumos"] == 5
+    assert resumen["facturas"] == 1
+    assert resumen["archivo"] == 30
+    db.expire_all()
+    assert db.get(Cliente, purgado) is None
+    assert archive.read_archived_consumos(purgado, datetime(2019, 1, 1), datetime(2021, 1, 1)) == []
+    # Las filas de otros clientes del mismo fichero se conservan
+    assert len(archive.read_archived_consumos(otro, datetime(2019, 1, 1), datetime(2021, 1, 1))) == 30
+    assert db.query(Consumo).filter(Consumo.cliente_id == otro).count() == 5
+    # Repetir la purga no falla ni borra nada más
+    assert archive.purge_archived_consumos(purgado) == 0
+
+
+def _peak_purge_memory(db, eventos: int, chunk_size: int) -> int:
+    make_cliente(db, "c1")
+    _insert_consumos(db, "c1", eventos, datetime.now() - timedelta(days=300))
+    _mark_deleted(db, "c1")
+    db.close()
+
+    tracemalloc.start()
+    try:
+        resumen = purge_cliente("c1", chunk_size=chunk_size)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert resumen["consumos"] == eventos
+    sesion = SessionLocal()
+    try:
+        assert sesion.query(Consumo).count() == 0
+    finally:
+        sesion.close()
+    return pico
+
+
+def test_purge_memory_does_not_depend_on_history_size(db):
+    # El pico lo marca un lote de ids, no el historial completo
+    pico = _peak_purge_memory(db, eventos=50_000, chunk_size=1000)
+    assert pico < 8 * 2**20
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.environ.get("TELCOX_SLOW_TESTS"), reason="prueba de volumen (TELCOX_SLOW_TESTS=1)")
+def test_purge_of_a_million_events_stays_within_memory_bound(db):
+    eventos = int(os.environ.get("TELCOX_SLOW_ROWS", 1_000_000))
+    pico = _peak_purge_memory(db, eventos=eventos, chunk_size=5000)
+    assert pico < 32 * 2**20
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+from sqlalchemy import func, insert
+
+from app import retention
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Consumo, ConsumoDiario, Eliminacion
+
+from .conftest import auth_headers, make_cliente, synthetic_consumos
+
+
+def _add_consumos(db, cliente_id, dias_atras, por_dia):
+    inicio = datetime.now() - timedelta(days=dias_atras)
+    for dia in range(dias_atras - 10):
+        for i in range(por_dia):
+            db.add(Consumo(
+                servicio="datos", cantidad=10.0, unidad="MB", cliente_id=cliente_id,
+                fecha=inicio + timedelta(days=dia, hours=i), costo_total=0.5
+            ))
+    db.commit()
+
+
+def _totales(db):
+    return db.query(
+        func.count(ConsumoDiario.id), func.sum(ConsumoDiario.datos_consumidos), func.sum(ConsumoDiario.costo_total)
+    ).one()
+
+
+def test_compaction_folds_old_rows_once(db):
+    make_cliente(db, "c1")
+    _add_consumos(db, "c1", dias_atras=40, por_dia=3)
+
+    resumen = retention.compact_consumos(db, horizonte_dias=5, batch_size=7, pausa_ms=0)
+
+    assert resumen["filas"] == 90
+    assert db.query(Consumo).count() == 0
+    assert _totales(db) == (30, 900.0, pytest.approx(45.0))
+    assert db.query(Eliminacion).count() == 0
+
+    # Una segunda pasada no encuentra nada que sumar
+    assert retention.compact_consumos(db, horizonte_dias=5, pausa_ms=0)["filas"] == 0
+    assert _totales(db) == (30, 900.0, pytest.approx(45.0))
+
+
+def test_concurrent_run_does_not_double_count(db, monkeypatch):
+    make_cliente(db, "c1")
+    _add_consumos(db, "c1", dias_atras=20, por_dia=2)
+
+    # Otra ejecución compacta todo entre la lectura del lote y su borrado
+    original = retention.delete
+    otra_hecha = []
+
+    def delete_tras_otra_ejecucion(tabla):
+        if not otra_hecha:
+            otra_hecha.append(True)
+            otra = SessionLocal()
+            try:
+                retention.compact_consumos(otra, horizonte_dias=5, pausa_ms=0)
+            finally:
+                otra.close()
+        return original(tabla)
+
+    monkeypatch.setattr(retention, "delete", delete_tras_otra_ejecucion)
+    resumen = retention.compact_consumos(db, horizonte_dias=5, batch_size=5, pausa_ms=0)
+
+    assert resumen["filas"] == 0
+    assert _totales(db) == (10, 200.0, pytest.approx(10.0))
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not os.environ.get("TELCOX_SLOW_TESTS"), reason="prueba de volumen (TELCOX_SLOW_TESTS=1)")
+def test_ingest_latency_stays_flat_while_compacting(db, client, monkeypatch):
+    """Millones de consumos antiguos: POST /consumos mantiene su latencia mientras se compacta"""
+    filas = int(os.environ.get("TELCOX_SLOW_ROWS", 2_000_000))
+    lotes_retencion = 200
+    clientes = [make_cliente(db, f"c{i}") for i in range(100)]
+    cabeceras = auth_headers(clientes[0])
+
+    generador = synthetic_consumos([cliente.id for cliente in clientes], filas, datetime.now() - timedelta(days=400), horas=24 * 300)
+    while True:
+        bloque = list(islice(generador, 50_000))
+        if not bloque:
+            break
+        db.execute(insert(Consumo), bloque)
+        db.commit()
+
+    def medir(n):
+        latencias = []
+        for i in range(n):
+            inicio = time.perf_counter()
+            respuesta = client.post("/consumos", headers=cabeceras, json={
+                "cliente_id": "c0", "servicio": "datos", "cantidad": 1.0, "unidad": "MB",
+                "fecha": datetime.now().isoformat(), "costo_total": 0.01
+            })
+            assert respuesta.status_code == 200, respuesta.text
+            latencias.append(time.perf_counter() - inicio)
+        latencias.sort()
+        return latencias[len(latencias) // 2], latencias[int(len(latencias) * 0.99)]
+
+    monkeypatch.setattr(settings, "consumo_group_commit", False)
+    base_p50, base_p99 = medir(200)
+
+    errores = []
+
+    def compactar():
+        sesion = SessionLocal()
+        try:
+            retention.compact_consumos(sesion, batch_size=1000, pausa_ms=50, max_lotes=lotes_retencion)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            sesion.close()
+
+    hilo = threading.Thread(target=compactar)
+    hilo.start()
+    p50, p99 = medir(400)
+    hilo.join()
+
+    assert not errores
+    assert db.query(Consumo).count() < filas
+    # Los lotes se autorregulan por debajo de retention_max_batch_seconds
+    assert p99 < base_p99 + 2 * settings.retention_max_batch_seconds
+    assert p50 < base_p50 + settings.retention_max_batch_seconds
@@ -0,0 +1,143 @@
+"""
+Búsqueda de clientes del panel de administración (``app/search.py``).
+"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import search
+from app.database import ALEMBIC_INI, SessionLocal
+from app.search import search_clientes
+
+from .conftest import auth_headers, make_cliente
+
+
+@pytest.fixture
+def clientes(db):
+    make_cliente(db, "cli_mas", nombre="Ana Pérez", telefono="+1234567890")
+    make_cliente(db, "cli_sin", nombre="Luis Gómez", telefono="1234999000")
+    make_cliente(db, "cli_sep", nombre="Marta Ruiz", telefono="+54 (11) 5555-0000")
+    return db
+
+
+@pytest.mark.parametrize("busqueda, esperados", [
+    ("1234", {"cli_mas", "cli_sin"}),
+    ("+1234", {"cli_mas", "cli_sin"}),
+    ("123 456", {"cli_mas"}),
+    ("5411 5555", {"cli_sep"}),
+    ("+54 (11) 55", {"cli_sep"}),
+])
+def test_phone_prefix_ignores_plus_and_separators(clientes, busqueda, esperados):
+    encontrados, total = search_clientes(clientes, busqueda, None, 1, 20)
+
+    assert {c.id for c in encontrados} == esperados
+    assert total == len(esperados)
+
+
+@pytest.mark.parametrize("busqueda", ["---", "( )", "- -"])
+def test_separators_only_falls_back_to_text_search(clientes, busqueda):
+    encontrados, total = search_clientes(clientes, busqueda, None, 1, 20)
+
+    assert encontrados == []
+    assert total == 0
+
+
+def test_phone_prefix_uses_expression_index(clientes):
+    from app.models import Cliente, telefono_normalizado
+
+    consulta = clientes.query(Cliente.id).filter(
+        telefono_normalizado(Cliente.telefono) >= "1234",
+        telefono_normalizado(Cliente.telefono) < "1235",
+    ).statement.compile(clientes.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = clientes.execute(text(f"EXPLAIN QUERY PLAN {consulta}")).all()
+
+    assert "ix_clientes_telefono_normalizado" in str(plan)
+
+
+@pytest.fixture
+def migrated_db(monkeypatch):
+    """Sesión sobre el esquema de las migraciones (con la tabla FTS5 y sus triggers)"""
+    from alembic import command
+    from alembic.config import Config
+
+    # Sin el .ini: su configuración de logging silenciaría los loggers de la app
+    config = Config()
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    command.upgrade(config, "head")
+    monkeypatch.setattr(search, "_indices_disponibles", {})
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        command.downgrade(config, "base")
+
+
+@pytest.fixture
+def perez(migrated_db):
+    make_cliente(migrated_db, "cli_doble", nombre="Ana Pérez", email="ana.perez@telcox.test")
+    make_cliente(migrated_db, "cli_nombre", nombre="Luis Pérez Gómez", email="luis@telcox.test")
+    make_cliente(migrated_db, "cli_email", nombre="Marta Ruiz",
+                 email="marta.ruiz.perez.facturacion@empresa.telcox.test")
+    make_cliente(migrated_db, "cli_otro", nombre="Pedro Díaz", email="pedro@telcox.test")
+    make_cliente(migrated_db, "cli_baja", nombre="Eva Pérez", eliminado_en=datetime(2026, 10, 1))
+    return migrated_db
+
+
+def test_fts_search_is_ranked_by_relevance(perez):
+    assert perez.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'clientes_fts'")).first()
+
+    encontrados, total = search_clientes(perez, "perez", None, 1, 20)
+
+    # bm25: primero la que coincide en nombre y email; después pesa más la
+    # coincidencia en un campo corto que en uno largo
+    assert [c.id for c in encontrados] == ["cli_doble", "cli_nombre", "cli_email"]
+    assert total == 3
+
+
+def test_fts_search_by_word_prefix_and_without_accents(perez):
+    encontrados, _ = search_clientes(perez, "pér gó", None, 1, 20)
+
+    assert [c.id for c in encontrados] == ["cli_nombre"]
+
+
+def test_fts_index_follows_updates(perez):
+    cliente = perez.get(search.Cliente, "cli_otro")
+    cliente.nombre = "Pedro Pérez"
+    perez.commit()
+
+    encontrados, _ = search_clientes(perez, "pedro", None, 1, 20)
+    assert [c.id for c in encontrados] == ["cli_otro"]
+    assert "cli_otro" in {c.id for c in search_clientes(perez, "perez", None, 1, 20)[0]}
+
+
+def test_estimated_total_is_capped(perez, monkeypatch):
+    monkeypatch.setattr(search, "MAX_ESTIMATED_COUNT", 2)
+
+    encontrados, exacto = search_clientes(perez, "perez", None, 1, 20)
+    _, estimado = search_clientes(perez, "perez", None, 1, 20, estimar_total=True)
+
+    assert exacto == len(encontrados) == 3
+    assert estimado == 2
+
+
+def test_users_endpoint_reports_estimated_total(perez, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(search, "MAX_ESTIMATED_COUNT", 2)
+    cabeceras = auth_headers(perez.get(search.Cliente, "cli_otro"))
+    client = TestClient(app)
+
+    estimada = client.get("/admin/users", params={"search": "perez", "total": "estimado", "size": 1},
+                          headers=cabeceras).json()
+    exacta = client.get("/admin/users", params={"search": "perez", "size": 1}, headers=cabeceras).json()
+
+    assert estimada["total_estimado"] is True
+    assert estimada["total"] == 2 and estimada["pages"] == 2
+    assert [c["id"] for c in estimada["items"]] == ["cli_doble"]
+    assert exacta["total_estimado"] is False
+    assert exacta["total"] == 3
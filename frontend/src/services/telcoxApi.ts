@@ -131,6 +131,7 @@ export interface PaginatedResponse<T> {
   page: number;
   size: number;
   pages: number;
+  total_estimado?: boolean;
 }
 
 export interface TelcoxLoginRequest {
@@ -292,17 +293,81 @@ export const telcoxConsumoService = {
   },
 };
 
+// Dashboard completo en una sola petición (GET /dashboard/bootstrap)
+export interface TelcoxDashboardBootstrap {
+  resumen: TelcoxDashboardResumen & { saldo: TelcoxSaldoResponse };
+  graficos: {
+    consumo_diario: TelcoxConsumoGrafico[];
+    consumo_mensual: TelcoxConsumoGrafico[];
+    facturacion_mensual: any[];
+  };
+  consumos: PaginatedResponse<TelcoxConsumoResponse>;
+  facturas: PaginatedResponse<TelcoxFacturaResponse>;
+}
+
 export const telcoxDashboardService = {
-  getDashboardData: async (): Promise<{
-    resumen: TelcoxDashboardResumen;
-    graficos: TelcoxConsumoGrafico[];
-  }> => {
-    const [resumen, graficos] = await Promise.all([
-      telcoxConsumoService.getConsumoResumen(),
-      telcoxConsumoService.getConsumoGrafico()
-    ]);
-    
-    return { resumen, graficos };
+  getBootstrap: async (size: number = 10): Promise<TelcoxDashboardBootstrap> => {
+    const response = await telcoxApi.get<TelcoxDashboardBootstrap>(`/dashboard/bootstrap?size=${size}`);
+    return response.data;
+  },
+};
+
+// Eventos en tiempo real del usuario (GET /user/stream, Server-Sent Events)
+export interface TelcoxStreamEvent {
+  tipo: 'consumo' | 'saldo' | 'factura' | 'resync';
+  datos?: any;
+}
+
+export const telcoxStreamService = {
+  // Se usa fetch en lugar de EventSource para poder enviar el token en la cabecera.
+  // Devuelve una función para cerrar la suscripción.
+  subscribe: (onEvent: (evento: TelcoxStreamEvent) => void): (() => void) => {
+    const controller = new AbortController();
+    let retryMs = 3000;
+
+    const connect = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const token = await getAuthToken();
+          const response = await fetch(`${telcoxApi.defaults.baseURL}/user/stream`, {
+            headers: token ? { Authorization: `Bearer ${token}` } : {},
+            signal: controller.signal,
+          });
+          if (!response.ok || !response.body) {
+            throw new Error(`Stream no disponible (${response.status})`);
+          }
+
+          const reader = response.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = '';
+          while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const bloques = buffer.split('\n\n');
+            buffer = bloques.pop() || '';
+            for (const bloque of bloques) {
+              for (const linea of bloque.split('\n')) {
+                if (linea.startsWith('retry: ')) {
+                  retryMs = parseInt(linea.slice(7), 10) || retryMs;
+                } else if (linea.startsWith('data: ')) {
+                  onEvent(JSON.parse(linea.slice(6)));
+                }
+              }
+            }
+          }
+          // Tras una reconexión se pudieron perder eventos
+          onEvent({ tipo: 'resync' });
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('Error en el stream de eventos:', error);
+        }
+        await new Promise((resolve) => setTimeout(resolve, retryMs));
+      }
+    };
+
+    connect();
+    return () => controller.abort();
   },
 };
 
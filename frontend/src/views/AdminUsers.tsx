@@ -38,6 +38,7 @@ import {
 } from '@ant-design/icons';
 import { telcoxService } from '../services/telcoxApi';
 import type { TelcoxUser, TelcoxUserCreate, TelcoxUserUpdate } from '../services/telcoxApi';
+import { config } from '../config/env';
 
 const { Title, Text } = Typography;
 const { Option } = Select;
@@ -51,14 +52,22 @@ export default function AdminUsers() {
   const [searchText, setSearchText] = useState('');
   const [selectedEstado, setSelectedEstado] = useState<string>('');
 
+  // La búsqueda se resuelve en el servidor con índices; se espera a que el
+  // usuario deje de escribir para no lanzar una consulta por tecla
   useEffect(() => {
-    fetchData();
-  }, []);
+    const timer = setTimeout(() => fetchData(), 300);
+    return () => clearTimeout(timer);
+  }, [searchText, selectedEstado]);
 
   const fetchData = async () => {
     setLoading(true);
     try {
-      const usersData = await telcoxService.getUsers();
+      const usersData = await telcoxService.getUsers(
+        1,
+        config.DEFAULT_PAGE_SIZE,
+        searchText.trim() || undefined,
+        selectedEstado || undefined
+      );
       setUsers(usersData.items);
     } catch (error) {
       message.error('Error al cargar los datos');
@@ -147,16 +156,8 @@ export default function AdminUsers() {
     }
   };
 
-  const filteredUsers = users.filter(user => {
-    const matchesSearch = 
-      user.nombre.toLowerCase().includes(searchText.toLowerCase()) ||
-      user.email.toLowerCase().includes(searchText.toLowerCase()) ||
-      user.telefono.includes(searchText);
-    
-    const matchesEstado = !selectedEstado || user.estado_cuenta === selectedEstado;
-    
-    return matchesSearch && matchesEstado;
-  });
+  // Los usuarios ya llegan filtrados y ordenados por relevancia desde la API
+  const filteredUsers = users;
 
   const getEstadoColor = (estado: string) => {
     return estado === 'activo' ? 'green' : 'red';
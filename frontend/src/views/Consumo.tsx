@@ -36,12 +36,13 @@ import {
   BarChart,
   Bar
 } from 'recharts';
-import { telcoxSaldoService, telcoxConsumoService, handleAuthError } from '../services/telcoxApi';
+import { telcoxConsumoService, telcoxDashboardService, telcoxStreamService, handleAuthError } from '../services/telcoxApi';
 import type {
   TelcoxSaldoResponse,
   TelcoxConsumoResponse,
   TelcoxDashboardResumen,
-  TelcoxConsumoGrafico
+  TelcoxConsumoGrafico,
+  TelcoxStreamEvent
 } from '../services/telcoxApi';
 import { config } from '../config/env';
 import * as localforage from 'localforage';
@@ -110,6 +111,37 @@ export default function Consumo() {
     }
   }, [isAuthenticated, user]);
 
+  // Aplicar los cambios que empuja el servidor en lugar de volver a consultar
+  useEffect(() => {
+    if (!isAuthenticated || !user) return;
+
+    const unsubscribe = telcoxStreamService.subscribe((evento: TelcoxStreamEvent) => {
+      switch (evento.tipo) {
+        case 'consumo':
+          setTotalConsumos((total) => total + 1);
+          if (currentPage === 1 && filtroServicio === 'todos' && !filtroFecha) {
+            setConsumos((actuales) => [evento.datos, ...actuales].slice(0, pageSize));
+          }
+          break;
+        case 'saldo':
+          setSaldo((actual) => actual && {
+            ...actual,
+            saldo_actual: evento.datos.saldo_actual,
+            saldo_disponible: evento.datos.saldo_disponible,
+          });
+          break;
+        case 'factura':
+          fetchResumen(0);
+          break;
+        case 'resync':
+          fetchData(0);
+          break;
+      }
+    });
+
+    return unsubscribe;
+  }, [isAuthenticated, user, currentPage, pageSize, filtroServicio, filtroFecha]);
+
   // Recargar consumos cuando cambien los filtros
   useEffect(() => {
     if (isAuthenticated && user) {
@@ -117,32 +149,6 @@ export default function Consumo() {
     }
   }, [filtroServicio, filtroFecha, currentPage, pageSize]);
 
-  const fetchSaldo = async (retryCount: number = 0) => {
-    try {
-      const response = await telcoxSaldoService.getUserSaldo();
-      setSaldo(response);
-      console.log('Saldo obtenido:', response);
-    } catch (error: any) {
-      console.error('Error obteniendo saldo:', error);
-      
-      // Usar la nueva función para manejar errores de autenticación
-      const shouldRedirect = await handleAuthError(error, retryCount);
-      
-      if (shouldRedirect) {
-        message.error('Sesión expirada. Redirigiendo al login...');
-        handleLogout();
-        return;
-      }
-      
-      // Si no es un error de autenticación o no requiere redirección
-      if (error.response?.status === 401) {
-        message.warning('Error de autenticación al obtener saldo. Puedes intentar refrescar o cerrar sesión manualmente.');
-      } else {
-        message.error('Error al obtener el saldo de la cuenta');
-      }
-    }
-  };
-
   const fetchConsumos = async (retryCount: number = 0) => {
     try {
       setDataLoading(true);
@@ -215,15 +221,26 @@ export default function Consumo() {
     }
   };
 
-  const fetchGraficos = async (retryCount: number = 0) => {
+  const fetchData = async (retryCount: number = 0) => {
+    // Con filtros o en otra página la tabla se carga aparte
+    const tablaInicial = currentPage === 1 && filtroServicio === 'todos' && !filtroFecha;
     try {
-      const response = await telcoxConsumoService.getConsumoGrafico();
-      setGraficos(response);
-      console.log('Gráficos obtenidos:', response);
+      setDataLoading(true);
+      // Una sola petición: resumen, saldo, gráficos y primera página de consumos
+      const response = await telcoxDashboardService.getBootstrap(pageSize);
+      setResumen(response.resumen);
+      setSaldo(response.resumen.saldo);
+      setGraficos(response.graficos.consumo_diario);
+      if (tablaInicial) {
+        setConsumos(response.consumos.items || []);
+        setTotalConsumos(response.consumos.total || 0);
+      } else {
+        await fetchConsumos(retryCount);
+      }
+      console.log('Dashboard obtenido:', response);
     } catch (error: any) {
-      console.error('Error obteniendo gráficos:', error);
+      console.error('Error cargando datos:', error);
       
-      // Usar la nueva función para manejar errores de autenticación
       const shouldRedirect = await handleAuthError(error, retryCount);
       
       if (shouldRedirect) {
@@ -232,26 +249,11 @@ export default function Consumo() {
         return;
       }
       
-      // Si no es un error de autenticación o no requiere redirección
       if (error.response?.status === 401) {
-        message.warning('Error de autenticación al obtener gráficos. Puedes intentar refrescar o cerrar sesión manualmente.');
+        message.warning('Error de autenticación al cargar el dashboard. Puedes intentar refrescar o cerrar sesión manualmente.');
       } else {
-        message.error('Error al obtener los gráficos de consumo');
+        message.error('Error al cargar los datos del dashboard');
       }
-    }
-  };
-
-  const fetchData = async (retryCount: number = 0) => {
-    try {
-      setDataLoading(true);
-      await Promise.all([
-        fetchSaldo(retryCount),
-        fetchConsumos(retryCount),
-        fetchResumen(retryCount),
-        fetchGraficos(retryCount)
-      ]);
-    } catch (error) {
-      console.error('Error cargando datos:', error);
     } finally {
       setDataLoading(false);
     }
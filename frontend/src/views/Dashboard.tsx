@@ -1,14 +1,17 @@
-import { useEffect } from 'react';
+import { useEffect, useState } from 'react';
 import { useAuthStore } from '../stores/authStore';
+import { telcoxDashboardService } from '../services/telcoxApi';
+import type { TelcoxDashboardBootstrap } from '../services/telcoxApi';
 
-import { Card, Row, Col, Statistic, Button, Typography, Divider } from 'antd';
+import { Card, Row, Col, Statistic, Button, Typography, Divider, message } from 'antd';
 import { 
-  BugOutlined, 
-  ToolOutlined, 
   DatabaseOutlined, 
   UserOutlined, 
   LogoutOutlined,
-  FieldTimeOutlined
+  FieldTimeOutlined,
+  WalletOutlined,
+  FileTextOutlined,
+  DollarOutlined
 } from '@ant-design/icons';
 
 
@@ -18,35 +21,29 @@ export default function Dashboard() {
   const user = useAuthStore((state) => state.user);
   const logout = useAuthStore((state) => state.logout);
 
-  // const [plagas, setPlagas] = useState<Plaga[]>([]);
-  // const [insumos, setInsumos] = useState<Insumo[]>([]);
-  // const [equipos, setEquipos] = useState<Equipo[]>([]);
-  // const [lotes, setLotes] = useState<Lote[]>([]);
+  const [bootstrap, setBootstrap] = useState<TelcoxDashboardBootstrap | null>(null);
+  const [loading, setLoading] = useState(true);
 
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // const [plagasData, insumosData, equiposData, lotesData] = await Promise.all([
-        //   plagaService.getAll(),
-        //   insumoService.getAll(),
-        //   equipoService.getAll(),
-        //   loteService.getAll()
-        // ]);
-        // setPlagas(plagasData);
-        // setInsumos(insumosData);
-        // setEquipos(equiposData);
-        // setLotes(lotesData);
+        // Una sola petición: resumen con saldo, gráficos y primeras páginas
+        const data = await telcoxDashboardService.getBootstrap(5);
+        setBootstrap(data);
       } catch (error) {
         console.error('Error al cargar datos:', error);
-              } finally {
-          // setLoading(false);
-        }
+        message.error('Error al cargar los datos del dashboard');
+      } finally {
+        setLoading(false);
+      }
     };
 
     fetchData();
   }, []);
 
+  const resumen = bootstrap?.resumen;
+
   const handleLogout = () => {
     logout();
     // La navegación se maneja en el Layout
@@ -86,50 +83,53 @@ export default function Dashboard() {
       {/* Estadísticas principales */}
       <Row gutter={[16, 16]} style={{ marginBottom: 32 }}>
         <Col xs={24} sm={12} md={8} lg={6}>
-          <Card>
+          <Card loading={loading}>
             <Statistic
-              title="Plagas Registradas"
-              value={0}
-              prefix={<BugOutlined style={{ color: '#ff4d4f' }} />}
-              valueStyle={{ color: '#ff4d4f' }}
+              title="Consumos del Mes"
+              value={resumen?.consumos_mes ?? 0}
+              prefix={<DatabaseOutlined style={{ color: '#1890ff' }} />}
+              valueStyle={{ color: '#1890ff' }}
             />
           </Card>
         </Col>
         <Col xs={24} sm={12} md={8} lg={6}>
-          <Card>
+          <Card loading={loading}>
             <Statistic
-              title="Insumos Disponibles"
-              value={0}
-              prefix={<DatabaseOutlined style={{ color: '#1890ff' }} />}
-              valueStyle={{ color: '#1890ff' }}
+              title="Gasto del Mes"
+              value={resumen?.monto_mes ?? 0}
+              precision={2}
+              prefix={<DollarOutlined style={{ color: '#722ed1' }} />}
+              valueStyle={{ color: '#722ed1' }}
             />
           </Card>
         </Col>
         <Col xs={24} sm={12} md={8} lg={6}>
-          <Card>
+          <Card loading={loading}>
             <Statistic
-              title="Equipos Activos"
-              value={0}
-              prefix={<ToolOutlined style={{ color: '#52c41a' }} />}
+              title="Saldo Disponible"
+              value={resumen?.saldo?.saldo_disponible ?? 0}
+              precision={2}
+              suffix={resumen?.saldo?.moneda}
+              prefix={<WalletOutlined style={{ color: '#52c41a' }} />}
               valueStyle={{ color: '#52c41a' }}
             />
           </Card>
         </Col>
         <Col xs={24} sm={12} md={8} lg={6}>
-          <Card>
+          <Card loading={loading}>
             <Statistic
-              title="Stock Total"
-              value={0}
-              prefix={<DatabaseOutlined style={{ color: '#722ed1' }} />}
-              valueStyle={{ color: '#722ed1' }}
+              title="Facturas Pendientes"
+              value={resumen?.facturas_pendientes ?? 0}
+              prefix={<FileTextOutlined style={{ color: '#ff4d4f' }} />}
+              valueStyle={{ color: '#ff4d4f' }}
             />
           </Card>
         </Col>
         <Col xs={24} sm={12} md={8} lg={6}>
-          <Card>
+          <Card loading={loading}>
             <Statistic
-              title="Lotes Activos"
-              value={0}
+              title="Consumos de Hoy"
+              value={resumen?.consumos_hoy ?? 0}
               prefix={<FieldTimeOutlined style={{ color: '#52c41a' }} />}
               valueStyle={{ color: '#52c41a' }}
             />